@@ -16,7 +16,118 @@ DATABASE_URL = os.getenv(
 API_PREFIX = os.getenv("API_PREFIX", "/api")
 
 # 调度器配置
-SCHEDULER_INTERVAL = float(os.getenv("SCHEDULER_INTERVAL", "2.0"))
+# Dispatcher 由 notifier 事件驱动，此间隔仅用于兜底的安全轮询
+SCHEDULER_INTERVAL = float(os.getenv("SCHEDULER_INTERVAL", "30.0"))
+# 同时运行的 Executor 全局上限
+SCHEDULER_MAX_WORKERS = int(os.getenv("SCHEDULER_MAX_WORKERS", "16"))
+# 单个 Agent 的默认并发上限（Agent.max_concurrency 为空时使用）
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "4"))
+# 每批派发最多取的 pending Ticket 数，每批在一个短事务中认领并提交
+SCHEDULER_DISPATCH_BATCH = int(os.getenv("SCHEDULER_DISPATCH_BATCH", "256"))
+# Ticket 租约时长（秒），Dispatcher 每 1/3 租约时长续约一次
+SCHEDULER_LEASE_TTL = float(os.getenv("SCHEDULER_LEASE_TTL", "60.0"))
+# 关闭时等待 Executor 在迭代边界退出的最长时间（秒），超时后取消，应小于租约时长
+SCHEDULER_DRAIN_TIMEOUT = float(os.getenv("SCHEDULER_DRAIN_TIMEOUT", "30.0"))
+# Executor worker 进程数，0 表示在 API 进程的事件循环中运行 Executor
+SCHEDULER_WORKER_PROCESSES = int(os.getenv("SCHEDULER_WORKER_PROCESSES", "0"))
+# worker 进程向 API 进程回报指标、淘汰闲置停放 Executor 的间隔（秒）
+SCHEDULER_WORKER_REPORT_INTERVAL = float(
+    os.getenv("SCHEDULER_WORKER_REPORT_INTERVAL", "5.0")
+)
+# 挂起 Executor 在内存中停放的最长时间（秒）和总内存上限（字节），超出后淘汰
+PARKING_IDLE_TTL = float(os.getenv("PARKING_IDLE_TTL", "1800.0"))
+PARKING_MAX_BYTES = int(os.getenv("PARKING_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# LLM 限流配置（进程内所有 Executor 共享，多进程模式下每个 worker 进程各占 1/N，0 表示不限制）
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+# 同时进行的 LLM 调用上限（AIMD 并发窗口的最大值）
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# 瞬时错误（429/5xx/超时/连接错误）的重试：最大次数、从首次调用起的最长重试时间（秒，0 表示不限制）、
+# 指数退避的初始值和上限（秒）。次数和时间可按 Agent 覆盖
+LLM_RETRY_MAX_RETRIES = int(
+    os.getenv("LLM_RETRY_MAX_RETRIES", os.getenv("LLM_RATE_LIMIT_RETRIES", "5"))
+)
+LLM_RETRY_MAX_ELAPSED = float(os.getenv("LLM_RETRY_MAX_ELAPSED", "300.0"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "60.0"))
+# 共享 AsyncAnthropic 客户端的连接池：最大连接数、keepalive 连接数及其空闲过期时间（秒）
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "64"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "32"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60.0"))
+# 单次模型请求的超时（秒）
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "600.0"))
+# 为 system、工具定义和会话前缀设置提示缓存断点（Anthropic 兼容接口不支持 cache_control 时关闭）
+LLM_PROMPT_CACHE = os.getenv("LLM_PROMPT_CACHE", "true").lower() in ("1", "true", "yes")
+# 流式调用模型：增量发布输出并逐步持久化 assistant 消息
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() in ("1", "true", "yes")
+# 流式输出期间部分 assistant 消息写入数据库的最小间隔（秒）
+LLM_STREAM_FLUSH_INTERVAL = float(os.getenv("LLM_STREAM_FLUSH_INTERVAL", "1.0"))
+# 每个实时输出订阅者的事件队列长度（消费过慢时丢弃最旧的事件）
+STREAM_SUBSCRIBER_QUEUE = int(os.getenv("STREAM_SUBSCRIBER_QUEUE", "1000"))
+# SSE 连接空闲时发送心跳的间隔（秒）
+STREAM_HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "15.0"))
+# 单次模型调用的最大输出 token 数
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "4096"))
+# 未在上下文窗口表中的模型的上下文窗口（token）
+LLM_CONTEXT_WINDOW_TOKENS = int(os.getenv("LLM_CONTEXT_WINDOW_TOKENS", "200000"))
+# 上下文压缩：最近多少条消息保持原样、旧工具结果截为多少字符的摘录
+CONTEXT_KEEP_RECENT_MESSAGES = int(os.getenv("CONTEXT_KEEP_RECENT_MESSAGES", "6"))
+CONTEXT_TOOL_RESULT_EXCERPT_CHARS = int(
+    os.getenv("CONTEXT_TOOL_RESULT_EXCERPT_CHARS", "2000")
+)
+# 省略旧轮次时调用模型生成摘要（关闭时以一条省略说明代替）
+CONTEXT_SUMMARY = os.getenv("CONTEXT_SUMMARY", "false").lower() in ("1", "true", "yes")
+# 模型路由：Agent 未设置 model 时使用的默认模型
+ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-3-5-sonnet-20241022")
+# ANTHROPIC_BASE_URL（服务商 default）之外提供相同模型的备用地址，格式 name=base_url,...；
+# API key 取 LLM_PROVIDER_<NAME>_API_KEY，未设置时与 default 相同
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "")
+# 路由统计：每个 模型@服务商 保留最近多少次调用；错误率达到阈值（且至少有最少样本数）时
+# 视为不健康，排到回退链末尾，最近一次失败后冷却时间（秒）过后重新探测
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "100"))
+LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+LLM_ROUTER_MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "5"))
+LLM_ROUTER_COOLDOWN = float(os.getenv("LLM_ROUTER_COOLDOWN", "30.0"))
+# 后面还有回退目标时，每个目标的瞬时错误最多重试次数（之后回退到下一个目标）
+LLM_ROUTER_FALLBACK_RETRIES = int(os.getenv("LLM_ROUTER_FALLBACK_RETRIES", "1"))
+# 模型调用的传输方式：live（直接调用）、record（调用并把请求/响应对写入本地存储）、
+# replay（只从本地存储回放，不访问网络）。存储目录按规范化请求的哈希保存响应
+LLM_TRANSPORT = os.getenv("LLM_TRANSPORT", "live").lower()
+LLM_CASSETTE_DIR = os.getenv("LLM_CASSETTE_DIR", f"{BASE_DIR}/data/llm_cassettes")
+# 回放时的人工延迟：固定毫秒数 + 录制时耗时的倍数（0 表示不使用录制时的耗时）
+LLM_REPLAY_LATENCY_MS = float(os.getenv("LLM_REPLAY_LATENCY_MS", "0"))
+LLM_REPLAY_LATENCY_SCALE = float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "0"))
+# 回放未命中时：error（抛出错误）或 live（调用模型并录制）
+LLM_REPLAY_MISS = os.getenv("LLM_REPLAY_MISS", "error").lower()
+# 计算请求哈希时忽略工具结果内容（工具输出不确定时，如重放历史 Ticket）
+LLM_REPLAY_IGNORE_TOOL_RESULTS = os.getenv(
+    "LLM_REPLAY_IGNORE_TOOL_RESULTS", "false"
+).lower() in ("1", "true", "yes")
+# 同一轮中并发执行的工具调用上限（1 表示全部串行）
+TOOL_CALL_CONCURRENCY = int(os.getenv("TOOL_CALL_CONCURRENCY", "4"))
+# 消息、步骤和模型调用记录的批量写入：待写入行数达到上限时立即提交，
+# 否则最晚在第一行入队后间隔（秒）提交；状态变化（挂起/完成/失败）时总是立即提交
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "100"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+# 未在价格表中的模型按此价格估算费用（美元 / 百万 token）
+LLM_INPUT_PRICE_PER_MTOK = float(os.getenv("LLM_INPUT_PRICE_PER_MTOK", "3.0"))
+LLM_OUTPUT_PRICE_PER_MTOK = float(os.getenv("LLM_OUTPUT_PRICE_PER_MTOK", "15.0"))
+
+# Ticket 默认预算（Ticket 和 Agent 均未设置时使用，0 表示不限制）
+TICKET_MAX_WALL_SECONDS = float(os.getenv("TICKET_MAX_WALL_SECONDS", "0"))
+TICKET_MAX_INPUT_TOKENS = int(os.getenv("TICKET_MAX_INPUT_TOKENS", "0"))
+TICKET_MAX_OUTPUT_TOKENS = int(os.getenv("TICKET_MAX_OUTPUT_TOKENS", "0"))
+TICKET_MAX_COST_USD = float(os.getenv("TICKET_MAX_COST_USD", "0"))
+# 已完成 Ticket 结果的默认缓存时长（秒，仅对启用缓存的 Agent 生效，0 表示只合并执行中的请求）
+TICKET_CACHE_TTL = int(os.getenv("TICKET_CACHE_TTL", "3600"))
+
+# 日志配置：级别、格式（text / json）；模型请求内容以 DEBUG 级别记录，
+# 每条最多记录的字符数及记录请求内容的 Ticket 比例（0~1，按 Ticket ID 抽样）
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.1"))
 
 # CORS 配置
 CORS_ORIGINS = os.getenv(
@@ -1,15 +1,150 @@
-"""日志配置模块 - 统一配置日志输出到文件和控制台"""
+"""日志配置模块 - 统一配置日志输出到文件和控制台
 
+- 日志记录经 QueueHandler 入队，控制台和文件输出在 QueueListener 线程中完成，
+  磁盘 I/O 不阻塞事件循环
+- LOG_FORMAT=json 时每条日志输出为一行 JSON（含 extra 传入的字段，如 ticket_id）
+- 大对象（如模型请求消息）用 Payload 包装后以 %s 参数传入：只有日志级别启用时才序列化，
+  序列化在达到 LOG_PAYLOAD_MAX_CHARS 后停止
+- payload_sampled(ticket_id) 按 LOG_PAYLOAD_SAMPLE_RATE 对 Ticket 抽样，同一 Ticket 的结果固定
+- 指标：log_records（按级别细分为 log_records.<level>）、log_chars 计数，log_emit（入队耗时）；
+  start_log_meter() 统计当前任务（如一个 Executor）产生的日志量
+"""
+
+import atexit
+import json
 import logging
+import queue
+import time
+import zlib
+from contextvars import ContextVar
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from typing import Any
+
+from app.config import (
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_PAYLOAD_MAX_CHARS,
+    LOG_PAYLOAD_SAMPLE_RATE,
+)
 
 # 日志目录
 LOG_DIR = Path(__file__).parent.parent / ".log"
 
+# LogRecord 的标准属性（其余属性为 extra 传入的字段）
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LogMeter:
+    """一个任务产生的日志条数和字符数"""
+
+    __slots__ = ("records", "chars")
+
+    def __init__(self):
+        self.records = 0
+        self.chars = 0
+
+    def take(self) -> tuple[int, int]:
+        """返回并清零自上次调用以来的计数"""
+        counts = (self.records, self.chars)
+        self.records = self.chars = 0
+        return counts
+
+
+_meter: ContextVar[LogMeter | None] = ContextVar("log_meter", default=None)
+
+
+def start_log_meter() -> LogMeter:
+    """在当前上下文（asyncio 任务）中开始统计日志量"""
+    meter = LogMeter()
+    _meter.set(meter)
+    return meter
+
+
+class MeteredQueueHandler(QueueHandler):
+    """入队时格式化消息并记录日志量和耗时"""
+
+    def __init__(self, log_queue: queue.Queue, metrics: Any):
+        super().__init__(log_queue)
+        self.metrics = metrics
+
+    def emit(self, record: logging.LogRecord):
+        started = time.perf_counter()
+        try:
+            prepared = self.prepare(record)
+            self.enqueue(prepared)
+        except Exception:
+            self.handleError(record)
+            return
+        chars = len(prepared.msg)
+        meter = _meter.get()
+        if meter is not None:
+            meter.records += 1
+            meter.chars += chars
+        self.metrics.increment("log_records")
+        self.metrics.increment(f"log_records.{record.levelname.lower()}")
+        self.metrics.increment("log_chars", chars)
+        self.metrics.record_latency("log_emit", time.perf_counter() - started)
+
+
+class Payload:
+    """延迟序列化的日志参数：格式化时才转为 JSON，超过 max_chars 的部分截断"""
+
+    __slots__ = ("value", "max_chars")
+
+    def __init__(self, value: Any, max_chars: int = LOG_PAYLOAD_MAX_CHARS):
+        self.value = value
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+        parts = []
+        size = 0
+        for chunk in encoder.iterencode(self.value):
+            parts.append(chunk)
+            size += len(chunk)
+            if size > self.max_chars:
+                return "".join(parts)[: self.max_chars] + "...(truncated)"
+        return "".join(parts)
+
+
+def payload_sampled(ticket_id: str, rate: float = LOG_PAYLOAD_SAMPLE_RATE) -> bool:
+    """Ticket 是否被抽中记录请求内容（按 ID 哈希，同一 Ticket 在各进程和重启后结果一致）"""
+    if rate <= 0:
+        return False
+    if rate >= 1:
+        return True
+    return zlib.crc32(ticket_id.encode()) % 10000 < rate * 10000
+
 
 def setup_logging():
     """配置日志系统"""
+    global _listener
+    from app.scheduler.metrics import scheduler_metrics
+
     # 确保日志目录存在
     LOG_DIR.mkdir(exist_ok=True)
 
@@ -17,27 +152,32 @@ def setup_logging():
     log_file = LOG_DIR / f"app_{datetime.now().strftime('%Y%m%d')}.log"
 
     # 日志格式
-    log_format = "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s"
-    date_format = "%Y-%m-%d %H:%M:%S"
+    if LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
+            "%Y-%m-%d %H:%M:%S",
+        )
 
-    # 配置根日志器
+    # 配置根日志器（低于 LOG_LEVEL 的日志在调用处即被丢弃，参数不做格式化）
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
+    root_logger.setLevel(LOG_LEVEL)
 
-    # 清除已有的 handler（避免重复添加）
+    # 清除已有的 handler（避免重复添加），停止之前的输出线程
     root_logger.handlers.clear()
+    stop_logging()
 
-    # 控制台 Handler
+    # 控制台和文件 Handler 在输出线程中运行
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.DEBUG)  # 临时改为 DEBUG 级别用于调试
-    console_handler.setFormatter(logging.Formatter(log_format, date_format))
-    root_logger.addHandler(console_handler)
-
-    # 文件 Handler
+    console_handler.setFormatter(formatter)
     file_handler = logging.FileHandler(log_file, encoding="utf-8")
-    file_handler.setLevel(logging.DEBUG)  # 文件记录更详细的日志
-    file_handler.setFormatter(logging.Formatter(log_format, date_format))
-    root_logger.addHandler(file_handler)
+    file_handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue()
+    _listener = QueueListener(log_queue, console_handler, file_handler)
+    _listener.start()
+    root_logger.addHandler(MeteredQueueHandler(log_queue, scheduler_metrics))
 
     # 降低第三方库的日志级别
     logging.getLogger("watchfiles").setLevel(logging.WARNING)
@@ -49,4 +189,15 @@ def setup_logging():
         uv_logger.handlers = root_logger.handlers
         uv_logger.propagate = False
 
-    logging.info(f"Logging initialized, log file: {log_file}")
+    logging.info("Logging initialized, log file: %s", log_file)
+
+
+def stop_logging():
+    """输出队列中剩余的日志并停止输出线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -1,16 +1,16 @@
 """Agent Platform Backend - FastAPI Application"""
 
-# 初始化日志配置（必须在其他模块导入前完成）
-from app.logging_config import setup_logging
-
-setup_logging()
-
 # 加载 .env 文件（必须在 config 导入前完成）
 # override=True 确保 .env 中的值覆盖系统环境变量
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
+# 初始化日志配置（必须在其他模块导入前完成，日志配置读取 config）
+from app.logging_config import setup_logging  # noqa: E402
+
+setup_logging()
+
 from contextlib import asynccontextmanager  # noqa: E402
 import logging
 
@@ -19,7 +19,7 @@ from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
 
 from app.config import CORS_ORIGINS, API_PREFIX  # noqa: E402
 from app.database import init_db  # noqa: E402
-from app.routers import agents, tools, tickets, sessions, skills  # noqa: E402
+from app.routers import agents, tools, tickets, sessions, skills, scheduler  # noqa: E402
 
 # 导入所有 tools 模块以触发注册
 # 注意：这很重要，否则 registry 中为空
@@ -46,16 +46,27 @@ async def lifespan(app: FastAPI):
         logger.info("Syncing tools to database...")
         await sync_tools_to_database(db)
 
-    # 启动调度器
+    # 启动调度器（配置了 worker 进程时 Executor 在 worker 进程中运行）
+    from app.config import SCHEDULER_WORKER_PROCESSES
     from app.scheduler import Dispatcher
-
-    dispatcher = Dispatcher()
+    from app.scheduler.process_pool import ProcessWorkerPool
+
+    pool = (
+        ProcessWorkerPool(SCHEDULER_WORKER_PROCESSES)
+        if SCHEDULER_WORKER_PROCESSES > 0
+        else None
+    )
+    dispatcher = Dispatcher(pool=pool)
     await dispatcher.start()
 
     yield
 
-    # 关闭时清理
-    dispatcher.stop()
+    # 关闭时排空 Executor，未完成的 Ticket 放回 pending
+    await dispatcher.shutdown()
+
+    from app.scheduler.llm_client import close_llm_client
+
+    await close_llm_client()
 
 
 app = FastAPI(
@@ -80,6 +91,7 @@ app.include_router(tools.router, prefix=API_PREFIX)
 app.include_router(tickets.router, prefix=API_PREFIX)
 app.include_router(sessions.router, prefix=API_PREFIX)
 app.include_router(skills.router, prefix=API_PREFIX)
+app.include_router(scheduler.router, prefix=API_PREFIX)
 
 
 @app.get("/health")
@@ -7,6 +7,7 @@ from app.models.ticket import Ticket
 from app.models.session import Session
 from app.models.step import Step
 from app.models.message import Message
+from app.models.llm_call import LLMCall
 
 __all__ = [
     "Agent",
@@ -16,4 +17,5 @@ __all__ = [
     "Session",
     "Step",
     "Message",
+    "LLMCall",
 ]
@@ -3,7 +3,7 @@
 from datetime import datetime
 from typing import TYPE_CHECKING, List
 
-from sqlalchemy import String, Text, DateTime, Integer
+from sqlalchemy import Boolean, String, Text, DateTime, Float, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -33,6 +33,34 @@ class Agent(Base):
     )  # JSON string
     tool_names: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON array
 
+    # 调度：该 Agent 同时运行的最大 Ticket 数（为空使用全局默认）
+    max_concurrency: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # 调度：跨 Agent 加权公平调度中的权重
+    schedule_weight: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
+
+    # 预算：每个 Ticket 的墙钟时间（秒）、token 数和估算费用（美元）上限，为空使用全局默认
+    max_wall_seconds: Mapped[float | None] = mapped_column(Float, nullable=True)
+    max_input_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    max_output_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    max_cost_usd: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+    # 模型调用瞬时错误的最大重试次数和最长重试时间（秒），为空使用全局默认
+    llm_retry_max_retries: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    llm_retry_max_elapsed: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+    # 模型：首选模型（为空使用 ANTHROPIC_MODEL）、有序的回退模型列表（JSON 数组，
+    # 元素为 "模型名" 或 "模型名@服务商"），级联模式下模型链按从便宜到强排列
+    model: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    fallback_models: Mapped[str | None] = mapped_column(Text, nullable=True)
+    model_cascade: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+    # 配置版本，每次更新递增（参与 Ticket 缓存键）
+    version: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
+    # 结果缓存：相同内容的 Ticket 合并执行 / 复用 TTL 内的已完成结果
+    cache_enabled: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    # 缓存时长（秒），为空使用 TICKET_CACHE_TTL
+    cache_ttl: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
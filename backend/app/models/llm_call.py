@@ -0,0 +1,47 @@
+"""LLMCall Model"""
+
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from sqlalchemy import String, DateTime, Float, ForeignKey, Integer, Index
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from app.database import Base
+
+if TYPE_CHECKING:
+    from app.models.ticket import Ticket
+
+
+class LLMCall(Base):
+    """LLMCall 单次模型调用记录（token 用量、提示缓存命中、首 token 延迟和总耗时）"""
+
+    __tablename__ = "llm_calls"
+    __table_args__ = (Index("ix_llm_calls_ticket_id", "ticket_id"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    ticket_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False
+    )
+    session_id: Mapped[str | None] = mapped_column(String(36), nullable=True)
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+    # 服务商（default 或 LLM_PROVIDERS 中的名称）
+    provider: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    stop_reason: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    # input_tokens 不含缓存写入/读取的 token
+    input_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    output_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    cache_write_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    cache_read_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    cost_usd: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    latency_ms: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    # 首个可见 token 的延迟（流式调用）
+    first_token_ms: Mapped[float | None] = mapped_column(Float, nullable=True)
+    # 成功前因瞬时错误重试的次数
+    retries: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    # 关系
+    ticket: Mapped["Ticket"] = relationship("Ticket", back_populates="llm_calls")
+
+    def __repr__(self) -> str:
+        return f"<LLMCall(id={self.id}, model={self.model})>"
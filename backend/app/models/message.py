@@ -4,7 +4,7 @@ from datetime import datetime
 from enum import Enum
 from typing import TYPE_CHECKING
 
-from sqlalchemy import String, Text, DateTime, ForeignKey, Integer
+from sqlalchemy import Boolean, String, Text, DateTime, ForeignKey, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -20,6 +20,8 @@ class MessageRole(str, Enum):
     ASSISTANT = "assistant"
     SYSTEM = "system"
     TOOL = "tool"
+    # 已省略轮次的摘要（由上下文管理生成，不作为普通消息发给模型）
+    SUMMARY = "summary"
 
 
 class Message(Base):
@@ -34,6 +36,8 @@ class Message(Base):
     role: Mapped[str] = mapped_column(String(20), nullable=False)
     content: Mapped[str] = mapped_column(Text, nullable=False)
     timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # 流式输出中尚未完成的 assistant 消息（不进入模型上下文）
+    partial: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
 
     # 关系
     session: Mapped["Session"] = relationship("Session", back_populates="messages")
@@ -4,7 +4,7 @@ from datetime import datetime
 from enum import Enum
 from typing import TYPE_CHECKING, List
 
-from sqlalchemy import String, Text, DateTime, ForeignKey
+from sqlalchemy import String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -21,12 +21,15 @@ class SessionStatus(str, Enum):
     SUSPENDED = "suspended"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 
 class Session(Base):
     """Session 会话实体"""
 
     __tablename__ = "sessions"
+    # Dispatcher 按 Ticket 查找活跃 Session
+    __table_args__ = (Index("ix_sessions_ticket_status", "ticket_id", "status"),)
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     ticket_id: Mapped[str] = mapped_column(
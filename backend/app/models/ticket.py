@@ -4,13 +4,14 @@ from datetime import datetime
 from enum import Enum
 from typing import TYPE_CHECKING, List
 
-from sqlalchemy import String, Text, DateTime, ForeignKey
+from sqlalchemy import String, Text, DateTime, Float, ForeignKey, Integer, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
 
 if TYPE_CHECKING:
     from app.models.agent import Agent
+    from app.models.llm_call import LLMCall
     from app.models.session import Session
     from app.models.step import Step
 
@@ -18,17 +19,27 @@ if TYPE_CHECKING:
 class TicketStatus(str, Enum):
     """Ticket 状态枚举"""
 
+    SCHEDULED = "scheduled"
     PENDING = "pending"
     RUNNING = "running"
     SUSPENDED = "suspended"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 
 class Ticket(Base):
     """Ticket 工单聚合根"""
 
     __tablename__ = "tickets"
+    # Dispatcher 启动时按此索引加载定时 Ticket
+    __table_args__ = (
+        Index("ix_tickets_status_run_at", "status", "run_at"),
+        # Dispatcher 按 Agent 分组、priority 降序取 pending Ticket
+        Index("ix_tickets_status_agent_priority", "status", "agent_id", "priority"),
+        Index("ix_tickets_idempotency_key", "idempotency_key", unique=True),
+        Index("ix_tickets_cache_key", "cache_key"),
+    )
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True)
     agent_id: Mapped[str] = mapped_column(
@@ -37,9 +48,44 @@ class Ticket(Base):
     status: Mapped[str] = mapped_column(
         String(20), default=TicketStatus.PENDING.value, nullable=False
     )
+    # 派发优先级（同一 Agent 内越大越先派发）
+    priority: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     params: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON
     context: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON
     error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # complete_task 的摘要和结果
+    result: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON
+    # 客户端提供的幂等键（Idempotency-Key 请求头），相同键只创建一次
+    idempotency_key: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    # 内容缓存键（仅启用缓存的 Agent），见 app/services/ticket_cache.py
+    cache_key: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # 结构化失败原因（如 budget_wall_clock），便于统计
+    failure_reason: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    # 定时执行：scheduled 状态的 Ticket 在 run_at（UTC）到达时进入 pending
+    run_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # 重复间隔（秒）：到期时派生一个 pending 副本，自身的 run_at 顺延
+    repeat_interval: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # 预算：为空时使用 Agent 的设置，再为空使用全局默认
+    max_iterations: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    max_wall_seconds: Mapped[float | None] = mapped_column(Float, nullable=True)
+    max_input_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    max_output_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    max_cost_usd: Mapped[float | None] = mapped_column(Float, nullable=True)
+    # 累计用量（Executor 每个迭代边界写回）
+    usage_iterations: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    usage_input_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    usage_output_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    usage_cache_write_tokens: Mapped[int] = mapped_column(
+        Integer, default=0, nullable=False
+    )
+    usage_cache_read_tokens: Mapped[int] = mapped_column(
+        Integer, default=0, nullable=False
+    )
+    usage_cost_usd: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    usage_wall_seconds: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    # 调度租约：持有该 running Ticket 的 Dispatcher 及租约过期时间
+    lease_owner: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
@@ -53,6 +99,9 @@ class Ticket(Base):
     steps: Mapped[List["Step"]] = relationship(
         "Step", back_populates="ticket", cascade="all, delete-orphan"
     )
+    llm_calls: Mapped[List["LLMCall"]] = relationship(
+        "LLMCall", back_populates="ticket", cascade="all, delete-orphan"
+    )
 
     def __repr__(self) -> str:
         return f"<Ticket(id={self.id[:8]}, status={self.status})>"
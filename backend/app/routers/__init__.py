@@ -1,5 +1,5 @@
 """Agent Platform - API Routers Package"""
 
-from app.routers import agents, tools, tickets, sessions
+from app.routers import agents, tools, tickets, sessions, scheduler
 
-__all__ = ["agents", "tools", "tickets", "sessions"]
+__all__ = ["agents", "tools", "tickets", "sessions", "scheduler"]
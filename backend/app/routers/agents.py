@@ -64,6 +64,21 @@ async def create_agent(req: AgentCreate, db: AsyncSession = Depends(get_db)):
         max_iterations=req.max_iterations,
         default_params=json.dumps(req.default_params) if req.default_params else None,
         tool_names=json.dumps(req.tool_names) if req.tool_names else None,
+        max_concurrency=req.max_concurrency,
+        schedule_weight=req.schedule_weight,
+        max_wall_seconds=req.max_wall_seconds,
+        max_input_tokens=req.max_input_tokens,
+        max_output_tokens=req.max_output_tokens,
+        max_cost_usd=req.max_cost_usd,
+        llm_retry_max_retries=req.llm_retry_max_retries,
+        llm_retry_max_elapsed=req.llm_retry_max_elapsed,
+        model=req.model,
+        fallback_models=(
+            json.dumps(req.fallback_models) if req.fallback_models else None
+        ),
+        model_cascade=req.model_cascade,
+        cache_enabled=req.cache_enabled,
+        cache_ttl=req.cache_ttl,
     )
 
     db.add(agent)
@@ -102,6 +117,37 @@ async def update_agent(
         agent.default_params = json.dumps(req.default_params)
     if req.tool_names is not None:
         agent.tool_names = json.dumps(req.tool_names)
+    if req.max_concurrency is not None:
+        agent.max_concurrency = req.max_concurrency
+    if req.schedule_weight is not None:
+        agent.schedule_weight = req.schedule_weight
+    if req.max_wall_seconds is not None:
+        agent.max_wall_seconds = req.max_wall_seconds
+    if req.max_input_tokens is not None:
+        agent.max_input_tokens = req.max_input_tokens
+    if req.max_output_tokens is not None:
+        agent.max_output_tokens = req.max_output_tokens
+    if req.max_cost_usd is not None:
+        agent.max_cost_usd = req.max_cost_usd
+    if req.llm_retry_max_retries is not None:
+        agent.llm_retry_max_retries = req.llm_retry_max_retries
+    if req.llm_retry_max_elapsed is not None:
+        agent.llm_retry_max_elapsed = req.llm_retry_max_elapsed
+    if req.model is not None:
+        # 空字符串表示恢复使用 ANTHROPIC_MODEL
+        agent.model = req.model or None
+    if req.fallback_models is not None:
+        agent.fallback_models = (
+            json.dumps(req.fallback_models) if req.fallback_models else None
+        )
+    if req.model_cascade is not None:
+        agent.model_cascade = req.model_cascade
+    if req.cache_enabled is not None:
+        agent.cache_enabled = req.cache_enabled
+    if req.cache_ttl is not None:
+        agent.cache_ttl = req.cache_ttl
+    # 配置变更后旧的缓存结果不再命中
+    agent.version = (agent.version or 1) + 1
 
     await db.commit()
     await db.refresh(agent, ["tools"])
@@ -0,0 +1,20 @@
+"""Scheduler API Router
+
+提供调度器运行指标查询接口
+"""
+
+from fastapi import APIRouter
+
+from app.scheduler.stats import worker_stats
+from app.schemas.scheduler import SchedulerStatsResponse
+
+router = APIRouter(prefix="/scheduler", tags=["Scheduler"])
+
+
+@router.get("/stats", response_model=SchedulerStatsResponse)
+async def get_scheduler_stats():
+    """获取调度器指标（排队等待时间、队列深度、工作池占用、LLM 限流状态、模型路由统计）
+
+    多进程模式下包含各 worker 进程最近一次回报的指标。
+    """
+    return worker_stats.snapshot()
@@ -1,19 +1,24 @@
 """Sessions API Router"""
 
+import asyncio
 import json
 import uuid
 from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.database import get_db
+from app.config import STREAM_HEARTBEAT_INTERVAL
+from app.database import async_session_maker, get_db
 from app.models.session import Session, SessionStatus
 from app.models.message import Message, MessageRole
 from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.notifier import notify_ticket_ready
+from app.scheduler.streaming import stream_hub
 from app.schemas.session import (
     SessionSummary,
     SessionResponse,
@@ -90,6 +95,7 @@ async def get_session(session_id: str, db: AsyncSession = Depends(get_db)):
                 role=m.role,
                 content=m.content,
                 timestamp=m.timestamp,
+                partial=m.partial,
             )
             for m in messages
         ],
@@ -98,6 +104,46 @@ async def get_session(session_id: str, db: AsyncSession = Depends(get_db)):
     )
 
 
+async def session_event_stream(
+    request: Request,
+    session_id: str,
+    queue: asyncio.Queue,
+    heartbeat: float = STREAM_HEARTBEAT_INTERVAL,
+):
+    """SSE 帧生成器：转发订阅队列中的事件，空闲时发送心跳，客户端断开后退订"""
+    try:
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            data = json.dumps(event, ensure_ascii=False)
+            yield f"event: {event['type']}\ndata: {data}\n\n"
+    finally:
+        stream_hub.unsubscribe(session_id, queue)
+
+
+@router.get("/{session_id}/stream")
+async def stream_session(session_id: str, request: Request):
+    """订阅 Session 的实时输出（Server-Sent Events）
+
+    只推送订阅之后的增量；已落库的内容（含 partial 消息）通过 GET /sessions/{id} 获取。
+    """
+    # 不使用 get_db：避免在整个长连接期间占用数据库会话
+    async with async_session_maker() as db:
+        exists = await db.scalar(select(Session.id).where(Session.id == session_id))
+    if not exists:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    queue = stream_hub.subscribe(session_id)
+    return StreamingResponse(
+        session_event_stream(request, session_id, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post(
     "/{session_id}/messages",
     response_model=MessageResponse,
@@ -127,13 +173,17 @@ async def add_message(
     )
     db.add(message)
 
-    # 如果 Session 处于 suspended 状态，自动恢复
+    # 如果 Session 处于 suspended 状态，自动恢复（重新进入 pending 等待派发）
+    resumed = False
     if session.status == SessionStatus.SUSPENDED.value:
         session.status = SessionStatus.ACTIVE.value
         if session.ticket.status == TicketStatus.SUSPENDED.value:
-            session.ticket.status = TicketStatus.RUNNING.value
+            session.ticket.status = TicketStatus.PENDING.value
+            resumed = True
 
-    await db.flush()
+    await db.commit()
+    if resumed:
+        notify_ticket_ready()
 
     return MessageResponse(
         id=message.id,
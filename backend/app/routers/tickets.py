@@ -1,23 +1,39 @@
 """Tickets API Router"""
 
+import asyncio
 import json
 import uuid
+from contextlib import nullcontext
+from datetime import datetime, timezone
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.database import get_db
 from app.models.agent import Agent
+from app.models.llm_call import LLMCall
 from app.models.ticket import Ticket, TicketStatus
 from app.models.session import Session, SessionStatus
 from app.models.step import Step
+from app.scheduler.notifier import notify_ticket_ready, notify_ticket_scheduled
+from app.scheduler.parking import parking_lot
+from app.scheduler.registry import executor_registry
+from app.services.ticket_cache import (
+    compute_cache_key,
+    find_cached_ticket,
+    single_flight,
+)
 from app.schemas.ticket import (
     TicketSummary,
     TicketResponse,
+    TicketUsage,
+    LLMCallResponse,
     CreateTicketRequest,
+    UpdateTicketRequest,
     StepResponse,
     SessionSummary,
 )
@@ -25,6 +41,43 @@ from app.schemas.ticket import (
 router = APIRouter(prefix="/tickets", tags=["Tickets"])
 
 
+def _to_utc_naive(value: datetime | None) -> datetime | None:
+    """转换为数据库中使用的 naive UTC 时间"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _schedule_values(run_at: datetime | None, repeat_interval: int | None) -> dict:
+    """根据定时参数计算 Ticket 的状态和定时字段
+
+    未来执行或重复执行的 Ticket 为 scheduled，由 Dispatcher 定时堆到期后转为 pending；
+    重复但未指定 run_at 的从现在开始第一次执行。
+    """
+    now = datetime.utcnow()
+    run_at = _to_utc_naive(run_at)
+    if repeat_interval and run_at is None:
+        run_at = now
+    scheduled = bool(repeat_interval) or (run_at is not None and run_at > now)
+    return {
+        "status": TicketStatus.SCHEDULED.value
+        if scheduled
+        else TicketStatus.PENDING.value,
+        "run_at": run_at,
+        "repeat_interval": repeat_interval,
+    }
+
+
+def _notify_ticket_changed(ticket_id: str, status: str, run_at: datetime | None):
+    """提交后通知 Dispatcher：scheduled 更新定时堆，pending 触发派发"""
+    if status == TicketStatus.SCHEDULED.value:
+        notify_ticket_scheduled(ticket_id, run_at)
+        return
+    notify_ticket_scheduled(ticket_id, None)
+    if status == TicketStatus.PENDING.value:
+        notify_ticket_ready()
+
+
 def _build_ticket_response(ticket: Ticket) -> TicketResponse:
     """构建 Ticket 响应"""
     # 找到当前活跃的 Session
@@ -76,9 +129,28 @@ def _build_ticket_response(ticket: Ticket) -> TicketResponse:
         agent_id=ticket.agent_id,
         agent_name=ticket.agent.name,
         status=ticket.status,
+        priority=ticket.priority,
+        run_at=ticket.run_at,
+        repeat_interval=ticket.repeat_interval,
         params=params,
         context=context,
         error_message=ticket.error_message,
+        failure_reason=ticket.failure_reason,
+        result=json.loads(ticket.result) if ticket.result else None,
+        max_iterations=ticket.max_iterations,
+        max_wall_seconds=ticket.max_wall_seconds,
+        max_input_tokens=ticket.max_input_tokens,
+        max_output_tokens=ticket.max_output_tokens,
+        max_cost_usd=ticket.max_cost_usd,
+        usage=TicketUsage(
+            iterations=ticket.usage_iterations or 0,
+            input_tokens=ticket.usage_input_tokens or 0,
+            output_tokens=ticket.usage_output_tokens or 0,
+            cache_write_tokens=ticket.usage_cache_write_tokens or 0,
+            cache_read_tokens=ticket.usage_cache_read_tokens or 0,
+            cost_usd=ticket.usage_cost_usd or 0.0,
+            wall_seconds=ticket.usage_wall_seconds or 0.0,
+        ),
         steps=steps,
         sessions=sessions_summary,  # 新增
         current_session_id=current_session.id if current_session else None,
@@ -111,6 +183,8 @@ async def list_tickets(
             agent_id=t.agent_id,
             agent_name=t.agent.name,
             status=t.status,
+            priority=t.priority,
+            run_at=t.run_at,
             created_at=t.created_at,
             updated_at=t.updated_at,
         )
@@ -137,9 +211,72 @@ async def get_ticket(ticket_id: str, db: AsyncSession = Depends(get_db)):
     return _build_ticket_response(ticket)
 
 
+@router.get("/{ticket_id}/llm-calls", response_model=List[LLMCallResponse])
+async def list_llm_calls(ticket_id: str, db: AsyncSession = Depends(get_db)):
+    """获取 Ticket 的模型调用记录（token 用量、提示缓存读写、耗时）"""
+    ticket = await db.get(Ticket, ticket_id)
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+    result = await db.execute(
+        select(LLMCall).where(LLMCall.ticket_id == ticket_id).order_by(LLMCall.id)
+    )
+    return result.scalars().all()
+
+
+async def _load_ticket_response(db: AsyncSession, ticket_id: str) -> TicketResponse:
+    """重新加载 Ticket 及其关系并构建响应"""
+    result = await db.execute(
+        select(Ticket)
+        .options(
+            selectinload(Ticket.agent),
+            selectinload(Ticket.sessions),
+            selectinload(Ticket.steps),
+        )
+        .where(Ticket.id == ticket_id)
+        .execution_options(populate_existing=True)
+    )
+    return _build_ticket_response(result.scalar_one())
+
+
+async def _replay_idempotent(
+    db: AsyncSession,
+    idempotency_key: str,
+    agent_id: str,
+    params: str | None,
+    context: str | None,
+    response: Response,
+) -> TicketResponse | None:
+    """幂等键已使用过时返回原 Ticket；请求内容不一致返回 422"""
+    result = await db.execute(
+        select(Ticket).where(Ticket.idempotency_key == idempotency_key)
+    )
+    ticket = result.scalar_one_or_none()
+    if not ticket:
+        return None
+    if (ticket.agent_id, ticket.params, ticket.context) != (agent_id, params, context):
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request",
+        )
+    response.status_code = status.HTTP_200_OK
+    response.headers["Idempotent-Replayed"] = "true"
+    return await _load_ticket_response(db, ticket.id)
+
+
 @router.post("", response_model=TicketResponse, status_code=status.HTTP_201_CREATED)
-async def create_ticket(req: CreateTicketRequest, db: AsyncSession = Depends(get_db)):
-    """创建 Ticket"""
+async def create_ticket(
+    req: CreateTicketRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    db: AsyncSession = Depends(get_db),
+):
+    """创建 Ticket
+
+    - 带 Idempotency-Key 请求头重试时返回首次创建的 Ticket（200）
+    - Agent 启用缓存时，相同内容的执行中 Ticket（coalesced）或 TTL 内已完成的
+      Ticket（hit）直接返回（200），X-Ticket-Cache 响应头标明命中类型
+    """
     from app.services.ticket_validator import validate_and_merge_params
     from jsonschema import ValidationError
 
@@ -159,18 +296,114 @@ async def create_ticket(req: CreateTicketRequest, db: AsyncSession = Depends(get
             status_code=422, detail=f"Parameter validation failed: {e.message}"
         )
 
-    ticket = Ticket(
-        id=str(uuid.uuid4()),
-        agent_id=req.agent_id,
-        status=TicketStatus.PENDING.value,
-        params=json.dumps(final_params) if final_params else None,
-        context=json.dumps(req.context) if req.context else None,
-    )
+    params_json = json.dumps(final_params) if final_params else None
+    context_json = json.dumps(req.context) if req.context else None
 
-    db.add(ticket)
-    await db.commit()
+    if idempotency_key:
+        replayed = await _replay_idempotent(
+            db, idempotency_key, req.agent_id, params_json, context_json, response
+        )
+        if replayed:
+            return replayed
+
+    # 只对立即执行的 Ticket 使用缓存（定时 Ticket 需要在指定时间执行）
+    cache_key = None
+    if (
+        agent.cache_enabled
+        and req.use_cache
+        and req.run_at is None
+        and req.repeat_interval is None
+    ):
+        cache_key = compute_cache_key(agent, final_params, req.context)
+
+    async with single_flight(cache_key) if cache_key else nullcontext():
+        if cache_key:
+            cached, outcome = await find_cached_ticket(db, agent, cache_key)
+            response.headers["X-Ticket-Cache"] = outcome
+            if cached:
+                response.status_code = status.HTTP_200_OK
+                return await _load_ticket_response(db, cached.id)
+
+        ticket = Ticket(
+            id=str(uuid.uuid4()),
+            agent_id=req.agent_id,
+            priority=req.priority,
+            params=params_json,
+            context=context_json,
+            idempotency_key=idempotency_key,
+            cache_key=cache_key,
+            max_iterations=req.max_iterations,
+            max_wall_seconds=req.max_wall_seconds,
+            max_input_tokens=req.max_input_tokens,
+            max_output_tokens=req.max_output_tokens,
+            max_cost_usd=req.max_cost_usd,
+            **_schedule_values(req.run_at, req.repeat_interval),
+        )
+
+        db.add(ticket)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # 并发请求使用了同一个幂等键，返回先提交的那个
+            await db.rollback()
+            replayed = None
+            if idempotency_key:
+                replayed = await _replay_idempotent(
+                    db, idempotency_key, req.agent_id, params_json, context_json, response
+                )
+            if not replayed:
+                raise
+            return replayed
+    _notify_ticket_changed(ticket.id, ticket.status, ticket.run_at)
+
+    return await _load_ticket_response(db, ticket.id)
+
+
+@router.patch("/{ticket_id}", response_model=TicketResponse)
+async def update_ticket(
+    ticket_id: str, req: UpdateTicketRequest, db: AsyncSession = Depends(get_db)
+):
+    """更新尚未开始执行的 Ticket（pending/scheduled）的优先级和定时"""
+    result = await db.execute(select(Ticket).where(Ticket.id == ticket_id))
+    ticket = result.scalar_one_or_none()
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+    if ticket.status not in [
+        TicketStatus.PENDING.value,
+        TicketStatus.SCHEDULED.value,
+    ]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot update ticket with status '{ticket.status}'",
+        )
+
+    fields = req.model_dump(exclude_unset=True)
+    values = {}
+    if fields.get("priority") is not None:
+        values["priority"] = req.priority
+    if "run_at" in fields or "repeat_interval" in fields:
+        values.update(
+            _schedule_values(
+                fields.get("run_at", ticket.run_at),
+                fields.get("repeat_interval", ticket.repeat_interval),
+            )
+        )
+
+    if values:
+        # 以读取时的状态为条件更新，避免覆盖 Dispatcher 同时进行的认领
+        updated = await db.execute(
+            update(Ticket)
+            .where(Ticket.id == ticket_id, Ticket.status == ticket.status)
+            .values(**values, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if updated.rowcount != 1:
+            raise HTTPException(
+                status_code=409, detail="Ticket was dispatched concurrently"
+            )
+        await db.commit()
 
-    # 重新加载关系
     result = await db.execute(
         select(Ticket)
         .options(
@@ -178,10 +411,12 @@ async def create_ticket(req: CreateTicketRequest, db: AsyncSession = Depends(get
             selectinload(Ticket.sessions),
             selectinload(Ticket.steps),
         )
-        .where(Ticket.id == ticket.id)
+        .where(Ticket.id == ticket_id)
+        .execution_options(populate_existing=True)
     )
     ticket = result.scalar_one()
-
+    if values:
+        _notify_ticket_changed(ticket.id, ticket.status, ticket.run_at)
     return _build_ticket_response(ticket)
 
 
@@ -207,22 +442,84 @@ async def resume_ticket(ticket_id: str, db: AsyncSession = Depends(get_db)):
             detail=f"Cannot resume ticket with status '{ticket.status}'",
         )
 
-    # 恢复 Ticket 和 Session 状态
-    ticket.status = TicketStatus.RUNNING.value
+    # 恢复 Session 状态，Ticket 重新进入 pending 由 Dispatcher 继续原 Session
+    ticket.status = TicketStatus.PENDING.value
     for session in ticket.sessions:
         if session.status == SessionStatus.SUSPENDED.value:
             session.status = SessionStatus.ACTIVE.value
 
-            # TODO: 这里应该通知 Scheduler 继续执行
-            # 目前 MVP 暂时依赖前端轮询或后台自动检测
+    await db.commit()
+    notify_ticket_ready()
+    return _build_ticket_response(ticket)
+
+
+async def _stop_executor(ticket_id: str):
+    """打断本进程（或其 worker 进程）中运行该 Ticket 的 Executor 并等待其退出，
+    避免其之后提交的状态覆盖本次修改"""
+    task = executor_registry.cancel(ticket_id)
+    if task:
+        await asyncio.wait([task], timeout=5.0)
+
+
+@router.post("/{ticket_id}/cancel", response_model=TicketResponse)
+async def cancel_ticket(ticket_id: str, db: AsyncSession = Depends(get_db)):
+    """取消 Ticket
 
-    await db.flush()
+    本进程中正在运行的 Executor 被立即打断（包括进行中的 LLM 调用和工具协程），
+    其槽位随任务结束释放。由其它进程运行的 Ticket 在该进程下次续约时发现租约丢失后取消。
+    """
+    await _stop_executor(ticket_id)
+
+    result = await db.execute(
+        select(Ticket)
+        .options(
+            selectinload(Ticket.agent),
+            selectinload(Ticket.sessions),
+            selectinload(Ticket.steps),
+        )
+        .where(Ticket.id == ticket_id)
+    )
+    ticket = result.scalar_one_or_none()
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+    if ticket.status not in [
+        TicketStatus.SCHEDULED.value,
+        TicketStatus.PENDING.value,
+        TicketStatus.RUNNING.value,
+        TicketStatus.SUSPENDED.value,
+    ]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot cancel ticket with status '{ticket.status}'",
+        )
+
+    ticket.status = TicketStatus.CANCELLED.value
+    ticket.lease_owner = None
+    ticket.lease_expires_at = None
+    for session in ticket.sessions:
+        if session.status in [
+            SessionStatus.ACTIVE.value,
+            SessionStatus.SUSPENDED.value,
+        ]:
+            session.status = SessionStatus.CANCELLED.value
+            # 丢弃停放中的 Executor
+            parking_lot.discard(session.id)
+
+    await db.commit()
+    notify_ticket_scheduled(ticket.id, None)
     return _build_ticket_response(ticket)
 
 
 @router.patch("/{ticket_id}/reset", response_model=TicketResponse)
 async def reset_ticket(ticket_id: str, db: AsyncSession = Depends(get_db)):
-    """重置 Ticket（创建新 Session）"""
+    """重置 Ticket（创建新 Session）
+
+    运行中的 Ticket 先按取消的方式打断其 Executor 并释放租约，旧 Executor 不会再写入
+    重置后的 Ticket 和归档的 Session。
+    """
+    await _stop_executor(ticket_id)
+
     result = await db.execute(
         select(Ticket)
         .options(
@@ -243,16 +540,34 @@ async def reset_ticket(ticket_id: str, db: AsyncSession = Depends(get_db)):
             SessionStatus.SUSPENDED.value,
         ]:
             session.status = SessionStatus.COMPLETED.value
+            parking_lot.discard(session.id)
 
     # 清空 Steps (PRD 0.0.3: Reset Ticket clears steps)
     for step in ticket.steps:
         await db.delete(step)
 
-    # 重置 Ticket 状态
-    ticket.status = TicketStatus.PENDING.value
+    # 重置 Ticket 状态，用量重新累计；重复执行的 Ticket 保持定时，重新进入定时堆
+    if ticket.repeat_interval:
+        schedule = _schedule_values(ticket.run_at, ticket.repeat_interval)
+        ticket.status = schedule["status"]
+        ticket.run_at = schedule["run_at"]
+    else:
+        ticket.status = TicketStatus.PENDING.value
+    ticket.lease_owner = None
+    ticket.lease_expires_at = None
     ticket.error_message = None
+    ticket.failure_reason = None
+    ticket.result = None
+    ticket.usage_iterations = 0
+    ticket.usage_input_tokens = 0
+    ticket.usage_output_tokens = 0
+    ticket.usage_cache_write_tokens = 0
+    ticket.usage_cache_read_tokens = 0
+    ticket.usage_cost_usd = 0.0
+    ticket.usage_wall_seconds = 0.0
 
     await db.commit()
+    _notify_ticket_changed(ticket.id, ticket.status, ticket.run_at)
 
     # 重新加载以获取更新后的数据
     result = await db.execute(
@@ -278,3 +593,5 @@ async def delete_ticket(ticket_id: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Ticket not found")
 
     await db.delete(ticket)
+    await db.commit()
+    notify_ticket_scheduled(ticket_id, None)
@@ -2,5 +2,6 @@
 
 from app.scheduler.dispatcher import Dispatcher
 from app.scheduler.executor_factory import ExecutorFactory
+from app.scheduler.registry import ExecutorRegistry, executor_registry
 
-__all__ = ["Dispatcher", "ExecutorFactory"]
+__all__ = ["Dispatcher", "ExecutorFactory", "ExecutorRegistry", "executor_registry"]
@@ -0,0 +1,244 @@
+"""TicketBudget - 单个 Ticket 的资源预算与用量
+
+预算项：迭代次数、墙钟时间（秒）、输入/输出 token 数、估算费用（美元）。
+输入 token 预算按全部输入计算：未缓存的输入 + 提示缓存写入 + 提示缓存读取。
+每项按 Ticket > Agent > 全局默认（TICKET_MAX_*）的顺序取第一个非空值，0 表示不限制。
+
+用量在 Ticket 的整个生命周期内累计（挂起等待人工输入的时间不计入墙钟时间），
+每个迭代边界随检查点写回 Ticket，重置 Ticket 时清零。
+"""
+
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any
+
+from app.config import (
+    LLM_INPUT_PRICE_PER_MTOK,
+    LLM_OUTPUT_PRICE_PER_MTOK,
+    TICKET_MAX_COST_USD,
+    TICKET_MAX_INPUT_TOKENS,
+    TICKET_MAX_OUTPUT_TOKENS,
+    TICKET_MAX_WALL_SECONDS,
+)
+
+# 模型名前缀 -> (输入, 输出) 每百万 token 的美元价格，未列出的模型使用 LLM_*_PRICE_PER_MTOK
+MODEL_PRICING: dict[str, tuple[float, float]] = {
+    "claude-3-haiku": (0.25, 1.25),
+    "claude-3-5-haiku": (0.8, 4.0),
+    "claude-haiku-4": (1.0, 5.0),
+    "claude-3-5-sonnet": (3.0, 15.0),
+    "claude-3-7-sonnet": (3.0, 15.0),
+    "claude-sonnet-4": (3.0, 15.0),
+    "claude-3-opus": (15.0, 75.0),
+    "claude-opus-4": (15.0, 75.0),
+}
+
+# 提示缓存写入 / 读取相对输入价格的倍率
+CACHE_WRITE_PRICE_RATIO = 1.25
+CACHE_READ_PRICE_RATIO = 0.1
+
+
+class BudgetReason(str, Enum):
+    """超出预算的失败原因（写入 Ticket.failure_reason）"""
+
+    ITERATIONS = "budget_iterations"
+    WALL_CLOCK = "budget_wall_clock"
+    INPUT_TOKENS = "budget_input_tokens"
+    OUTPUT_TOKENS = "budget_output_tokens"
+    COST = "budget_cost"
+
+
+class BudgetExceeded(Exception):
+    """Ticket 超出预算"""
+
+    def __init__(self, reason: BudgetReason, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def model_price(model: str) -> tuple[float, float]:
+    """模型每百万 token 的 (输入, 输出) 价格"""
+    for prefix, price in MODEL_PRICING.items():
+        if model.startswith(prefix):
+            return price
+    return LLM_INPUT_PRICE_PER_MTOK, LLM_OUTPUT_PRICE_PER_MTOK
+
+
+def estimate_cost(
+    model: str,
+    input_tokens: int,
+    output_tokens: int,
+    cache_write_tokens: int = 0,
+    cache_read_tokens: int = 0,
+) -> float:
+    """估算一次调用的费用（美元），input_tokens 不含缓存写入/读取的 token"""
+    input_price, output_price = model_price(model)
+    return (
+        input_tokens * input_price
+        + cache_write_tokens * input_price * CACHE_WRITE_PRICE_RATIO
+        + cache_read_tokens * input_price * CACHE_READ_PRICE_RATIO
+        + output_tokens * output_price
+    ) / 1_000_000
+
+
+def _first_limit(*values):
+    """取第一个非空值，0 视为不限制"""
+    for value in values:
+        if value is not None:
+            return value or None
+    return None
+
+
+@dataclass
+class TicketUsage:
+    """Ticket 累计用量"""
+
+    iterations: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_write_tokens: int = 0
+    cache_read_tokens: int = 0
+    cost_usd: float = 0.0
+    wall_seconds: float = 0.0
+
+    @classmethod
+    def from_ticket(cls, ticket: Any) -> "TicketUsage":
+        return cls(
+            iterations=ticket.usage_iterations or 0,
+            input_tokens=ticket.usage_input_tokens or 0,
+            output_tokens=ticket.usage_output_tokens or 0,
+            cache_write_tokens=ticket.usage_cache_write_tokens or 0,
+            cache_read_tokens=ticket.usage_cache_read_tokens or 0,
+            cost_usd=ticket.usage_cost_usd or 0.0,
+            wall_seconds=ticket.usage_wall_seconds or 0.0,
+        )
+
+    @classmethod
+    def from_response(cls, model: str, response: Any) -> "TicketUsage | None":
+        """单次模型响应的 usage（响应不带 usage 时返回 None）"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        call = cls(
+            input_tokens=getattr(usage, "input_tokens", 0) or 0,
+            output_tokens=getattr(usage, "output_tokens", 0) or 0,
+            cache_write_tokens=getattr(usage, "cache_creation_input_tokens", 0) or 0,
+            cache_read_tokens=getattr(usage, "cache_read_input_tokens", 0) or 0,
+        )
+        call.cost_usd = estimate_cost(
+            model,
+            call.input_tokens,
+            call.output_tokens,
+            call.cache_write_tokens,
+            call.cache_read_tokens,
+        )
+        return call
+
+    def add_response(self, model: str, response: Any) -> "TicketUsage | None":
+        """累加一次模型响应的 usage，返回该次调用的 usage"""
+        call = TicketUsage.from_response(model, response)
+        if call is None:
+            return None
+        self.input_tokens += call.input_tokens
+        self.output_tokens += call.output_tokens
+        self.cache_write_tokens += call.cache_write_tokens
+        self.cache_read_tokens += call.cache_read_tokens
+        self.cost_usd += call.cost_usd
+        return call
+
+    @property
+    def total_input_tokens(self) -> int:
+        """全部输入 token（含提示缓存写入/读取，input_tokens 只是未缓存的部分）"""
+        return self.input_tokens + self.cache_write_tokens + self.cache_read_tokens
+
+    def apply_to(self, ticket: Any):
+        """写回 Ticket"""
+        ticket.usage_iterations = self.iterations
+        ticket.usage_input_tokens = self.input_tokens
+        ticket.usage_output_tokens = self.output_tokens
+        ticket.usage_cache_write_tokens = self.cache_write_tokens
+        ticket.usage_cache_read_tokens = self.cache_read_tokens
+        ticket.usage_cost_usd = round(self.cost_usd, 6)
+        ticket.usage_wall_seconds = round(self.wall_seconds, 3)
+
+
+@dataclass
+class TicketBudget:
+    """Ticket 的生效预算（None 表示不限制）"""
+
+    max_iterations: int | None = None
+    max_wall_seconds: float | None = None
+    max_input_tokens: int | None = None
+    max_output_tokens: int | None = None
+    max_cost_usd: float | None = None
+
+    @classmethod
+    def resolve(cls, ticket: Any, agent: Any) -> "TicketBudget":
+        """合并 Ticket、Agent 与全局默认预算"""
+        return cls(
+            max_iterations=_first_limit(ticket.max_iterations, agent.max_iterations),
+            max_wall_seconds=_first_limit(
+                ticket.max_wall_seconds, agent.max_wall_seconds, TICKET_MAX_WALL_SECONDS
+            ),
+            max_input_tokens=_first_limit(
+                ticket.max_input_tokens, agent.max_input_tokens, TICKET_MAX_INPUT_TOKENS
+            ),
+            max_output_tokens=_first_limit(
+                ticket.max_output_tokens,
+                agent.max_output_tokens,
+                TICKET_MAX_OUTPUT_TOKENS,
+            ),
+            max_cost_usd=_first_limit(
+                ticket.max_cost_usd, agent.max_cost_usd, TICKET_MAX_COST_USD
+            ),
+        )
+
+    def remaining_seconds(self, usage: TicketUsage) -> float | None:
+        """剩余墙钟时间（秒），不限制时返回 None"""
+        if self.max_wall_seconds is None:
+            return None
+        return max(0.0, self.max_wall_seconds - usage.wall_seconds)
+
+    def check(self, usage: TicketUsage) -> BudgetExceeded | None:
+        """开始下一轮迭代前检查预算，超出时返回对应的 BudgetExceeded"""
+        if self.max_iterations is not None and usage.iterations >= self.max_iterations:
+            return BudgetExceeded(
+                BudgetReason.ITERATIONS,
+                f"Iteration budget exhausted ({usage.iterations}/{self.max_iterations})",
+            )
+        if (
+            self.max_wall_seconds is not None
+            and usage.wall_seconds >= self.max_wall_seconds
+        ):
+            return self.wall_clock_exceeded(usage)
+        if (
+            self.max_input_tokens is not None
+            and usage.total_input_tokens >= self.max_input_tokens
+        ):
+            return BudgetExceeded(
+                BudgetReason.INPUT_TOKENS,
+                f"Input token budget exhausted "
+                f"({usage.total_input_tokens}/{self.max_input_tokens})",
+            )
+        if (
+            self.max_output_tokens is not None
+            and usage.output_tokens >= self.max_output_tokens
+        ):
+            return BudgetExceeded(
+                BudgetReason.OUTPUT_TOKENS,
+                f"Output token budget exhausted "
+                f"({usage.output_tokens}/{self.max_output_tokens})",
+            )
+        if self.max_cost_usd is not None and usage.cost_usd >= self.max_cost_usd:
+            return BudgetExceeded(
+                BudgetReason.COST,
+                f"Cost budget exhausted (${usage.cost_usd:.4f}/${self.max_cost_usd:.4f})",
+            )
+        return None
+
+    def wall_clock_exceeded(self, usage: TicketUsage) -> BudgetExceeded:
+        return BudgetExceeded(
+            BudgetReason.WALL_CLOCK,
+            f"Wall-clock budget exhausted "
+            f"({usage.wall_seconds:.1f}s/{self.max_wall_seconds:.1f}s)",
+        )
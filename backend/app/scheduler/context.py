@@ -5,10 +5,11 @@ from typing import Any
 
 @dataclass
 class ExecutionContext:
-    db: Any
     ticket: Any
     session: Any
     executor: Any
+    # Executor 的租约条件（LeaseFence），系统工具的写入随之受租约保护
+    fence: Any = None
 
 
 # Context variable to hold the current execution context
@@ -0,0 +1,272 @@
+"""ContextWindow - 控制发给模型的会话不超出模型上下文窗口
+
+每条消息的 token 估算值在追加到 ConversationBuffer 时计算一次并缓存。请求超出
+模型的上下文预算（窗口 - 输出预留 - system - 工具定义）时依次：
+1. 从最早的消息开始，把工具结果截为首尾摘录（最近 CONTEXT_KEEP_RECENT_MESSAGES 条不动）
+2. 仍然超出时从最早的轮次开始省略，以一条说明消息代替；开启 CONTEXT_SUMMARY 时
+   由 Executor 生成摘要，作为 summary 消息保存（恢复时据此跳过已摘要的轮次）
+
+压缩只影响发出的请求，数据库中的原始消息不变。压缩进度只前进不后退，
+之后的请求沿用同样的前缀，提示缓存仍然有效。
+
+request_tokens 由同样的缓存值得出本轮请求的输入 token 估算（限流器按它预扣 TPM），
+不再每轮序列化整个请求；开启提示缓存时上一次请求已发送的前缀不计入。
+"""
+
+import json
+import logging
+from typing import TYPE_CHECKING, Any
+
+from app.config import (
+    CONTEXT_KEEP_RECENT_MESSAGES,
+    CONTEXT_TOOL_RESULT_EXCERPT_CHARS,
+    LLM_CONTEXT_WINDOW_TOKENS,
+    LLM_MAX_OUTPUT_TOKENS,
+    LLM_PROMPT_CACHE,
+)
+
+if TYPE_CHECKING:
+    from app.scheduler.conversation import ConversationBuffer
+
+logger = logging.getLogger(__name__)
+
+# 模型名前缀 -> 上下文窗口（token），未列出的模型使用 LLM_CONTEXT_WINDOW_TOKENS
+MODEL_CONTEXT_WINDOWS: dict[str, int] = {
+    "claude-3-haiku": 200_000,
+    "claude-3-5-haiku": 200_000,
+    "claude-haiku-4": 200_000,
+    "claude-3-5-sonnet": 200_000,
+    "claude-3-7-sonnet": 200_000,
+    "claude-sonnet-4": 200_000,
+    "claude-3-opus": 200_000,
+    "claude-opus-4": 200_000,
+}
+
+OMITTED_MESSAGE = "[之前的 {count} 条消息已省略以控制上下文长度，完整内容保留在会话记录中]"
+SUMMARY_MESSAGE = "[之前对话的摘要]\n{summary}"
+EXCERPT_MARKER = "\n...[省略 {count} 个字符，完整输出保留在会话记录中]...\n"
+
+
+def estimate_tokens(value: Any) -> int:
+    """估算 token 数：ASCII 约 4 字符 / token，其它字符（中文等）按 1 字符 / token"""
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def context_window(model: str) -> int:
+    """模型的上下文窗口（token）"""
+    for prefix, window in MODEL_CONTEXT_WINDOWS.items():
+        if model.startswith(prefix):
+            return window
+    return LLM_CONTEXT_WINDOW_TOKENS
+
+
+def excerpt(text: str, limit: int = CONTEXT_TOOL_RESULT_EXCERPT_CHARS) -> str:
+    """截为首尾摘录（保留开头 2/3 和结尾 1/3）"""
+    if len(text) <= limit:
+        return text
+    head = limit * 2 // 3
+    tail = limit - head
+    marker = EXCERPT_MARKER.format(count=len(text) - limit)
+    return f"{text[:head]}{marker}{text[-tail:]}"
+
+
+def excerpt_tool_results(message: dict[str, Any]) -> dict[str, Any]:
+    """返回工具结果截为摘录的消息副本（没有可截断的内容时返回原消息）"""
+    content = message["content"]
+    if message["role"] != "user" or not isinstance(content, list):
+        return message
+    blocks = []
+    changed = False
+    for block in content:
+        result = block.get("content")
+        if block.get("type") == "tool_result" and isinstance(result, str):
+            shortened = excerpt(result)
+            if shortened is not result:
+                block = {**block, "content": shortened}
+                changed = True
+        blocks.append(block)
+    return {**message, "content": blocks} if changed else message
+
+
+class ContextWindow:
+    """一个 Executor 的会话上下文管理（随 Executor 停放）"""
+
+    def __init__(self, conversation: "ConversationBuffer"):
+        self.conversation = conversation
+        # messages[:excerpt_until] 中的工具结果已截为摘录
+        self.excerpt_until = 0
+        # messages[:drop_until] 不再发送，由摘要或省略说明代替
+        self.drop_until = conversation.summary_covers
+        # 截为摘录后的消息及其 token 估算值（按消息下标缓存）
+        self._excerpts: dict[int, tuple[dict[str, Any], int]] = {}
+        # system + 工具定义的 token 估算值（工具列表在 Ticket 内不变，按列表对象缓存）
+        self._fixed: tuple[int, int] | None = None
+        # 最近一次 fit 的模型和消息 token 数
+        self._model: str | None = None
+        self._view_tokens = 0
+        # 上一次已发送请求的 (模型, 压缩进度) 和 token 数：前缀相同时预计命中提示缓存
+        self._sent: tuple[tuple, int] | None = None
+
+    @property
+    def needs_summary(self) -> bool:
+        """是否有尚未被摘要覆盖的已省略轮次"""
+        return self.drop_until > self.conversation.summary_covers
+
+    def budget(self, model: str, tools: list[dict[str, Any]]) -> int:
+        """会话消息可用的 token 数"""
+        return context_window(model) - LLM_MAX_OUTPUT_TOKENS - self._fixed_tokens(tools)
+
+    def request_tokens(self, tools: list[dict[str, Any]]) -> int:
+        """最近一次 fit 的请求预计计入 TPM 的输入 token 数（提示缓存读取不计入）"""
+        tokens = self._fixed_tokens(tools) + self._view_tokens
+        if LLM_PROMPT_CACHE and self._sent and self._sent[0] == self._sent_key():
+            tokens -= self._sent[1]
+        return max(0, tokens)
+
+    def mark_sent(self, tools: list[dict[str, Any]]):
+        """最近一次 fit 的请求已成功发送，其内容成为下一轮请求的缓存前缀"""
+        self._sent = (
+            self._sent_key(),
+            self._fixed_tokens(tools) + self._view_tokens,
+        )
+
+    def fit(self, model: str, tools: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """本轮发给模型的消息列表（必要时推进压缩进度）"""
+        messages = self.conversation.messages
+        self._model = model
+        if not messages:
+            self._view_tokens = 0
+            return self.conversation.api_messages()
+
+        budget = self.budget(model, tools)
+        total = before = self._total()
+        # 最后一条消息始终保持原样（可能仍在追加工具结果）
+        protected = max(0, len(messages) - max(1, CONTEXT_KEEP_RECENT_MESSAGES))
+
+        # 1. 截断旧的工具结果
+        while total > budget and self.excerpt_until < protected:
+            index = self.excerpt_until
+            self.excerpt_until += 1
+            if index < self.drop_until:
+                continue
+            compacted = excerpt_tool_results(messages[index])
+            if compacted is not messages[index]:
+                tokens = estimate_tokens(compacted["content"])
+                total -= self.conversation.tokens[index] - tokens
+                self._excerpts[index] = (compacted, tokens)
+
+        # 2. 省略最早的轮次（切分点为 assistant 消息，保证 tool_use / tool_result 成对）
+        while total > budget:
+            cut = self._next_cut(protected)
+            if cut is None:
+                break
+            total -= sum(self._tokens(i) for i in range(self.drop_until, cut))
+            self.drop_until = cut
+
+        if total != before:
+            logger.info(
+                f"Context compacted: {before} -> {total} tokens (budget {budget}), "
+                f"excerpted {len(self._excerpts)} messages, omitted {self.drop_until}"
+            )
+        view = self._view()
+        self._view_tokens = total
+        if self.drop_until:
+            self._view_tokens += estimate_tokens(view[0]["content"])
+        return view
+
+    def set_summary(self, summary: str):
+        """记录已省略轮次的摘要（保存到数据库的 summary 消息由调用方写入）"""
+        self.conversation.summary = summary
+        self.conversation.summary_covers = self.drop_until
+
+    def _fixed_tokens(self, tools: list[dict[str, Any]]) -> int:
+        if self._fixed is None or self._fixed[0] != id(tools):
+            tokens = estimate_tokens(self.conversation.system) + estimate_tokens(tools)
+            self._fixed = (id(tools), tokens)
+        return self._fixed[1]
+
+    def _sent_key(self) -> tuple:
+        # 压缩进度变化时已发送的前缀改变，缓存不再命中
+        return (self._model, self.drop_until, self.excerpt_until)
+
+    def _next_cut(self, protected: int) -> int | None:
+        messages = self.conversation.messages
+        for index in range(self.drop_until + 1, protected):
+            if messages[index]["role"] == "assistant":
+                return index
+        return None
+
+    def _tokens(self, index: int) -> int:
+        cached = self._excerpts.get(index)
+        return cached[1] if cached else self.conversation.tokens[index]
+
+    def _total(self) -> int:
+        return sum(
+            self._tokens(i) for i in range(self.drop_until, len(self.conversation))
+        )
+
+    def _prefix(self) -> dict[str, Any]:
+        conversation = self.conversation
+        if conversation.summary and conversation.summary_covers == self.drop_until:
+            text = SUMMARY_MESSAGE.format(summary=conversation.summary)
+        else:
+            text = OMITTED_MESSAGE.format(count=self.drop_until)
+        return {"role": "user", "content": text}
+
+    def _view(self) -> list[dict[str, Any]]:
+        messages = self.conversation.messages
+        view = [self._prefix()] if self.drop_until else []
+        for index in range(self.drop_until, len(messages)):
+            cached = self._excerpts.get(index)
+            view.append(cached[0] if cached else messages[index])
+        return view
+
+
+# ============================================================
+# 摘要
+# ============================================================
+
+SUMMARY_SYSTEM_PROMPT = (
+    "你负责压缩一个 Agent 任务的对话历史。请用简洁的要点总结已完成的操作、"
+    "得到的关键结果和数据、做出的决定以及尚未完成的事项，供 Agent 继续执行任务。"
+    "不要编造对话中没有的信息。"
+)
+# 摘要请求中对话记录的最大字符数
+SUMMARY_TRANSCRIPT_CHARS = 100_000
+SUMMARY_MAX_TOKENS = 1024
+
+
+def render_transcript(messages: list[dict[str, Any]]) -> str:
+    """将 API 格式消息渲染为纯文本对话记录（工具结果截为摘录）"""
+    lines = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            lines.append(f"{message['role']}: {content}")
+            continue
+        for block in content:
+            block_type = block.get("type")
+            if block_type == "text":
+                lines.append(f"{message['role']}: {block['text']}")
+            elif block_type == "tool_use":
+                arguments = excerpt(json.dumps(block.get("input"), ensure_ascii=False))
+                lines.append(f"tool_use {block.get('name')}: {arguments}")
+            elif block_type == "tool_result":
+                lines.append(f"tool_result: {excerpt(str(block.get('content', '')))}")
+    return "\n".join(lines)
+
+
+def summary_request(previous: str, messages: list[dict[str, Any]]) -> dict[str, Any]:
+    """生成摘要的模型请求参数（包含之前的摘要，新摘要覆盖全部已省略的轮次）"""
+    transcript = render_transcript(messages)
+    if previous:
+        transcript = f"之前的摘要：\n{previous}\n\n之后的对话：\n{transcript}"
+    return {
+        "system": SUMMARY_SYSTEM_PROMPT,
+        "max_tokens": SUMMARY_MAX_TOKENS,
+        "messages": [
+            {"role": "user", "content": excerpt(transcript, SUMMARY_TRANSCRIPT_CHARS)}
+        ],
+    }
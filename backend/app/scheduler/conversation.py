@@ -0,0 +1,113 @@
+"""ConversationBuffer - Executor 内存中的 API 格式会话
+
+会话加载时按时间顺序构建一次，之后随 Executor 写入的消息（以及恢复时新增的消息）
+追加，每轮调用模型时直接使用，不再重新排序、重新解析所有历史消息。
+
+只保存发给模型的内容（system 文本 + API 格式消息），不持有 ORM 对象；
+挂起停放时占用的内存随之减少。每条 API 消息的 token 估算值随消息一起缓存，
+供 ContextWindow 控制请求长度。
+"""
+
+import json
+from typing import Any
+
+from app.models.message import MessageRole
+from app.scheduler.context_window import estimate_tokens
+
+# 没有任何消息时发给模型的启动消息
+START_MESSAGE = "请开始执行任务。"
+
+
+class ConversationBuffer:
+    """追加式 API 格式会话"""
+
+    def __init__(self):
+        self.system = ""
+        self.messages: list[dict[str, Any]] = []
+        # 与 messages 一一对应的 token 估算值
+        self.tokens: list[int] = []
+        # 最近一次摘要及其覆盖的最早消息数（messages[:summary_covers]）
+        self.summary = ""
+        self.summary_covers = 0
+        # 已并入缓冲的最大消息 ID（恢复时只加载其后的消息）
+        self.last_message_id = 0
+        # 原始消息内容字节数（估算内存占用）
+        self.size_bytes = 0
+        # 当前连续的工具结果（合并为一条 user 消息）
+        self._tool_results: list[dict[str, Any]] | None = None
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def add(self, role: str, content: str, parsed: Any = None):
+        """追加一条消息
+
+        content 为数据库中保存的内容；parsed 为已解析的 JSON（调用方已有时传入，避免重复解析）。
+        """
+        self.size_bytes += len(content)
+
+        if role == MessageRole.SYSTEM.value:
+            self.system = content
+            return
+
+        if role == MessageRole.SUMMARY.value:
+            if parsed is None:
+                try:
+                    parsed = json.loads(content)
+                except json.JSONDecodeError:
+                    return
+            self.summary = parsed.get("summary", "")
+            self.summary_covers = parsed.get("messages", 0)
+            return
+
+        if role == MessageRole.TOOL.value:
+            if parsed is None:
+                try:
+                    parsed = json.loads(content)
+                except json.JSONDecodeError:
+                    return
+            block = {
+                "type": "tool_result",
+                "tool_use_id": parsed.get("tool_use_id", ""),
+                "content": parsed.get("result", ""),
+            }
+            if self._tool_results is None:
+                self._tool_results = [block]
+                self._append({"role": "user", "content": self._tool_results})
+            else:
+                self._tool_results.append(block)
+                self.tokens[-1] += estimate_tokens(block)
+            return
+
+        self._tool_results = None
+        if role == MessageRole.USER.value:
+            self._append({"role": "user", "content": content})
+        elif role == MessageRole.ASSISTANT.value:
+            if parsed is None:
+                try:
+                    parsed = json.loads(content)
+                except json.JSONDecodeError:
+                    parsed = content
+            if isinstance(parsed, list):
+                # 过滤掉 thinking 类型的 block (Anthropic API 不接受)
+                blocks = [block for block in parsed if block.get("type") != "thinking"]
+                if blocks:
+                    self._append({"role": "assistant", "content": blocks})
+            else:
+                self._append({"role": "assistant", "content": content})
+
+    def _append(self, message: dict[str, Any]):
+        self.messages.append(message)
+        self.tokens.append(estimate_tokens(message["content"]))
+
+    def add_row(self, message_id: int | None, role: str, content: str):
+        """追加一条从数据库加载的消息"""
+        self.add(role, content)
+        if message_id is not None and message_id > self.last_message_id:
+            self.last_message_id = message_id
+
+    def api_messages(self) -> list[dict[str, Any]]:
+        """本轮发给模型的消息列表（浅拷贝，之后的追加不影响已发出的请求）"""
+        if not self.messages:
+            return [{"role": "user", "content": START_MESSAGE}]
+        return list(self.messages)
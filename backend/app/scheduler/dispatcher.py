@@ -1,35 +1,93 @@
 """Dispatcher - 主循环调度器
 
 职责：
-1. 定时轮询 pending 状态的 Tickets
-2. 为每个 Ticket 创建 Session（如果不存在）
-3. 派发给 Executor 执行
+1. 被 notifier 唤醒（或定时兜底轮询）时查找 pending 状态的 Tickets
+2. 按批次（SCHEDULER_DISPATCH_BATCH）只取派发所需的列，以 compare-and-set 方式
+   批量认领 Ticket 并持有租约，多个进程可共享同一数据库；每批一个短事务
+3. 为每个 Ticket 批量创建 Session（如果不存在）
+4. 按 FairQueue 顺序（resume lane 优先、跨 Agent 加权公平、priority）派发，
+   WorkerPool 无空闲槽位或超出并发上限的 Ticket 保持 pending
+5. 定时续约自己持有的租约，回收过期租约（崩溃进程遗留的 Ticket）
+6. 启动时恢复无存活持有者的 running Ticket；关闭时排空 Executor，
+   未完成的 Ticket 放回 pending，由下一个进程从最近一次迭代检查点继续
+7. 维护 scheduled Ticket 的定时堆，睡到最早的到期时间，到期后将其转为 pending
+   （重复 Ticket 派生 pending 副本并顺延自身 run_at）
 """
 
 import asyncio
 import logging
+import os
+import socket
+import time
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import func, insert, or_, select, update
 
 from app.database import async_session_maker
+from app.models.agent import Agent
 from app.models.ticket import Ticket, TicketStatus
 from app.models.session import Session, SessionStatus
-from app.config import SCHEDULER_INTERVAL
-from app.scheduler.executor_factory import ExecutorFactory
+from app.config import (
+    SCHEDULER_DISPATCH_BATCH,
+    SCHEDULER_DRAIN_TIMEOUT,
+    SCHEDULER_INTERVAL,
+    SCHEDULER_LEASE_TTL,
+)
+from app.scheduler.worker_pool import BaseWorkerPool, WorkerPool
+from app.scheduler.fair_queue import FairQueue, QueueEntry, LANE_RESUME, LANE_DEFAULT
+from app.scheduler.metrics import scheduler_metrics
+from app.scheduler.parking import parking_lot
+from app.scheduler.write_behind import write_behind
+from app.scheduler.timer_heap import TimerHeap
+from app.scheduler import notifier
 
 logger = logging.getLogger(__name__)
 
 
+def _owner_is_dead(owner: str) -> bool:
+    """租约持有者是否可确认已退出（仅能判断同一主机上的进程）"""
+    host, _, rest = owner.partition(":")
+    pid, _, _ = rest.partition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
 class Dispatcher:
     """主循环调度器"""
 
-    def __init__(self, interval: float = SCHEDULER_INTERVAL):
+    def __init__(
+        self,
+        interval: float = SCHEDULER_INTERVAL,
+        pool: BaseWorkerPool | None = None,
+        lease_ttl: float = SCHEDULER_LEASE_TTL,
+        dispatch_batch: int = SCHEDULER_DISPATCH_BATCH,
+    ):
         self.interval = interval
+        self.lease_ttl = lease_ttl
+        self.dispatch_batch = dispatch_batch
         self.running = False
         self._task: asyncio.Task | None = None
+        self._heartbeat_task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._draining = False
+        # 处理 Executor 退出的后台任务（持有引用避免被回收）
+        self._exit_tasks: set[asyncio.Task] = set()
+        self.pool = pool or WorkerPool()
+        self.pool.on_release = self._wake
+        self.queue = FairQueue()
+        self.timers = TimerHeap()
+        # 下一次兜底轮询（同时从数据库重新加载定时堆）的事件循环时间
+        self._next_sweep = 0.0
+        # 租约持有者标识，进程内唯一
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
 
     async def start(self):
         """启动调度器"""
@@ -38,74 +96,576 @@ class Dispatcher:
             return
 
         self.running = True
+        self._draining = False
+        self._next_sweep = 0.0
+        await self.pool.start()
+        try:
+            await self._recover_orphaned_tickets()
+        except Exception as e:
+            logger.error(f"Error recovering orphaned tickets: {e}", exc_info=True)
+
+        self._wakeup = notifier.subscribe()
+        notifier.subscribe_schedule(self._on_schedule_changed)
         self._task = asyncio.create_task(self._run_loop())
-        logger.info(f"Dispatcher started with interval {self.interval}s")
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(
+            f"Dispatcher {self.worker_id} started with sweep interval {self.interval}s"
+        )
 
     def stop(self):
         """停止调度器"""
         self.running = False
+        if self._wakeup:
+            notifier.unsubscribe(self._wakeup)
+            self._wakeup = None
+        notifier.unsubscribe_schedule(self._on_schedule_changed)
         if self._task:
             self._task.cancel()
             self._task = None
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
         logger.info("Dispatcher stopped")
 
+    async def shutdown(self, timeout: float = SCHEDULER_DRAIN_TIMEOUT):
+        """优雅关闭
+
+        1. 停止派发新 Ticket（租约心跳继续，排空期间租约不会过期）
+        2. 请求所有 Executor 在迭代边界停止，等待至多 timeout 秒，超时的被取消
+        3. 本进程仍持有的 running Ticket 放回 pending，清除租约，
+           其活跃 Session 使其进入 resume lane，由下一个进程从检查点继续
+        """
+        self.running = False
+        self._draining = True
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        cancelled = await self.pool.drain(timeout)
+        await write_behind.flush()
+        if self._exit_tasks:
+            await asyncio.gather(*self._exit_tasks, return_exceptions=True)
+        requeued = await self._requeue_owned_tickets()
+        # 停放 Executor 的状态都已落库，重启后从数据库重建
+        parking_lot.clear()
+        await self.pool.close()
+        self.stop()
+        logger.info(
+            f"Dispatcher drained: {requeued} tickets requeued, {cancelled} executors cancelled"
+        )
+
+    def _wake(self):
+        """唤醒主循环（WorkerPool 释放槽位时调用）"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _on_schedule_changed(self, ticket_id: str, run_at: datetime | None):
+        """定时变更回调：更新定时堆并唤醒主循环重新计算睡眠时间"""
+        if run_at is None:
+            self.timers.remove(ticket_id)
+        else:
+            self.timers.schedule(ticket_id, run_at)
+        self._wake()
+
     async def _run_loop(self):
-        """主循环"""
+        """主循环
+
+        有 Ticket 变为可派发时由 notifier 立即唤醒，有定时 Ticket 时睡到最早的到期时间；
+        interval 只作为兜底的安全轮询间隔，兜底时从数据库重新加载定时堆
+        （覆盖其它进程对定时 Ticket 的修改）。
+        """
+        loop = asyncio.get_running_loop()
         while self.running:
+            # 先清除再派发：派发期间到达的通知会触发下一轮
+            self._wakeup.clear()
             try:
+                if loop.time() >= self._next_sweep:
+                    self._next_sweep = loop.time() + self.interval
+                    await self._load_timers()
+                await self._promote_due_tickets()
                 await self._dispatch_pending_tickets()
             except Exception as e:
                 logger.error(f"Error in dispatcher loop: {e}", exc_info=True)
 
-            await asyncio.sleep(self.interval)
+            timeout = max(0.0, self._next_sweep - loop.time())
+            deadline = self.timers.next_deadline()
+            if deadline is not None:
+                timeout = min(
+                    timeout, max(0.0, (deadline - datetime.utcnow()).total_seconds())
+                )
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
 
-    async def _dispatch_pending_tickets(self):
-        """查找并派发 pending 状态的 Tickets"""
+    async def _load_timers(self):
+        """通过 (status, run_at) 索引加载所有 scheduled Ticket 到定时堆"""
         async with async_session_maker() as db:
-            # 查找所有 pending 状态的 Tickets
             result = await db.execute(
-                select(Ticket)
-                .options(
-                    selectinload(Ticket.agent),
-                    selectinload(Ticket.sessions),
+                select(Ticket.id, Ticket.run_at).where(
+                    Ticket.status == TicketStatus.SCHEDULED.value,
+                    Ticket.run_at.is_not(None),
                 )
-                .where(Ticket.status == TicketStatus.PENDING.value)
             )
-            pending_tickets = result.scalars().all()
+            self.timers.reload({row.id: row.run_at for row in result.all()})
+        scheduler_metrics.set_gauge("timers_scheduled", len(self.timers))
 
-            for ticket in pending_tickets:
-                await self._dispatch_ticket(db, ticket)
+    async def _promote_due_tickets(self) -> int:
+        """将到期的 scheduled Ticket 转为 pending，返回转换数量
 
-            await db.commit()
+        以 compare-and-set 方式更新，多个进程同时到期时只有一个生效；
+        堆中已失效的条目（已被删除或在其它进程修改）更新不到任何行，直接丢弃。
+        """
+        now = datetime.utcnow()
+        due = self.timers.pop_due(now)
+        if not due:
+            return 0
 
-    async def _dispatch_ticket(self, db, ticket: Ticket):
-        """派发单个 Ticket"""
-        logger.info(f"Dispatching ticket {ticket.id[:8]}")
+        promoted = 0
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(Ticket).where(
+                    Ticket.id.in_(due),
+                    Ticket.status == TicketStatus.SCHEDULED.value,
+                    Ticket.run_at <= now,
+                )
+            )
+            for ticket in result.scalars().all():
+                if ticket.repeat_interval:
+                    if await self._spawn_occurrence(db, ticket, now):
+                        promoted += 1
+                else:
+                    claimed = await db.execute(
+                        update(Ticket)
+                        .where(
+                            Ticket.id == ticket.id,
+                            Ticket.status == TicketStatus.SCHEDULED.value,
+                            Ticket.run_at == ticket.run_at,
+                        )
+                        .values(status=TicketStatus.PENDING.value, updated_at=now)
+                        .execution_options(synchronize_session=False)
+                    )
+                    promoted += claimed.rowcount
+            await db.commit()
 
-        # 更新 Ticket 状态为 running
-        ticket.status = TicketStatus.RUNNING.value
-        ticket.updated_at = datetime.utcnow()
+        scheduler_metrics.set_gauge("timers_scheduled", len(self.timers))
+        if promoted:
+            logger.info(f"Promoted {promoted} scheduled tickets to pending")
+        return promoted
 
-        # 检查是否有活跃的 Session，没有则创建
-        active_session = next(
-            (s for s in ticket.sessions if s.status == SessionStatus.ACTIVE.value), None
+    async def _spawn_occurrence(self, db, ticket: Ticket, now: datetime) -> bool:
+        """重复 Ticket 到期：顺延 run_at（跳过错过的周期）并派生一个 pending 副本"""
+        interval = timedelta(seconds=ticket.repeat_interval)
+        missed = (now - ticket.run_at) // interval
+        next_run = ticket.run_at + interval * (missed + 1)
+        advanced = await db.execute(
+            update(Ticket)
+            .where(
+                Ticket.id == ticket.id,
+                Ticket.status == TicketStatus.SCHEDULED.value,
+                Ticket.run_at == ticket.run_at,
+            )
+            .values(run_at=next_run)
+            .execution_options(synchronize_session=False)
         )
+        if advanced.rowcount != 1:
+            return False
 
-        if not active_session:
-            # 创建新 Session
-            active_session = Session(
+        db.add(
+            Ticket(
                 id=str(uuid.uuid4()),
-                ticket_id=ticket.id,
-                status=SessionStatus.ACTIVE.value,
+                agent_id=ticket.agent_id,
+                status=TicketStatus.PENDING.value,
+                priority=ticket.priority,
+                params=ticket.params,
+                context=ticket.context,
+                run_at=ticket.run_at,
+                max_iterations=ticket.max_iterations,
+                max_wall_seconds=ticket.max_wall_seconds,
+                max_input_tokens=ticket.max_input_tokens,
+                max_output_tokens=ticket.max_output_tokens,
+                max_cost_usd=ticket.max_cost_usd,
+            )
+        )
+        self.timers.schedule(ticket.id, next_run)
+        return True
+
+    async def _heartbeat_loop(self):
+        """租约心跳：每 1/3 TTL 续约一次，回收过期租约，淘汰闲置的停放 Executor"""
+        # 由 stop() 取消；shutdown() 排空期间仍需续约
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            parking_lot.evict()
+            try:
+                await self._renew_leases()
+                if await self._reclaim_expired_leases():
+                    self._wake()
+            except Exception as e:
+                logger.error(f"Error in lease heartbeat: {e}", exc_info=True)
+
+    async def _renew_leases(self):
+        """续约本进程正在运行的 Ticket，丢失租约的 Executor 会被停止"""
+        ticket_ids = self.pool.running_ticket_ids()
+        if not ticket_ids:
+            return
+
+        async with async_session_maker() as db:
+            await db.execute(
+                update(Ticket)
+                .where(
+                    Ticket.id.in_(ticket_ids),
+                    Ticket.lease_owner == self.worker_id,
+                    Ticket.status == TicketStatus.RUNNING.value,
+                )
+                .values(lease_expires_at=self._lease_deadline())
+            )
+            result = await db.execute(
+                select(Ticket.id).where(
+                    Ticket.id.in_(ticket_ids),
+                    Ticket.lease_owner == self.worker_id,
+                    Ticket.status == TicketStatus.RUNNING.value,
+                )
+            )
+            owned = set(result.scalars().all())
+            await db.commit()
+
+        # 租约已被回收或 Ticket 已不再 running（被其它进程接管或已结束）
+        for ticket_id in set(ticket_ids) - owned:
+            logger.warning(f"Lease lost for ticket {ticket_id[:8]}, cancelling executor")
+            self.pool.cancel(ticket_id)
+
+    async def _reclaim_expired_leases(self) -> int:
+        """将租约已过期的 running Ticket 放回 pending，返回回收数量"""
+        async with async_session_maker() as db:
+            result = await db.execute(
+                update(Ticket)
+                .where(
+                    Ticket.status == TicketStatus.RUNNING.value,
+                    Ticket.lease_expires_at < datetime.utcnow(),
+                )
+                .values(
+                    status=TicketStatus.PENDING.value,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                )
+            )
+            await db.commit()
+
+        if result.rowcount:
+            logger.warning(f"Reclaimed {result.rowcount} tickets with expired leases")
+        return result.rowcount
+
+    async def _recover_orphaned_tickets(self) -> int:
+        """启动时恢复无存活持有者的 running Ticket，返回恢复数量
+
+        没有租约、租约已过期、或持有者是本机上已退出的进程（如重启前的本服务）的
+        running Ticket 放回 pending；仍有活跃 Session 的会进入 resume lane 继续执行。
+        """
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(Ticket.lease_owner)
+                .where(
+                    Ticket.status == TicketStatus.RUNNING.value,
+                    Ticket.lease_owner.is_not(None),
+                )
+                .distinct()
             )
-            db.add(active_session)
-            logger.info(
-                f"Created new session {active_session.id[:8]} for ticket {ticket.id[:8]}"
+            dead_owners = [
+                owner for owner in result.scalars().all() if _owner_is_dead(owner)
+            ]
+            result = await db.execute(
+                update(Ticket)
+                .where(
+                    Ticket.status == TicketStatus.RUNNING.value,
+                    or_(
+                        Ticket.lease_owner.is_(None),
+                        Ticket.lease_expires_at.is_(None),
+                        Ticket.lease_expires_at < datetime.utcnow(),
+                        Ticket.lease_owner.in_(dead_owners),
+                    ),
+                )
+                .values(
+                    status=TicketStatus.PENDING.value,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                )
+            )
+            await db.commit()
+
+        if result.rowcount:
+            logger.warning(f"Recovered {result.rowcount} orphaned running tickets")
+        return result.rowcount
+
+    async def _requeue_owned_tickets(self) -> int:
+        """将本进程仍持有的 running Ticket 放回 pending，返回数量"""
+        async with async_session_maker() as db:
+            result = await db.execute(
+                update(Ticket)
+                .where(
+                    Ticket.status == TicketStatus.RUNNING.value,
+                    Ticket.lease_owner == self.worker_id,
+                )
+                .values(
+                    status=TicketStatus.PENDING.value,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                )
+            )
+            await db.commit()
+        return result.rowcount
+
+    def _on_executor_exit(self, ticket_id: str, task: asyncio.Task):
+        """Executor 任务结束回调：排空期间由 shutdown() 统一处理"""
+        if self._draining or task.cancelled():
+            return
+        exit_task = asyncio.create_task(self._settle_exited_ticket(ticket_id))
+        self._exit_tasks.add(exit_task)
+        exit_task.add_done_callback(self._exit_tasks.discard)
+
+    async def _settle_exited_ticket(self, ticket_id: str):
+        """Executor 正常退出但 Ticket 仍为 running（模型结束回合但未调用系统工具）
+
+        此时 Executor 在等待下一次输入：将 Ticket 和 Session 挂起并释放租约，
+        避免其一直占用 running 状态，或在租约过期后被回收重复执行。
+        """
+        try:
+            async with async_session_maker() as db:
+                result = await db.execute(
+                    update(Ticket)
+                    .where(
+                        Ticket.id == ticket_id,
+                        Ticket.status == TicketStatus.RUNNING.value,
+                        Ticket.lease_owner == self.worker_id,
+                    )
+                    .values(
+                        status=TicketStatus.SUSPENDED.value,
+                        lease_owner=None,
+                        lease_expires_at=None,
+                    )
+                )
+                if result.rowcount:
+                    # 与 request_human_input 一致：Session 一并挂起，人工回复后恢复
+                    await db.execute(
+                        update(Session)
+                        .where(
+                            Session.ticket_id == ticket_id,
+                            Session.status == SessionStatus.ACTIVE.value,
+                        )
+                        .values(status=SessionStatus.SUSPENDED.value)
+                    )
+                await db.commit()
+            if result.rowcount:
+                logger.info(
+                    f"Executor for ticket {ticket_id[:8]} exited without a final state, "
+                    "suspended for input"
+                )
+        except Exception as e:
+            logger.error(f"Error settling ticket {ticket_id[:8]}: {e}", exc_info=True)
+
+    def _lease_deadline(self) -> datetime:
+        """新的租约过期时间"""
+        return datetime.utcnow() + timedelta(seconds=self.lease_ttl)
+
+    async def _dispatch_pending_tickets(self):
+        """按批次派发 pending 状态的 Tickets，直到槽位用满或没有可派发的 Ticket"""
+        if self.pool.is_full:
+            return
+
+        started = time.perf_counter()
+        async with async_session_maker() as db:
+            await self._record_queue_depth(db)
+
+        while not self.pool.is_full:
+            fetched, dispatched = await self._dispatch_batch()
+            # 提交后再启动 Executor，确保其能读到 running 状态和新 Session
+            for entry, session_id in dispatched:
+                task = self.pool.launch(entry.ticket.id, session_id)
+                task.add_done_callback(
+                    lambda t, ticket_id=entry.ticket.id: self._on_executor_exit(
+                        ticket_id, t
+                    )
+                )
+            if not dispatched or fetched < self.dispatch_batch:
+                break
+
+        scheduler_metrics.set_gauge(
+            "dispatch_cycle_ms", (time.perf_counter() - started) * 1000
+        )
+        scheduler_metrics.set_gauge("workers_active", self.pool.active_count)
+        scheduler_metrics.set_gauge("executors_parked", len(parking_lot))
+
+    async def _dispatch_batch(self) -> tuple[int, list[tuple[QueueEntry, str]]]:
+        """派发一批 Ticket（一个短事务），返回 (取到的候选数, [(条目, session_id)])"""
+        async with async_session_maker() as db:
+            rows = await self._fetch_candidates(db)
+            entries = [self._queue_entry(row) for row in rows]
+
+            selected: list[QueueEntry] = []
+            try:
+                for entry in self.queue.order(entries):
+                    ticket = entry.ticket
+                    if self.pool.is_full:
+                        break
+                    if self.pool.is_running(ticket.id):
+                        continue
+                    # 超出 Agent 并发上限的 Ticket 保持 pending，等待下一轮
+                    if not self.pool.has_capacity(ticket.agent_id, ticket.max_concurrency):
+                        continue
+                    self.pool.reserve(ticket.id, ticket.agent_id)
+                    self.queue.charge(entry)
+                    selected.append(entry)
+
+                claimed = await self._claim_tickets(db, [e.ticket.id for e in selected])
+                dispatched = []
+                new_sessions = []
+                for entry in selected:
+                    ticket = entry.ticket
+                    if ticket.id not in claimed:
+                        logger.info(f"Ticket {ticket.id[:8]} already claimed by another worker")
+                        self.pool.release(ticket.id)
+                        continue
+                    session_id = ticket.session_id
+                    if session_id is None:
+                        session_id = str(uuid.uuid4())
+                        new_sessions.append(
+                            {
+                                "id": session_id,
+                                "ticket_id": ticket.id,
+                                "status": SessionStatus.ACTIVE.value,
+                            }
+                        )
+                    logger.info(
+                        f"Dispatching ticket {ticket.id[:8]} in session {session_id[:8]}"
+                    )
+                    dispatched.append((entry, session_id))
+
+                if new_sessions:
+                    await db.execute(insert(Session), new_sessions)
+                await db.commit()
+            except Exception:
+                for entry in selected:
+                    self.pool.release(entry.ticket.id)
+                raise
+
+        now = datetime.utcnow()
+        for entry, _ in dispatched:
+            scheduler_metrics.record_queue_wait(
+                entry.lane, (now - entry.enqueued_at).total_seconds()
             )
+        return len(rows), dispatched
 
-        await db.flush()
+    async def _fetch_candidates(self, db) -> list:
+        """取一批待派发的候选 Ticket（只取派发所需的列）
 
-        # 启动 Executor 执行任务（异步）
-        # 使用 Factory 创建
-        executor = ExecutorFactory.create_executor(ticket.id, active_session.id)
-        asyncio.create_task(executor.run())
+        每个 Agent 最多取空闲槽位数个（按 resume 优先、priority 降序、入队时间升序），
+        积压很多的 Agent 不会把其它 Agent 挤出本批；总数不超过 dispatch_batch。
+        """
+        free_slots = max(1, self.pool.max_workers - self.pool.active_count)
+        active_session = (
+            select(Session.id)
+            .where(
+                Session.ticket_id == Ticket.id,
+                Session.status == SessionStatus.ACTIVE.value,
+            )
+            .limit(1)
+            .scalar_subquery()
+        )
+        pending = (
+            select(
+                Ticket.id,
+                Ticket.agent_id,
+                Ticket.priority,
+                func.coalesce(Ticket.updated_at, Ticket.created_at).label("enqueued_at"),
+                active_session.label("session_id"),
+            )
+            .where(Ticket.status == TicketStatus.PENDING.value)
+            .subquery()
+        )
+        ranked = select(
+            pending,
+            func.row_number()
+            .over(
+                partition_by=pending.c.agent_id,
+                order_by=(
+                    pending.c.session_id.is_(None),
+                    pending.c.priority.desc(),
+                    pending.c.enqueued_at,
+                ),
+            )
+            .label("agent_rank"),
+        ).subquery()
+        result = await db.execute(
+            select(
+                ranked.c.id,
+                ranked.c.agent_id,
+                ranked.c.priority,
+                ranked.c.enqueued_at,
+                ranked.c.session_id,
+                Agent.max_concurrency,
+                Agent.schedule_weight,
+            )
+            .join(Agent, Agent.id == ranked.c.agent_id)
+            .where(ranked.c.agent_rank <= free_slots)
+            .order_by(
+                ranked.c.agent_rank,
+                ranked.c.priority.desc(),
+                ranked.c.enqueued_at,
+            )
+            .limit(self.dispatch_batch)
+        )
+        return result.all()
+
+    async def _record_queue_depth(self, db):
+        """按 lane 统计 pending Ticket 数量"""
+        resumable = (
+            select(Session.ticket_id)
+            .where(Session.status == SessionStatus.ACTIVE.value)
+            .scalar_subquery()
+        )
+        total, resumed = (
+            await db.execute(
+                select(
+                    func.count(),
+                    func.count().filter(Ticket.id.in_(resumable)),
+                ).where(Ticket.status == TicketStatus.PENDING.value)
+            )
+        ).one()
+        scheduler_metrics.set_gauge(f"queue_depth.{LANE_RESUME}", resumed)
+        scheduler_metrics.set_gauge(f"queue_depth.{LANE_DEFAULT}", total - resumed)
+
+    def _queue_entry(self, row) -> QueueEntry:
+        """将候选行转换为队列条目
+
+        仍有活跃 Session 的 Ticket 是人工输入后恢复（或租约回收）的，进入 resume lane。
+        pending Ticket 的 updated_at 即其进入 pending 的时间。
+        """
+        return QueueEntry(
+            ticket=row,
+            agent_id=row.agent_id,
+            lane=LANE_RESUME if row.session_id else LANE_DEFAULT,
+            priority=row.priority or 0,
+            enqueued_at=row.enqueued_at,
+            weight=row.schedule_weight or 1,
+        )
+
+    async def _claim_tickets(self, db, ticket_ids: list[str]) -> set[str]:
+        """原子认领一批 Ticket：仅仍为 pending 的置为 running 并写入租约，返回认领成功的 ID"""
+        if not ticket_ids:
+            return set()
+        result = await db.execute(
+            update(Ticket)
+            .where(
+                Ticket.id.in_(ticket_ids),
+                Ticket.status == TicketStatus.PENDING.value,
+            )
+            .values(
+                status=TicketStatus.RUNNING.value,
+                lease_owner=self.worker_id,
+                lease_expires_at=self._lease_deadline(),
+                updated_at=datetime.utcnow(),
+            )
+            .returning(Ticket.id)
+            .execution_options(synchronize_session=False)
+        )
+        return set(result.scalars().all())
@@ -6,26 +6,68 @@
 3. 处理 Tool 调用
 4. 处理系统工具（人工介入、任务完成、任务失败）
 5. 更新 Step 和 Message
+6. 执行 Ticket 预算（迭代次数、墙钟时间、token、费用），累计用量写回 Ticket
+7. 为请求设置提示缓存断点，每次模型调用记录 LLMCall（含缓存写入/读取 token）
+8. 流式调用模型：输出实时发布到 stream_hub，并增量写入 partial 消息
+9. 同一轮中相互独立的工具调用并发执行，结果按调用顺序写回
+10. 控制请求不超出模型上下文窗口：截断旧的工具结果、省略（可选摘要）旧轮次
+11. 一轮迭代产生的消息、步骤和模型调用记录在迭代边界一起交给 write_behind 批量提交，
+    状态变化（挂起/完成/失败）前等待提交完成
+12. 状态只在开始时的短事务中加载，之后不持有数据库会话：模型调用和工具执行期间
+    不占用连接、不持有事务
+13. 每轮日志只记录本轮新增的内容：请求消息以 DEBUG 级别、按 Ticket 抽样并截断记录，
+    每轮的日志条数和字符数记入 log_records_per_iteration / log_chars_per_iteration
+14. 模型按 Agent 的模型链选择（model_router）：失败时回退到下一个模型/服务商，
+    级联模式下从便宜的模型开始，失败或响应置信度低时升级
 """
 
 import asyncio
-import os
 import json
 import logging
+import time
 from datetime import datetime
+from types import SimpleNamespace
 from typing import Any
 
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-
+from sqlalchemy import select, update
+from sqlalchemy.orm import noload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.config import (
+    CONTEXT_SUMMARY,
+    LLM_MAX_OUTPUT_TOKENS,
+    LLM_ROUTER_FALLBACK_RETRIES,
+    LLM_STREAMING,
+    TOOL_CALL_CONCURRENCY,
+)
 from app.database import async_session_maker
+from app.logging_config import LogMeter, Payload, payload_sampled, start_log_meter
 from app.models.agent import Agent
 from app.models.ticket import Ticket, TicketStatus
 from app.models.session import Session, SessionStatus
 from app.models.message import Message, MessageRole
+from app.models.llm_call import LLMCall
 from app.models.step import Step, StepStatus
 from app.tools import get_tool_executor, get_all_tools_for_agent
+from app.tools.registry import is_serial_tool
 from app.scheduler.base_executor import IExecutor
+from app.scheduler.budget import BudgetExceeded, TicketBudget, TicketUsage
+from app.scheduler.context_window import ContextWindow, summary_request
+from app.scheduler.conversation import ConversationBuffer
+from app.scheduler.llm_client import get_llm_client
+from app.scheduler.model_router import (
+    ModelTarget,
+    fallback_reason,
+    low_confidence,
+    model_router,
+)
+from app.scheduler.metrics import scheduler_metrics
+from app.scheduler.parking import parking_lot
+from app.scheduler.prompt_cache import apply_prompt_cache
+from app.scheduler.rate_limiter import estimate_request_tokens, llm_rate_limiter
+from app.scheduler.retry import RetryPolicy, retry_reason
+from app.scheduler.streaming import AssistantStream
+from app.scheduler.write_behind import LeaseFence, release_lease, write_behind
 
 logger = logging.getLogger(__name__)
 
@@ -101,6 +143,8 @@ SYSTEM_TOOLS = [
     },
 ]
 
+SYSTEM_TOOL_NAMES = {tool["name"] for tool in SYSTEM_TOOLS}
+
 
 class AnthropicExecutor(IExecutor):
     """Agent 任务执行器 (Anthropic 原生 API 实现)"""
@@ -109,35 +153,101 @@ class AnthropicExecutor(IExecutor):
         self.ticket_id = ticket_id
         self.session_id = session_id
         self._should_stop = False
+        self._suspended = False
+        # 内存中的 API 格式会话（加载时构建一次，之后追加），挂起后随 Executor 一起停放
+        self._conversation: ConversationBuffer | None = None
+        self._context: ContextWindow | None = None
+        # 模型调用的重试策略（运行时按 Agent 设置解析）及最近一次调用的重试次数
+        self._retry_policy = RetryPolicy()
+        self._call_retries = 0
+        # 本 Executor 写入的消息（提交后取其 ID，恢复时跳过）
+        self._written: list[Message] = []
+        # 本轮迭代产生、尚未交给 write_behind 的行（迭代边界一起入队，在同一批中提交）
+        self._unsaved: list[Any] = []
+        # 本次运行认领时的租约：写入以 Ticket.lease_owner 仍为认领者为条件，丢失时停止
+        self._lease: LeaseFence | None = None
+        # 本次运行的 Ticket 累计用量及开始时间（墙钟时间 = 之前累计 + 本次已运行）
+        self._usage: TicketUsage | None = None
+        self._wall_base = 0.0
+        self._run_started = 0.0
+        # 是否记录请求内容（按 Ticket 抽样）、结构化日志字段及本次运行的日志量统计
+        self._log_payloads = payload_sampled(ticket_id)
+        self._log_extra = {"ticket_id": ticket_id}
+        self._log_meter: LogMeter | None = None
+        # Agent 的模型链；级联模式下当前所在的模型链下标（升级后停留，挂起恢复后保留）
+        self._models: list[str] = []
+        self._cascade = False
+        self._cascade_level = 0
 
     async def run(self):
-        """执行任务主循环"""
+        """执行任务主循环
+
+        首次运行从数据库加载会话并构建 API 格式的内存会话；从停放中恢复的 Executor
+        保留内存会话，只增量加载挂起期间新增的消息。
+        """
+        self._should_stop = False
+        self._suspended = False
+        self._usage = None
+        self._lease = None
+        self._unsaved.clear()
+        self._log_meter = start_log_meter()
+        budget_exceeded = None
         try:
-            async with async_session_maker() as db:
-                # 加载 Ticket, Agent, Session
-                ticket = await self._load_ticket(db)
-                if not ticket:
-                    logger.error(f"Ticket {self.ticket_id} not found")
-                    return
-
-                session = await self._load_session(db)
-                if not session:
-                    logger.error(f"Session {self.session_id} not found")
-                    return
-
-                agent = ticket.agent
-                logger.info(
-                    f"Executor started for ticket {ticket.id[:8]}, agent: {agent.name}"
-                )
+            state = await self._load_state()
+            if state is None:
+                return
+            ticket, session = state
+            if ticket.lease_owner:
+                self._lease = LeaseFence(ticket.id, ticket.lease_owner, self.stop)
+
+            agent = ticket.agent
+            logger.info(
+                f"Executor started for ticket {ticket.id[:8]}, agent: {agent.name}"
+            )
+
+            # 构建初始消息（如果是新 Session）
+            if not self._conversation.last_message_id:
+                self._add_system_message(session, agent, ticket)
+                self._save_iteration()
 
-                # 构建初始消息（如果是新 Session）
-                if not session.messages:
-                    await self._add_system_message(db, session, agent, ticket)
+            budget = TicketBudget.resolve(ticket, agent)
+            self._retry_policy = RetryPolicy.resolve(agent)
+            self._models = model_router.chain(agent)
+            self._cascade = bool(agent.model_cascade)
+            self._start_usage(ticket)
 
-                # 主执行循环
-                await self._execute_loop(db, ticket, session, agent)
+            # 主执行循环，墙钟预算用 asyncio 超时强制执行（可打断模型调用和工具执行）
+            timeout = asyncio.timeout(budget.remaining_seconds(self._usage))
+            try:
+                async with timeout:
+                    await self._execute_loop(ticket, session, agent, budget)
+            except TimeoutError:
+                if not timeout.expired():
+                    raise
+                # 丢弃未完成的迭代，在新的会话中标记失败
+                self._unsaved.clear()
+                self._tick_usage()
+                budget_exceeded = budget.wall_clock_exceeded(self._usage)
+            else:
+                # 状态变化：本轮的行和 Ticket / Session 状态一起提交，离开 running 时释放租约
+                self._record_usage(ticket)
+                if ticket.status != TicketStatus.RUNNING.value:
+                    release_lease(ticket)
+                self._save_iteration(ticket, session)
+                await write_behind.flush()
+
+            if self._lease_lost:
+                return
+
+            if budget_exceeded:
+                logger.warning(f"Ticket {self.ticket_id[:8]} {budget_exceeded}")
+                await self._mark_failed(
+                    str(budget_exceeded), budget_exceeded.reason.value
+                )
 
-                await db.commit()
+            # 等待人工输入：停放 Executor，恢复时由 Dispatcher 取回继续执行
+            if self._suspended:
+                parking_lot.park(self.session_id, self)
 
         except Exception as e:
             logger.error(
@@ -145,10 +255,60 @@ class AnthropicExecutor(IExecutor):
             )
             await self._mark_failed(str(e))
 
+    async def _load_state(self) -> tuple[Ticket, Session] | None:
+        """在一个短事务中加载 Ticket（含 Agent、工具、步骤）、Session 和新增的消息
+
+        会话关闭后对象为 detached：执行期间不占用数据库连接，不在模型调用和工具执行期间
+        持有事务；对它们的修改在迭代边界和状态变化时经 write_behind 写回。
+        """
+        async with async_session_maker() as db:
+            ticket = await self._load_ticket(db)
+            if not ticket:
+                logger.error(f"Ticket {self.ticket_id} not found")
+                return None
+
+            session = await self._load_session(db)
+            if not session:
+                logger.error(f"Session {self.session_id} not found")
+                return None
+
+            if self._conversation is None:
+                self._conversation = ConversationBuffer()
+                await self._load_messages(db)
+                self._context = ContextWindow(self._conversation)
+            else:
+                loaded = await self._load_messages(db)
+                logger.info(
+                    f"Resumed parked executor for ticket {ticket.id[:8]} "
+                    f"with {loaded} new messages"
+                )
+        return ticket, session
+
+    def _start_usage(self, ticket: Ticket):
+        """从 Ticket 读取累计用量并开始计时"""
+        self._usage = TicketUsage.from_ticket(ticket)
+        self._wall_base = self._usage.wall_seconds
+        self._run_started = time.monotonic()
+
+    def _tick_usage(self):
+        """更新用量中的墙钟时间"""
+        self._usage.wall_seconds = self._wall_base + (
+            time.monotonic() - self._run_started
+        )
+
+    def _record_usage(self, ticket: Ticket):
+        """将累计用量写回 Ticket（随下一次 _save_iteration 落库）"""
+        self._tick_usage()
+        self._usage.apply_to(ticket)
+
     def stop(self):
         """停止任务"""
         self._should_stop = True
 
+    def parked_size(self) -> int:
+        """停放时占用内存的估算值（消息内容字节数）"""
+        return self._conversation.size_bytes if self._conversation else 0
+
     async def _load_ticket(self, db) -> Ticket | None:
         """加载 Ticket"""
         result = await db.execute(
@@ -162,17 +322,54 @@ class AnthropicExecutor(IExecutor):
         return result.scalar_one_or_none()
 
     async def _load_session(self, db) -> Session | None:
-        """加载 Session"""
+        """加载 Session（消息单独加载到内存会话）"""
         result = await db.execute(
             select(Session)
-            .options(selectinload(Session.messages))
+            .options(noload(Session.messages))
             .where(Session.id == self.session_id)
+            .execution_options(populate_existing=True)
         )
         return result.scalar_one_or_none()
 
-    async def _add_system_message(
-        self, db, session: Session, agent: Agent, ticket: Ticket
-    ):
+    async def _load_messages(self, db) -> int:
+        """将内存会话之后的消息追加到内存会话（只查询需要的列，跳过 partial 消息），返回追加数量"""
+        conversation = self._conversation
+        for message in self._written:
+            if message.id is not None and message.id > conversation.last_message_id:
+                conversation.last_message_id = message.id
+        self._written.clear()
+
+        result = await db.execute(
+            select(Message.id, Message.role, Message.content)
+            .where(
+                Message.session_id == self.session_id,
+                Message.id > conversation.last_message_id,
+                Message.partial.is_(False),
+            )
+            .order_by(Message.timestamp, Message.id)
+        )
+        rows = result.all()
+        for row in rows:
+            conversation.add_row(row.id, row.role, row.content)
+        return len(rows)
+
+    def _append_message(self, message: Message, parsed: Any = None):
+        """保存消息并追加到内存会话（parsed 为 content 已解析的 JSON）"""
+        self._unsaved.append(message)
+        self._written.append(message)
+        self._conversation.add(message.role, message.content, parsed)
+
+    def _save_iteration(self, *rows: Any):
+        """本轮迭代产生的行（及 rows，如 Ticket、Session）交给 write_behind"""
+        write_behind.save(*self._unsaved, *rows, fence=self._lease)
+        self._unsaved.clear()
+
+    @property
+    def _lease_lost(self) -> bool:
+        """认领时的租约是否已丢失（被回收、取消或重置），此后的写入都被丢弃"""
+        return self._lease is not None and self._lease.lost
+
+    def _add_system_message(self, session: Session, agent: Agent, ticket: Ticket):
         """添加系统消息"""
         from app.services.prompt_compiler import compile_system_message
 
@@ -211,8 +408,7 @@ class AnthropicExecutor(IExecutor):
             content=system_content,
             timestamp=datetime.utcnow(),
         )
-        db.add(message)
-        session.messages.append(message)
+        self._append_message(message)
 
         # 添加初始用户消息（Anthropic API 要求第一条非系统消息必须是 user）
         user_message = Message(
@@ -221,64 +417,74 @@ class AnthropicExecutor(IExecutor):
             content="请开始执行任务。",
             timestamp=datetime.utcnow(),
         )
-        db.add(user_message)
-        session.messages.append(user_message)
-
-        await db.flush()
+        self._append_message(user_message)
 
-    async def _execute_loop(self, db, ticket: Ticket, session: Session, agent: Agent):
+    async def _execute_loop(
+        self, ticket: Ticket, session: Session, agent: Agent, budget: TicketBudget
+    ):
         """执行循环"""
-        import anthropic
-
-        # 初始化 Anthropic 客户端
-        base_url = os.getenv("ANTHROPIC_BASE_URL")
-        client = (
-            anthropic.Anthropic(base_url=base_url)
-            if base_url
-            else anthropic.Anthropic()
-        )
-
         # 获取 Agent 可用的工具
-        logger.info(
-            f"Agent {agent.name} has {len(agent.tools)} tools: {[t.name for t in agent.tools]}"
-        )
         agent_tools = get_all_tools_for_agent(agent)
         all_tools = agent_tools + SYSTEM_TOOLS
         logger.info(
-            f"Total tools for API call: {len(all_tools)} (agent: {len(agent_tools)}, system: {len(SYSTEM_TOOLS)})"
+            "Agent %s has %d tools (agent: %d, system: %d)",
+            agent.name,
+            len(all_tools),
+            len(agent_tools),
+            len(SYSTEM_TOOLS),
+            extra=self._log_extra,
         )
 
-        max_iterations = 50  # 防止无限循环
-        iteration = 0
-
-        while not self._should_stop and iteration < max_iterations:
-            iteration += 1
-
-            # 构建消息历史
-            messages = self._build_messages(session)
+        while not self._should_stop:
+            # 预算检查：超出任一预算的 Ticket 以结构化原因失败
+            self._tick_usage()
+            exceeded = budget.check(self._usage)
+            if exceeded:
+                logger.warning(f"Ticket {ticket.id[:8]} {exceeded}")
+                await self._fail_budget(ticket, session, exceeded)
+                break
+            self._usage.iterations += 1
 
-            logger.info(f"Messages history: {str(messages)}")
+            # 本轮的模型调用计划，按首选目标构建消息历史（控制在模型上下文窗口内）
+            plan = model_router.plan(
+                self._models, self._cascade_level if self._cascade else 0
+            )
+            model = plan[0][1].model
+            messages = self._context.fit(model, all_tools)
+            if CONTEXT_SUMMARY and self._context.needs_summary:
+                await self._summarize(plan[0][1], session)
+                messages = self._context.fit(model, all_tools)
+
+            # 之前的消息已在前几轮记录，只记录本轮最新的一条（级别未启用时不序列化）
+            if self._log_payloads:
+                logger.debug(
+                    "Request for ticket %s: %d messages, latest: %s",
+                    ticket.id[:8],
+                    len(messages),
+                    Payload(messages[-1]),
+                    extra=self._log_extra,
+                )
 
-            # 调用 Claude API
+            # 调用 Claude API（system、工具定义和会话前缀设置提示缓存断点）
+            stream = (
+                AssistantStream(session.id, fence=self._lease) if LLM_STREAMING else None
+            )
             try:
-                model = os.getenv("ANTHROPIC_MODEL", "claude-3-5-sonnet-20241022")
-                logger.info(f"Calling Claude API with model: {model}")
-                response = client.messages.create(
-                    model=model,
-                    max_tokens=4096,
-                    system=self._get_system_message(session),
-                    messages=messages,
-                    tools=all_tools,
-                )
-            except Exception as e:
+                response = await self._call_models(plan, all_tools, messages, stream)
+            except BaseException as e:
+                # 失败、取消或超时：删除流中已写入的 partial 消息
+                if stream is not None:
+                    stream.abort()
+                if not isinstance(e, Exception):
+                    raise
                 logger.error(f"Claude API error: {e}")
                 await self._handle_system_tool(
-                    db, ticket, session, "fail_task", {"error": str(e)}
+                    ticket, session, "fail_task", {"error": str(e)}
                 )
                 break
 
             # 处理响应
-            await self._handle_response(db, ticket, session, response)
+            await self._handle_response(ticket, session, response, stream)
 
             # 检查是否需要停止
             if response.stop_reason == "end_turn":
@@ -287,86 +493,291 @@ class AnthropicExecutor(IExecutor):
                     logger.info("No tool calls, waiting for next input or ending")
                     break
 
-            await db.flush()
+            # 迭代边界检查点：本轮消息和累计用量交给 write_behind，停止/重启后从此处继续
+            self._record_usage(ticket)
+            self._save_iteration(ticket)
+            self._record_log_volume()
+
+    def _record_log_volume(self):
+        """记录本轮迭代产生的日志条数和字符数"""
+        records, chars = self._log_meter.take()
+        scheduler_metrics.record_value("log_records_per_iteration", records)
+        scheduler_metrics.record_value("log_chars_per_iteration", chars)
+
+    async def _call_models(
+        self,
+        plan: list[tuple[int, ModelTarget]],
+        tools: list[dict[str, Any]],
+        messages: list[dict[str, Any]],
+        stream: AssistantStream | None,
+    ):
+        """按计划调用模型，返回第一个被采用的响应
+
+        与目标有关的错误（见 fallback_reason）在重试后回退到下一个目标，后面还有目标时
+        每个目标最多重试 LLM_ROUTER_FALLBACK_RETRIES 次；级联模式下失败或低置信度的响应
+        升级到模型链的下一个模型（被丢弃的响应同样记录调用和用量）。
+        """
+        last = len(plan) - 1
+        for attempt, (level, target) in enumerate(plan):
+            if attempt:
+                if target.model != plan[attempt - 1][1].model:
+                    messages = self._context.fit(target.model, tools)
+                if stream is not None:
+                    stream.restart()
+            logger.info(
+                "Calling model %s for ticket %s (iteration %d)",
+                target.key,
+                self.ticket_id[:8],
+                self._usage.iterations,
+                extra=self._log_extra,
+            )
+            policy = self._retry_policy
+            if attempt < last:
+                policy = policy.limited(LLM_ROUTER_FALLBACK_RETRIES)
+            started = time.monotonic()
+            try:
+                response = await self._create_message(
+                    get_llm_client(target.provider),
+                    stream=stream,
+                    target=target,
+                    policy=policy,
+                    estimated_tokens=self._context.request_tokens(tools),
+                    model=target.model,
+                    max_tokens=LLM_MAX_OUTPUT_TOKENS,
+                    **apply_prompt_cache(self._conversation.system, tools, messages),
+                )
+            except Exception as e:
+                reason = fallback_reason(e)
+                if attempt == last or reason is None:
+                    raise
+                scheduler_metrics.increment("llm_fallbacks")
+                logger.warning(
+                    f"Model {target.key} failed for ticket {self.ticket_id[:8]} "
+                    f"({reason}: {e}), falling back to {plan[attempt + 1][1].key}"
+                )
+                self._escalate(plan[attempt + 1][0])
+                continue
+
+            self._context.mark_sent(tools)
+            call_usage = self._usage.add_response(target.model, response)
+            self._record_call(
+                target.model,
+                response,
+                call_usage,
+                time.monotonic() - started,
+                stream,
+                provider=target.provider,
+            )
+            signal = low_confidence(response, tools) if self._cascade else None
+            next_level = plan[attempt + 1][0] if attempt < last else level
+            if signal is None or next_level <= level:
+                return response
+            scheduler_metrics.increment("llm_escalations")
+            scheduler_metrics.increment(f"llm_escalations.{signal}")
+            logger.info(
+                f"Low-confidence response ({signal}) from {target.key} for ticket "
+                f"{self.ticket_id[:8]}, escalating to {self._models[next_level]}"
+            )
+            self._escalate(next_level)
+        raise RuntimeError("Empty model plan")
+
+    def _escalate(self, level: int):
+        """级联模式：升级到模型链的第 level 个模型，之后的调用从它开始"""
+        if self._cascade:
+            self._cascade_level = max(self._cascade_level, level)
+
+    async def _summarize(self, target: ModelTarget, session: Session):
+        """为已省略的轮次生成摘要并保存为 summary 消息（失败时沿用省略说明）"""
+        conversation = self._conversation
+        dropped = conversation.messages[
+            conversation.summary_covers : self._context.drop_until
+        ]
+        started = time.monotonic()
+        try:
+            response = await self._create_message(
+                get_llm_client(target.provider),
+                target=target,
+                model=target.model,
+                **summary_request(conversation.summary, dropped),
+            )
+        except Exception as e:
+            logger.warning(f"Context summary failed for ticket {self.ticket_id[:8]}: {e}")
+            return
+        call_usage = self._usage.add_response(target.model, response)
+        self._record_call(
+            target.model,
+            response,
+            call_usage,
+            time.monotonic() - started,
+            provider=target.provider,
+        )
+
+        summary = "".join(
+            block.text for block in response.content if block.type == "text"
+        ).strip()
+        if not summary:
+            return
+        self._context.set_summary(summary)
+        parsed = {"summary": summary, "messages": self._context.drop_until}
+        message = Message(
+            session_id=session.id,
+            role=MessageRole.SUMMARY.value,
+            content=json.dumps(parsed, ensure_ascii=False),
+            timestamp=datetime.utcnow(),
+        )
+        self._append_message(message, parsed)
+        logger.info(
+            f"Summarized {len(dropped)} earlier messages for ticket {self.ticket_id[:8]}"
+        )
 
-        if iteration >= max_iterations:
-            logger.warning(f"Max iterations reached for ticket {ticket.id[:8]}")
-            await self._handle_system_tool(
-                db, ticket, session, "fail_task", {"error": "Max iterations reached"}
+    def _record_call(
+        self,
+        model: str,
+        response,
+        call_usage: TicketUsage | None,
+        elapsed: float,
+        stream: AssistantStream | None = None,
+        provider: str | None = None,
+    ):
+        """记录单次模型调用（随本轮迭代落库）"""
+        call_usage = call_usage or TicketUsage()
+        first_token = stream.first_token_latency if stream is not None else None
+        scheduler_metrics.record_latency("llm_call", elapsed)
+        self._unsaved.append(
+            LLMCall(
+                ticket_id=self.ticket_id,
+                session_id=self.session_id,
+                model=model,
+                provider=provider,
+                stop_reason=getattr(response, "stop_reason", None),
+                input_tokens=call_usage.input_tokens,
+                output_tokens=call_usage.output_tokens,
+                cache_write_tokens=call_usage.cache_write_tokens,
+                cache_read_tokens=call_usage.cache_read_tokens,
+                cost_usd=round(call_usage.cost_usd, 6),
+                latency_ms=round(elapsed * 1000, 1),
+                first_token_ms=(
+                    round(first_token * 1000, 1) if first_token is not None else None
+                ),
+                retries=self._call_retries,
+            )
+        )
+        if call_usage.cache_read_tokens or call_usage.cache_write_tokens:
+            logger.info(
+                "Prompt cache for ticket %s: read=%d write=%d uncached=%d",
+                self.ticket_id[:8],
+                call_usage.cache_read_tokens,
+                call_usage.cache_write_tokens,
+                call_usage.input_tokens,
+                extra=self._log_extra,
             )
 
-    def _get_system_message(self, session: Session) -> str:
-        """获取系统消息"""
-        for msg in session.messages:
-            if msg.role == MessageRole.SYSTEM.value:
-                return msg.content
-        return ""
-
-    def _build_messages(self, session: Session) -> list:
-        """构建 API 消息格式"""
-        messages = []
-        pending_tool_results = []  # 收集连续的工具结果
-
-        for msg in sorted(session.messages, key=lambda m: m.timestamp):
-            if msg.role == MessageRole.SYSTEM.value:
-                continue  # 系统消息单独传
-
-            if msg.role == MessageRole.USER.value:
-                # 先刷新 pending tool results
-                if pending_tool_results:
-                    messages.append({"role": "user", "content": pending_tool_results})
-                    pending_tool_results = []
-                messages.append({"role": "user", "content": msg.content})
-            elif msg.role == MessageRole.ASSISTANT.value:
-                # 先刷新 pending tool results
-                if pending_tool_results:
-                    messages.append({"role": "user", "content": pending_tool_results})
-                    pending_tool_results = []
-                # 尝试解析为 content blocks
-                try:
-                    content = json.loads(msg.content)
-                    if isinstance(content, list):
-                        # 过滤掉 thinking 类型的 block (Anthropic API 不接受)
-                        filtered_content = [
-                            block
-                            for block in content
-                            if block.get("type") != "thinking"
-                        ]
-                        if filtered_content:
-                            messages.append(
-                                {"role": "assistant", "content": filtered_content}
-                            )
+    async def _fail_budget(
+        self, ticket: Ticket, session: Session, exceeded: BudgetExceeded
+    ):
+        """超出预算：标记失败并记录结构化原因"""
+        await self._handle_system_tool(
+            ticket, session, "fail_task", {"error": str(exceeded)}
+        )
+        ticket.failure_reason = exceeded.reason.value
+
+    async def _create_message(
+        self,
+        client,
+        stream: AssistantStream | None = None,
+        target: ModelTarget | None = None,
+        policy: RetryPolicy | None = None,
+        estimated_tokens: int | None = None,
+        **request,
+    ):
+        """经进程内共享限流器调用模型
+
+        瞬时错误（429/5xx/超时/连接错误）按重试策略（默认为 Agent 的策略）指数退避后重新排队，
+        429/529 时限流器还会收缩并发窗口并按 retry-after 暂停所有调用；
+        不可重试或重试耗尽时抛出。传入 stream 时以流式调用，输出增量写入 stream。
+        传入 target 时每次尝试的耗时和成败记入 model_router 的滚动统计。
+        estimated_tokens 为限流器预扣的 token 数（会话请求由 ContextWindow 给出，
+        未提供时按请求内容估算，如摘要请求）。
+        """
+        estimated = (
+            estimated_tokens
+            if estimated_tokens is not None
+            else estimate_request_tokens(**request)
+        )
+        policy = policy or self._retry_policy
+        started = time.monotonic()
+        if stream is not None:
+            stream.start()
+        retry = 0
+        while True:
+            # 单次尝试的耗时（不含限流排队）
+            attempt_started = None
+            try:
+                async with llm_rate_limiter.limit(estimated) as permit:
+                    attempt_started = time.monotonic()
+                    if stream is not None:
+                        response = await self._stream_message(client, stream, request)
                     else:
-                        messages.append({"role": "assistant", "content": msg.content})
-                except json.JSONDecodeError:
-                    messages.append({"role": "assistant", "content": msg.content})
-
-            elif msg.role == MessageRole.TOOL.value:
-                # 工具结果消息 - 收集到 pending 列表中
-                try:
-                    tool_result = json.loads(msg.content)
-                    pending_tool_results.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": tool_result.get("tool_use_id", ""),
-                            "content": tool_result.get("result", ""),
-                        }
+                        response = await client.messages.create(**request)
+                    permit.record_usage(response)
+                    self._call_retries = retry
+                    if target is not None:
+                        model_router.record(
+                            target, time.monotonic() - attempt_started, ok=True
+                        )
+                    return response
+            except Exception as e:
+                if (
+                    target is not None
+                    and attempt_started is not None
+                    and fallback_reason(e) is not None
+                ):
+                    model_router.record(
+                        target, time.monotonic() - attempt_started, ok=False
                     )
-                except json.JSONDecodeError:
-                    pass
-
-        # 刷新剩余的 pending tool results
-        if pending_tool_results:
-            messages.append({"role": "user", "content": pending_tool_results})
-
-        # 如果没有用户消息，添加一个启动消息
-        if not messages:
-            messages.append({"role": "user", "content": "请开始执行任务。"})
-
-        return messages
+                reason = retry_reason(e)
+                delay = policy.next_delay(e, retry, time.monotonic() - started)
+                if delay is None:
+                    if reason is not None:
+                        scheduler_metrics.increment("llm_retries_exhausted")
+                    raise
+                retry += 1
+                scheduler_metrics.increment("llm_retries")
+                scheduler_metrics.increment(f"llm_retries.{reason}")
+                scheduler_metrics.record_latency("llm_retry_wait", delay)
+                logger.warning(
+                    f"LLM call for ticket {self.ticket_id[:8]} failed ({reason}: {e}), "
+                    f"retry {retry}/{policy.max_retries} in {delay:.1f}s"
+                )
+                if stream is not None:
+                    stream.restart()
+                await asyncio.sleep(delay)
 
-    async def _handle_response(self, db, ticket: Ticket, session: Session, response):
-        """处理 Claude 响应"""
+    async def _stream_message(
+        self, client, stream: AssistantStream, request: dict[str, Any]
+    ):
+        """流式调用模型：文本增量和工具调用开始写入 stream，返回完整响应"""
+        async with client.messages.stream(**request) as events:
+            async for event in events:
+                if event.type == "text":
+                    stream.text_delta(event.text)
+                elif (
+                    event.type == "content_block_start"
+                    and event.content_block.type == "tool_use"
+                ):
+                    stream.tool_use(
+                        event.content_block.id, event.content_block.name
+                    )
+            return await events.get_final_message()
+
+    async def _handle_response(
+        self,
+        ticket: Ticket,
+        session: Session,
+        response,
+        stream: AssistantStream | None = None,
+    ):
+        """处理 Claude 响应（流式调用时复用流中写入的 partial 消息）"""
         # 保存 assistant 消息
         content_blocks = []
         for block in response.content:
@@ -385,62 +796,87 @@ class AnthropicExecutor(IExecutor):
                     }
                 )
 
-        assistant_msg = Message(
-            session_id=session.id,
-            role=MessageRole.ASSISTANT.value,
-            content=json.dumps(content_blocks, ensure_ascii=False),
-            timestamp=datetime.utcnow(),
-        )
-        db.add(assistant_msg)
-        session.messages.append(assistant_msg)
+        content = json.dumps(content_blocks, ensure_ascii=False)
+        assistant_msg = stream.finish(content) if stream is not None else None
+        if assistant_msg is None:
+            assistant_msg = Message(
+                session_id=session.id,
+                role=MessageRole.ASSISTANT.value,
+                content=content,
+                timestamp=datetime.utcnow(),
+            )
+        self._append_message(assistant_msg, content_blocks)
+
+        # 处理工具调用（结果按调用顺序保存）
+        tool_blocks = [block for block in response.content if block.type == "tool_use"]
+        results = await self._run_tool_calls(ticket, session, tool_blocks)
+        for block, result in zip(tool_blocks, results):
+            self._save_tool_result(session, block, result)
+
+    async def _run_tool_calls(
+        self, ticket: Ticket, session: Session, tool_blocks: list
+    ) -> list[str]:
+        """执行一轮中的工具调用，返回与 tool_blocks 顺序一致的结果
+
+        连续的可并发调用作为一批同时执行（最多 TOOL_CALL_CONCURRENCY 个）；串行工具
+        （系统工具、以 serial=True 注册的工具和按参数判断为写操作的调用，如 http_request
+        的 POST）等待前面的调用全部完成后单独执行，
+        先写后读这类依赖调用顺序的副作用不会被打乱。
+        """
+        results = [""] * len(tool_blocks)
+        semaphore = asyncio.Semaphore(max(1, TOOL_CALL_CONCURRENCY))
+
+        async def run(index: int):
+            async with semaphore:
+                results[index] = await self._call_tool(
+                    ticket, session, tool_blocks[index]
+                )
 
-        # 处理工具调用
-        for block in response.content:
-            if block.type == "tool_use":
-                await self._handle_tool_call(db, ticket, session, block)
+        batch: list[int] = []
+        for index, block in enumerate(tool_blocks):
+            if block.name in SYSTEM_TOOL_NAMES or is_serial_tool(block.name, block.input):
+                if batch:
+                    await asyncio.gather(*(run(i) for i in batch))
+                    batch = []
+                results[index] = await self._call_tool(ticket, session, block)
+            else:
+                batch.append(index)
+        if batch:
+            await asyncio.gather(*(run(i) for i in batch))
+        return results
 
-    async def _handle_tool_call(self, db, ticket: Ticket, session: Session, tool_block):
-        """处理工具调用"""
+    async def _call_tool(self, ticket: Ticket, session: Session, tool_block) -> str:
+        """执行单个工具调用"""
         tool_name = tool_block.name
         tool_input = tool_block.input
-        tool_id = tool_block.id
 
-        logger.info(f"Tool call: {tool_name}")
+        logger.info("Tool call: %s", tool_name, extra=self._log_extra)
 
         # 检查是否是系统工具
-        if tool_name in [
-            "request_human_input",
-            "complete_step",
-            "complete_task",
-            "fail_task",
-            "add_step",
-        ]:
-            result = await self._handle_system_tool(
-                db, ticket, session, tool_name, tool_input
+        if tool_name in SYSTEM_TOOL_NAMES:
+            return await self._handle_system_tool(
+                ticket, session, tool_name, tool_input
             )
-        else:
-            # 执行普通工具
-            result = await self._execute_tool(tool_name, tool_input)
-
-        # 保存工具结果
+        # 执行普通工具
+        return await self._execute_tool(tool_name, tool_input)
+
+    def _save_tool_result(self, session: Session, tool_block, result: str):
+        """保存工具结果"""
+        tool_result = {
+            "tool_use_id": tool_block.id,
+            "tool_name": tool_block.name,
+            "result": result,
+        }
         tool_msg = Message(
             session_id=session.id,
             role=MessageRole.TOOL.value,
-            content=json.dumps(
-                {
-                    "tool_use_id": tool_id,
-                    "tool_name": tool_name,
-                    "result": result,
-                },
-                ensure_ascii=False,
-            ),
+            content=json.dumps(tool_result, ensure_ascii=False),
             timestamp=datetime.utcnow(),
         )
-        db.add(tool_msg)
-        session.messages.append(tool_msg)
+        self._append_message(tool_msg, tool_result)
 
     async def _handle_system_tool(
-        self, db, ticket: Ticket, session: Session, tool_name: str, tool_input: dict
+        self, ticket: Ticket, session: Session, tool_name: str, tool_input: dict
     ) -> str:
         """处理系统工具"""
         if tool_name == "request_human_input":
@@ -448,6 +884,7 @@ class AnthropicExecutor(IExecutor):
             ticket.status = TicketStatus.SUSPENDED.value
             session.status = SessionStatus.SUSPENDED.value
             self._should_stop = True
+            self._suspended = True
             logger.info(f"Ticket {ticket.id[:8]} suspended for human input")
             return f"任务已挂起，等待用户输入。提示: {tool_input.get('prompt', '')}"
 
@@ -459,6 +896,7 @@ class AnthropicExecutor(IExecutor):
                 latest_step.result = json.dumps(
                     {"summary": tool_input.get("summary", "")}
                 )
+                self._unsaved.append(latest_step)
                 logger.info(f"Step {latest_step.idx} completed: {latest_step.title}")
                 return f"步骤 {latest_step.idx} 已完成。摘要: {tool_input.get('summary', '')}"
             else:
@@ -485,11 +923,19 @@ class AnthropicExecutor(IExecutor):
                 if tool_input.get("result")
                 else None,
             )
-            db.add(step)
-            ticket.steps.append(step)
+            # 步骤由 write_behind 插入，不经 Ticket 关系的级联写入
+            self._unsaved.append(step)
+            set_committed_value(ticket, "steps", [*ticket.steps, step])
             return f"步骤 {step_idx} 已添加: {step.title}"
         elif tool_name == "complete_task":
             ticket.status = TicketStatus.COMPLETED.value
+            ticket.result = json.dumps(
+                {
+                    "summary": tool_input.get("summary", ""),
+                    "result": tool_input.get("result"),
+                },
+                ensure_ascii=False,
+            )
             session.status = SessionStatus.COMPLETED.value
             self._should_stop = True
             logger.info(f"Ticket {ticket.id[:8]} completed")
@@ -510,20 +956,38 @@ class AnthropicExecutor(IExecutor):
             logger.error(f"Tool {tool_name} error: {e}")
             return f"Tool execution error: {str(e)}"
 
-    async def _mark_failed(self, error: str):
-        """标记任务失败"""
+    async def _mark_failed(self, error: str, reason: str | None = None):
+        """标记任务失败（同时写回已累计的用量并释放租约，之前迭代的行先落库）
+
+        有租约时以 lease_owner 仍为认领者为条件更新，租约已丢失则不写入。
+        """
+        await write_behind.flush()
+        if self._lease_lost:
+            return
+        values = {
+            "status": TicketStatus.FAILED.value,
+            "error_message": error,
+            "failure_reason": reason,
+            "lease_owner": None,
+            "lease_expires_at": None,
+        }
+        if self._usage is not None:
+            self._tick_usage()
+            usage = SimpleNamespace()
+            self._usage.apply_to(usage)
+            values.update(vars(usage))
+        conditions = [Ticket.id == self.ticket_id]
+        if self._lease is not None:
+            conditions.append(Ticket.lease_owner == self._lease.owner)
+
         async with async_session_maker() as db:
-            result = await db.execute(select(Ticket).where(Ticket.id == self.ticket_id))
-            ticket = result.scalar_one_or_none()
-            if ticket:
-                ticket.status = TicketStatus.FAILED.value
-                ticket.error_message = error
-
-            result = await db.execute(
-                select(Session).where(Session.id == self.session_id)
+            result = await db.execute(update(Ticket).where(*conditions).values(values))
+            if self._lease is not None and result.rowcount == 0:
+                self._lease.mark_lost()
+                return
+            await db.execute(
+                update(Session)
+                .where(Session.id == self.session_id)
+                .values(status=SessionStatus.FAILED.value)
             )
-            session = result.scalar_one_or_none()
-            if session:
-                session.status = SessionStatus.FAILED.value
-
             await db.commit()
@@ -1,12 +1,19 @@
-"""SDK Executor - 基于 claude_agent_sdk 的执行器"""
+"""SDK Executor - 基于 claude_agent_sdk 的执行器
+
+开启 include_partial_messages，模型输出经 AssistantStream 实时发布（与 AnthropicExecutor 相同的流接口）。
+消息交给 write_behind 批量提交，Ticket 状态变化（系统工具）和运行结束前等待提交完成。
+状态在开始时的短事务中加载，运行期间（包括模型调用和工具执行）不持有数据库会话。
+与 AnthropicExecutor 相同，所有写入以认领时的租约为条件（LeaseFence），离开 running 时释放租约。
+"""
 
 import logging
 import json
 import asyncio
+from datetime import datetime
 from typing import Any, List, Dict
 
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, update
+from sqlalchemy.orm import noload, selectinload
 
 from app.database import async_session_maker
 from app.models.agent import Agent as DbAgent
@@ -17,6 +24,8 @@ from app.models.step import Step, StepStatus
 from app.scheduler.base_executor import IExecutor
 from app.tools.registry import get_sdk_tools_for_agent
 from app.scheduler.context import execution_context, ExecutionContext
+from app.scheduler.streaming import AssistantStream
+from app.scheduler.write_behind import LeaseFence, release_lease, write_behind
 from app.tools.system_tools import (
     request_human_input,
     complete_task,
@@ -26,7 +35,7 @@ from app.tools.system_tools import (
 
 # Direct import since dependency is installed
 from claude_agent_sdk import ClaudeSDKClient, ClaudeAgentOptions, create_sdk_mcp_server
-from claude_agent_sdk.types import TextBlock, ToolUseBlock, ResultMessage
+from claude_agent_sdk.types import TextBlock, ToolUseBlock, ResultMessage, StreamEvent
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +49,8 @@ class SDKExecutor(IExecutor):
         self._should_stop = False
         self._client = None
         self._stop_event = asyncio.Event()
+        # 本次运行认领时的租约：写入以 Ticket.lease_owner 仍为认领者为条件，丢失时停止
+        self._lease: LeaseFence | None = None
 
     def stop(self):
         """标记停止并触发事件"""
@@ -61,147 +72,187 @@ class SDKExecutor(IExecutor):
 
     async def run(self):
         try:
-            async with async_session_maker() as db:
-                ticket = await self._load_ticket(db)
-                if not ticket:
-                    return
-                session = await self._load_session(db)
-                if not session:
-                    return
-
-                agent_def = ticket.agent
-
-                # 0. Set Execution Context
-                ctx_token = execution_context.set(
-                    ExecutionContext(
-                        db=db, ticket=ticket, session=session, executor=self
-                    )
+            ticket, session = await self._load_state()
+            if not ticket or not session:
+                return
+            if ticket.lease_owner:
+                self._lease = LeaseFence(ticket.id, ticket.lease_owner, self.stop)
+
+            agent_def = ticket.agent
+
+            # 0. Set Execution Context
+            ctx_token = execution_context.set(
+                ExecutionContext(
+                    ticket=ticket, session=session, executor=self, fence=self._lease
                 )
+            )
 
+            try:
+                # 1. Gather Tools
+                system_tools = [
+                    request_human_input,
+                    complete_task,
+                    fail_task,
+                    add_step,
+                ]
+
+                # Get User Tools
+                tool_names = [t.name for t in agent_def.tools]
+                user_tools = get_sdk_tools_for_agent(tool_names)
+
+                all_tools = user_tools + system_tools
+
+                # Create MCP Server
+                logger.debug(f"Creating MCP server with {len(all_tools)} tools")
+                for tool in all_tools:
+                    tool_name = getattr(tool, "__name__", str(tool))
+                    logger.debug(f"  - Tool: {tool_name}")
+
+                server = create_sdk_mcp_server("local_tools", tools=all_tools)
+                logger.debug(f"MCP server created: {server}")
+
+                # 2. Configure Options
+                logger.debug(
+                    f"Agent prompt length: {len(agent_def.prompt) if agent_def.prompt else 0}"
+                )
+                options = ClaudeAgentOptions(
+                    permission_mode="bypassPermissions",
+                    system_prompt=agent_def.prompt,
+                    mcp_servers={"local": server},
+                    include_partial_messages=True,
+                )
+                logger.debug(f"ClaudeAgentOptions created: {options}")
+
+                # 3. Build Initial Prompt
+                context_str = self._build_context_str(ticket)
+                initial_prompt = f"{context_str}\n\n请开始执行任务。"
+                logger.debug(f"Initial prompt length: {len(initial_prompt)}")
+                logger.debug(f"Initial prompt preview: {initial_prompt[:200]}...")
+
+                # 4. Initialize Client
+                logger.info("Creating ClaudeSDKClient...")
+                self._client = ClaudeSDKClient(options)
+                logger.info(f"ClaudeSDKClient created: {self._client}")
+
+                # 5. Connect WITHOUT initial prompt (use streaming mode)
+                # SDK requires streaming mode for bidirectional communication
+                logger.info(f"SDKExecutor connecting for agent {agent_def.name}")
+                logger.info("Calling connect() in streaming mode...")
                 try:
-                    # 1. Gather Tools
-                    system_tools = [
-                        request_human_input,
-                        complete_task,
-                        fail_task,
-                        add_step,
-                    ]
-
-                    # Get User Tools
-                    tool_names = [t.name for t in agent_def.tools]
-                    user_tools = get_sdk_tools_for_agent(tool_names)
-
-                    all_tools = user_tools + system_tools
-
-                    # Create MCP Server
-                    logger.debug(f"Creating MCP server with {len(all_tools)} tools")
-                    for tool in all_tools:
-                        tool_name = getattr(tool, "__name__", str(tool))
-                        logger.debug(f"  - Tool: {tool_name}")
-
-                    server = create_sdk_mcp_server("local_tools", tools=all_tools)
-                    logger.debug(f"MCP server created: {server}")
-
-                    # 2. Configure Options
-                    logger.debug(
-                        f"Agent prompt length: {len(agent_def.prompt) if agent_def.prompt else 0}"
+                    await self._client.connect()  # No prompt - streaming mode
+                    logger.info("connect() completed successfully")
+                except Exception as conn_err:
+                    logger.error(
+                        f"connect() failed: {type(conn_err).__name__}: {conn_err}"
                     )
-                    options = ClaudeAgentOptions(
-                        permission_mode="bypassPermissions",
-                        system_prompt=agent_def.prompt,
-                        mcp_servers={"local": server},
-                    )
-                    logger.debug(f"ClaudeAgentOptions created: {options}")
-
-                    # 3. Build Initial Prompt
-                    context_str = self._build_context_str(ticket)
-                    initial_prompt = f"{context_str}\n\n请开始执行任务。"
-                    logger.debug(f"Initial prompt length: {len(initial_prompt)}")
-                    logger.debug(f"Initial prompt preview: {initial_prompt[:200]}...")
-
-                    # 4. Initialize Client
-                    logger.info("Creating ClaudeSDKClient...")
-                    self._client = ClaudeSDKClient(options)
-                    logger.info(f"ClaudeSDKClient created: {self._client}")
-
-                    # 5. Connect WITHOUT initial prompt (use streaming mode)
-                    # SDK requires streaming mode for bidirectional communication
-                    logger.info(f"SDKExecutor connecting for agent {agent_def.name}")
-                    logger.info("Calling connect() in streaming mode...")
-                    try:
-                        await self._client.connect()  # No prompt - streaming mode
-                        logger.info("connect() completed successfully")
-                    except Exception as conn_err:
-                        logger.error(
-                            f"connect() failed: {type(conn_err).__name__}: {conn_err}"
-                        )
-                        logger.error(f"Client state after error: {self._client}")
-                        raise
-
-                    # 6. Send initial prompt via query()
-                    logger.info("Sending initial prompt via query()...")
-                    await self._client.query(initial_prompt)
-
-                    # 7. Message Loop
-                    try:
-                        async for message in self._client.receive_messages():
-                            # Check for ResultMessage (indicates completion)
-                            if isinstance(message, ResultMessage):
-                                logger.info(
-                                    "Received ResultMessage, agent completed response"
-                                )
-                                break
-
-                            # Save Assistant Messages to DB
-                            if hasattr(message, "content"):
-                                blocks = []
-                                for block in message.content:
-                                    if isinstance(block, TextBlock):
-                                        blocks.append(
-                                            {"type": "text", "text": block.text}
-                                        )
-                                    elif isinstance(block, ToolUseBlock):
-                                        blocks.append(
-                                            {
-                                                "type": "tool_use",
-                                                "id": block.id,
-                                                "name": block.name,
-                                                "input": block.input,
-                                            }
-                                        )
-
-                                if blocks:
+                    logger.error(f"Client state after error: {self._client}")
+                    raise
+
+                # 6. Send initial prompt via query()
+                logger.info("Sending initial prompt via query()...")
+                await self._client.query(initial_prompt)
+
+                # 7. Message Loop
+                stream: AssistantStream | None = None
+                try:
+                    async for message in self._client.receive_messages():
+                        # 流式增量：发布并增量写入 partial 消息
+                        if isinstance(message, StreamEvent):
+                            stream = self._on_stream_event(
+                                session, stream, message.event
+                            )
+                            continue
+
+                        # Check for ResultMessage (indicates completion)
+                        if isinstance(message, ResultMessage):
+                            logger.info(
+                                "Received ResultMessage, agent completed response"
+                            )
+                            break
+
+                        # Save Assistant Messages to DB
+                        if hasattr(message, "content"):
+                            blocks = []
+                            for block in message.content:
+                                if isinstance(block, TextBlock):
+                                    blocks.append(
+                                        {"type": "text", "text": block.text}
+                                    )
+                                elif isinstance(block, ToolUseBlock):
+                                    blocks.append(
+                                        {
+                                            "type": "tool_use",
+                                            "id": block.id,
+                                            "name": block.name,
+                                            "input": block.input,
+                                        }
+                                    )
+
+                            if blocks:
+                                content = json.dumps(blocks, ensure_ascii=False)
+                                # 复用流中写入的 partial 消息
+                                db_msg = stream.finish(content) if stream else None
+                                stream = None
+                                if db_msg is None:
                                     db_msg = Message(
                                         session_id=session.id,
                                         role=MessageRole.ASSISTANT.value,
-                                        content=json.dumps(blocks, ensure_ascii=False),
-                                        timestamp=asyncio.get_event_loop().time(),  # Use standard time roughly or datetime
+                                        content=content,
+                                        timestamp=datetime.utcnow(),
                                     )
-                                    # timestamp needs datetime
-                                    from datetime import datetime
-
-                                    db_msg.timestamp = datetime.utcnow()
 
-                                    db.add(db_msg)
-                                    await db.commit()
+                                write_behind.save(db_msg, fence=self._lease)
 
-                            if self._should_stop:
-                                logger.info("Stop flag set, exiting loop")
-                                break
-
-                    except Exception as e:
-                        logger.error(f"SDK Loop Error: {e}")
-                    finally:
-                        await self._client.disconnect()
-                        await db.commit()
+                        if self._should_stop:
+                            logger.info("Stop flag set, exiting loop")
+                            break
 
+                except Exception as e:
+                    logger.error(f"SDK Loop Error: {e}")
                 finally:
-                    execution_context.reset(ctx_token)
+                    await self._client.disconnect()
+                    # 未结束的消息（失败、停止或取消）：删除已写入的 partial 消息
+                    if stream is not None:
+                        stream.abort()
+                    # 系统工具对 Ticket / Session 的修改与消息一起提交，离开 running 时释放租约
+                    if ticket.status != TicketStatus.RUNNING.value:
+                        release_lease(ticket)
+                    write_behind.save(ticket, session, fence=self._lease)
+                    await write_behind.flush()
+
+            finally:
+                execution_context.reset(ctx_token)
 
         except Exception as e:
             logger.error(f"SDKExecutor error: {e}", exc_info=True)
             await self._mark_failed(str(e))
 
+    def _on_stream_event(
+        self,
+        session: Session,
+        stream: AssistantStream | None,
+        event: dict[str, Any],
+    ) -> AssistantStream | None:
+        """处理 SDK 透传的原始 API 流事件，返回当前消息的 AssistantStream"""
+        event_type = event.get("type")
+        if event_type == "message_start" or stream is None:
+            stream = AssistantStream(session.id, fence=self._lease)
+            stream.start()
+        if event_type == "content_block_delta":
+            delta = event.get("delta", {})
+            if delta.get("type") == "text_delta":
+                stream.text_delta(delta.get("text", ""))
+        elif event_type == "content_block_start":
+            block = event.get("content_block", {})
+            if block.get("type") == "tool_use":
+                stream.tool_use(block.get("id"), block.get("name"))
+        return stream
+
+    async def _load_state(self) -> tuple[Ticket | None, Session | None]:
+        """在一个短事务中加载 Ticket 和 Session（之后为 detached 对象，执行期间不占用连接）"""
+        async with async_session_maker() as db:
+            return await self._load_ticket(db), await self._load_session(db)
+
     async def _load_ticket(self, db) -> Ticket | None:
         result = await db.execute(
             select(Ticket)
@@ -216,7 +267,7 @@ class SDKExecutor(IExecutor):
     async def _load_session(self, db) -> Session | None:
         result = await db.execute(
             select(Session)
-            .options(selectinload(Session.messages))
+            .options(noload(Session.messages))
             .where(Session.id == self.session_id)
         )
         return result.scalar_one_or_none()
@@ -230,18 +281,31 @@ class SDKExecutor(IExecutor):
         return ctx_str
 
     async def _mark_failed(self, error: str):
-        async with async_session_maker() as db:
-            result = await db.execute(select(Ticket).where(Ticket.id == self.ticket_id))
-            ticket = result.scalar_one_or_none()
-            if ticket:
-                ticket.status = TicketStatus.FAILED.value
-                ticket.error_message = error
+        """标记任务失败并释放租约（有租约时以 lease_owner 仍为认领者为条件，已丢失则不写入）"""
+        await write_behind.flush()
+        if self._lease is not None and self._lease.lost:
+            return
+        conditions = [Ticket.id == self.ticket_id]
+        if self._lease is not None:
+            conditions.append(Ticket.lease_owner == self._lease.owner)
 
+        async with async_session_maker() as db:
             result = await db.execute(
-                select(Session).where(Session.id == self.session_id)
+                update(Ticket)
+                .where(*conditions)
+                .values(
+                    status=TicketStatus.FAILED.value,
+                    error_message=error,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                )
+            )
+            if self._lease is not None and result.rowcount == 0:
+                self._lease.mark_lost()
+                return
+            await db.execute(
+                update(Session)
+                .where(Session.id == self.session_id)
+                .values(status=SessionStatus.FAILED.value)
             )
-            session = result.scalar_one_or_none()
-            if session:
-                session.status = SessionStatus.FAILED.value
-
             await db.commit()
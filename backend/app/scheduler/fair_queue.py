@@ -0,0 +1,83 @@
+"""FairQueue - 派发顺序
+
+1. Lane 之间严格优先：resume（人工输入后恢复、仍有活跃 Session 的 Ticket）先于 default
+2. Lane 内跨 Agent 加权公平：每派发一个 Ticket，该 Agent 的虚拟时间前进 1/weight，
+   每次选择虚拟时间最小的 Agent，积压再多的 Agent 也无法饿死其它 Agent
+3. 同一 Agent 内按 priority 降序、入队时间升序
+"""
+
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterator
+
+LANE_RESUME = "resume"
+LANE_DEFAULT = "default"
+LANES = (LANE_RESUME, LANE_DEFAULT)
+
+
+@dataclass
+class QueueEntry:
+    """一个待派发的 Ticket"""
+
+    ticket: Any
+    agent_id: str
+    lane: str
+    priority: int
+    enqueued_at: datetime
+    weight: int = 1
+
+
+class FairQueue:
+    """加权公平队列（虚拟时间跨派发轮次保留）"""
+
+    def __init__(self):
+        # agent_id -> 虚拟时间
+        self._vtime: dict[str, float] = {}
+
+    def order(self, entries: list[QueueEntry]) -> Iterator[QueueEntry]:
+        """按派发顺序产出条目
+
+        调用方实际派发某个条目后需调用 charge()，虚拟时间在迭代过程中实时生效。
+        """
+        lanes: dict[str, dict[str, list[QueueEntry]]] = {
+            lane: defaultdict(list) for lane in LANES
+        }
+        for entry in entries:
+            lanes[entry.lane][entry.agent_id].append(entry)
+
+        # 只保留有积压的 Agent 的虚拟时间，闲置 Agent 重新出现时从当前下限开始
+        self._vtime = {
+            agent_id: vtime
+            for agent_id, vtime in self._vtime.items()
+            if any(agent_id in queues for queues in lanes.values())
+        }
+
+        for lane in LANES:
+            queues = {
+                agent_id: deque(
+                    sorted(items, key=lambda e: (-e.priority, e.enqueued_at))
+                )
+                for agent_id, items in lanes[lane].items()
+            }
+            self._normalize(queues)
+
+            while queues:
+                agent_id = min(queues, key=lambda a: (self._vtime[a], a))
+                entry = queues[agent_id].popleft()
+                if not queues[agent_id]:
+                    del queues[agent_id]
+                yield entry
+
+    def charge(self, entry: QueueEntry):
+        """记录一次派发，推进该 Agent 的虚拟时间"""
+        self._vtime[entry.agent_id] = self._vtime.get(entry.agent_id, 0.0) + 1.0 / max(
+            entry.weight, 1
+        )
+
+    def _normalize(self, queues: dict[str, deque]):
+        """新出现的 Agent 从当前最小虚拟时间开始，避免闲置后突发抢占"""
+        known = [self._vtime[a] for a in queues if a in self._vtime]
+        floor = min(known) if known else 0.0
+        for agent_id in queues:
+            self._vtime[agent_id] = max(self._vtime.get(agent_id, floor), floor)
@@ -0,0 +1,113 @@
+"""LLM Client - 进程内共享的异步 Anthropic 客户端
+
+所有 Executor 复用同一个 AsyncAnthropic 客户端及其 HTTP 连接池（keepalive），
+模型调用直接在事件循环上 await，不占用线程，也不阻塞其它 Ticket 和 API 请求。
+
+httpx 的连接绑定在创建它的事件循环上，因此每个事件循环各有一个客户端
+（正常运行时只有一个；测试和 benchmark 中每次 asyncio.run 会新建一个）。
+
+服务商：default 使用 ANTHROPIC_BASE_URL（未设置时为官方地址），LLM_PROVIDERS 中的备用地址
+各有独立的客户端和连接池。
+
+客户端经传输层（见 llm_transport，LLM_TRANSPORT）包装，可录制请求/响应对或离线回放。
+"""
+
+import asyncio
+import logging
+import os
+import weakref
+from functools import partial
+
+import httpx
+
+from app.config import (
+    LLM_HTTP_KEEPALIVE_EXPIRY,
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE,
+    LLM_HTTP_TIMEOUT,
+    LLM_PROVIDERS,
+)
+from app.scheduler.llm_transport import LLMTransport, transport_from_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDER = "default"
+
+# 事件循环 -> 服务商 -> 客户端
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, object]]" = (
+    weakref.WeakKeyDictionary()
+)
+_transport: LLMTransport = transport_from_config()
+
+
+def parse_providers(spec: str) -> dict[str, str | None]:
+    """解析 LLM_PROVIDERS（name=base_url,...），default 的地址为 None（取 ANTHROPIC_BASE_URL）"""
+    providers: dict[str, str | None] = {DEFAULT_PROVIDER: None}
+    for item in spec.split(","):
+        name, sep, base_url = item.strip().partition("=")
+        if not sep or not name.strip() or not base_url.strip():
+            if item.strip():
+                logger.warning(f"Ignoring malformed LLM_PROVIDERS entry: {item!r}")
+            continue
+        providers[name.strip()] = base_url.strip()
+    return providers
+
+
+# 服务商 -> base_url
+PROVIDERS = parse_providers(LLM_PROVIDERS)
+
+
+def _create_client(provider: str = DEFAULT_PROVIDER):
+    import anthropic
+
+    http_client = anthropic.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=10.0),
+    )
+    base_url = PROVIDERS.get(provider) or os.getenv("ANTHROPIC_BASE_URL")
+    # 重试由 Executor 的 RetryPolicy 负责（经过限流器并记录指标），客户端不再自行重试
+    kwargs = {"http_client": http_client, "max_retries": 0}
+    if base_url:
+        kwargs["base_url"] = base_url
+    api_key = os.getenv(f"LLM_PROVIDER_{provider.upper()}_API_KEY")
+    if api_key:
+        kwargs["api_key"] = api_key
+    logger.info(
+        f"Creating shared AsyncAnthropic client for provider {provider} "
+        f"(max_connections={LLM_HTTP_MAX_CONNECTIONS}, keepalive={LLM_HTTP_MAX_KEEPALIVE})"
+    )
+    return anthropic.AsyncAnthropic(**kwargs)
+
+
+def get_llm_client(provider: str = DEFAULT_PROVIDER):
+    """获取当前事件循环中某个服务商的共享客户端（首次调用时创建）"""
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(provider)
+    if client is None:
+        client = _transport.wrap(partial(_create_client, provider), provider)
+        clients[provider] = client
+    return client
+
+
+async def close_llm_client():
+    """关闭当前事件循环的共享客户端（应用关闭时调用）"""
+    clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        if hasattr(client, "close"):
+            await client.close()
+
+
+async def set_llm_transport(transport: LLMTransport) -> LLMTransport:
+    """替换传输层（测试和 benchmark 用），返回原来的传输层
+
+    先关闭当前事件循环的客户端，之后新建的客户端使用新的传输层（其它事件循环的客户端
+    绑定在各自的循环上，由该循环关闭）。
+    """
+    global _transport
+    await close_llm_client()
+    previous, _transport = _transport, transport
+    return previous
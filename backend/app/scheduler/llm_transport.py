@@ -0,0 +1,350 @@
+"""LLM Transport - 模型调用的传输层：直接调用、录制和离线回放
+
+get_llm_client 创建的客户端经当前传输层包装：
+- LiveTransport：原样使用 AsyncAnthropic 客户端（默认）
+- RecordTransport：调用模型，并把（规范化请求、响应、耗时）写入 CassetteStore
+- ReplayTransport：按规范化请求的哈希从 CassetteStore 返回录制的响应，不访问网络；
+  返回前等待 latency_ms + latency_scale × 录制时耗时（await，不占用事件循环）。
+  未命中时抛出 ReplayMiss，或（on_miss="live"）调用模型并录制
+
+包装后的客户端与 AsyncAnthropic 的用法相同：messages.create(**request)，以及
+messages.stream(**request)（async with 后迭代事件，get_final_message() 取完整响应），
+Executor、Dispatcher 和 API 路由不感知传输方式。
+
+请求规范化：去掉 cache_control 断点（是否设置提示缓存不影响响应内容）和 stream、timeout
+等传输参数，按键排序序列化后取 SHA-256；可选忽略工具结果的内容（工具输出不确定时）。
+
+传输方式由 LLM_TRANSPORT 选择，测试和 benchmark 可用 llm_client.set_llm_transport 替换。
+指标：计数 llm_replay_hits / llm_replay_misses / llm_recorded。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable
+
+from app.config import (
+    LLM_CASSETTE_DIR,
+    LLM_REPLAY_IGNORE_TOOL_RESULTS,
+    LLM_REPLAY_LATENCY_MS,
+    LLM_REPLAY_LATENCY_SCALE,
+    LLM_REPLAY_MISS,
+    LLM_TRANSPORT,
+)
+from app.scheduler.metrics import scheduler_metrics
+
+logger = logging.getLogger(__name__)
+
+# 不影响模型响应的请求参数
+TRANSPORT_PARAMS = {"stream", "timeout", "extra_headers", "extra_query", "extra_body"}
+
+
+class ReplayMiss(LookupError):
+    """回放时没有录制的响应"""
+
+
+def _strip(value: Any, ignore_tool_results: bool) -> Any:
+    if isinstance(value, dict):
+        if ignore_tool_results and value.get("type") == "tool_result":
+            return {"type": "tool_result", "tool_use_id": value.get("tool_use_id")}
+        return {
+            key: _strip(item, ignore_tool_results)
+            for key, item in value.items()
+            if key != "cache_control"
+        }
+    if isinstance(value, (list, tuple)):
+        return [_strip(item, ignore_tool_results) for item in value]
+    return value
+
+
+def normalize_request(
+    request: dict[str, Any], ignore_tool_results: bool = False
+) -> dict[str, Any]:
+    """去掉不影响响应内容的部分"""
+    return _strip(
+        {k: v for k, v in request.items() if k not in TRANSPORT_PARAMS},
+        ignore_tool_results,
+    )
+
+
+def request_key(request: dict[str, Any], ignore_tool_results: bool = False) -> str:
+    """规范化请求的哈希"""
+    normalized = normalize_request(request, ignore_tool_results)
+    encoded = json.dumps(
+        normalized, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _plain(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if isinstance(value, SimpleNamespace):
+        return {key: _plain(item) for key, item in vars(value).items()}
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+def dump_response(response: Any) -> dict[str, Any]:
+    """响应转为可 JSON 序列化的 dict"""
+    return _plain(response)
+
+
+def load_response(data: dict[str, Any]) -> SimpleNamespace:
+    """录制的响应转为与 SDK 响应相同的属性访问形式（工具参数保持 dict）"""
+    content = [SimpleNamespace(**block) for block in data.get("content") or []]
+    usage = data.get("usage")
+    return SimpleNamespace(
+        **{
+            **data,
+            "content": content,
+            "usage": SimpleNamespace(**usage) if usage else None,
+        }
+    )
+
+
+class CassetteStore:
+    """本地存储：每个请求一个 JSON 文件（<哈希前两位>/<哈希>.json），原子写入"""
+
+    def __init__(self, path: str | Path = LLM_CASSETTE_DIR):
+        self.path = Path(path)
+        self._cache: dict[str, dict[str, Any]] = {}
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        entry = self._cache.get(key)
+        if entry is None:
+            file = self._file(key)
+            if not file.exists():
+                return None
+            entry = json.loads(file.read_text(encoding="utf-8"))
+            self._cache[key] = entry
+        return entry
+
+    def put(self, key: str, entry: dict[str, Any]):
+        file = self._file(key)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=file.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, file)
+        self._cache[key] = entry
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.path.glob("*/*.json"))
+
+    def _file(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json"
+
+
+class LLMTransport:
+    """传输层基类：直接调用模型"""
+
+    def wrap(self, create: Callable[[], Any], provider: str) -> Any:
+        """包装 create() 创建的客户端"""
+        return create()
+
+
+class LiveTransport(LLMTransport):
+    """直接调用模型"""
+
+
+class RecordTransport(LLMTransport):
+    """调用模型并录制请求/响应对"""
+
+    def __init__(
+        self,
+        store: CassetteStore | None = None,
+        ignore_tool_results: bool = LLM_REPLAY_IGNORE_TOOL_RESULTS,
+    ):
+        self.store = store if store is not None else CassetteStore()
+        self.ignore_tool_results = ignore_tool_results
+
+    def wrap(self, create: Callable[[], Any], provider: str) -> Any:
+        return TransportClient(self, provider, create)
+
+    def key(self, request: dict[str, Any]) -> str:
+        return request_key(request, self.ignore_tool_results)
+
+    async def create(self, client: "TransportClient", request: dict[str, Any]):
+        started = time.monotonic()
+        response = await client.inner.messages.create(**request)
+        await self.record(client.provider, request, response, time.monotonic() - started)
+        return response
+
+    def stream(self, client: "TransportClient", request: dict[str, Any]):
+        return RecordingStream(self, client.provider, client.inner, request)
+
+    async def record(
+        self, provider: str, request: dict[str, Any], response: Any, latency: float
+    ):
+        """写入一对请求/响应（文件写入在线程中执行）"""
+        entry = {
+            "provider": provider,
+            "recorded_at": datetime.utcnow().isoformat(),
+            "latency": latency,
+            "request": normalize_request(request, self.ignore_tool_results),
+            "response": dump_response(response),
+        }
+        await asyncio.to_thread(self.store.put, self.key(request), entry)
+        scheduler_metrics.increment("llm_recorded")
+
+
+class ReplayTransport(RecordTransport):
+    """从本地存储回放，未命中时报错或调用模型并录制"""
+
+    def __init__(
+        self,
+        store: CassetteStore | None = None,
+        latency_ms: float = LLM_REPLAY_LATENCY_MS,
+        latency_scale: float = LLM_REPLAY_LATENCY_SCALE,
+        on_miss: str = LLM_REPLAY_MISS,
+        ignore_tool_results: bool = LLM_REPLAY_IGNORE_TOOL_RESULTS,
+    ):
+        super().__init__(store, ignore_tool_results)
+        self.latency_ms = latency_ms
+        self.latency_scale = latency_scale
+        self.on_miss = on_miss
+
+    async def create(self, client: "TransportClient", request: dict[str, Any]):
+        entry = self._lookup(request)
+        if entry is None:
+            return await super().create(client, request)
+        return await self._replay(entry)
+
+    def stream(self, client: "TransportClient", request: dict[str, Any]):
+        entry = self._lookup(request)
+        if entry is None:
+            return super().stream(client, request)
+        return ReplayStream(self._replay(entry))
+
+    def _lookup(self, request: dict[str, Any]) -> dict[str, Any] | None:
+        """查找录制的响应；未命中且不允许调用模型时抛出 ReplayMiss"""
+        key = self.key(request)
+        entry = self.store.get(key)
+        if entry is not None:
+            scheduler_metrics.increment("llm_replay_hits")
+            return entry
+        scheduler_metrics.increment("llm_replay_misses")
+        if self.on_miss != "live":
+            raise ReplayMiss(
+                f"No recorded response for request {key[:12]} "
+                f"(model={request.get('model')}, {len(request.get('messages', []))} messages)"
+            )
+        logger.info(f"Replay miss for request {key[:12]}, calling model")
+        return None
+
+    async def _replay(self, entry: dict[str, Any]):
+        delay = self.latency_ms / 1000 + self.latency_scale * entry.get("latency", 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return load_response(entry["response"])
+
+
+class TransportClient:
+    """经传输层调用的客户端（接口与 AsyncAnthropic 的 messages 相同）"""
+
+    def __init__(self, transport: RecordTransport, provider: str, create: Callable):
+        self.transport = transport
+        self.provider = provider
+        self._create = create
+        self._inner = None
+        self.messages = SimpleNamespace(create=self._create_message, stream=self._stream)
+
+    @property
+    def inner(self):
+        """实际的模型客户端（回放时只在未命中需要调用模型时创建）"""
+        if self._inner is None:
+            self._inner = self._create()
+        return self._inner
+
+    async def _create_message(self, **request):
+        return await self.transport.create(self, request)
+
+    def _stream(self, **request):
+        return self.transport.stream(self, request)
+
+    async def close(self):
+        if self._inner is not None and hasattr(self._inner, "close"):
+            await self._inner.close()
+
+
+class RecordingStream:
+    """包装 messages.stream(...)：事件原样透传，取完整响应时录制"""
+
+    def __init__(
+        self,
+        transport: RecordTransport,
+        provider: str,
+        inner: Any,
+        request: dict[str, Any],
+    ):
+        self._transport = transport
+        self._provider = provider
+        self._request = request
+        self._manager = inner.messages.stream(**request)
+        self._events = None
+        self._started = time.monotonic()
+
+    async def __aenter__(self):
+        self._started = time.monotonic()
+        self._events = await self._manager.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._manager.__aexit__(*exc)
+
+    def __aiter__(self):
+        return self._events.__aiter__()
+
+    async def get_final_message(self):
+        response = await self._events.get_final_message()
+        await self._transport.record(
+            self._provider, self._request, response, time.monotonic() - self._started
+        )
+        return response
+
+
+class ReplayStream:
+    """回放的流：进入时等待录制的响应，按内容产生 text / content_block_start 事件"""
+
+    def __init__(self, pending):
+        self._pending = pending
+        self._response = None
+
+    async def __aenter__(self):
+        self._response = await self._pending
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for block in self._response.content:
+            if block.type == "text":
+                yield SimpleNamespace(type="text", text=block.text)
+            elif block.type == "tool_use":
+                yield SimpleNamespace(type="content_block_start", content_block=block)
+
+    async def get_final_message(self):
+        return self._response
+
+
+def transport_from_config() -> LLMTransport:
+    """按 LLM_TRANSPORT 创建传输层"""
+    if LLM_TRANSPORT == "record":
+        return RecordTransport()
+    if LLM_TRANSPORT == "replay":
+        return ReplayTransport()
+    if LLM_TRANSPORT != "live":
+        logger.warning(f"Unknown LLM_TRANSPORT {LLM_TRANSPORT!r}, using live")
+    return LiveTransport()
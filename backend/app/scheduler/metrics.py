@@ -0,0 +1,114 @@
+"""Scheduler Metrics - 调度指标
+
+进程内的轻量指标收集，供 /api/scheduler/stats 查询。
+"""
+
+from collections import defaultdict, deque
+from typing import Any
+
+
+class LatencyStats:
+    """耗时统计：累计计数/均值/最大值 + 最近样本的分位数"""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        """记录一次耗时（秒）"""
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._recent.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        """最近样本的分位数（秒）"""
+        if not self._recent:
+            return 0.0
+        ordered = sorted(self._recent)
+        idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[idx]
+
+    def snapshot(self) -> dict[str, Any]:
+        """导出为毫秒单位的摘要"""
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class ValueStats(LatencyStats):
+    """数值分布统计（如批大小），导出时不做单位换算"""
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": self.max,
+        }
+
+
+class SchedulerMetrics:
+    """调度器指标集合"""
+
+    def __init__(self):
+        # lane -> Ticket 从进入 pending 到被派发的等待时间
+        self.queue_wait: dict[str, LatencyStats] = defaultdict(LatencyStats)
+        # 其它耗时指标，如 llm_first_token（首个可见 token）、llm_call（完整调用）
+        self.latency: dict[str, LatencyStats] = defaultdict(LatencyStats)
+        # 数值分布指标，如 write_behind_batch_size（每次批量提交的行数）
+        self.values: dict[str, ValueStats] = defaultdict(ValueStats)
+        self.gauges: dict[str, float] = {}
+        # 累计计数，如 llm_retries（按原因细分为 llm_retries.<reason>）
+        self.counters: dict[str, int] = defaultdict(int)
+
+    def record_queue_wait(self, lane: str, seconds: float):
+        """记录某个 lane 的排队等待时间"""
+        self.queue_wait[lane].record(seconds)
+
+    def record_latency(self, name: str, seconds: float):
+        """记录一次耗时指标"""
+        self.latency[name].record(seconds)
+
+    def record_value(self, name: str, value: float):
+        """记录一次数值分布指标"""
+        self.values[name].record(value)
+
+    def increment(self, name: str, amount: int = 1):
+        """累加计数指标"""
+        self.counters[name] += amount
+
+    def set_gauge(self, name: str, value: float):
+        """设置瞬时值指标"""
+        self.gauges[name] = value
+
+    def snapshot(self) -> dict[str, Any]:
+        """导出所有指标"""
+        return {
+            "queue_wait": {
+                lane: stats.snapshot() for lane, stats in self.queue_wait.items()
+            },
+            "latency": {name: stats.snapshot() for name, stats in self.latency.items()},
+            "values": {name: stats.snapshot() for name, stats in self.values.items()},
+            "gauges": dict(self.gauges),
+            "counters": dict(self.counters),
+        }
+
+    def reset(self):
+        """清空所有指标（测试用）"""
+        self.queue_wait.clear()
+        self.latency.clear()
+        self.values.clear()
+        self.gauges.clear()
+        self.counters.clear()
+
+
+# 全局指标实例
+scheduler_metrics = SchedulerMetrics()
@@ -0,0 +1,214 @@
+"""ModelRouter - 按 Agent 选择模型：回退链、级联和按模型/服务商的滚动统计
+
+Agent 的模型配置：
+- model：首选模型（为空使用 ANTHROPIC_MODEL）
+- fallback_models：有序的回退模型列表，与 model 组成模型链
+- model_cascade：级联模式，模型链按从便宜到强排列：从第一个开始，调用失败或响应
+  置信度低（见 low_confidence）时升级到下一个，之后该 Ticket 停留在升级后的模型上
+
+模型写作 "模型名" 或 "模型名@服务商"。服务商为 default（ANTHROPIC_BASE_URL）和
+LLM_PROVIDERS 中的备用地址；未指定服务商的模型可在任一服务商上调用。
+
+每次模型调用按计划（plan）依次尝试目标（模型@服务商），失败时回退到下一个目标。
+每个目标保留最近 LLM_ROUTER_WINDOW 次调用的耗时和成败：
+- 同一模型的多个服务商按 p95、p50 耗时从低到高排列（没有样本的优先，用于探测）
+- 错误率达到 LLM_ROUTER_MAX_ERROR_RATE（至少 LLM_ROUTER_MIN_SAMPLES 次调用）的目标
+  视为不健康，排到计划末尾；最近一次失败 LLM_ROUTER_COOLDOWN 秒后恢复正常顺序（探测）
+
+指标：llm_fallbacks（回退到下一个目标）、llm_escalations（级联升级，按原因细分为
+llm_escalations.<reason>），各目标的统计见 snapshot()。
+"""
+
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+
+from app.config import (
+    ANTHROPIC_MODEL,
+    LLM_ROUTER_COOLDOWN,
+    LLM_ROUTER_MAX_ERROR_RATE,
+    LLM_ROUTER_MIN_SAMPLES,
+    LLM_ROUTER_WINDOW,
+)
+from app.scheduler.llm_client import PROVIDERS
+from app.scheduler.metrics import LatencyStats
+from app.scheduler.retry import retry_reason
+
+logger = logging.getLogger(__name__)
+
+# 换一个模型或服务商可能成功的 HTTP 状态码（鉴权、无权限、模型不存在），另外所有可重试错误
+FALLBACK_STATUS_CODES = {401, 403, 404}
+
+
+@dataclass(frozen=True)
+class ModelTarget:
+    """一次调用的目标：模型及服务商"""
+
+    model: str
+    provider: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.model}@{self.provider}"
+
+
+def fallback_reason(error: BaseException) -> str | None:
+    """换一个目标可能成功的错误的分类，请求本身有误（如 400）时返回 None"""
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and status in FALLBACK_STATUS_CODES:
+        return f"status_{status}"
+    return retry_reason(error)
+
+
+def low_confidence(response: Any, tools: list[dict[str, Any]]) -> str | None:
+    """响应的低置信度信号（级联模式下升级模型），正常时返回 None
+
+    - max_tokens：输出被截断
+    - empty：没有任何内容
+    - unknown_tool：调用了不存在的工具
+    - invalid_input：工具调用缺少必填参数
+    """
+    if getattr(response, "stop_reason", None) == "max_tokens":
+        return "max_tokens"
+    content = getattr(response, "content", None) or []
+    if not any(
+        block.type == "tool_use" or (block.type == "text" and block.text.strip())
+        for block in content
+    ):
+        return "empty"
+    schemas = {tool["name"]: tool.get("input_schema") or {} for tool in tools}
+    for block in content:
+        if block.type != "tool_use":
+            continue
+        if block.name not in schemas:
+            return "unknown_tool"
+        required = schemas[block.name].get("required", [])
+        if not isinstance(block.input, dict) or any(
+            key not in block.input for key in required
+        ):
+            return "invalid_input"
+    return None
+
+
+class TargetStats:
+    """一个目标最近调用的耗时和成败"""
+
+    def __init__(self, window: int = LLM_ROUTER_WINDOW):
+        # 只记录成功调用的耗时
+        self.latency = LatencyStats(window)
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.last_failure = 0.0
+
+    def record(self, seconds: float, ok: bool):
+        self.outcomes.append(ok)
+        if ok:
+            self.latency.record(seconds)
+        else:
+            self.last_failure = time.monotonic()
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "calls": len(self.outcomes),
+            "error_rate": self.error_rate,
+            "p50_ms": self.latency.percentile(50) * 1000,
+            "p95_ms": self.latency.percentile(95) * 1000,
+        }
+
+
+class ModelRouter:
+    """进程内共享的模型路由"""
+
+    def __init__(
+        self,
+        providers: list[str] | None = None,
+        window: int = LLM_ROUTER_WINDOW,
+        max_error_rate: float = LLM_ROUTER_MAX_ERROR_RATE,
+        min_samples: int = LLM_ROUTER_MIN_SAMPLES,
+        cooldown: float = LLM_ROUTER_COOLDOWN,
+    ):
+        self.providers = providers or list(PROVIDERS)
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self._stats: dict[ModelTarget, TargetStats] = {}
+
+    @staticmethod
+    def chain(agent: Any) -> list[str]:
+        """Agent 的模型链：[首选模型, *回退模型]"""
+        chain = [getattr(agent, "model", None) or ANTHROPIC_MODEL]
+        fallbacks = getattr(agent, "fallback_models", None)
+        if fallbacks:
+            try:
+                chain += [m for m in json.loads(fallbacks) if m and m not in chain]
+            except (json.JSONDecodeError, TypeError):
+                logger.warning(f"Invalid fallback_models for agent {agent.id}: {fallbacks}")
+        return chain
+
+    def plan(self, chain: list[str], start: int = 0) -> list[tuple[int, ModelTarget]]:
+        """从模型链第 start 个开始的调用计划：[(模型链下标, 目标)]，不健康的目标排在末尾"""
+        now = time.monotonic()
+        healthy: list[tuple[int, ModelTarget]] = []
+        degraded: list[tuple[int, ModelTarget]] = []
+        for level in range(min(start, len(chain) - 1), len(chain)):
+            for target in self._targets(chain[level]):
+                if self.is_healthy(target, now):
+                    healthy.append((level, target))
+                else:
+                    degraded.append((level, target))
+        return healthy + degraded
+
+    def is_healthy(self, target: ModelTarget, now: float | None = None) -> bool:
+        stats = self._stats.get(target)
+        if stats is None or len(stats.outcomes) < self.min_samples:
+            return True
+        if stats.error_rate < self.max_error_rate:
+            return True
+        # 冷却期过后重新探测
+        return (now or time.monotonic()) - stats.last_failure >= self.cooldown
+
+    def record(self, target: ModelTarget, seconds: float, ok: bool):
+        """记录一次调用（失败只记录与目标有关的错误，见 fallback_reason）"""
+        stats = self._stats.get(target)
+        if stats is None:
+            stats = self._stats[target] = TargetStats(self.window)
+        stats.record(seconds, ok)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """各目标的滚动统计"""
+        now = time.monotonic()
+        return {
+            target.key: {**stats.snapshot(), "healthy": self.is_healthy(target, now)}
+            for target, stats in self._stats.items()
+        }
+
+    def reset(self):
+        """清空统计（测试用）"""
+        self._stats.clear()
+
+    def _targets(self, spec: str) -> list[ModelTarget]:
+        """一个模型的候选目标：指定服务商时只有一个，否则按耗时排列所有服务商"""
+        model, sep, provider = spec.rpartition("@")
+        if sep and provider in self.providers:
+            return [ModelTarget(model, provider)]
+        targets = [ModelTarget(spec, provider) for provider in self.providers]
+        return sorted(targets, key=self._latency_key)
+
+    def _latency_key(self, target: ModelTarget) -> tuple[float, float]:
+        stats = self._stats.get(target)
+        if stats is None or not stats.latency.count:
+            return (0.0, 0.0)
+        return (stats.latency.percentile(95), stats.latency.percentile(50))
+
+
+# 全局实例
+model_router = ModelRouter()
@@ -0,0 +1,56 @@
+"""Notifier - 进程内调度唤醒通道
+
+Routers 在提交会改变待调度 Ticket 的事务后调用 notify_ticket_ready()，
+Dispatcher 订阅后即可立即开始下一轮派发，而不必等待轮询间隔。
+定时 Ticket 的创建、修改和删除通过 notify_ticket_scheduled() 同步到 Dispatcher 的定时堆。
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Callable
+
+# 已订阅的唤醒事件（每个 Dispatcher 一个）
+_listeners: set[asyncio.Event] = set()
+# 定时变更回调：(ticket_id, run_at)，run_at 为 None 表示不再定时
+_schedule_listeners: set[Callable[[str, datetime | None], None]] = set()
+
+
+def subscribe() -> asyncio.Event:
+    """订阅唤醒通知，返回一个在有新 Ticket 可派发时被 set 的 Event"""
+    event = asyncio.Event()
+    _listeners.add(event)
+    return event
+
+
+def unsubscribe(event: asyncio.Event):
+    """取消订阅"""
+    _listeners.discard(event)
+
+
+def notify_ticket_ready():
+    """通知所有 Dispatcher 有 Ticket 进入可派发状态
+
+    必须在事务提交之后调用，否则 Dispatcher 可能读不到新数据。
+    """
+    for event in _listeners:
+        event.set()
+
+
+def subscribe_schedule(callback: Callable[[str, datetime | None], None]):
+    """订阅定时变更通知"""
+    _schedule_listeners.add(callback)
+
+
+def unsubscribe_schedule(callback: Callable[[str, datetime | None], None]):
+    """取消订阅定时变更通知"""
+    _schedule_listeners.discard(callback)
+
+
+def notify_ticket_scheduled(ticket_id: str, run_at: datetime | None):
+    """通知所有 Dispatcher 某个 Ticket 的定时时间已变更
+
+    run_at 为 None 表示该 Ticket 不再定时（已删除、取消或改为立即执行）。
+    与 notify_ticket_ready() 一样必须在事务提交之后调用。
+    """
+    for callback in list(_schedule_listeners):
+        callback(ticket_id, run_at)
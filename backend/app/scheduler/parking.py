@@ -0,0 +1,105 @@
+"""ParkingLot - 挂起 Executor 的停放区
+
+Executor 因 request_human_input 挂起后停放在内存中（按 session_id），
+人工回复使 Ticket 重新进入 pending 后，Dispatcher 取回同一个 Executor 继续执行，
+沿用其内存中的会话历史，无需从数据库重新加载。
+
+挂起状态和所有消息在停放前都已写入数据库，因此淘汰一个停放的 Executor 只是释放内存：
+之后恢复时 Dispatcher 会创建新的 Executor 从数据库重建会话。
+淘汰策略：
+1. 停放超过 PARKING_IDLE_TTL 秒
+2. 所有停放 Executor 的估算内存超过 PARKING_MAX_BYTES 时，按最久未使用淘汰
+
+多进程模式下 Executor 停放在运行它的 worker 进程中：API 进程的 discard() 经 forwarder
+通知 worker 进程丢弃（见 process_pool.py），worker 进程定期调用 evict()。
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from app.config import PARKING_IDLE_TTL, PARKING_MAX_BYTES
+from app.scheduler.base_executor import IExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ParkingLot:
+    """挂起 Executor 停放区（LRU）"""
+
+    def __init__(
+        self, idle_ttl: float = PARKING_IDLE_TTL, max_bytes: int = PARKING_MAX_BYTES
+    ):
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        # session_id -> (executor, 停放时间, 估算字节数)
+        self._parked: OrderedDict[str, tuple[IExecutor, float, int]] = OrderedDict()
+        self._total_bytes = 0
+        self._forwarders: list[Callable[[str], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._parked)
+
+    @property
+    def total_bytes(self) -> int:
+        """所有停放 Executor 的估算内存"""
+        return self._total_bytes
+
+    def park(self, session_id: str, executor: IExecutor):
+        """停放 Executor"""
+        self._discard(session_id)
+        size = executor.parked_size() if hasattr(executor, "parked_size") else 0
+        self._parked[session_id] = (executor, time.monotonic(), size)
+        self._total_bytes += size
+        logger.info(f"Parked executor for session {session_id[:8]} ({size} bytes)")
+        self.evict()
+
+    def take(self, session_id: str) -> IExecutor | None:
+        """取回停放的 Executor（取回后不再停放）"""
+        self.evict()
+        entry = self._discard(session_id)
+        return entry[0] if entry else None
+
+    def discard(self, session_id: str):
+        """丢弃 Session 停放的 Executor（Ticket 取消或重置时），同时通知 forwarder"""
+        for forwarder in self._forwarders:
+            forwarder(session_id)
+        if self._discard(session_id):
+            logger.info(f"Discarded parked executor for session {session_id[:8]}")
+
+    def add_forwarder(self, forwarder: Callable[[str], None]):
+        """注册丢弃回调（API 进程通知 worker 进程丢弃其中停放的 Executor）"""
+        self._forwarders.append(forwarder)
+
+    def remove_forwarder(self, forwarder: Callable[[str], None]):
+        if forwarder in self._forwarders:
+            self._forwarders.remove(forwarder)
+
+    def evict(self) -> int:
+        """按空闲时间和内存上限淘汰，返回淘汰数量"""
+        evicted = 0
+        deadline = time.monotonic() - self.idle_ttl
+        while self._parked:
+            session_id, (_, parked_at, _) = next(iter(self._parked.items()))
+            if parked_at > deadline and self._total_bytes <= self.max_bytes:
+                break
+            self._discard(session_id)
+            evicted += 1
+            logger.info(f"Evicted parked executor for session {session_id[:8]}")
+        return evicted
+
+    def clear(self):
+        """清空停放区"""
+        self._parked.clear()
+        self._total_bytes = 0
+
+    def _discard(self, session_id: str) -> tuple[IExecutor, float, int] | None:
+        entry = self._parked.pop(session_id, None)
+        if entry:
+            self._total_bytes -= entry[2]
+        return entry
+
+
+# 全局停放区
+parking_lot = ParkingLot()
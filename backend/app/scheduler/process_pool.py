@@ -0,0 +1,373 @@
+"""ProcessWorkerPool - 多进程 Executor 工作池
+
+API 进程中的 Dispatcher 仍负责认领、公平排队、并发上限和租约续约，
+认领后的 Ticket 交给 N 个 worker 进程执行。每个 worker 进程有自己的事件循环、
+数据库连接和停放区，序列化历史、解码工具输出等 CPU 开销分摊到多个核心上，
+API 进程保持响应。
+
+与 worker 进程之间通过 multiprocessing 队列通信：
+- 下发：("run", ticket_id, session_id, agent_id) / ("stop", ticket_id) / ("cancel", ticket_id)
+        / ("discard", session_id) / ("drain", timeout) / ("exit",)
+- 回报：("done", ticket_id, cancelled) / ("stream", session_id, event)
+        / ("stats", index, report)
+
+worker 进程中 Executor 的流式输出事件经回报队列转发到 API 进程的 stream_hub，
+SSE 订阅者不关心 Executor 在哪个进程中运行。
+
+同一 Session 固定分配到同一个 worker 进程，挂起后恢复时可以取回停放在该进程中的 Executor；
+API 进程中 parking_lot.discard() 转发为 discard 命令，丢弃停放在 worker 进程中的 Executor。
+
+取消：cancel 命令打断 worker 进程中的 Executor，API 进程中代表其运行的 Future 在 worker
+进程写完该 Executor 的待写入行并回报 done 后才结束，槽位此时才释放。
+
+worker 进程意外退出（OOM、崩溃）时，监视线程经 proc.sentinel 发现后取消分配给它的
+Ticket 的 Future：槽位释放、不再续约，租约过期后 Ticket 被回收重新执行；随后重启该 worker 进程。
+指标：计数 worker_process_restarts。
+
+每个 worker 进程的 LLM 限流器只使用 1/N 的限额（见 LLMRateLimiter.partition），
+每 SCHEDULER_WORKER_REPORT_INTERVAL 秒淘汰闲置的停放 Executor，并把指标、限流器和
+模型路由统计回报给 API 进程（见 stats.py）。
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.connection
+import sys
+import threading
+import zlib
+from typing import Any, Callable
+
+from app.config import SCHEDULER_WORKER_PROCESSES, SCHEDULER_WORKER_REPORT_INTERVAL
+from app.scheduler.llm_client import close_llm_client
+from app.scheduler.metrics import scheduler_metrics
+from app.scheduler.parking import parking_lot
+from app.scheduler.rate_limiter import llm_rate_limiter
+from app.scheduler.registry import executor_registry
+from app.scheduler.stats import local_report, worker_stats
+from app.scheduler.streaming import stream_hub
+from app.scheduler.worker_pool import BaseWorkerPool, WorkerPool
+from app.scheduler.write_behind import write_behind
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteExecutorHandle:
+    """worker 进程中 Executor 的句柄
+
+    注册到 executor_registry 中，取消 Ticket 时通过它通知 worker 进程取消 Executor。
+    """
+
+    def __init__(self, pool: "ProcessWorkerPool", ticket_id: str):
+        self._pool = pool
+        self.ticket_id = ticket_id
+
+    def stop(self):
+        """请求 worker 进程中的 Executor 在迭代边界停止"""
+        self._pool.stop(self.ticket_id)
+
+    def cancel(self):
+        """取消 worker 进程中的 Executor（其 Future 在 worker 进程回报退出后结束）"""
+        self._pool.cancel(self.ticket_id)
+
+
+class ProcessWorkerPool(BaseWorkerPool):
+    """将 Executor 分发到多个 worker 进程运行的工作池（槽位管理与 WorkerPool 相同）"""
+
+    def __init__(
+        self,
+        processes: int = SCHEDULER_WORKER_PROCESSES,
+        initializer: Callable[..., Any] | None = None,
+        initargs: tuple = (),
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.processes = max(1, processes)
+        # 在每个 worker 进程启动时调用（与 ProcessPoolExecutor 的 initializer 相同）
+        self.initializer = initializer
+        self.initargs = initargs
+        self._ctx = multiprocessing.get_context("spawn")
+        self._procs: list = []
+        self._inboxes: list = []
+        self._outbox = None
+        self._reader: threading.Thread | None = None
+        self._monitor: threading.Thread | None = None
+        self._closing = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # ticket_id -> worker 进程序号
+        self._assigned: dict[str, int] = {}
+
+    async def start(self):
+        """启动 worker 进程和回报读取线程"""
+        if self._procs:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._closing = False
+        self._outbox = self._ctx.Queue()
+        self._procs = [None] * self.processes
+        self._inboxes = [None] * self.processes
+        for index in range(self.processes):
+            self._start_worker(index)
+        self._reader = threading.Thread(
+            target=self._read_results, name="agent-worker-results", daemon=True
+        )
+        self._reader.start()
+        self._monitor = threading.Thread(
+            target=self._watch_workers, name="agent-worker-monitor", daemon=True
+        )
+        self._monitor.start()
+        parking_lot.add_forwarder(self.discard)
+        logger.info(f"Started {self.processes} executor worker processes")
+
+    async def close(self):
+        """通知 worker 进程退出并等待其结束"""
+        self._closing = True
+        parking_lot.remove_forwarder(self.discard)
+        for inbox in self._inboxes:
+            inbox.put(("exit",))
+        for proc in self._procs:
+            await asyncio.to_thread(proc.join, 10)
+            if proc.is_alive():
+                proc.terminate()
+        if self._outbox is not None:
+            self._outbox.put(None)
+        if self._reader:
+            await asyncio.to_thread(self._reader.join, 5)
+        if self._monitor:
+            await asyncio.to_thread(self._monitor.join, 5)
+        self._procs.clear()
+        self._inboxes.clear()
+        self._reader = None
+        self._monitor = None
+        worker_stats.clear()
+
+    def launch(self, ticket_id: str, session_id: str) -> asyncio.Future:
+        """将 Ticket 交给 worker 进程执行，返回在其结束时完成的 Future"""
+        index = self._worker_index(session_id)
+        future = self._loop.create_future()
+        handle = RemoteExecutorHandle(self, ticket_id)
+        self._tasks[ticket_id] = future
+        self._assigned[ticket_id] = index
+        executor_registry.register(ticket_id, handle, future)
+        future.add_done_callback(lambda f: self._on_done(ticket_id, f))
+        agent_id = self._ticket_agents.get(ticket_id, ticket_id)
+        self._inboxes[index].put(("run", ticket_id, session_id, agent_id))
+        return future
+
+    def stop(self, ticket_id: str):
+        """请求 worker 进程中的 Executor 在迭代边界停止"""
+        self._send(ticket_id, ("stop", ticket_id))
+
+    def cancel(self, ticket_id: str):
+        """取消 worker 进程中的 Executor，其 Future 在 worker 进程回报退出后结束"""
+        self._send(ticket_id, ("cancel", ticket_id))
+
+    def discard(self, session_id: str):
+        """丢弃停放在 worker 进程中的 Executor"""
+        if self._inboxes:
+            self._inboxes[self._worker_index(session_id)].put(("discard", session_id))
+
+    async def drain(self, timeout: float) -> int:
+        """所有 worker 进程排空，返回被取消的 Executor 数量"""
+        futures = list(self._tasks.values())
+        if not futures:
+            return 0
+
+        for inbox in self._inboxes:
+            inbox.put(("drain", timeout))
+        # worker 进程超时取消后还需回报结果，多留一点时间；仍未回报的视为已取消
+        _, pending = await asyncio.wait(futures, timeout=timeout + 5)
+        for future in pending:
+            future.cancel()
+        return sum(1 for future in futures if future.cancelled())
+
+    def release(self, ticket_id: str):
+        self._assigned.pop(ticket_id, None)
+        super().release(ticket_id)
+
+    def _start_worker(self, index: int):
+        """启动（或重启）第 index 个 worker 进程"""
+        inbox = self._ctx.Queue()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                index,
+                self.processes,
+                inbox,
+                self._outbox,
+                self.initializer,
+                self.initargs,
+            ),
+            name=f"agent-worker-{index}",
+            daemon=True,
+        )
+        proc.start()
+        self._inboxes[index] = inbox
+        self._procs[index] = proc
+
+    def _watch_workers(self):
+        """后台线程：等待 worker 进程的 sentinel，意外退出时通知事件循环"""
+        reported: set[int] = set()
+        while not self._closing:
+            watched = {
+                proc.sentinel: (index, proc)
+                for index, proc in enumerate(list(self._procs))
+                if proc is not None and id(proc) not in reported
+            }
+            ready = multiprocessing.connection.wait(list(watched), timeout=0.5)
+            if self._closing:
+                return
+            for sentinel in ready:
+                index, proc = watched[sentinel]
+                reported.add(id(proc))
+                self._loop.call_soon_threadsafe(self._on_worker_exit, index, proc)
+
+    def _on_worker_exit(self, index: int, proc):
+        """worker 进程意外退出：取消分配给它的 Ticket（停止续约、释放槽位）并重启"""
+        if self._closing or self._procs[index] is not proc:
+            return
+        proc.join(0)
+        lost = [
+            ticket_id
+            for ticket_id, assigned in self._assigned.items()
+            if assigned == index
+        ]
+        logger.error(
+            f"Executor worker process {index} exited with code {proc.exitcode}, "
+            f"abandoning {len(lost)} tickets"
+        )
+        for ticket_id in lost:
+            future = self._tasks.get(ticket_id)
+            if future is not None and not future.done():
+                future.cancel()
+        # 旧队列不再有读取者，退出时不等待其缓冲写完
+        self._inboxes[index].cancel_join_thread()
+        worker_stats.discard(index)
+        scheduler_metrics.increment("worker_process_restarts")
+        self._start_worker(index)
+
+    def _worker_index(self, session_id: str) -> int:
+        """Session 固定分配的 worker 进程序号"""
+        return zlib.crc32(session_id.encode()) % self.processes
+
+    def _send(self, ticket_id: str, command: tuple):
+        index = self._assigned.get(ticket_id)
+        if index is not None:
+            self._inboxes[index].put(command)
+
+    def _read_results(self):
+        """后台线程：读取 worker 回报并在事件循环中完成对应的 Future"""
+        while True:
+            message = self._outbox.get()
+            if message is None:
+                return
+            kind = message[0]
+            if kind == "stream":
+                _, session_id, event = message
+                self._loop.call_soon_threadsafe(stream_hub.publish, session_id, event)
+            elif kind == "stats":
+                _, index, report = message
+                self._loop.call_soon_threadsafe(worker_stats.update, index, report)
+            else:
+                _, ticket_id, cancelled = message
+                self._loop.call_soon_threadsafe(self._resolve, ticket_id, cancelled)
+
+    def _resolve(self, ticket_id: str, cancelled: bool):
+        future = self._tasks.get(ticket_id)
+        if future is None or future.done():
+            return
+        if cancelled:
+            future.cancel()
+        else:
+            future.set_result(None)
+
+
+def _worker_main(
+    index: int,
+    processes: int,
+    inbox,
+    outbox,
+    initializer: Callable[..., Any] | None,
+    initargs: tuple,
+):
+    """worker 进程入口"""
+    from app.logging_config import setup_logging
+
+    setup_logging()
+    if initializer:
+        initializer(*initargs)
+    asyncio.run(_worker_loop(index, processes, inbox, outbox))
+
+
+async def _worker_loop(index: int, processes: int, inbox, outbox):
+    """worker 进程主循环：在本进程的 WorkerPool 中运行 Executor"""
+    loop = asyncio.get_running_loop()
+    # 并发上限由 API 进程中的 Dispatcher 控制；LLM 限额由所有 worker 进程均分
+    pool = WorkerPool(max_workers=sys.maxsize, default_agent_limit=sys.maxsize)
+    llm_rate_limiter.partition(processes)
+    exited = asyncio.Event()
+    background: set[asyncio.Task] = set()
+
+    def spawn(coro):
+        task = loop.create_task(coro)
+        background.add(task)
+        task.add_done_callback(background.discard)
+
+    async def finish(ticket_id: str, cancelled: bool):
+        # 该 Executor 的待写入行落库（或因丢失租约被丢弃）后再回报退出
+        try:
+            await write_behind.flush()
+        except Exception as e:
+            logger.error(f"Write-behind flush failed before reporting {ticket_id[:8]}: {e}")
+        outbox.put(("done", ticket_id, cancelled))
+
+    def report(ticket_id: str, task: asyncio.Future):
+        spawn(finish(ticket_id, task.cancelled()))
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(SCHEDULER_WORKER_REPORT_INTERVAL)
+            parking_lot.evict()
+            outbox.put(("stats", index, local_report()))
+
+    def forward(session_id: str, event: dict):
+        outbox.put(("stream", session_id, event))
+
+    stream_hub.add_forwarder(forward)
+
+    def handle(command: tuple):
+        kind = command[0]
+        if kind == "run":
+            _, ticket_id, session_id, agent_id = command
+            pool.reserve(ticket_id, agent_id)
+            task = pool.launch(ticket_id, session_id)
+            task.add_done_callback(lambda t, ticket_id=ticket_id: report(ticket_id, t))
+        elif kind == "stop":
+            pool.stop(command[1])
+        elif kind == "cancel":
+            pool.cancel(command[1])
+        elif kind == "discard":
+            parking_lot.discard(command[1])
+        elif kind == "drain":
+            spawn(pool.drain(command[1]))
+        elif kind == "exit":
+            exited.set()
+
+    def read_commands():
+        while True:
+            command = inbox.get()
+            loop.call_soon_threadsafe(handle, command)
+            if command[0] == "exit":
+                return
+
+    threading.Thread(target=read_commands, daemon=True).start()
+    logger.info(f"Executor worker process {index} ready")
+    reporter = loop.create_task(heartbeat())
+    await exited.wait()
+    reporter.cancel()
+    # 退出前取消仍在运行的 Executor（正常关闭时已排空）
+    await pool.drain(0)
+    if background:
+        await asyncio.wait(background, timeout=5)
+    await write_behind.flush()
+    await close_llm_client()
@@ -0,0 +1,65 @@
+"""Prompt Cache - 为模型请求设置提示缓存断点
+
+请求前缀按 tools -> system -> messages 的顺序参与缓存，设置三个断点：
+1. 最后一个工具定义：工具列表在 Ticket 内不变（顺序确定）
+2. system：编译后的系统提示（全局提示 + Skill + Agent 提示 + 上下文 + 参数）
+3. 最后一条消息：滚动的会话前缀，下一轮请求从这里读取缓存
+
+断点只加在发出的请求副本上，不修改内存会话中保存的消息。
+"""
+
+from typing import Any
+
+from app.config import LLM_PROMPT_CACHE
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _with_breakpoint(block: dict[str, Any]) -> dict[str, Any]:
+    return {**block, "cache_control": CACHE_CONTROL}
+
+
+def cache_tools(tools: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """在最后一个工具定义上设置断点"""
+    if not tools:
+        return tools
+    return [*tools[:-1], _with_breakpoint(tools[-1])]
+
+
+def cache_system(system: str) -> list[dict[str, Any]] | str:
+    """将系统提示转为带断点的 text block"""
+    if not system:
+        return system
+    return [_with_breakpoint({"type": "text", "text": system})]
+
+
+def cache_messages(messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """在最后一条消息的最后一个 content block 上设置断点"""
+    if not messages:
+        return messages
+    last = messages[-1]
+    content = last["content"]
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content}]
+    else:
+        blocks = list(content)
+    if not blocks:
+        return messages
+    blocks[-1] = _with_breakpoint(blocks[-1])
+    return [*messages[:-1], {**last, "content": blocks}]
+
+
+def apply_prompt_cache(
+    system: str, tools: list[dict[str, Any]], messages: list[dict[str, Any]]
+) -> dict[str, Any]:
+    """返回设置了缓存断点的 system / tools / messages 请求参数
+
+    LLM_PROMPT_CACHE 关闭时原样返回（兼容不支持 cache_control 的 Anthropic 兼容接口）。
+    """
+    if not LLM_PROMPT_CACHE:
+        return {"system": system, "tools": tools, "messages": messages}
+    return {
+        "system": cache_system(system),
+        "tools": cache_tools(tools),
+        "messages": cache_messages(messages),
+    }
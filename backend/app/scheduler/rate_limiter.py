@@ -0,0 +1,255 @@
+"""LLMRateLimiter - 进程内共享的 LLM 调用限流器
+
+所有 Executor 调用模型前从同一个限流器获取许可：
+1. 请求数令牌桶（LLM_REQUESTS_PER_MINUTE）
+2. token 数令牌桶（LLM_TOKENS_PER_MINUTE），按请求估算值预扣，响应后按实际 usage 修正
+   （未缓存的输入 + 输出；会话请求的估算值由 ContextWindow.request_tokens 按缓存的
+   每条消息估算值给出，不计入预计命中提示缓存的前缀）
+3. AIMD 并发窗口：每次成功窗口加 1/窗口（约每轮加 1），遇到 429/529 窗口减半，
+   并在 retry-after 指定的时间内暂停放行所有请求
+
+等待中的请求按到达顺序（FIFO）放行。限额为 0 表示不限制该项。
+
+多进程模式下每个 worker 进程有自己的限流器，启动时用 partition(N) 取 1/N 的请求数、
+token 数和并发上限，所有进程合计不超过配置的限额。
+"""
+
+import asyncio
+import json
+import logging
+import math
+import time
+from collections import deque
+from typing import Any
+
+from app.config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+)
+
+logger = logging.getLogger(__name__)
+
+# 未返回 retry-after 时的默认暂停时间（秒）
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def estimate_request_tokens(**request: Any) -> int:
+    """粗略估算一次请求的输入 token 数（约 4 字符 / token，需序列化整个请求，
+    只用于没有缓存估算值的请求，如摘要）"""
+    return len(json.dumps(request, ensure_ascii=False, default=str)) // 4
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """是否为供应商限流/过载错误（429/529）"""
+    return getattr(error, "status_code", None) in (429, 529)
+
+
+def retry_after_seconds(error: BaseException) -> float | None:
+    """从错误响应的 retry-after 头读取建议的等待时间"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """按分钟速率匀速补充的令牌桶（容量为一分钟的额度）"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        """当前可用令牌数（可能为负：实际用量超过预扣）"""
+        self._refill()
+        return self.tokens
+
+    def wait_time(self, amount: float) -> float:
+        """获得 amount 个令牌还需等待的秒数（超过容量的按容量计）"""
+        deficit = min(amount, self.capacity) - self.available()
+        return max(0.0, deficit / self.rate)
+
+    def consume(self, amount: float):
+        """扣除令牌（允许为负，之后补充时偿还）"""
+        self._refill()
+        self.tokens -= amount
+
+
+class RatePermit:
+    """一次已放行的调用，结束时归还并发窗口"""
+
+    def __init__(self, limiter: "LLMRateLimiter", estimated_tokens: int):
+        self._limiter = limiter
+        self._estimated = estimated_tokens
+        self._recorded = False
+
+    def record_usage(self, response: Any):
+        """按响应的实际 usage 修正 token 桶"""
+        usage = getattr(response, "usage", None)
+        if usage is None or self._recorded:
+            return
+        actual = (getattr(usage, "input_tokens", 0) or 0) + (
+            getattr(usage, "output_tokens", 0) or 0
+        )
+        self._recorded = True
+        if self._limiter.tokens:
+            self._limiter.tokens.consume(actual - self._estimated)
+
+    async def __aenter__(self) -> "RatePermit":
+        await self._limiter.acquire(self._estimated)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._limiter.release()
+        if exc is not None and is_rate_limited(exc):
+            self._limiter.on_rate_limited(retry_after_seconds(exc))
+        elif exc is None:
+            self._limiter.on_success()
+        return False
+
+
+class LLMRateLimiter:
+    """令牌桶 + AIMD 并发窗口限流器"""
+
+    def __init__(
+        self,
+        requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        min_concurrency: int = 1,
+    ):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.window = float(max_concurrency)
+        self.in_flight = 0
+        self.rate_limited_total = 0
+        self._blocked_until = 0.0
+        # 等待放行的请求（FIFO），只有队首可以被放行
+        self._queue: deque[object] = deque()
+        self._waiters: set[asyncio.Future] = set()
+
+    def partition(self, parts: int):
+        """只使用 1/parts 的限额（多进程模式下每个 worker 进程调用一次）"""
+        if parts <= 1:
+            return
+        if self.requests:
+            self.requests = TokenBucket(self.requests.capacity / parts)
+        if self.tokens:
+            self.tokens = TokenBucket(self.tokens.capacity / parts)
+        self.max_concurrency = max(self.min_concurrency, self.max_concurrency // parts)
+        self.window = min(self.window, float(self.max_concurrency))
+
+    @property
+    def queue_depth(self) -> int:
+        """等待放行的请求数"""
+        return len(self._queue)
+
+    def limit(self, estimated_tokens: int = 0) -> RatePermit:
+        """获取一次调用许可：async with limiter.limit(n) as permit: ..."""
+        return RatePermit(self, estimated_tokens)
+
+    async def acquire(self, estimated_tokens: int = 0):
+        """等待直到可以发出一次调用"""
+        marker = object()
+        self._queue.append(marker)
+        try:
+            while True:
+                delay = None
+                if self._queue[0] is marker:
+                    delay = self._admit_delay(estimated_tokens)
+                    if delay == 0:
+                        self._admit(estimated_tokens)
+                        return
+                await self._sleep(delay)
+        finally:
+            self._queue.remove(marker)
+            self._wake_all()
+
+    def release(self):
+        """调用结束，归还并发窗口"""
+        self.in_flight = max(0, self.in_flight - 1)
+        self._wake_all()
+
+    def on_success(self):
+        """加性增：每个窗口的成功调用使窗口约增加 1"""
+        self.window = min(float(self.max_concurrency), self.window + 1.0 / self.window)
+
+    def on_rate_limited(self, retry_after: float | None = None):
+        """乘性减：窗口减半，并在 retry-after 时间内暂停放行"""
+        self.rate_limited_total += 1
+        self.window = max(float(self.min_concurrency), self.window / 2)
+        pause = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER
+        self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+        logger.warning(
+            f"LLM rate limited, concurrency window -> {self.window:.1f}, pausing {pause:.1f}s"
+        )
+        self._wake_all()
+
+    def snapshot(self) -> dict[str, Any]:
+        """当前限额与状态"""
+        return {
+            "requests_per_minute": self.requests.capacity if self.requests else 0,
+            "tokens_per_minute": self.tokens.capacity if self.tokens else 0,
+            "available_requests": self.requests.available() if self.requests else None,
+            "available_tokens": self.tokens.available() if self.tokens else None,
+            "concurrency_window": self.window,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "paused_for_s": max(0.0, self._blocked_until - time.monotonic()),
+            "rate_limited_total": self.rate_limited_total,
+        }
+
+    def _admit_delay(self, estimated_tokens: int) -> float | None:
+        """队首请求还需等待的秒数；0 表示可放行，None 表示需等待并发窗口释放"""
+        delays = [self._blocked_until - time.monotonic()]
+        if self.requests:
+            delays.append(self.requests.wait_time(1))
+        if self.tokens:
+            delays.append(self.tokens.wait_time(estimated_tokens))
+        delay = max(delays)
+        if delay > 0:
+            return delay
+        if self.in_flight >= math.floor(self.window):
+            return None
+        return 0
+
+    def _admit(self, estimated_tokens: int):
+        self.in_flight += 1
+        if self.requests:
+            self.requests.consume(1)
+        if self.tokens:
+            self.tokens.consume(estimated_tokens)
+
+    async def _sleep(self, timeout: float | None):
+        """等待超时或被唤醒（队首变化、窗口释放、限流状态变化）"""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiters.discard(waiter)
+
+    def _wake_all(self):
+        for waiter in list(self._waiters):
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+# 全局限流器（所有 Executor 共享）
+llm_rate_limiter = LLMRateLimiter()
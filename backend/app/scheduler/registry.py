@@ -0,0 +1,65 @@
+"""ExecutorRegistry - 进程内运行中 Executor 的注册表
+
+WorkerPool 启动 Executor 时注册、任务结束时注销，
+使路由等调度器之外的代码可以按 ticket_id 找到并取消正在运行的 Executor。
+
+取消直接 cancel 其 asyncio 任务：正在等待的 LLM 调用或工具协程立即被打断，
+未提交的本轮迭代回滚，任务结束后 WorkerPool 释放槽位。
+worker 进程中的 Executor 由句柄的 cancel() 通知 worker 进程取消，返回的 Future 在
+worker 进程回报其退出后才结束。
+"""
+
+import asyncio
+import logging
+
+from app.scheduler.base_executor import IExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorRegistry:
+    """ticket_id -> (Executor, 任务)"""
+
+    def __init__(self):
+        self._entries: dict[str, tuple[IExecutor, asyncio.Task]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, ticket_id: str) -> bool:
+        return ticket_id in self._entries
+
+    def register(self, ticket_id: str, executor: IExecutor, task: asyncio.Task):
+        """登记运行中的 Executor"""
+        self._entries[ticket_id] = (executor, task)
+
+    def unregister(self, ticket_id: str, task: asyncio.Task | None = None):
+        """注销 Executor；指定 task 时仅在仍是该任务时注销"""
+        entry = self._entries.get(ticket_id)
+        if entry and (task is None or entry[1] is task):
+            del self._entries[ticket_id]
+
+    def get(self, ticket_id: str) -> IExecutor | None:
+        """获取运行中的 Executor"""
+        entry = self._entries.get(ticket_id)
+        return entry[0] if entry else None
+
+    def cancel(self, ticket_id: str) -> asyncio.Task | None:
+        """立即取消 Ticket 的 Executor，返回被取消的任务（未在本进程运行时返回 None）"""
+        entry = self._entries.get(ticket_id)
+        if not entry:
+            return None
+
+        executor, task = entry
+        cancel = getattr(executor, "cancel", None)
+        if cancel is not None:
+            cancel()
+        else:
+            executor.stop()
+            task.cancel()
+        logger.info(f"Cancelled executor for ticket {ticket_id[:8]}")
+        return task
+
+
+# 全局注册表
+executor_registry = ExecutorRegistry()
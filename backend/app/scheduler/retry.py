@@ -0,0 +1,101 @@
+"""RetryPolicy - 模型调用的瞬时错误重试
+
+可重试的错误：429 / 529 限流过载、其它 5xx、超时、连接错误（连接被重置等）。
+重试间隔为指数退避加完全抖动（random(0, min(max_delay, base_delay * 2^n))），
+响应带 retry-after 时按其等待。超过最大重试次数，或下一次重试会超出从第一次
+调用开始计算的最长重试时间时放弃，把最后一次错误抛给调用方。
+
+重试次数和最长重试时间按 Agent > 全局默认（LLM_RETRY_*）取值。
+"""
+
+import random
+from dataclasses import dataclass, replace
+from typing import Any
+
+from app.config import (
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+    LLM_RETRY_MAX_ELAPSED,
+    LLM_RETRY_MAX_RETRIES,
+)
+from app.scheduler.rate_limiter import retry_after_seconds
+
+# 可重试的 HTTP 状态码（另外所有 5xx 均可重试）
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+# 按类名识别的超时 / 连接错误（anthropic、httpx 和内置异常）
+RETRYABLE_ERROR_NAMES = {
+    "APITimeoutError",
+    "APIConnectionError",
+    "TimeoutException",
+    "ConnectTimeout",
+    "ReadTimeout",
+    "WriteTimeout",
+    "PoolTimeout",
+    "ConnectError",
+    "ReadError",
+    "WriteError",
+    "RemoteProtocolError",
+}
+
+
+def retry_reason(error: BaseException) -> str | None:
+    """可重试错误的分类（用于指标），不可重试时返回 None"""
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        if status in (429, 529):
+            return "rate_limited"
+        if status == 408:
+            return "timeout"
+        if status >= 500:
+            return "server_error"
+        if status in RETRYABLE_STATUS_CODES:
+            return "conflict"
+        return None
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return "timeout" if isinstance(error, TimeoutError) else "connection"
+    for cls in type(error).__mro__:
+        if cls.__name__ in RETRYABLE_ERROR_NAMES:
+            return "timeout" if "Timeout" in cls.__name__ else "connection"
+    return None
+
+
+@dataclass
+class RetryPolicy:
+    """一次模型调用的重试策略"""
+
+    max_retries: int = LLM_RETRY_MAX_RETRIES
+    max_elapsed: float = LLM_RETRY_MAX_ELAPSED
+    base_delay: float = LLM_RETRY_BASE_DELAY
+    max_delay: float = LLM_RETRY_MAX_DELAY
+
+    @classmethod
+    def resolve(cls, agent: Any) -> "RetryPolicy":
+        """Agent 设置优先，未设置时使用全局默认"""
+        policy = cls()
+        if getattr(agent, "llm_retry_max_retries", None) is not None:
+            policy.max_retries = agent.llm_retry_max_retries
+        if getattr(agent, "llm_retry_max_elapsed", None) is not None:
+            policy.max_elapsed = agent.llm_retry_max_elapsed
+        return policy
+
+    def limited(self, max_retries: int) -> "RetryPolicy":
+        """最多重试 max_retries 次的副本（后面还有回退目标时使用）"""
+        return replace(self, max_retries=min(self.max_retries, max_retries))
+
+    def backoff(self, retry: int) -> float:
+        """第 retry 次重试（从 0 开始）前的退避时间（完全抖动）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+    def next_delay(
+        self, error: BaseException, retry: int, elapsed: float
+    ) -> float | None:
+        """第 retry 次重试前的等待时间；不应重试时返回 None"""
+        if retry >= self.max_retries or retry_reason(error) is None:
+            return None
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = self.backoff(retry)
+        if self.max_elapsed and elapsed + delay > self.max_elapsed:
+            return None
+        return delay
@@ -0,0 +1,144 @@
+"""Scheduler Stats - 合并本进程与 worker 进程的调度器指标
+
+多进程模式下 Executor 在 worker 进程中运行，其指标（scheduler_metrics）、LLM 限流器和
+模型路由的统计只存在于 worker 进程中。worker 进程定期把 local_report() 经回报队列发给
+API 进程，worker_stats 保存每个进程最近一次的回报，/api/scheduler/stats 返回合并结果：
+- 计数和瞬时值相加
+- 耗时/数值分布：次数相加，均值按次数加权，分位数和最大值取各进程中的最大值（近似）
+- 限流器：限额、可用额度、并发窗口、在途和排队数相加，暂停时间取最大值
+- 模型路由：调用数相加，错误率按调用数加权，分位数取最大值，任一进程不健康即不健康
+
+多进程模式下 API 进程不运行 Executor，其限流器和模型路由不参与合并。
+"""
+
+from collections import defaultdict
+from typing import Any
+
+from app.scheduler.metrics import scheduler_metrics
+from app.scheduler.model_router import model_router
+from app.scheduler.rate_limiter import llm_rate_limiter
+
+# 限流器快照中取最大值的字段，其余数值字段相加
+_LIMITER_MAX_FIELDS = {"paused_for_s"}
+
+
+def local_report() -> dict[str, Any]:
+    """本进程的指标快照"""
+    return {
+        "metrics": scheduler_metrics.snapshot(),
+        "rate_limiter": llm_rate_limiter.snapshot(),
+        "models": model_router.snapshot(),
+    }
+
+
+def _merge_summary(summaries: list[dict[str, Any]]) -> dict[str, Any]:
+    count = sum(summary["count"] for summary in summaries)
+    merged: dict[str, Any] = {"count": count}
+    for key in summaries[0]:
+        if key == "count":
+            continue
+        if key.startswith("mean"):
+            total = sum(summary[key] * summary["count"] for summary in summaries)
+            merged[key] = total / count if count else 0.0
+        else:
+            merged[key] = max(summary[key] for summary in summaries)
+    return merged
+
+
+def _merge_named(groups: list[dict[str, dict[str, Any]]]) -> dict[str, dict[str, Any]]:
+    named: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    for group in groups:
+        for name, summary in group.items():
+            named[name].append(summary)
+    return {name: _merge_summary(summaries) for name, summaries in named.items()}
+
+
+def _sum_values(groups: list[dict[str, float]]) -> dict[str, float]:
+    merged: dict[str, float] = defaultdict(int)
+    for group in groups:
+        for name, value in group.items():
+            merged[name] += value
+    return dict(merged)
+
+
+def merge_metrics(snapshots: list[dict[str, Any]]) -> dict[str, Any]:
+    """合并多个 scheduler_metrics.snapshot()"""
+    return {
+        "queue_wait": _merge_named([s["queue_wait"] for s in snapshots]),
+        "latency": _merge_named([s["latency"] for s in snapshots]),
+        "values": _merge_named([s["values"] for s in snapshots]),
+        "gauges": _sum_values([s["gauges"] for s in snapshots]),
+        "counters": _sum_values([s["counters"] for s in snapshots]),
+    }
+
+
+def merge_rate_limiters(snapshots: list[dict[str, Any]]) -> dict[str, Any]:
+    """合并多个 llm_rate_limiter.snapshot()"""
+    merged = dict(snapshots[0])
+    for snapshot in snapshots[1:]:
+        for key, value in snapshot.items():
+            if value is None or merged[key] is None:
+                merged[key] = None
+            elif key in _LIMITER_MAX_FIELDS:
+                merged[key] = max(merged[key], value)
+            else:
+                merged[key] += value
+    return merged
+
+
+def merge_models(snapshots: list[dict[str, dict[str, Any]]]) -> dict[str, dict[str, Any]]:
+    """合并多个 model_router.snapshot()"""
+    targets: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    for snapshot in snapshots:
+        for key, stats in snapshot.items():
+            targets[key].append(stats)
+    merged = {}
+    for key, items in targets.items():
+        calls = sum(item["calls"] for item in items)
+        errors = sum(item["error_rate"] * item["calls"] for item in items)
+        merged[key] = {
+            "calls": calls,
+            "error_rate": errors / calls if calls else 0.0,
+            "p50_ms": max(item["p50_ms"] for item in items),
+            "p95_ms": max(item["p95_ms"] for item in items),
+            "healthy": all(item["healthy"] for item in items),
+        }
+    return merged
+
+
+class WorkerStats:
+    """各 worker 进程最近一次回报的指标"""
+
+    def __init__(self):
+        # worker 进程序号 -> local_report()
+        self._reports: dict[int, dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._reports)
+
+    def update(self, index: int, report: dict[str, Any]):
+        """保存 worker 进程的回报"""
+        self._reports[index] = report
+
+    def discard(self, index: int):
+        """丢弃已退出的 worker 进程的回报"""
+        self._reports.pop(index, None)
+
+    def clear(self):
+        """清空回报（工作池关闭时）"""
+        self._reports.clear()
+
+    def snapshot(self) -> dict[str, Any]:
+        """本进程与各 worker 进程合并后的指标"""
+        local = local_report()
+        reports = list(self._reports.values())
+        remote = reports or [local]
+        return {
+            **merge_metrics([local["metrics"], *(r["metrics"] for r in reports)]),
+            "rate_limiter": merge_rate_limiters([r["rate_limiter"] for r in remote]),
+            "models": merge_models([r["models"] for r in remote]),
+        }
+
+
+# 全局实例（API 进程中由 ProcessWorkerPool 更新）
+worker_stats = WorkerStats()
@@ -0,0 +1,201 @@
+"""Streaming - 模型输出的实时发布与增量持久化
+
+StreamHub: 进程内按 session_id 的发布/订阅，SSE 接口（GET /api/sessions/{id}/stream）
+订阅后实时收到 Executor 的输出事件。worker 进程中的 Executor 通过 forwarder
+把事件转发到 API 进程的 StreamHub（见 process_pool.py）。
+
+事件（dict，type 字段区分）：
+- message_start：开始生成一条 assistant 消息
+- text_delta：文本增量 {"text"}
+- tool_use：开始一个工具调用 {"id", "name"}
+- message_restart：本次调用重试，之前的增量作废
+- message_stop：assistant 消息生成结束 {"message_id"}
+- message_abort：调用失败或被取消，本条消息作废（partial 消息已删除）
+
+AssistantStream: 一条 assistant 消息的流式输出，AnthropicExecutor 和 SDKExecutor 共用。
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable
+
+from app.config import LLM_STREAM_FLUSH_INTERVAL, STREAM_SUBSCRIBER_QUEUE
+from app.models.message import Message, MessageRole
+from app.scheduler.metrics import scheduler_metrics
+from app.scheduler.write_behind import LeaseFence, WriteBehindBuffer, write_behind
+
+logger = logging.getLogger(__name__)
+
+
+class StreamHub:
+    """按 session_id 分发输出事件
+
+    每个订阅者一个有界队列；消费过慢时丢弃最旧的事件（完整内容始终可以从 Session 重新获取）。
+    """
+
+    def __init__(self, queue_size: int = STREAM_SUBSCRIBER_QUEUE):
+        self.queue_size = queue_size
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self._forwarders: list[Callable[[str, dict[str, Any]], None]] = []
+
+    def subscribe(self, session_id: str) -> asyncio.Queue:
+        """订阅某个 Session 的输出事件"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[session_id].add(queue)
+        return queue
+
+    def unsubscribe(self, session_id: str, queue: asyncio.Queue):
+        """取消订阅"""
+        queues = self._subscribers.get(session_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[session_id]
+
+    def subscriber_count(self, session_id: str) -> int:
+        return len(self._subscribers.get(session_id, ()))
+
+    def add_forwarder(self, forwarder: Callable[[str, dict[str, Any]], None]):
+        """注册转发回调（worker 进程把事件转发给 API 进程）"""
+        self._forwarders.append(forwarder)
+
+    def remove_forwarder(self, forwarder: Callable[[str, dict[str, Any]], None]):
+        if forwarder in self._forwarders:
+            self._forwarders.remove(forwarder)
+
+    def publish(self, session_id: str, event: dict[str, Any]):
+        """发布事件（不阻塞）"""
+        for forwarder in self._forwarders:
+            forwarder(session_id, event)
+        for queue in self._subscribers.get(session_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+# 全局实例
+stream_hub = StreamHub()
+
+
+class AssistantStream:
+    """一条 assistant 消息的流式输出
+
+    - 文本增量和工具调用开始发布到 stream_hub
+    - 首个可见 token 到达时写入一条 partial 消息（经 write_behind 批量提交），之后最多每
+      flush_interval 秒更新一次；中途崩溃时已输出的内容仍保留在数据库中（partial 消息不进入
+      模型上下文）
+    - 记录首个可见 token 的延迟（scheduler_metrics 的 llm_first_token）
+
+    finish() 写入最终内容并清除 partial 标记，由调用方交给 write_behind；message_stop
+    事件在消息落库后发布（订阅方收到后重新加载 Session 即可看到最终内容）。
+    调用最终失败、Ticket 被取消或超时时调用方调用 abort()，删除已写入的 partial 消息。
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        flush_interval: float = LLM_STREAM_FLUSH_INTERVAL,
+        hub: StreamHub | None = None,
+        writer: WriteBehindBuffer | None = None,
+        fence: LeaseFence | None = None,
+    ):
+        self.session_id = session_id
+        self.flush_interval = flush_interval
+        self.hub = hub or stream_hub
+        self.writer = writer or write_behind
+        # Executor 的租约条件，partial 消息与 Executor 的其它写入一样受租约保护
+        self.fence = fence
+        self.started = time.monotonic()
+        # 首个可见 token 的延迟（秒）
+        self.first_token_latency: float | None = None
+        self.message: Message | None = None
+        self._blocks: list[dict[str, Any]] = []
+        self._last_flush = 0.0
+
+    def start(self):
+        """开始一条 assistant 消息"""
+        self.started = time.monotonic()
+        self.hub.publish(self.session_id, {"type": "message_start"})
+
+    def text_delta(self, text: str):
+        """文本增量"""
+        if not text:
+            return
+        if self._blocks and self._blocks[-1]["type"] == "text":
+            self._blocks[-1]["text"] += text
+        else:
+            self._blocks.append({"type": "text", "text": text})
+        self.hub.publish(self.session_id, {"type": "text_delta", "text": text})
+        self._on_visible()
+
+    def tool_use(self, tool_use_id: str, name: str):
+        """开始一个工具调用（参数在 finish 时随完整内容写入）"""
+        self._blocks.append(
+            {"type": "tool_use", "id": tool_use_id, "name": name, "input": {}}
+        )
+        self.hub.publish(
+            self.session_id, {"type": "tool_use", "id": tool_use_id, "name": name}
+        )
+        self._on_visible()
+
+    def restart(self):
+        """调用重试：丢弃已收到的增量"""
+        self._blocks.clear()
+        self.hub.publish(self.session_id, {"type": "message_restart"})
+
+    def finish(self, content: str) -> Message | None:
+        """结束流：返回已写入的 partial 消息（已更新为最终内容），没有写入过时返回 None"""
+        message = self.message
+        if message is None:
+            self.hub.publish(self.session_id, {"type": "message_stop", "message_id": None})
+            return None
+        message.content = content
+        message.partial = False
+        self.writer.after_flush(
+            lambda: self.hub.publish(
+                self.session_id, {"type": "message_stop", "message_id": message.id}
+            )
+        )
+        return message
+
+    def abort(self):
+        """调用失败或被取消：删除已写入的 partial 消息（finish 之后调用无效）"""
+        message = self.message
+        if message is not None and not message.partial:
+            return
+        self._blocks.clear()
+        self.message = None
+        if message is not None:
+            # 不受租约保护：租约丢失后残留的 partial 消息同样应删除
+            self.writer.delete(message)
+        self.hub.publish(self.session_id, {"type": "message_abort"})
+
+    def _on_visible(self):
+        now = time.monotonic()
+        if self.first_token_latency is None:
+            self.first_token_latency = now - self.started
+            scheduler_metrics.record_latency("llm_first_token", self.first_token_latency)
+            self._persist(now)
+        elif now - self._last_flush >= self.flush_interval:
+            self._persist(now)
+
+    def _persist(self, now: float):
+        """写入/更新 partial 消息（交给 write_behind）"""
+        content = json.dumps(self._blocks, ensure_ascii=False)
+        if self.message is None:
+            self.message = Message(
+                session_id=self.session_id,
+                role=MessageRole.ASSISTANT.value,
+                content=content,
+                timestamp=datetime.utcnow(),
+                partial=True,
+            )
+        else:
+            self.message.content = content
+        self.writer.save(self.message, fence=self.fence)
+        self._last_flush = now
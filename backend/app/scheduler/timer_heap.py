@@ -0,0 +1,76 @@
+"""TimerHeap - 定时 Ticket 的到期时间小顶堆
+
+Dispatcher 启动时通过 (status, run_at) 索引加载所有 scheduled Ticket，
+之后由 notifier 的定时变更通知维护，主循环只需睡到堆顶的到期时间，
+无需反复扫描 tickets 表。
+
+删除和修改采用惰性删除：旧条目留在堆中，弹出时与当前到期时间比对后丢弃。
+"""
+
+import heapq
+from datetime import datetime
+
+
+class TimerHeap:
+    """ticket_id 的到期时间小顶堆（惰性删除）"""
+
+    def __init__(self):
+        self._heap: list[tuple[datetime, str]] = []
+        # ticket_id -> 当前有效的到期时间
+        self._deadlines: dict[str, datetime] = {}
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, ticket_id: str) -> bool:
+        return ticket_id in self._deadlines
+
+    def schedule(self, ticket_id: str, run_at: datetime):
+        """设置（或修改）Ticket 的到期时间"""
+        if self._deadlines.get(ticket_id) == run_at:
+            return
+        self._deadlines[ticket_id] = run_at
+        heapq.heappush(self._heap, (run_at, ticket_id))
+        # 失效条目过多时重建，避免频繁修改导致堆无限增长
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._rebuild()
+
+    def remove(self, ticket_id: str):
+        """移除 Ticket 的定时"""
+        self._deadlines.pop(ticket_id, None)
+
+    def next_deadline(self) -> datetime | None:
+        """最早的到期时间，没有定时 Ticket 时返回 None"""
+        self._prune()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> list[str]:
+        """弹出所有在 now 之前到期的 Ticket"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            run_at, ticket_id = heapq.heappop(self._heap)
+            if self._deadlines.get(ticket_id) == run_at:
+                del self._deadlines[ticket_id]
+                due.append(ticket_id)
+        return due
+
+    def reload(self, deadlines: dict[str, datetime]):
+        """用数据库中的完整定时集合替换堆内容"""
+        self._deadlines = dict(deadlines)
+        self._rebuild()
+
+    def clear(self):
+        """清空"""
+        self._heap.clear()
+        self._deadlines.clear()
+
+    def _prune(self):
+        while self._heap:
+            run_at, ticket_id = self._heap[0]
+            if self._deadlines.get(ticket_id) == run_at:
+                return
+            heapq.heappop(self._heap)
+
+    def _rebuild(self):
+        self._heap = [(run_at, ticket_id) for ticket_id, run_at in self._deadlines.items()]
+        heapq.heapify(self._heap)
@@ -0,0 +1,181 @@
+"""WorkerPool - Executor 工作池
+
+限制同时运行的 Executor 数量：
+1. 全局并发上限（SCHEDULER_MAX_WORKERS）
+2. 每个 Agent 的并发上限（Agent.max_concurrency，为空时使用 AGENT_MAX_CONCURRENCY）
+
+超出上限的 Ticket 不会被派发，保持 pending 留在队列中。
+关闭时 drain() 请求所有 Executor 在迭代边界停止，超过截止时间仍未退出的被取消。
+
+BaseWorkerPool 只管理槽位；WorkerPool 在当前事件循环中运行 Executor，
+多进程模式见 process_pool.ProcessWorkerPool。
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Callable
+
+from app.config import AGENT_MAX_CONCURRENCY, SCHEDULER_MAX_WORKERS
+from app.scheduler.base_executor import IExecutor
+from app.scheduler.executor_factory import ExecutorFactory
+from app.scheduler.parking import parking_lot
+from app.scheduler.registry import executor_registry
+
+logger = logging.getLogger(__name__)
+
+
+class BaseWorkerPool(ABC):
+    """有界工作池的槽位管理，子类实现 Executor 的启动、停止和排空"""
+
+    def __init__(
+        self,
+        max_workers: int = SCHEDULER_MAX_WORKERS,
+        default_agent_limit: int = AGENT_MAX_CONCURRENCY,
+        on_release: Callable[[], None] | None = None,
+    ):
+        self.max_workers = max_workers
+        self.default_agent_limit = default_agent_limit
+        self.on_release = on_release
+        # ticket_id -> 占用槽位的 Agent
+        self._ticket_agents: dict[str, str] = {}
+        # ticket_id -> 代表 Executor 运行的任务（或 Future）
+        self._tasks: dict[str, asyncio.Future] = {}
+        self._agent_counts: dict[str, int] = defaultdict(int)
+
+    async def start(self):
+        """启动工作池（进程内模式无需准备）"""
+
+    async def close(self):
+        """关闭工作池（进程内模式无需清理）"""
+
+    @property
+    def active_count(self) -> int:
+        """当前占用的槽位数量（含已预留、尚未启动的）"""
+        return len(self._ticket_agents)
+
+    @property
+    def is_full(self) -> bool:
+        """全局并发是否已满"""
+        return len(self._ticket_agents) >= self.max_workers
+
+    def agent_count(self, agent_id: str) -> int:
+        """某个 Agent 当前占用的槽位数量"""
+        return self._agent_counts.get(agent_id, 0)
+
+    def is_running(self, ticket_id: str) -> bool:
+        """Ticket 是否已在池中占用槽位"""
+        return ticket_id in self._ticket_agents
+
+    def running_ticket_ids(self) -> list[str]:
+        """已启动 Executor 的 Ticket ID 列表"""
+        return list(self._tasks)
+
+    def has_capacity(self, agent_id: str, agent_limit: int | None = None) -> bool:
+        """是否还能为该 Agent 启动一个 Executor"""
+        if self.is_full:
+            return False
+        limit = agent_limit or self.default_agent_limit
+        return self.agent_count(agent_id) < limit
+
+    def reserve(self, ticket_id: str, agent_id: str):
+        """为 Ticket 预留槽位（派发事务提交前调用）"""
+        self._ticket_agents[ticket_id] = agent_id
+        self._agent_counts[agent_id] += 1
+
+    @abstractmethod
+    def launch(self, ticket_id: str, session_id: str) -> asyncio.Future:
+        """在已预留的槽位上为 Ticket 启动 Executor，返回代表其运行的任务"""
+        pass
+
+    @abstractmethod
+    def stop(self, ticket_id: str):
+        """请求停止某个 Ticket 的 Executor（在迭代边界生效）"""
+        pass
+
+    @abstractmethod
+    def cancel(self, ticket_id: str):
+        """立即取消某个 Ticket 的 Executor（打断进行中的 LLM/工具调用）"""
+        pass
+
+    @abstractmethod
+    async def drain(self, timeout: float) -> int:
+        """停止所有 Executor 并等待其退出，超时后取消剩余任务，返回被取消的数量"""
+        pass
+
+    def _on_done(self, ticket_id: str, task: asyncio.Future):
+        executor_registry.unregister(ticket_id, task)
+        self.release(ticket_id)
+
+    def release(self, ticket_id: str):
+        """释放槽位（任务结束或预留作废时调用）"""
+        self._tasks.pop(ticket_id, None)
+        agent_id = self._ticket_agents.pop(ticket_id, None)
+        if agent_id is None:
+            return
+
+        self._agent_counts[agent_id] -= 1
+        if self._agent_counts[agent_id] <= 0:
+            del self._agent_counts[agent_id]
+
+        logger.debug(f"Worker slot released by ticket {ticket_id[:8]}")
+        # 空出槽位后唤醒 Dispatcher 派发排队中的 Ticket
+        if self.on_release:
+            self.on_release()
+
+
+class WorkerPool(BaseWorkerPool):
+    """在当前事件循环中运行 Executor 的有界工作池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # ticket_id -> 正在运行的 Executor
+        self._executors: dict[str, IExecutor] = {}
+
+    def launch(self, ticket_id: str, session_id: str) -> asyncio.Future:
+        """在已预留的槽位上为 Ticket 启动 Executor，返回代表其运行的任务
+
+        人工输入后恢复的 Ticket 优先取回停放的 Executor，沿用其内存中的会话。
+        """
+        executor = parking_lot.take(session_id) or ExecutorFactory.create_executor(
+            ticket_id, session_id
+        )
+        return self.submit(ticket_id, executor)
+
+    def submit(self, ticket_id: str, executor: IExecutor) -> asyncio.Task:
+        """在已预留的槽位上启动 Executor，任务结束后自动释放"""
+        task = asyncio.create_task(executor.run())
+        self._tasks[ticket_id] = task
+        self._executors[ticket_id] = executor
+        executor_registry.register(ticket_id, executor, task)
+        task.add_done_callback(lambda t: self._on_done(ticket_id, t))
+        return task
+
+    def stop(self, ticket_id: str):
+        executor = self._executors.get(ticket_id)
+        if executor:
+            executor.stop()
+
+    def cancel(self, ticket_id: str):
+        task = self._tasks.get(ticket_id)
+        if task:
+            self._executors[ticket_id].stop()
+            task.cancel()
+
+    async def drain(self, timeout: float) -> int:
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return 0
+
+        for executor in list(self._executors.values()):
+            executor.stop()
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        return len(pending)
+
+    def release(self, ticket_id: str):
+        self._executors.pop(ticket_id, None)
+        super().release(ticket_id)
@@ -0,0 +1,395 @@
+"""WriteBehind - 消息、步骤和模型调用记录的批量写入
+
+Executor 产生的 Message / Step / LLMCall 等行不再各自提交，而是交给进程内共享的
+write_behind：所有 Executor 的写入合并为一个事务提交（group commit），SQLite 单写锁
+从每条消息争用一次降为每批一次。
+
+- save(row) 在调用时快照行的列值：新行（没有主键）插入全部已设置的列，已写入或从数据库
+  加载的行只更新修改过的列。之后对对象的修改不影响已入队的快照，需要再次 save；
+  同一行在一批中多次 save 合并为一次写入
+- 待写入行数达到 WRITE_BEHIND_MAX_BATCH 时立即在后台提交，否则最晚在第一行入队后
+  WRITE_BEHIND_FLUSH_INTERVAL 秒提交
+- 状态变化（挂起/完成/失败）落库前调用方 await flush()，此时之前的消息已全部落库
+- 插入的行提交后回填主键和默认值，成为 detached 对象（与 ORM 查询得到的对象相同）
+- after_flush(callback) 在包含此前所有已入队行的提交完成后调用（如发布消息已落库的事件）
+- delete(row) 删除一行：尚未提交的插入直接从队列中丢弃，已写入的行在下一次刷新时删除
+- save(..., fence=LeaseFence) 的行受租约保护：提交时 Ticket 的 lease_owner 已不是 fence.owner
+  （租约被回收、Ticket 被取消或重置）则丢弃这些行并调用 fence.on_lost；Ticket 本身的
+  UPDATE 带 lease_owner 条件，影响行数为 0 同样视为丢失租约；Executor 自己释放租约
+  （release_lease）提交后，之后的写入以租约为空为条件
+
+写入使用 Core 语句，不把调用方的对象关联到刷新用的 Session，刷新期间调用方可以继续修改对象。
+
+指标：write_behind_flush（提交耗时）、write_behind_batch_size（每批行数），
+计数 write_behind_rows / write_behind_flushes / write_behind_errors / write_behind_fenced
+（因丢失租约丢弃的行），瞬时值 write_behind_pending。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable
+
+from sqlalchemy import delete, insert, inspect, select, update
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.config import WRITE_BEHIND_FLUSH_INTERVAL, WRITE_BEHIND_MAX_BATCH
+from app.database import async_session_maker
+from app.models.ticket import Ticket
+from app.scheduler.metrics import scheduler_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseFence:
+    """Executor 写入的租约条件：Ticket 的 lease_owner 仍为 owner 时才写入"""
+
+    def __init__(
+        self,
+        ticket_id: str,
+        owner: str | None,
+        on_lost: Callable[[], None] | None = None,
+    ):
+        self.ticket_id = ticket_id
+        self.owner = owner
+        self.on_lost = on_lost
+        self.lost = False
+
+    def mark_lost(self):
+        """标记租约丢失（只通知一次）"""
+        if self.lost:
+            return
+        self.lost = True
+        logger.warning(
+            f"Lease lost for ticket {self.ticket_id[:8]}, dropping executor writes"
+        )
+        if self.on_lost is not None:
+            self.on_lost()
+
+
+def release_lease(ticket: Ticket):
+    """清除 Ticket 的租约（离开 running 时调用，随 Ticket 的下一次 save 写入）"""
+    ticket.lease_owner = None
+    ticket.lease_expires_at = None
+
+
+class _LeaseLost(Exception):
+    """刷新中 Ticket 的带租约条件的 UPDATE 未命中"""
+
+    def __init__(self, fence: LeaseFence):
+        self.fence = fence
+
+
+class PendingWrite:
+    """一行待写入的快照"""
+
+    __slots__ = ("row", "values", "insert", "fence", "delete")
+
+    def __init__(
+        self,
+        row: Any,
+        values: dict[str, Any],
+        insert: bool,
+        fence: LeaseFence | None = None,
+        delete: bool = False,
+    ):
+        self.row = row
+        # 属性名 -> 值
+        self.values = values
+        self.insert = insert
+        self.fence = fence
+        self.delete = delete
+
+    def merge(self, later: "PendingWrite"):
+        """合并同一行之后的写入"""
+        self.values.update(later.values)
+        self.fence = self.fence or later.fence
+        self.delete = self.delete or later.delete
+
+    @property
+    def fenced_ticket(self) -> bool:
+        """是否为受租约保护的 Ticket 更新"""
+        return (
+            self.fence is not None
+            and not self.insert
+            and isinstance(self.row, Ticket)
+            and self.row.id == self.fence.ticket_id
+        )
+
+
+def _snapshot(row: Any, changed_only: bool) -> dict[str, Any]:
+    """快照行的列值并清除修改记录（之后的修改相对快照记录）"""
+    state = inspect(row)
+    values = {}
+    for attr in state.mapper.column_attrs:
+        key = attr.key
+        if changed_only:
+            added = state.attrs[key].history.added
+            if not added:
+                continue
+            value = added[0]
+        elif key in state.dict:
+            value = state.dict[key]
+        else:
+            continue
+        values[key] = value
+        set_committed_value(row, key, value)
+    return values
+
+
+class WriteBehindBuffer:
+    """进程内共享的批量写入缓冲"""
+
+    def __init__(
+        self,
+        max_batch: int = WRITE_BEHIND_MAX_BATCH,
+        flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+        session_maker: Callable[[], Any] | None = None,
+    ):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        # 未指定时每次刷新取模块级 async_session_maker（测试中可替换）
+        self.session_maker = session_maker
+        # id(row) -> 待写入快照（保持入队顺序）
+        self._pending: dict[int, PendingWrite] = {}
+        # 正在提交的插入行（提交完成前再次 save 的按更新处理）
+        self._inflight: set[int] = set()
+        self._callbacks: list[Callable[[], None]] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock: asyncio.Lock | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        """待写入的行数"""
+        return len(self._pending)
+
+    def save(self, *rows: Any, fence: LeaseFence | None = None):
+        """快照并入队一行或多行，在下一次刷新时落库（fence 已丢失时直接丢弃）"""
+        if fence is not None and fence.lost:
+            scheduler_metrics.increment("write_behind_fenced", len(rows))
+            return
+        for row in rows:
+            self._enqueue(row, fence)
+        scheduler_metrics.set_gauge("write_behind_pending", len(self._pending))
+        self._schedule()
+
+    def delete(self, row: Any):
+        """删除一行：尚未提交的插入直接丢弃，已写入（或正在提交）的行在下一次刷新时删除"""
+        key = id(row)
+        pending = self._pending.get(key)
+        if pending is not None and pending.insert:
+            del self._pending[key]
+        elif inspect(row).key is not None or key in self._inflight:
+            # 覆盖尚未提交的更新
+            self._pending[key] = PendingWrite(row, {}, False, delete=True)
+        scheduler_metrics.set_gauge("write_behind_pending", len(self._pending))
+        self._schedule()
+
+    def after_flush(self, callback: Callable[[], None]):
+        """在包含此前所有已入队行的提交完成后调用 callback"""
+        self._callbacks.append(callback)
+        self._schedule()
+
+    async def flush(self):
+        """立即提交所有待写入的行（与正在进行的刷新串行）"""
+        async with self._get_lock():
+            await self._flush_batch()
+
+    def clear(self):
+        """丢弃所有待写入的行（测试用）"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending.clear()
+        self._callbacks.clear()
+
+    def _enqueue(self, row: Any, fence: LeaseFence | None):
+        key = id(row)
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.merge(
+                PendingWrite(row, _snapshot(row, not pending.insert), False, fence)
+            )
+            return
+        state = inspect(row)
+        is_new = state.key is None and key not in self._inflight
+        values = _snapshot(row, changed_only=not is_new)
+        if values or is_new:
+            self._pending[key] = PendingWrite(row, values, is_new, fence)
+
+    def _schedule(self):
+        if len(self._pending) >= self.max_batch:
+            self._flush_soon()
+        elif (self._pending or self._callbacks) and self._timer is None:
+            self._timer = self._event_loop().call_later(
+                self.flush_interval, self._flush_soon
+            )
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # 新的事件循环（如测试之间）：重建锁，旧循环上的定时器失效
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._timer = None
+        return loop
+
+    def _get_lock(self) -> asyncio.Lock:
+        self._event_loop()
+        return self._lock
+
+    def _flush_soon(self):
+        """在后台刷新（定时器到期或达到批大小时）"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = self._event_loop().create_task(self._background_flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _background_flush(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Write-behind flush failed, will retry: {e}")
+            self._schedule()
+
+    async def _flush_batch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = list(self._pending.values())
+        callbacks = self._callbacks
+        self._pending = {}
+        self._callbacks = []
+        if not batch:
+            self._run_callbacks(callbacks)
+            return
+
+        self._inflight = {id(write.row) for write in batch if write.insert}
+        started = time.monotonic()
+        try:
+            maker = self.session_maker or async_session_maker
+            while True:
+                batch = self._drop_lost(batch)
+                try:
+                    async with maker() as db:
+                        await self._check_fences(db, batch)
+                        inserted = await self._write_batch(db, batch)
+                        await db.commit()
+                    break
+                except _LeaseLost as lost:
+                    # 事务已回滚：丢弃该 Executor 的行后重试其余的行
+                    lost.fence.mark_lost()
+        except Exception:
+            # 整批放回队首（之后入队的同一行写入合并到其后），下次刷新重试
+            scheduler_metrics.increment("write_behind_errors")
+            requeued = {id(write.row): write for write in batch}
+            for key, later in self._pending.items():
+                if key in requeued:
+                    requeued[key].merge(later)
+                else:
+                    requeued[key] = later
+            self._pending = requeued
+            self._callbacks = callbacks + self._callbacks
+            raise
+        finally:
+            self._inflight = set()
+
+        for write in batch:
+            if write.fenced_ticket and "lease_owner" in write.values:
+                # 租约已由 Executor 自己释放（或变更），之后的写入以新值为条件
+                write.fence.owner = write.values["lease_owner"]
+
+        for write, returned in inserted:
+            mapper = inspect(write.row).mapper
+            for column in mapper.local_table.c:
+                set_committed_value(
+                    write.row,
+                    mapper.get_property_by_column(column).key,
+                    returned._mapping[column],
+                )
+            make_transient_to_detached(write.row)
+
+        elapsed = time.monotonic() - started
+        scheduler_metrics.record_latency("write_behind_flush", elapsed)
+        scheduler_metrics.record_value("write_behind_batch_size", len(batch))
+        scheduler_metrics.increment("write_behind_flushes")
+        scheduler_metrics.increment("write_behind_rows", len(batch))
+        scheduler_metrics.set_gauge("write_behind_pending", len(self._pending))
+        logger.debug(f"Write-behind flushed {len(batch)} rows in {elapsed * 1000:.1f}ms")
+        self._run_callbacks(callbacks)
+
+    async def _check_fences(self, db, batch: list[PendingWrite]):
+        """在写入前检查本批涉及的租约，已丢失时抛出 _LeaseLost"""
+        fences = {write.fence for write in batch if write.fence is not None}
+        if not fences:
+            return
+        result = await db.execute(
+            select(Ticket.id, Ticket.lease_owner).where(
+                Ticket.id.in_({fence.ticket_id for fence in fences})
+            )
+        )
+        owners = dict(result.all())
+        for fence in fences:
+            if owners.get(fence.ticket_id) != fence.owner:
+                raise _LeaseLost(fence)
+
+    async def _write_batch(
+        self, db, batch: list[PendingWrite]
+    ) -> list[tuple[PendingWrite, Any]]:
+        """在 db 的事务中执行本批写入，返回插入的行及其返回值"""
+        inserted = []
+        for write in batch:
+            if write.insert and write.delete:
+                # 插入失败后放回队列期间又被删除：不再写入
+                continue
+            result = await db.execute(self._statement(write))
+            if write.insert:
+                inserted.append((write, result.one()))
+            elif write.fenced_ticket and result.rowcount == 0:
+                raise _LeaseLost(write.fence)
+        return inserted
+
+    @staticmethod
+    def _drop_lost(batch: list[PendingWrite]) -> list[PendingWrite]:
+        """丢弃租约已丢失的行"""
+        kept = [write for write in batch if write.fence is None or not write.fence.lost]
+        if len(kept) < len(batch):
+            scheduler_metrics.increment("write_behind_fenced", len(batch) - len(kept))
+        return kept
+
+    @staticmethod
+    def _run_callbacks(callbacks: list[Callable[[], None]]):
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Write-behind callback failed: {e}", exc_info=True)
+
+    @staticmethod
+    def _statement(write: PendingWrite):
+        mapper = inspect(write.row).mapper
+        table = mapper.local_table
+        values = {
+            mapper.attrs[key].columns[0].key: value
+            for key, value in write.values.items()
+        }
+        if write.insert:
+            return insert(table).values(values).returning(*table.c)
+        conditions = [
+            column == getattr(write.row, mapper.get_property_by_column(column).key)
+            for column in mapper.primary_key
+        ]
+        if write.delete:
+            return delete(table).where(*conditions)
+        if write.fenced_ticket:
+            conditions.append(table.c.lease_owner == write.fence.owner)
+        return update(table).where(*conditions).values(values)
+
+
+# 全局实例
+write_behind = WriteBehindBuffer()
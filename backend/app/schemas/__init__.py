@@ -10,7 +10,10 @@ from app.schemas.tool import ToolResponse
 from app.schemas.ticket import (
     TicketSummary,
     TicketResponse,
+    TicketUsage,
+    LLMCallResponse,
     CreateTicketRequest,
+    UpdateTicketRequest,
     StepResponse,
 )
 from app.schemas.session import (
@@ -19,6 +22,11 @@ from app.schemas.session import (
     MessageResponse,
     AddMessageRequest,
 )
+from app.schemas.scheduler import (
+    LatencySummary,
+    RateLimiterStats,
+    SchedulerStatsResponse,
+)
 
 __all__ = [
     "ErrorResponse",
@@ -28,10 +36,16 @@ __all__ = [
     "ToolResponse",
     "TicketSummary",
     "TicketResponse",
+    "TicketUsage",
+    "LLMCallResponse",
     "CreateTicketRequest",
+    "UpdateTicketRequest",
     "StepResponse",
     "SessionSummary",
     "SessionResponse",
     "MessageResponse",
     "AddMessageRequest",
+    "LatencySummary",
+    "RateLimiterStats",
+    "SchedulerStatsResponse",
 ]
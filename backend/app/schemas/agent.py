@@ -21,6 +21,46 @@ class AgentBase(BaseModel):
     max_iterations: int = Field(10, description="最大执行迭代次数", ge=1, le=100)
     default_params: Optional[Dict[str, Any]] = Field(None, description="默认参数")
     tool_names: Optional[List[str]] = Field(None, description="工具名称列表")
+    max_concurrency: Optional[int] = Field(
+        None, description="同时运行的最大 Ticket 数（为空使用全局默认）", ge=1
+    )
+    schedule_weight: int = Field(1, description="跨 Agent 公平调度权重", ge=1, le=100)
+    max_wall_seconds: Optional[float] = Field(
+        None, description="每个 Ticket 的墙钟时间上限（秒，0 表示不限制）", ge=0
+    )
+    max_input_tokens: Optional[int] = Field(
+        None, description="每个 Ticket 的输入 token 上限（含提示缓存写入/读取，0 表示不限制）", ge=0
+    )
+    max_output_tokens: Optional[int] = Field(
+        None, description="每个 Ticket 的输出 token 上限（0 表示不限制）", ge=0
+    )
+    max_cost_usd: Optional[float] = Field(
+        None, description="每个 Ticket 的估算费用上限（美元，0 表示不限制）", ge=0
+    )
+    llm_retry_max_retries: Optional[int] = Field(
+        None, description="模型调用瞬时错误的最大重试次数（为空使用全局默认）", ge=0
+    )
+    llm_retry_max_elapsed: Optional[float] = Field(
+        None, description="模型调用的最长重试时间（秒，0 表示不限制）", ge=0
+    )
+    model: Optional[str] = Field(
+        None,
+        max_length=100,
+        description="首选模型（为空使用 ANTHROPIC_MODEL），可写作 模型名@服务商",
+    )
+    fallback_models: Optional[List[str]] = Field(
+        None, description="首选模型失败或不健康时依次使用的回退模型"
+    )
+    model_cascade: bool = Field(
+        False,
+        description="级联模式：模型链按从便宜到强排列，失败或响应置信度低时升级",
+    )
+    cache_enabled: bool = Field(
+        False, description="相同内容的 Ticket 合并执行并复用已完成的结果"
+    )
+    cache_ttl: Optional[int] = Field(
+        None, description="已完成结果的缓存时长（秒，为空使用全局默认）", ge=0
+    )
 
 
 class AgentCreate(AgentBase):
@@ -40,6 +80,19 @@ class AgentUpdate(BaseModel):
     max_iterations: Optional[int] = Field(None, ge=1, le=100)
     default_params: Optional[Dict[str, Any]] = None
     tool_names: Optional[List[str]] = None
+    max_concurrency: Optional[int] = Field(None, ge=1)
+    schedule_weight: Optional[int] = Field(None, ge=1, le=100)
+    max_wall_seconds: Optional[float] = Field(None, ge=0)
+    max_input_tokens: Optional[int] = Field(None, ge=0)
+    max_output_tokens: Optional[int] = Field(None, ge=0)
+    max_cost_usd: Optional[float] = Field(None, ge=0)
+    llm_retry_max_retries: Optional[int] = Field(None, ge=0)
+    llm_retry_max_elapsed: Optional[float] = Field(None, ge=0)
+    model: Optional[str] = Field(None, max_length=100)
+    fallback_models: Optional[List[str]] = None
+    model_cascade: Optional[bool] = None
+    cache_enabled: Optional[bool] = None
+    cache_ttl: Optional[int] = Field(None, ge=0)
 
 
 class AgentToolUpdate(BaseModel):
@@ -52,6 +105,7 @@ class AgentResponse(AgentBase):
     """Agent 响应模型"""
 
     id: str
+    version: int = 1
     created_at: datetime
     updated_at: datetime
     tools: List["ToolResponse"] = Field(
@@ -61,6 +115,15 @@ class AgentResponse(AgentBase):
     class Config:
         from_attributes = True
 
+    @field_validator("fallback_models", mode="before")
+    def parse_fallback_models(cls, v):
+        if isinstance(v, str):
+            try:
+                return json.loads(v)
+            except json.JSONDecodeError:
+                return None
+        return v
+
     @field_validator("params_schema", mode="before")
     def parse_params_schema(cls, v):
         if isinstance(v, str):
@@ -0,0 +1,87 @@
+"""Scheduler Schemas"""
+
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+
+class LatencySummary(BaseModel):
+    """耗时摘要（毫秒）"""
+
+    count: int
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    max_ms: float
+
+
+class ValueSummary(BaseModel):
+    """数值分布摘要"""
+
+    count: int
+    mean: float
+    p50: float
+    p95: float
+    max: float
+
+
+class RateLimiterStats(BaseModel):
+    """LLM 限流器状态"""
+
+    requests_per_minute: float = Field(..., description="请求数限额，0 表示不限制")
+    tokens_per_minute: float = Field(..., description="token 数限额，0 表示不限制")
+    available_requests: Optional[float] = None
+    available_tokens: Optional[float] = None
+    concurrency_window: float = Field(..., description="当前 AIMD 并发窗口")
+    max_concurrency: int
+    in_flight: int
+    queue_depth: int = Field(..., description="等待放行的调用数")
+    paused_for_s: float = Field(..., description="因 retry-after 剩余的暂停时间")
+    rate_limited_total: int
+
+
+class ModelRouteStats(BaseModel):
+    """一个 模型@服务商 最近调用的滚动统计"""
+
+    calls: int
+    error_rate: float
+    p50_ms: float
+    p95_ms: float
+    healthy: bool = Field(..., description="不健康的目标排在回退链末尾")
+
+
+class SchedulerStatsResponse(BaseModel):
+    """调度器指标响应"""
+
+    queue_wait: Dict[str, LatencySummary] = Field(
+        default_factory=dict, description="各 lane 的排队等待时间"
+    )
+    latency: Dict[str, LatencySummary] = Field(
+        default_factory=dict,
+        description=(
+            "耗时指标（llm_first_token: 首个可见 token，llm_call: 完整模型调用，"
+            "llm_retry_wait: 重试前的退避等待，write_behind_flush: 批量写入的提交，"
+            "log_emit: 日志入队）"
+        ),
+    )
+    values: Dict[str, ValueSummary] = Field(
+        default_factory=dict,
+        description=(
+            "数值分布指标（write_behind_batch_size: 每次批量提交的行数，"
+            "log_records_per_iteration / log_chars_per_iteration: Executor 每轮的日志量）"
+        ),
+    )
+    gauges: Dict[str, float] = Field(default_factory=dict)
+    counters: Dict[str, int] = Field(
+        default_factory=dict,
+        description=(
+            "累计计数（llm_retries: 模型调用重试，llm_retries_exhausted: 重试后仍失败，"
+            "llm_fallbacks: 回退到下一个模型/服务商，llm_escalations: 级联升级，"
+            "write_behind_rows / write_behind_flushes: 批量写入的行数和提交次数，"
+            "log_records / log_chars: 日志条数和字符数）"
+        ),
+    )
+    rate_limiter: Optional[RateLimiterStats] = None
+    models: Dict[str, ModelRouteStats] = Field(
+        default_factory=dict, description="各 模型@服务商 的滚动耗时和错误率"
+    )
@@ -16,6 +16,7 @@ class MessageResponse(BaseModel):
     role: MessageRole
     content: str
     timestamp: datetime
+    partial: bool = False
 
     class Config:
         from_attributes = True
@@ -43,6 +43,8 @@ class TicketSummary(BaseModel):
     agent_id: str
     agent_name: str
     status: TicketStatus
+    priority: int = 0
+    run_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
@@ -50,16 +52,66 @@ class TicketSummary(BaseModel):
         from_attributes = True
 
 
-class TicketResponse(BaseModel):
+class TicketUsage(BaseModel):
+    """Ticket 累计用量"""
+
+    iterations: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_write_tokens: int = 0
+    cache_read_tokens: int = 0
+    cost_usd: float = 0.0
+    wall_seconds: float = 0.0
+
+
+class LLMCallResponse(BaseModel):
+    """单次模型调用记录"""
+
+    id: int
+    session_id: Optional[str] = None
+    model: str
+    provider: Optional[str] = Field(None, description="服务商（回退时为实际调用的服务商）")
+    stop_reason: Optional[str] = None
+    input_tokens: int
+    output_tokens: int
+    cache_write_tokens: int
+    cache_read_tokens: int
+    cost_usd: float
+    latency_ms: float
+    first_token_ms: Optional[float] = None
+    retries: int = 0
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class TicketBudgetFields(BaseModel):
+    """Ticket 预算（为空使用 Agent 的设置，0 表示不限制）"""
+
+    max_iterations: Optional[int] = Field(None, description="最大迭代次数", ge=1)
+    max_wall_seconds: Optional[float] = Field(None, description="墙钟时间上限（秒）", ge=0)
+    max_input_tokens: Optional[int] = Field(None, description="输入 token 上限（含提示缓存写入/读取）", ge=0)
+    max_output_tokens: Optional[int] = Field(None, description="输出 token 上限", ge=0)
+    max_cost_usd: Optional[float] = Field(None, description="估算费用上限（美元）", ge=0)
+
+
+class TicketResponse(TicketBudgetFields):
     """Ticket 详情响应"""
 
     id: str
     agent_id: str
     agent_name: str
     status: TicketStatus
+    priority: int = 0
+    run_at: Optional[datetime] = None
+    repeat_interval: Optional[int] = None
     params: Optional[dict[str, Any]] = None
     context: Optional[dict[str, Any]] = None
     error_message: Optional[str] = None
+    failure_reason: Optional[str] = None
+    result: Optional[dict[str, Any]] = None
+    usage: TicketUsage = Field(default_factory=TicketUsage)
     steps: List[StepResponse] = Field(default_factory=list)
     sessions: List[SessionSummary] = Field(default_factory=list)  # 新增
     current_session_id: Optional[str] = None
@@ -70,9 +122,27 @@ class TicketResponse(BaseModel):
         from_attributes = True
 
 
-class CreateTicketRequest(BaseModel):
+class CreateTicketRequest(TicketBudgetFields):
     """创建 Ticket 请求"""
 
     agent_id: str
     params: Optional[dict[str, Any]] = None
     context: Optional[dict[str, Any]] = None
+    priority: int = Field(0, description="派发优先级，越大越先派发", ge=0, le=100)
+    run_at: Optional[datetime] = Field(None, description="定时执行时间，为空则立即执行")
+    repeat_interval: Optional[int] = Field(
+        None, description="重复间隔（秒），从 run_at 开始周期执行", ge=60
+    )
+    use_cache: bool = Field(
+        True, description="Agent 启用缓存时是否复用相同内容的 Ticket，False 强制重新执行"
+    )
+
+
+class UpdateTicketRequest(BaseModel):
+    """更新 Ticket 请求（仅 pending/scheduled 状态）"""
+
+    priority: Optional[int] = Field(None, ge=0, le=100)
+    run_at: Optional[datetime] = Field(None, description="显式置空表示立即执行")
+    repeat_interval: Optional[int] = Field(
+        None, description="显式置空表示取消重复", ge=60
+    )
@@ -0,0 +1,107 @@
+"""Ticket Cache Service
+
+Content-addressed deduplication for Ticket creation (opt-in per Agent).
+
+缓存键 = hash(Agent ID, Agent 版本, 编译后的 prompt 的 hash, params, context)：
+- 相同缓存键的 Ticket 正在执行（pending/running/suspended）时，
+  新请求直接挂到该 Ticket 上（single-flight），不再重复执行
+- TTL 内已完成的相同 Ticket 直接返回其结果
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import TICKET_CACHE_TTL
+from app.models.agent import Agent
+from app.models.ticket import Ticket, TicketStatus
+
+logger = logging.getLogger(__name__)
+
+CACHE_HIT = "hit"
+CACHE_COALESCED = "coalesced"
+CACHE_MISS = "miss"
+
+# 仍在执行中（可被新请求挂靠）的状态
+IN_FLIGHT_STATUSES = (
+    TicketStatus.PENDING.value,
+    TicketStatus.RUNNING.value,
+    TicketStatus.SUSPENDED.value,
+)
+
+# cache_key -> 锁，保证同一进程内相同请求串行查找/创建
+_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+_lock_users: Dict[str, int] = defaultdict(int)
+
+
+def compute_cache_key(
+    agent: Agent, params: Optional[Dict[str, Any]], context: Optional[Dict[str, Any]]
+) -> str:
+    """计算 Ticket 内容的缓存键"""
+    from app.services.prompt_compiler import compile_system_message
+
+    compiled = compile_system_message(
+        skill_name=agent.skill_name, agent_prompt=agent.prompt, params=params or {}
+    )
+    payload = {
+        "agent_id": agent.id,
+        "agent_version": agent.version,
+        "prompt": hashlib.sha256(compiled.encode("utf-8")).hexdigest(),
+        "params": params or {},
+        "context": context or {},
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+async def find_cached_ticket(
+    db: AsyncSession, agent: Agent, cache_key: str
+) -> tuple[Optional[Ticket], str]:
+    """查找可复用的 Ticket，返回 (Ticket, CACHE_COALESCED / CACHE_HIT) 或 (None, CACHE_MISS)"""
+    result = await db.execute(
+        select(Ticket)
+        .where(Ticket.cache_key == cache_key, Ticket.status.in_(IN_FLIGHT_STATUSES))
+        .order_by(Ticket.created_at)
+        .limit(1)
+    )
+    ticket = result.scalar_one_or_none()
+    if ticket:
+        return ticket, CACHE_COALESCED
+
+    ttl = agent.cache_ttl if agent.cache_ttl is not None else TICKET_CACHE_TTL
+    if ttl <= 0:
+        return None, CACHE_MISS
+    result = await db.execute(
+        select(Ticket)
+        .where(
+            Ticket.cache_key == cache_key,
+            Ticket.status == TicketStatus.COMPLETED.value,
+            Ticket.updated_at >= datetime.utcnow() - timedelta(seconds=ttl),
+        )
+        .order_by(Ticket.updated_at.desc())
+        .limit(1)
+    )
+    ticket = result.scalar_one_or_none()
+    return (ticket, CACHE_HIT) if ticket else (None, CACHE_MISS)
+
+
+@asynccontextmanager
+async def single_flight(cache_key: str):
+    """相同缓存键的创建请求在进程内串行执行（查找 + 创建 + 提交）"""
+    _lock_users[cache_key] += 1
+    try:
+        async with _locks[cache_key]:
+            yield
+    finally:
+        _lock_users[cache_key] -= 1
+        if not _lock_users[cache_key]:
+            del _lock_users[cache_key]
+            _locks.pop(cache_key, None)
@@ -35,9 +35,12 @@ def get_tool_executor(tool_name: str) -> Callable[[dict], Awaitable[str]] | None
 
 
 def get_all_tools_for_agent(agent) -> list[dict]:
-    """获取 Agent 可用的所有工具定义（Claude API 格式）"""
+    """获取 Agent 可用的所有工具定义（Claude API 格式）
+
+    按工具名排序，保证每次请求的工具列表一致（提示缓存按前缀匹配）。
+    """
     tools = []
-    for tool in agent.tools:
+    for tool in sorted(agent.tools, key=lambda t: t.name):
         schema = (
             json.loads(tool.schema) if isinstance(tool.schema, str) else tool.schema
         )
@@ -6,7 +6,10 @@ from app.tools.registry import register_tool
 
 
 @register_tool(
-    name="execute_command", description="执行 shell 命令", input_schema={"command": str}
+    name="execute_command",
+    description="执行 shell 命令",
+    input_schema={"command": str},
+    serial=True,
 )
 async def execute_command(params: dict[str, Any]) -> str:
     """执行 shell 命令
@@ -42,6 +45,10 @@ async def execute_command(params: dict[str, Any]) -> str:
         except asyncio.TimeoutError:
             process.kill()
             return "Error: Command timed out after 60 seconds"
+        except asyncio.CancelledError:
+            # Ticket 被取消：结束子进程，避免其在后台继续运行
+            process.kill()
+            raise
 
         # 构建输出
         result_parts = []
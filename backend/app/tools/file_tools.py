@@ -47,6 +47,7 @@ async def read_file(params: dict[str, Any]) -> str:
     name="write_file",
     description="写入文件内容",
     input_schema={"path": str, "content": str},
+    serial=True,
 )
 async def write_file(params: dict[str, Any]) -> str:
     """写入文件内容
@@ -5,11 +5,20 @@ import httpx
 from typing import Any
 from app.tools.registry import register_tool
 
+# 无副作用的请求方法，同一轮中可与其它工具调用并发执行
+SAFE_METHODS = {"GET", "HEAD"}
+
+
+def _is_write_request(params: dict[str, Any]) -> bool:
+    """POST/PUT/DELETE 等写请求按调用顺序串行执行"""
+    return str(params.get("method") or "GET").upper() not in SAFE_METHODS
+
 
 @register_tool(
     name="http_request",
     description="发送 HTTP 请求",
     input_schema={"url": str, "method": str, "headers": dict, "body": str},
+    serial=_is_write_request,
 )
 async def http_request(params: dict[str, Any]) -> str:
     """发送 HTTP 请求
@@ -18,18 +18,22 @@ class ToolDefinition:
         input_schema: dict,
         sdk_tool_func: Callable,  # SDK 包装后的函数
         original_func: Callable,  # 原始函数
+        # 有副作用，不与同一轮的其它工具调用并发执行；可为按调用参数判断的函数
+        serial: bool | Callable[[dict[str, Any]], bool] = False,
     ):
         self.name = name
         self.description = description
         self.input_schema = input_schema
         self.sdk_tool_func = sdk_tool_func
         self.original_func = original_func
+        self.serial = serial
 
 
 def register_tool(
     name: str,
     description: str,
     input_schema: dict[str, type] | dict,
+    serial: bool | Callable[[dict[str, Any]], bool] = False,
 ):
     """
     统一工具注册装饰器
@@ -40,6 +44,9 @@ def register_tool(
 
     目前支持的 input_schema 格式：
     SDK 简写格式: {"path": str, "content": str}
+
+    serial=True 的工具（写文件、执行命令、系统工具等有副作用的工具）在同一轮中
+    不与其它工具调用并发执行。serial 为函数时按每次调用的参数判断（如只读请求可并发）。
     """
 
     def decorator(func: Callable[[dict[str, Any]], Awaitable[dict[str, Any]]]):
@@ -57,6 +64,7 @@ def register_tool(
             input_schema=json_schema,
             sdk_tool_func=sdk_wrapped,
             original_func=func,
+            serial=serial,
         )
 
         # 返回 SDK 包装后的函数，以便在那直接使用
@@ -121,6 +129,16 @@ def get_all_registered_tools() -> dict[str, ToolDefinition]:
     return _TOOL_REGISTRY.copy()
 
 
+def is_serial_tool(name: str, tool_input: dict[str, Any] | None = None) -> bool:
+    """工具调用是否必须串行执行（未注册的工具按可并发处理，按参数判断的工具缺少参数时串行）"""
+    definition = _TOOL_REGISTRY.get(name)
+    if definition is None:
+        return False
+    if callable(definition.serial):
+        return not isinstance(tool_input, dict) or bool(definition.serial(tool_input))
+    return definition.serial
+
+
 def get_sdk_tools_for_agent(tool_names: list[str]) -> list[Callable]:
     """获取 Agent 可用的 SDK 工具函数列表"""
     tools = []
@@ -1,7 +1,9 @@
 import json
 import logging
+from sqlalchemy.orm.attributes import set_committed_value
 from app.tools.registry import register_tool
 from app.scheduler.context import execution_context
+from app.scheduler.write_behind import release_lease, write_behind
 from app.models.step import Step
 
 # Status enums are strings in models, but nice to have constants if available.
@@ -16,20 +18,23 @@ logger = logging.getLogger(__name__)
     name="request_human_input",
     description="请求人工介入，暂停任务等待用户输入。当你需要用户提供额外信息、确认操作或做出决策时使用此工具。",
     input_schema={"prompt": str},
+    serial=True,
 )
 async def request_human_input(args: dict) -> dict:
     """请求人工介入 - 符合 SDK 工具格式"""
     prompt = args.get("prompt", "")
 
     ctx = execution_context.get()
-    db = ctx.db
     ticket = ctx.ticket
     session = ctx.session
     executor = ctx.executor
 
     ticket.status = TicketStatus.SUSPENDED.value
     session.status = SessionStatus.SUSPENDED.value
-    await db.commit()
+    release_lease(ticket)
+    # 状态变化与之前的消息一起落库（以 Executor 的租约为条件）
+    write_behind.save(ticket, session, fence=ctx.fence)
+    await write_behind.flush()
     executor.stop()
 
     logger.info(f"Ticket {ticket.id[:8]} suspended for human input")
@@ -44,6 +49,7 @@ async def request_human_input(args: dict) -> dict:
     name="complete_task",
     description="标记任务完成。当任务目标已达成时调用此工具。",
     input_schema={"summary": str},
+    serial=True,
 )
 async def complete_task(args: dict) -> dict:
     """标记任务完成 - 符合 SDK 工具格式"""
@@ -51,16 +57,17 @@ async def complete_task(args: dict) -> dict:
     summary = args.get("summary", "")
 
     ctx = execution_context.get()
-    db = ctx.db
     ticket = ctx.ticket
     session = ctx.session
     executor = ctx.executor
 
     ticket.status = TicketStatus.COMPLETED.value
     session.status = SessionStatus.COMPLETED.value
+    release_lease(ticket)
 
     # Commit status changes immediately
-    await db.commit()
+    write_behind.save(ticket, session, fence=ctx.fence)
+    await write_behind.flush()
 
     executor.stop()
 
@@ -72,13 +79,13 @@ async def complete_task(args: dict) -> dict:
     name="fail_task",
     description="标记任务失败。当遇到无法恢复的错误时调用此工具。",
     input_schema={"error": str},
+    serial=True,
 )
 async def fail_task(args: dict) -> dict:
     """标记任务失败 - 符合 SDK 工具格式"""
     error = args.get("error", "")
 
     ctx = execution_context.get()
-    db = ctx.db
     ticket = ctx.ticket
     session = ctx.session
     executor = ctx.executor
@@ -86,7 +93,9 @@ async def fail_task(args: dict) -> dict:
     ticket.status = TicketStatus.FAILED.value
     ticket.error_message = error
     session.status = SessionStatus.FAILED.value
-    await db.commit()
+    release_lease(ticket)
+    write_behind.save(ticket, session, fence=ctx.fence)
+    await write_behind.flush()
     executor.stop()
 
     logger.info(f"Ticket {ticket.id[:8]} failed: {error}")
@@ -100,6 +109,7 @@ async def fail_task(args: dict) -> dict:
     name="add_step",
     description="添加一个任务步骤。用于记录任务的子步骤进度。",
     input_schema={"title": str, "status": str},
+    serial=True,
 )
 async def add_step(args: dict) -> dict:
     """添加任务步骤 - 符合 SDK 工具格式"""
@@ -108,14 +118,13 @@ async def add_step(args: dict) -> dict:
 
     ctx = execution_context.get()
     ticket = ctx.ticket
-    db = ctx.db
 
     step_idx = len(ticket.steps)
     step = Step(
         ticket_id=ticket.id, idx=step_idx, title=title, status=status, result=None
     )
-    db.add(step)
-    ticket.steps.append(step)
-    await db.commit()
+    # 步骤由 write_behind 插入，不经 Ticket 关系的级联写入
+    write_behind.save(step, fence=ctx.fence)
+    set_committed_value(ticket, "steps", [*ticket.steps, step])
 
     return {"content": [{"type": "text", "text": f"步骤 {step_idx} 已添加: {title}"}]}
@@ -0,0 +1,140 @@
+"""Benchmark: 长会话中每轮构建模型消息的 CPU 开销与内存占用
+
+模拟一个 --turns 轮的 Ticket（每轮一条 assistant tool_use 消息 + 一条工具结果）：
+- 旧实现：内存中保存 ORM Message 列表，每轮按时间重新排序并重新解析所有 JSON 构建消息
+- 当前 ConversationBuffer：加载时构建一次，之后每轮只追加
+
+输出整个 Ticket 构建消息的总耗时、最后一轮的耗时，以及会话在内存中的占用（tracemalloc）。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_conversation --turns 200 500
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.common import use_temp_database
+
+use_temp_database()
+
+from app.models.message import Message, MessageRole  # noqa: E402
+from app.scheduler.conversation import ConversationBuffer  # noqa: E402
+
+
+def legacy_build_messages(history: list[Message]) -> list:
+    """旧实现的 _build_messages（每轮全量重建）"""
+    messages = []
+    pending = []
+    for msg in sorted(history, key=lambda m: m.timestamp):
+        if msg.role == MessageRole.SYSTEM.value:
+            continue
+        if msg.role in (MessageRole.USER.value, MessageRole.ASSISTANT.value) and pending:
+            messages.append({"role": "user", "content": pending})
+            pending = []
+        if msg.role == MessageRole.USER.value:
+            messages.append({"role": "user", "content": msg.content})
+        elif msg.role == MessageRole.ASSISTANT.value:
+            content = json.loads(msg.content)
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": [b for b in content if b.get("type") != "thinking"],
+                }
+            )
+        elif msg.role == MessageRole.TOOL.value:
+            result = json.loads(msg.content)
+            pending.append(
+                {
+                    "type": "tool_result",
+                    "tool_use_id": result["tool_use_id"],
+                    "content": result["result"],
+                }
+            )
+    if pending:
+        messages.append({"role": "user", "content": pending})
+    return messages
+
+
+def turn_rows(turn: int) -> list[tuple[str, str, object]]:
+    """一轮的消息：(role, 数据库内容, 已解析内容)"""
+    blocks = [
+        {"type": "text", "text": f"Reading chunk {turn}"},
+        {
+            "type": "tool_use",
+            "id": f"toolu_{turn}",
+            "name": "read_file",
+            "input": {"path": f"f{turn}"},
+        },
+    ]
+    result = {
+        "tool_use_id": f"toolu_{turn}",
+        "tool_name": "read_file",
+        "result": "x" * 2000,
+    }
+    return [
+        (MessageRole.ASSISTANT.value, json.dumps(blocks), blocks),
+        (MessageRole.TOOL.value, json.dumps(result), result),
+    ]
+
+
+def orm_message(role: str, content: str) -> Message:
+    return Message(session_id="s", role=role, content=content, timestamp=datetime.now())
+
+
+def run_legacy(turns: int) -> tuple[float, float, int]:
+    tracemalloc.start()
+    history = [
+        orm_message(MessageRole.SYSTEM.value, "system"),
+        orm_message(MessageRole.USER.value, "start"),
+    ]
+    total = last = 0.0
+    for turn in range(turns):
+        start = time.perf_counter()
+        legacy_build_messages(history)
+        last = time.perf_counter() - start
+        total += last
+        for role, content, _ in turn_rows(turn):
+            history.append(orm_message(role, content))
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return total, last, memory
+
+
+def run_buffer(turns: int) -> tuple[float, float, int]:
+    tracemalloc.start()
+    buffer = ConversationBuffer()
+    buffer.add(MessageRole.SYSTEM.value, "system")
+    buffer.add(MessageRole.USER.value, "start")
+    total = last = 0.0
+    for turn in range(turns):
+        start = time.perf_counter()
+        buffer.api_messages()
+        last = time.perf_counter() - start
+        total += last
+        for role, content, parsed in turn_rows(turn):
+            # 数据库内容随 Message 写入后即释放，缓冲只保留解析后的结构
+            buffer.add(role, content, parsed)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return total, last, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[200, 500])
+    args = parser.parse_args()
+
+    for turns in args.turns:
+        for name, fn in (("rebuild (legacy)", run_legacy), ("append buffer", run_buffer)):
+            total, last, memory = fn(turns)
+            print(
+                f"{turns:>5} turns  {name:<18} total={total * 1000:9.1f}ms  "
+                f"last turn={last * 1000:7.3f}ms  memory={memory / 1024:8.0f}KiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Benchmark: 大量积压时的派发周期耗时与写入阻塞
+
+写入 --tickets 个 pending Ticket（其中一部分带若干历史 Session），然后反复执行一次派发周期：
+- 旧实现的加载方式：selectinload 全部 pending Ticket 及其 Agent、所有 Session
+- 当前 Dispatcher._dispatch_pending_tickets：有界批次、只取所需列、批量认领并创建 Session
+
+派发周期运行期间，另一个任务不断执行单行写入并提交（模拟 API 请求），
+记录其最大等待时间，用于观察派发事务对 SQLite 写入者的阻塞。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_dispatch_batch --tickets 10000 --rounds 5
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+from unittest.mock import patch
+
+from benchmarks.common import report, use_temp_database
+
+use_temp_database()
+
+from sqlalchemy import delete, select, update  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+from app.database import async_session_maker, init_db  # noqa: E402
+from app.models.agent import Agent  # noqa: E402
+from app.models.session import Session, SessionStatus  # noqa: E402
+from app.models.ticket import Ticket, TicketStatus  # noqa: E402
+from app.scheduler import Dispatcher  # noqa: E402
+from app.scheduler.worker_pool import WorkerPool  # noqa: E402
+
+AGENTS = 10
+
+
+class IdleExecutor:
+    """运行到被取消为止的假 Executor（只测派发本身）"""
+
+    def __init__(self, ticket_id: str, session_id: str):
+        pass
+
+    async def run(self):
+        await asyncio.Event().wait()
+
+    def stop(self):
+        pass
+
+
+async def prepare(tickets: int, history: int):
+    """写入 pending Ticket，每 10 个 Ticket 中有一个带 history 个已结束的 Session"""
+    await init_db()
+    async with async_session_maker() as db:
+        await db.execute(delete(Session))
+        await db.execute(delete(Ticket))
+        await db.execute(delete(Agent))
+        agent_ids = [str(uuid.uuid4()) for _ in range(AGENTS)]
+        db.add_all(
+            Agent(id=agent_id, name=f"Agent {i}", prompt="benchmark", max_concurrency=16)
+            for i, agent_id in enumerate(agent_ids)
+        )
+        for i in range(tickets):
+            ticket_id = str(uuid.uuid4())
+            db.add(
+                Ticket(id=ticket_id, agent_id=agent_ids[i % AGENTS], priority=i % 3)
+            )
+            if i % 10 == 0:
+                db.add_all(
+                    Session(
+                        id=str(uuid.uuid4()),
+                        ticket_id=ticket_id,
+                        status=SessionStatus.COMPLETED.value,
+                        context="x" * 2000,
+                    )
+                    for _ in range(history)
+                )
+        await db.commit()
+
+
+async def reset():
+    """撤销上一轮派发：Ticket 放回 pending，删除其新建的 Session"""
+    async with async_session_maker() as db:
+        await db.execute(
+            delete(Session).where(Session.status == SessionStatus.ACTIVE.value)
+        )
+        await db.execute(
+            update(Ticket)
+            .where(Ticket.status == TicketStatus.RUNNING.value)
+            .values(
+                status=TicketStatus.PENDING.value,
+                lease_owner=None,
+                lease_expires_at=None,
+            )
+        )
+        await db.commit()
+
+
+async def legacy_load():
+    """旧实现的加载方式（不含逐个认领）"""
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(Ticket)
+            .options(selectinload(Ticket.agent), selectinload(Ticket.sessions))
+            .where(Ticket.status == TicketStatus.PENDING.value)
+            .order_by(Ticket.created_at)
+        )
+        return len(result.scalars().all())
+
+
+async def dispatch_cycle(workers: int):
+    """执行一次当前实现的派发周期"""
+    dispatcher = Dispatcher(
+        pool=WorkerPool(max_workers=workers, default_agent_limit=workers)
+    )
+    await dispatcher._dispatch_pending_tickets()
+    # 取消的 Executor 不会被 Dispatcher 挂起，reset() 统一放回 pending
+    tasks = list(dispatcher.pool._tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def measure(cycle) -> tuple[float, float]:
+    """执行 cycle，返回 (耗时, 同时进行的单行写入的最大耗时)，单位毫秒"""
+    done = asyncio.Event()
+    writes: list[float] = []
+
+    async def writer():
+        while not done.is_set():
+            start = time.perf_counter()
+            async with async_session_maker() as db:
+                agent = await db.get(Agent, (await db.scalar(select(Agent.id))))
+                agent.description = uuid.uuid4().hex
+                await db.commit()
+            writes.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.005)
+
+    task = asyncio.create_task(writer())
+    await asyncio.sleep(0.02)
+    start = time.perf_counter()
+    await cycle()
+    elapsed = (time.perf_counter() - start) * 1000
+    done.set()
+    await task
+    return elapsed, max(writes)
+
+
+async def run(tickets: int, history: int, rounds: int, workers: int):
+    await prepare(tickets, history)
+    legacy, legacy_writes, current, current_writes = [], [], [], []
+    for _ in range(rounds):
+        elapsed, blocked = await measure(legacy_load)
+        legacy.append(elapsed)
+        legacy_writes.append(blocked)
+
+        elapsed, blocked = await measure(lambda: dispatch_cycle(workers))
+        current.append(elapsed)
+        current_writes.append(blocked)
+        await reset()
+
+    print(f"{tickets} pending tickets, {workers} free worker slots")
+    report("legacy full load", legacy)
+    report("  max concurrent write", legacy_writes)
+    report("batched dispatch cycle", current)
+    report("  max concurrent write", current_writes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=10000)
+    parser.add_argument("--history", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    with patch(
+        "app.scheduler.worker_pool.ExecutorFactory.create_executor", IdleExecutor
+    ):
+        asyncio.run(run(args.tickets, args.history, args.rounds, args.workers))
+
+
+if __name__ == "__main__":
+    main()
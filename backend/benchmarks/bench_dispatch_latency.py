@@ -0,0 +1,78 @@
+"""Benchmark: Ticket 创建到首次 LLM 调用的延迟
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_dispatch_latency --tickets 20
+    python -m benchmarks.bench_dispatch_latency --poll-only --interval 2
+
+--poll-only 屏蔽 notifier 唤醒，仅依靠 Dispatcher 轮询，用于和事件驱动派发对比。
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from unittest.mock import patch
+
+from benchmarks.common import FakeAnthropic, report, use_temp_database
+
+use_temp_database()
+
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.database import init_db  # noqa: E402
+from app.scheduler import Dispatcher  # noqa: E402
+
+
+async def run(tickets: int, interval: float) -> list[float]:
+    await init_db()
+
+    dispatcher = Dispatcher(interval=interval)
+    await dispatcher.start()
+
+    latencies = []
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        res = await client.post(
+            "/api/agents", json={"name": "Bench Agent", "prompt": "benchmark"}
+        )
+        agent_id = res.json()["id"]
+
+        for _ in range(tickets):
+            seen = len(FakeAnthropic.calls)
+            start = time.perf_counter()
+            res = await client.post("/api/tickets", json={"agent_id": agent_id})
+            assert res.status_code == 201, res.text
+
+            while len(FakeAnthropic.calls) == seen:
+                await asyncio.sleep(0.001)
+            latencies.append((FakeAnthropic.calls[seen] - start) * 1000)
+
+    dispatcher.stop()
+    # 等待最后一个 Executor 收尾
+    await asyncio.sleep(0.1)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=30.0)
+    parser.add_argument("--poll-only", action="store_true")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with patch("anthropic.AsyncAnthropic", FakeAnthropic):
+        if args.poll_only:
+            with patch("app.routers.tickets.notify_ticket_ready", lambda: None):
+                latencies = asyncio.run(run(args.tickets, args.interval))
+        else:
+            latencies = asyncio.run(run(args.tickets, args.interval))
+
+    mode = "poll-only" if args.poll_only else "event-driven"
+    report(f"create->first LLM call ({mode})", latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark: N 个并发 Ticket 的模型调用是否重叠执行
+
+每次模型调用固定等待 --latency-ms（await，模拟网络往返）。所有 Executor 共享
+同一个 AsyncAnthropic 客户端，调用直接在事件循环上 await，N 个 Ticket 的总耗时
+应接近单次延迟，而不是 N × 延迟；同时输出观测到的最大并发调用数。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_llm_overlap --tickets 1 10 50
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+
+from benchmarks.common import FakeAnthropic, install_fake_anthropic, use_temp_database
+
+use_temp_database()
+
+from sqlalchemy import delete, func, select  # noqa: E402
+
+from app.database import async_session_maker, engine, init_db  # noqa: E402
+from app.models.agent import Agent  # noqa: E402
+from app.models.session import Session  # noqa: E402
+from app.models.ticket import Ticket, TicketStatus  # noqa: E402
+from app.scheduler import Dispatcher  # noqa: E402
+from app.scheduler.llm_client import close_llm_client  # noqa: E402
+from app.scheduler.worker_pool import WorkerPool  # noqa: E402
+
+MAX_WORKERS = 64
+
+
+async def run(tickets: int) -> float:
+    """执行一轮，返回全部 Ticket 完成的耗时（秒）"""
+    await init_db()
+    async with async_session_maker() as db:
+        await db.execute(delete(Session))
+        await db.execute(delete(Ticket))
+        agent = (await db.execute(select(Agent))).scalars().first()
+        if agent is None:
+            agent = Agent(id=str(uuid.uuid4()), name="Bench Agent", prompt="benchmark")
+            db.add(agent)
+        agent.max_concurrency = MAX_WORKERS
+        await db.flush()
+        db.add_all(
+            Ticket(id=str(uuid.uuid4()), agent_id=agent.id) for _ in range(tickets)
+        )
+        await db.commit()
+
+    FakeAnthropic.max_in_flight = 0
+    pool = WorkerPool(max_workers=MAX_WORKERS, default_agent_limit=MAX_WORKERS)
+    dispatcher = Dispatcher(pool=pool)
+
+    start = time.perf_counter()
+    await dispatcher.start()
+    while True:
+        async with async_session_maker() as db:
+            done = await db.scalar(
+                select(func.count()).where(
+                    Ticket.status.in_(
+                        [TicketStatus.COMPLETED.value, TicketStatus.FAILED.value]
+                    )
+                )
+            )
+        if done >= tickets:
+            break
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    await dispatcher.shutdown(timeout=5)
+    await close_llm_client()
+    await engine.dispose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    latency = args.latency_ms / 1000
+    install_fake_anthropic(latency=latency)
+
+    for tickets in args.tickets:
+        elapsed = asyncio.run(run(tickets))
+        print(
+            f"{tickets:>4} tickets  wall={elapsed * 1000:8.1f}ms  "
+            f"serial={tickets * latency * 1000:8.1f}ms  "
+            f"max in-flight calls={FakeAnthropic.max_in_flight}"
+        )
+
+
+if __name__ == "__main__":
+    main()
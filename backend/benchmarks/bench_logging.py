@@ -0,0 +1,131 @@
+"""Benchmark: 长会话中每轮日志的输出量和在调用线程上的耗时
+
+模拟一个 --turns 轮的 Ticket（每轮一条 assistant tool_use 消息 + 一条 2000 字符的工具结果），
+每轮记录一次请求日志，日志写入临时文件：
+- 旧实现：INFO 级别记录 str(messages)（整个会话），同步 FileHandler 在调用线程写盘
+- 当前实现：请求内容以 DEBUG 级别、按 Ticket 抽样记录最新一条消息（截断），
+  QueueHandler 入队后由输出线程写盘；分别测 INFO 级别（不记录内容）和抽中的 Ticket（DEBUG）
+
+输出每种方式写入的日志大小、每轮平均大小和调用线程上的总耗时/最后一轮耗时。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_logging --turns 200 500
+"""
+
+import argparse
+import logging
+import queue
+import tempfile
+import time
+from logging.handlers import QueueListener
+from pathlib import Path
+
+from benchmarks.common import use_temp_database
+
+use_temp_database()
+
+from app.logging_config import MeteredQueueHandler, Payload  # noqa: E402
+from app.scheduler.metrics import SchedulerMetrics  # noqa: E402
+
+FORMAT = "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s"
+
+
+def turn_messages(turn: int) -> list[dict]:
+    """一轮新增的 API 格式消息"""
+    return [
+        {
+            "role": "assistant",
+            "content": [
+                {"type": "text", "text": f"Reading chunk {turn}"},
+                {
+                    "type": "tool_use",
+                    "id": f"toolu_{turn}",
+                    "name": "read_file",
+                    "input": {"path": f"f{turn}"},
+                },
+            ],
+        },
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "tool_result",
+                    "tool_use_id": f"toolu_{turn}",
+                    "content": "x" * 2000,
+                }
+            ],
+        },
+    ]
+
+
+def legacy(logger: logging.Logger, messages: list, turn: int):
+    logger.info(f"Messages history: {str(messages)}")
+    logger.info(f"Calling Claude API with model: {'model'}")
+
+
+def current(logger: logging.Logger, messages: list, turn: int):
+    logger.debug(
+        "Request for ticket %s: %d messages, latest: %s",
+        "ticket-1",
+        len(messages),
+        Payload(messages[-1]),
+        extra={"ticket_id": "ticket-1"},
+    )
+    logger.info(
+        "Calling model %s for ticket %s (iteration %d)",
+        "model",
+        "ticket-1",
+        turn,
+        extra={"ticket_id": "ticket-1"},
+    )
+
+
+def run(name: str, turns: int, level: int, queued: bool, log_fn) -> None:
+    log_file = Path(tempfile.mkdtemp(prefix="agent_bench_log_")) / "app.log"
+    file_handler = logging.FileHandler(log_file, encoding="utf-8")
+    file_handler.setFormatter(logging.Formatter(FORMAT))
+    logger = logging.getLogger(f"bench.{name}")
+    logger.propagate = False
+    logger.setLevel(level)
+    listener = None
+    if queued:
+        log_queue: queue.Queue = queue.Queue()
+        listener = QueueListener(log_queue, file_handler)
+        listener.start()
+        logger.addHandler(MeteredQueueHandler(log_queue, SchedulerMetrics()))
+    else:
+        logger.addHandler(file_handler)
+
+    messages = [{"role": "user", "content": "start"}]
+    total = last = 0.0
+    for turn in range(turns):
+        start = time.perf_counter()
+        log_fn(logger, messages, turn)
+        last = time.perf_counter() - start
+        total += last
+        messages.extend(turn_messages(turn))
+
+    if listener is not None:
+        listener.stop()
+    file_handler.close()
+    size = log_file.stat().st_size
+    print(
+        f"{turns:>5} turns  {name:<22} written={size / 1024:9.0f}KiB  "
+        f"per turn={size / turns / 1024:7.1f}KiB  "
+        f"total={total * 1000:9.1f}ms  last turn={last * 1000:7.3f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[200, 500])
+    args = parser.parse_args()
+
+    for turns in args.turns:
+        run("str(messages) (legacy)", turns, logging.DEBUG, False, legacy)
+        run("queued, INFO", turns, logging.INFO, True, current)
+        run("queued, sampled DEBUG", turns, logging.DEBUG, True, current)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark: 经 Dispatcher 离线回放录制的模型响应
+
+先用 RecordTransport 录制（FakeAnthropic 每次调用等待 --record-latency-ms），或用
+--cassette-dir 指定已有的录制（例如 LLM_TRANSPORT=record 运行时写入的目录）；
+然后用 ReplayTransport 回放 --tickets 个并发 Ticket，按 --latency-ms 和 --latency-scale
+（录制时耗时的倍数）注入人工延迟。回放不调用模型，结果可重复。
+
+输出每轮的总耗时以及回放命中/未命中次数。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_replay --tickets 1 20 --latency-ms 0 200
+    python -m benchmarks.bench_replay --tickets 20 --latency-scale 1
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+
+from benchmarks.common import install_fake_anthropic, use_temp_database
+
+use_temp_database()
+
+from app.scheduler.llm_client import set_llm_transport  # noqa: E402
+from app.scheduler.llm_transport import (  # noqa: E402
+    CassetteStore,
+    RecordTransport,
+    ReplayTransport,
+)
+from app.scheduler.metrics import scheduler_metrics  # noqa: E402
+from benchmarks.bench_llm_overlap import run  # noqa: E402
+
+
+async def run_with(transport, tickets: int) -> float:
+    """换用 transport 后执行一轮"""
+    await set_llm_transport(transport)
+    return await run(tickets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, nargs="+", default=[1, 20])
+    parser.add_argument("--latency-ms", type=float, nargs="+", default=[0.0, 200.0])
+    parser.add_argument("--latency-scale", type=float, default=0.0)
+    parser.add_argument("--record-latency-ms", type=float, default=300.0)
+    parser.add_argument("--cassette-dir")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    store = CassetteStore(args.cassette_dir or tempfile.mkdtemp(prefix="agent_bench_llm_"))
+    if not args.cassette_dir:
+        install_fake_anthropic(latency=args.record_latency_ms / 1000)
+        elapsed = asyncio.run(run_with(RecordTransport(store), 1))
+        print(f"recorded {len(store)} responses in {elapsed * 1000:.1f}ms -> {store.path}")
+
+    for latency_ms in args.latency_ms:
+        for tickets in args.tickets:
+            transport = ReplayTransport(store, latency_ms, args.latency_scale)
+            scheduler_metrics.reset()
+            elapsed = asyncio.run(run_with(transport, tickets))
+            counters = scheduler_metrics.snapshot()["counters"]
+            print(
+                f"{tickets:>4} tickets  latency={latency_ms:6.0f}ms"
+                f"+{args.latency_scale:g}x  wall={elapsed * 1000:8.1f}ms  "
+                f"hits={counters.get('llm_replay_hits', 0)}  "
+                f"misses={counters.get('llm_replay_misses', 0)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
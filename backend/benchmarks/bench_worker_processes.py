@@ -0,0 +1,126 @@
+"""Benchmark: 不同 worker 进程数下的 Ticket 吞吐量
+
+每个 Ticket 的模型调用占用固定的 CPU 时间（--cpu-ms），模拟序列化历史、解析工具输出等
+在事件循环上执行的纯 Python 开销。进程内模式下所有 Executor 共享一个核心；
+多进程模式下吞吐量应随进程数（不超过 CPU 核数）近似线性增长。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_worker_processes --tickets 200 --processes 0 1 2 4
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+from benchmarks.common import install_fake_anthropic, use_temp_database
+
+use_temp_database()
+
+from sqlalchemy import delete, func, select, update  # noqa: E402
+
+from app.database import async_session_maker, engine, init_db  # noqa: E402
+from app.models.agent import Agent  # noqa: E402
+from app.models.session import Session  # noqa: E402
+from app.models.ticket import Ticket, TicketStatus  # noqa: E402
+from app.scheduler import Dispatcher  # noqa: E402
+from app.scheduler.process_pool import ProcessWorkerPool  # noqa: E402
+from app.scheduler.worker_pool import WorkerPool  # noqa: E402
+
+MAX_WORKERS = 64
+
+
+async def prepare(tickets: int) -> str:
+    """清空并写入一批 pending Ticket，返回 Agent ID"""
+    async with async_session_maker() as db:
+        await db.execute(delete(Session))
+        await db.execute(delete(Ticket))
+        agent = (await db.execute(select(Agent))).scalars().first()
+        if agent is None:
+            agent = Agent(id=str(uuid.uuid4()), name="Bench Agent", prompt="benchmark")
+            db.add(agent)
+        agent.max_concurrency = MAX_WORKERS
+        await db.flush()
+        db.add_all(
+            Ticket(id=str(uuid.uuid4()), agent_id=agent.id) for _ in range(tickets)
+        )
+        await db.commit()
+        return agent.id
+
+
+async def run(tickets: int, processes: int, cpu_time: float) -> float:
+    """执行一轮，返回每秒完成的 Ticket 数"""
+    await init_db()
+    await prepare(tickets)
+
+    if processes:
+        pool = ProcessWorkerPool(
+            processes,
+            initializer=install_fake_anthropic,
+            initargs=(0.0, cpu_time),
+            max_workers=MAX_WORKERS,
+            default_agent_limit=MAX_WORKERS,
+        )
+    else:
+        install_fake_anthropic(cpu_time=cpu_time)
+        pool = WorkerPool(max_workers=MAX_WORKERS, default_agent_limit=MAX_WORKERS)
+    dispatcher = Dispatcher(pool=pool)
+
+    # 先启动 worker 进程，排除进程启动时间
+    await pool.start()
+    async with async_session_maker() as db:
+        await db.execute(update(Ticket).values(status=TicketStatus.PENDING.value))
+        await db.commit()
+
+    start = time.perf_counter()
+    await dispatcher.start()
+    while True:
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(Ticket.status, func.count())
+                .where(
+                    Ticket.status.in_(
+                        [TicketStatus.COMPLETED.value, TicketStatus.FAILED.value]
+                    )
+                )
+                .group_by(Ticket.status)
+            )
+            counts = dict(result.all())
+        if sum(counts.values()) >= tickets:
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    if counts.get(TicketStatus.FAILED.value):
+        print(f"  warning: {counts[TicketStatus.FAILED.value]} tickets failed")
+
+    await dispatcher.shutdown(timeout=5)
+    # 每轮使用新的事件循环，连接池不能跨轮复用
+    await engine.dispose()
+    return tickets / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=200)
+    parser.add_argument("--processes", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--cpu-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    print(f"CPU cores: {os.cpu_count()}")
+
+    baseline = None
+    for processes in args.processes:
+        throughput = asyncio.run(run(args.tickets, processes, args.cpu_ms / 1000))
+        baseline = baseline or throughput
+        mode = f"{processes} worker processes" if processes else "in-process"
+        print(
+            f"{mode:<24} {throughput:8.1f} tickets/s  "
+            f"({throughput / baseline:4.2f}x in-process)"
+        )
+
+
+if __name__ == "__main__":
+    main()
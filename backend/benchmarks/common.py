@@ -0,0 +1,134 @@
+"""Benchmark 公共工具
+
+所有 benchmark 都运行在临时 SQLite 数据库上，并用 FakeAnthropic 替代真实的模型调用，
+因此可以离线、可重复地运行。
+"""
+
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+
+
+def use_temp_database() -> str:
+    """将 DATABASE_URL 指向临时 SQLite 文件
+
+    必须在导入任何 app 模块之前调用。spawn 出的 worker 进程重新导入 benchmark 模块时
+    沿用父进程的临时数据库。
+    """
+    tmp_dir = os.environ.get("AGENT_BENCH_DIR")
+    if not tmp_dir:
+        tmp_dir = tempfile.mkdtemp(prefix="agent_bench_")
+        os.environ["AGENT_BENCH_DIR"] = tmp_dir
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp_dir}/bench.db"
+    return tmp_dir
+
+
+def complete_task_response(summary: str = "done"):
+    """构造一个直接调用 complete_task 的模型响应"""
+    return SimpleNamespace(
+        stop_reason="tool_use",
+        content=[
+            SimpleNamespace(
+                type="tool_use",
+                id=f"toolu_{uuid.uuid4().hex[:12]}",
+                name="complete_task",
+                input={"summary": summary},
+            )
+        ],
+        usage=SimpleNamespace(input_tokens=100, output_tokens=20),
+    )
+
+
+class FakeAnthropic:
+    """anthropic.AsyncAnthropic 的替身，记录每次调用的时间点
+
+    latency 模拟网络等待（await，不占用事件循环），cpu_time 模拟同步的 CPU 开销。
+    """
+
+    calls: list[float] = []
+    in_flight: int = 0
+    max_in_flight: int = 0
+    latency: float = 0.0
+    cpu_time: float = 0.0
+
+    def __init__(self, *args, **kwargs):
+        self.messages = SimpleNamespace(create=self._create, stream=self._stream)
+
+    def _stream(self, **kwargs):
+        return FakeMessageStream(self._create(**kwargs))
+
+    async def _create(self, **kwargs):
+        FakeAnthropic.calls.append(time.perf_counter())
+        FakeAnthropic.in_flight += 1
+        FakeAnthropic.max_in_flight = max(FakeAnthropic.max_in_flight, FakeAnthropic.in_flight)
+        try:
+            if FakeAnthropic.latency:
+                await asyncio.sleep(FakeAnthropic.latency)
+            if FakeAnthropic.cpu_time:
+                burn_cpu(FakeAnthropic.cpu_time)
+        finally:
+            FakeAnthropic.in_flight -= 1
+        return complete_task_response()
+
+
+class FakeMessageStream:
+    """messages.stream(...) 的替身：进入时等待响应，按内容产生流事件"""
+
+    def __init__(self, pending):
+        self._pending = pending
+        self._response = None
+
+    async def __aenter__(self):
+        self._response = await self._pending
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for block in self._response.content:
+            if block.type == "tool_use":
+                yield SimpleNamespace(type="content_block_start", content_block=block)
+
+    async def get_final_message(self):
+        return self._response
+
+
+def burn_cpu(seconds: float):
+    """占用 CPU 指定时间（模拟序列化历史、解析工具输出等纯 Python 开销）"""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(i * i for i in range(1000))
+
+
+def install_fake_anthropic(latency: float = 0.0, cpu_time: float = 0.0):
+    """用 FakeAnthropic 替换 anthropic.AsyncAnthropic（可作为 worker 进程的 initializer）"""
+    import anthropic
+
+    FakeAnthropic.latency = latency
+    FakeAnthropic.cpu_time = cpu_time
+    anthropic.AsyncAnthropic = FakeAnthropic
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def report(name: str, values_ms: list[float]):
+    """打印一组耗时（毫秒）的摘要"""
+    print(
+        f"{name:<32} n={len(values_ms):<5} "
+        f"mean={statistics.fmean(values_ms):8.1f}ms "
+        f"p50={percentile(values_ms, 50):8.1f}ms "
+        f"p95={percentile(values_ms, 95):8.1f}ms "
+        f"max={max(values_ms):8.1f}ms"
+    )
@@ -0,0 +1,6 @@
+-- ============================================================
+-- Migration: Bounded executor worker pool
+-- ============================================================
+
+-- Per-agent concurrency cap; NULL falls back to AGENT_MAX_CONCURRENCY
+ALTER TABLE agents ADD COLUMN max_concurrency INTEGER;
@@ -0,0 +1,8 @@
+-- ============================================================
+-- Migration: Atomic ticket claiming with leases
+-- ============================================================
+
+-- Dispatcher that claimed the running ticket, and when its lease expires.
+-- Expired leases are reclaimed (ticket goes back to pending).
+ALTER TABLE tickets ADD COLUMN lease_owner TEXT;
+ALTER TABLE tickets ADD COLUMN lease_expires_at DATETIME;
@@ -0,0 +1,9 @@
+-- ============================================================
+-- Migration: Priority lanes and weighted fair scheduling
+-- ============================================================
+
+-- Dispatch priority within an agent (higher first)
+ALTER TABLE tickets ADD COLUMN priority INTEGER DEFAULT 0 NOT NULL;
+
+-- Weight of the agent in the cross-agent weighted fair queue
+ALTER TABLE agents ADD COLUMN schedule_weight INTEGER DEFAULT 1 NOT NULL;
@@ -0,0 +1,12 @@
+-- ============================================================
+-- Migration: Scheduled and recurring tickets
+-- ============================================================
+
+-- Time (UTC) at which a scheduled ticket becomes pending
+ALTER TABLE tickets ADD COLUMN run_at DATETIME;
+
+-- Recurrence interval in seconds; each run spawns a pending copy
+ALTER TABLE tickets ADD COLUMN repeat_interval INTEGER;
+
+-- The dispatcher loads its timer heap through this index
+CREATE INDEX IF NOT EXISTS ix_tickets_status_run_at ON tickets (status, run_at);
@@ -0,0 +1,9 @@
+-- ============================================================
+-- Migration: Indexes for batched dispatch
+-- ============================================================
+
+-- The dispatcher ranks pending tickets per agent by priority
+CREATE INDEX IF NOT EXISTS ix_tickets_status_agent_priority ON tickets (status, agent_id, priority);
+
+-- Active-session lookup per ticket (resume lane, session reuse)
+CREATE INDEX IF NOT EXISTS ix_sessions_ticket_status ON sessions (ticket_id, status);
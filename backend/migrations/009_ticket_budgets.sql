@@ -0,0 +1,26 @@
+-- ============================================================
+-- Migration: Per-ticket budgets and usage totals
+-- ============================================================
+
+-- Agent-level budgets (NULL = global default, 0 = unlimited)
+ALTER TABLE agents ADD COLUMN max_wall_seconds FLOAT;
+ALTER TABLE agents ADD COLUMN max_input_tokens INTEGER;
+ALTER TABLE agents ADD COLUMN max_output_tokens INTEGER;
+ALTER TABLE agents ADD COLUMN max_cost_usd FLOAT;
+
+-- Ticket-level budget overrides (NULL = agent setting)
+ALTER TABLE tickets ADD COLUMN max_iterations INTEGER;
+ALTER TABLE tickets ADD COLUMN max_wall_seconds FLOAT;
+ALTER TABLE tickets ADD COLUMN max_input_tokens INTEGER;
+ALTER TABLE tickets ADD COLUMN max_output_tokens INTEGER;
+ALTER TABLE tickets ADD COLUMN max_cost_usd FLOAT;
+
+-- Usage totals written by the executor at every iteration boundary
+ALTER TABLE tickets ADD COLUMN usage_iterations INTEGER DEFAULT 0 NOT NULL;
+ALTER TABLE tickets ADD COLUMN usage_input_tokens INTEGER DEFAULT 0 NOT NULL;
+ALTER TABLE tickets ADD COLUMN usage_output_tokens INTEGER DEFAULT 0 NOT NULL;
+ALTER TABLE tickets ADD COLUMN usage_cost_usd FLOAT DEFAULT 0 NOT NULL;
+ALTER TABLE tickets ADD COLUMN usage_wall_seconds FLOAT DEFAULT 0 NOT NULL;
+
+-- Structured failure reason (e.g. budget_wall_clock)
+ALTER TABLE tickets ADD COLUMN failure_reason VARCHAR(50);
@@ -0,0 +1,21 @@
+-- ============================================================
+-- Migration: Idempotent ticket creation and result cache
+-- ============================================================
+
+-- Agent config version (bumped on every update, part of the cache key)
+ALTER TABLE agents ADD COLUMN version INTEGER DEFAULT 1 NOT NULL;
+
+-- Opt-in result cache per agent; NULL ttl = TICKET_CACHE_TTL
+ALTER TABLE agents ADD COLUMN cache_enabled BOOLEAN DEFAULT 0 NOT NULL;
+ALTER TABLE agents ADD COLUMN cache_ttl INTEGER;
+
+-- complete_task summary/result (JSON)
+ALTER TABLE tickets ADD COLUMN result TEXT;
+
+-- Client-supplied Idempotency-Key header
+ALTER TABLE tickets ADD COLUMN idempotency_key VARCHAR(255);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_tickets_idempotency_key ON tickets (idempotency_key);
+
+-- Content-addressed cache key
+ALTER TABLE tickets ADD COLUMN cache_key VARCHAR(64);
+CREATE INDEX IF NOT EXISTS ix_tickets_cache_key ON tickets (cache_key);
@@ -0,0 +1,24 @@
+-- ============================================================
+-- Migration: Per-call LLM usage and prompt cache accounting
+-- ============================================================
+
+-- One row per model call (cache write/read tokens, latency, estimated cost)
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id VARCHAR(36) NOT NULL REFERENCES tickets(id) ON DELETE CASCADE,
+    session_id VARCHAR(36),
+    model VARCHAR(100) NOT NULL,
+    stop_reason VARCHAR(50),
+    input_tokens INTEGER DEFAULT 0 NOT NULL,
+    output_tokens INTEGER DEFAULT 0 NOT NULL,
+    cache_write_tokens INTEGER DEFAULT 0 NOT NULL,
+    cache_read_tokens INTEGER DEFAULT 0 NOT NULL,
+    cost_usd FLOAT DEFAULT 0 NOT NULL,
+    latency_ms FLOAT DEFAULT 0 NOT NULL,
+    created_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS ix_llm_calls_ticket_id ON llm_calls (ticket_id);
+
+-- Prompt cache totals per ticket
+ALTER TABLE tickets ADD COLUMN usage_cache_write_tokens INTEGER DEFAULT 0 NOT NULL;
+ALTER TABLE tickets ADD COLUMN usage_cache_read_tokens INTEGER DEFAULT 0 NOT NULL;
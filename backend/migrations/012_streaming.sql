@@ -0,0 +1,9 @@
+-- ============================================================
+-- Migration: Streaming responses
+-- ============================================================
+
+-- Assistant message still being streamed (excluded from the model context)
+ALTER TABLE messages ADD COLUMN partial BOOLEAN DEFAULT 0 NOT NULL;
+
+-- Time to first visible token per model call
+ALTER TABLE llm_calls ADD COLUMN first_token_ms FLOAT;
@@ -0,0 +1,10 @@
+-- ============================================================
+-- Migration: Retry policy for transient LLM failures
+-- ============================================================
+
+-- Agent-level retry settings (NULL = global default)
+ALTER TABLE agents ADD COLUMN llm_retry_max_retries INTEGER;
+ALTER TABLE agents ADD COLUMN llm_retry_max_elapsed FLOAT;
+
+-- Retries needed before each model call succeeded
+ALTER TABLE llm_calls ADD COLUMN retries INTEGER DEFAULT 0 NOT NULL;
@@ -0,0 +1,12 @@
+-- ============================================================
+-- Migration: Per-agent model routing
+-- ============================================================
+
+-- Preferred model (NULL = ANTHROPIC_MODEL), ordered fallback chain (JSON array)
+-- and cascade mode (start with the first model, escalate on failure/low confidence)
+ALTER TABLE agents ADD COLUMN model VARCHAR(100);
+ALTER TABLE agents ADD COLUMN fallback_models TEXT;
+ALTER TABLE agents ADD COLUMN model_cascade BOOLEAN DEFAULT 0 NOT NULL;
+
+-- Provider each model call was sent to
+ALTER TABLE llm_calls ADD COLUMN provider VARCHAR(50);
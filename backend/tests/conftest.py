@@ -18,6 +18,7 @@ from app.models.agent import Agent
 from app.models.ticket import Ticket, TicketStatus
 from app.models.session import Session, SessionStatus
 from app.models.tool import Tool
+from app.scheduler.write_behind import write_behind
 
 
 # ============================================================================
@@ -130,6 +131,13 @@ async def sample_session(db_session: AsyncSession, sample_ticket: Ticket) -> Ses
     return session
 
 
+@pytest.fixture(autouse=True)
+def clear_write_behind():
+    """丢弃测试遗留的待写入行（write_behind 为进程内共享实例）"""
+    yield
+    write_behind.clear()
+
+
 # ============================================================================
 # 环境变量 Fixtures
 # ============================================================================
@@ -0,0 +1,166 @@
+"""日志配置测试"""
+
+import json
+import logging
+import queue
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.logging_config import (
+    JsonFormatter,
+    MeteredQueueHandler,
+    Payload,
+    payload_sampled,
+    start_log_meter,
+)
+from app.models.agent import Agent
+from app.models.session import Session
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.executor import AnthropicExecutor
+from app.scheduler.metrics import SchedulerMetrics, scheduler_metrics
+from app.scheduler.write_behind import write_behind
+from tests.test_scheduler.fake_llm import FakeMessages
+
+
+@pytest.fixture
+def metered():
+    """挂在独立 logger 上的 MeteredQueueHandler"""
+    log_queue = queue.Queue()
+    metrics = SchedulerMetrics()
+    logger = logging.getLogger("tests.metered")
+    handler = MeteredQueueHandler(log_queue, metrics)
+    logger.addHandler(handler)
+    logger.propagate = False
+    yield logger, log_queue, metrics
+    logger.removeHandler(handler)
+
+
+@pytest.mark.unit
+class TestPayload:
+    """测试延迟序列化和截断"""
+
+    def test_truncated(self):
+        text = str(Payload({"content": "x" * 10_000}, max_chars=100))
+        assert len(text) == 100 + len("...(truncated)")
+        assert text.startswith('{"content": "xxx')
+        assert str(Payload([{"a": 1}], max_chars=100)) == '[{"a": 1}]'
+
+    def test_not_serialized_when_level_disabled(self, metered):
+        logger, log_queue, _ = metered
+        logger.setLevel(logging.INFO)
+        with patch.object(Payload, "__str__") as serialize:
+            logger.debug("payload %s", Payload([1, 2, 3]))
+        serialize.assert_not_called()
+        assert log_queue.empty()
+
+    def test_sampling_is_stable_per_ticket(self):
+        ids = [f"ticket-{i}" for i in range(2000)]
+        sampled = [t for t in ids if payload_sampled(t, 0.1)]
+        assert 100 < len(sampled) < 300
+        assert sampled == [t for t in ids if payload_sampled(t, 0.1)]
+        assert not payload_sampled("ticket-1", 0) and payload_sampled("ticket-1", 1)
+
+
+@pytest.mark.unit
+class TestQueueLogging:
+    """测试入队和日志量统计"""
+
+    def test_records_formatted_and_counted(self, metered):
+        logger, log_queue, metrics = metered
+        logger.setLevel(logging.INFO)
+        meter = start_log_meter()
+        logger.info("hello %s", "world", extra={"ticket_id": "t-1"})
+        logger.warning("careful")
+
+        record = log_queue.get_nowait()
+        # 消息在入队时已格式化，输出线程不再访问参数
+        assert record.msg == "hello world" and record.args is None
+        assert meter.take() == (2, len("hello world") + len("careful"))
+        assert meter.take() == (0, 0)
+        counters = metrics.snapshot()["counters"]
+        assert counters["log_records"] == 2
+        assert counters["log_records.warning"] == 1
+        assert metrics.snapshot()["latency"]["log_emit"]["count"] == 2
+
+    def test_json_formatter(self):
+        record = logging.makeLogRecord(
+            {"name": "app", "msg": "hi %d", "args": (1,), "ticket_id": "t"}
+        )
+        entry = json.loads(JsonFormatter().format(record))
+        assert entry["message"] == "hi 1"
+        assert entry["logger"] == "app"
+        assert entry["ticket_id"] == "t"
+
+
+@pytest.mark.unit
+class TestExecutorLogging:
+    """测试 Executor 每轮的日志量"""
+
+    async def test_payload_logging_bounded(self, test_engine):
+        maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        async with maker() as db:
+            db.add(Agent(id="agent-1", name="Agent", prompt="p" * 50_000))
+            db.add(
+                Ticket(id="ticket-1", agent_id="agent-1", status=TicketStatus.RUNNING.value)
+            )
+            db.add(Session(id="session-1", ticket_id="ticket-1"))
+            await db.commit()
+
+        def response(name, tool_input):
+            return SimpleNamespace(
+                stop_reason="tool_use",
+                content=[
+                    SimpleNamespace(
+                        type="tool_use", id=f"toolu_{name}", name=name, input=tool_input
+                    )
+                ],
+                usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+            )
+
+        responses = [
+            response("add_step", {"title": "s" * 50_000, "status": "running"}),
+            response("complete_step", {"summary": "ok"}),
+            response("complete_task", {"summary": "done"}),
+        ]
+
+        class FakeClient:
+            def __init__(self, *args, **kwargs):
+                self.messages = FakeMessages(self.create)
+
+            async def create(self, **kwargs):
+                return responses.pop(0)
+
+        log_queue = queue.Queue()
+        executor_logger = logging.getLogger("app.scheduler.executor")
+        handler = MeteredQueueHandler(log_queue, scheduler_metrics)
+        executor_logger.addHandler(handler)
+        level = executor_logger.level
+        executor_logger.setLevel(logging.DEBUG)
+        scheduler_metrics.reset()
+        try:
+            with (
+                patch("app.scheduler.executor.async_session_maker", maker),
+                patch("app.scheduler.write_behind.async_session_maker", maker),
+                patch.object(write_behind, "flush_interval", 60),
+                patch("anthropic.AsyncAnthropic", FakeClient),
+                patch("app.scheduler.executor.payload_sampled", return_value=True),
+            ):
+                await AnthropicExecutor("ticket-1", "session-1").run()
+        finally:
+            executor_logger.removeHandler(handler)
+            executor_logger.setLevel(level)
+
+        records = []
+        while not log_queue.empty():
+            records.append(log_queue.get_nowait())
+        requests = [r for r in records if r.msg.startswith("Request for ticket")]
+        assert len(requests) == 3
+        # 大提示词和大工具参数不会整段写入日志
+        assert all(len(r.msg) < 2200 for r in requests)
+        assert all(r.ticket_id == "ticket-1" for r in requests)
+        per_iteration = scheduler_metrics.snapshot()["values"]["log_records_per_iteration"]
+        assert per_iteration["count"] >= 2
+        assert per_iteration["max"] >= 3
@@ -0,0 +1,102 @@
+"""Scheduler Router 集成测试"""
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from app.main import app
+from app.scheduler.metrics import scheduler_metrics
+from app.scheduler.stats import local_report, worker_stats
+
+
+@pytest.mark.integration
+class TestSchedulerRouter:
+    """测试 Scheduler Router API"""
+
+    @pytest.fixture
+    async def async_client(self):
+        """创建测试客户端"""
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+        scheduler_metrics.reset()
+
+    async def test_get_stats(self, async_client):
+        """测试获取调度器指标"""
+        scheduler_metrics.record_queue_wait("resume", 0.05)
+        scheduler_metrics.set_gauge("workers_active", 3)
+
+        response = await async_client.get("/api/scheduler/stats")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["queue_wait"]["resume"]["count"] == 1
+        assert data["queue_wait"]["resume"]["max_ms"] == pytest.approx(50.0)
+        assert data["gauges"]["workers_active"] == 3
+        assert data["rate_limiter"]["queue_depth"] == 0
+        assert data["rate_limiter"]["concurrency_window"] > 0
+
+    async def test_stats_include_worker_processes(self, async_client):
+        """测试合并 worker 进程回报的指标"""
+        scheduler_metrics.reset()
+        report = local_report()
+        report["metrics"]["counters"] = {"llm_fallbacks": 2}
+        report["metrics"]["latency"] = {
+            "llm_call": {
+                "count": 2,
+                "mean_ms": 100.0,
+                "p50_ms": 90.0,
+                "p95_ms": 150.0,
+                "max_ms": 150.0,
+            }
+        }
+        report["models"] = {
+            "m@default": {
+                "calls": 4,
+                "error_rate": 0.5,
+                "p50_ms": 10.0,
+                "p95_ms": 20.0,
+                "healthy": True,
+            }
+        }
+        other = local_report()
+        other["metrics"]["counters"] = {"llm_fallbacks": 1}
+        other["metrics"]["latency"] = {
+            "llm_call": {
+                "count": 1,
+                "mean_ms": 400.0,
+                "p50_ms": 400.0,
+                "p95_ms": 400.0,
+                "max_ms": 400.0,
+            }
+        }
+        other["models"] = {
+            "m@default": {
+                "calls": 1,
+                "error_rate": 0.0,
+                "p50_ms": 30.0,
+                "p95_ms": 30.0,
+                "healthy": False,
+            }
+        }
+        worker_stats.update(0, report)
+        worker_stats.update(1, other)
+        scheduler_metrics.record_queue_wait("default", 0.01)
+        try:
+            response = await async_client.get("/api/scheduler/stats")
+        finally:
+            worker_stats.clear()
+
+        data = response.json()
+        assert data["queue_wait"]["default"]["count"] == 1
+        assert data["counters"]["llm_fallbacks"] == 3
+        llm_call = data["latency"]["llm_call"]
+        assert llm_call["count"] == 3
+        assert llm_call["mean_ms"] == pytest.approx(200.0)
+        assert llm_call["max_ms"] == pytest.approx(400.0)
+        # 两个 worker 进程的限流器额度相加
+        single = report["rate_limiter"]["max_concurrency"]
+        assert data["rate_limiter"]["max_concurrency"] == 2 * single
+        model = data["models"]["m@default"]
+        assert model["calls"] == 5
+        assert model["error_rate"] == pytest.approx(0.4)
+        assert model["p95_ms"] == pytest.approx(30.0)
+        assert model["healthy"] is False
@@ -1,9 +1,18 @@
 """Tickets Router 集成测试"""
 
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
 import pytest
 from httpx import AsyncClient, ASGITransport
 
+from app.database import async_session_maker
 from app.main import app
+from app.models.llm_call import LLMCall
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler import notifier
+from app.scheduler.registry import executor_registry
 
 
 @pytest.mark.integration
@@ -52,6 +61,44 @@ class TestTicketsRouter:
         fetched_ticket = get_response.json()
         assert fetched_ticket["id"] == ticket["id"]
 
+    async def test_ticket_budget_and_usage(self, async_client):
+        """测试创建带预算的 Ticket，响应包含累计用量"""
+        agent_response = await async_client.post(
+            "/api/agents",
+            json={"name": "Budget Agent", "prompt": "p", "max_cost_usd": 0.5},
+        )
+        agent = agent_response.json()
+        assert agent["max_cost_usd"] == 0.5
+
+        create_response = await async_client.post(
+            "/api/tickets",
+            json={"agent_id": agent["id"], "max_wall_seconds": 120, "max_input_tokens": 0},
+        )
+        assert create_response.status_code == 201
+        ticket = create_response.json()
+        assert ticket["max_wall_seconds"] == 120
+        assert ticket["max_input_tokens"] == 0
+        assert ticket["failure_reason"] is None
+        assert ticket["usage"] == {
+            "iterations": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_write_tokens": 0,
+            "cache_read_tokens": 0,
+            "cost_usd": 0.0,
+            "wall_seconds": 0.0,
+        }
+        calls = await async_client.get(f"/api/tickets/{ticket['id']}/llm-calls")
+        assert calls.status_code == 200
+        assert calls.json() == []
+
+        async with async_session_maker() as db:
+            db.add(LLMCall(ticket_id=ticket["id"], model="m", provider="backup"))
+            await db.commit()
+        calls = await async_client.get(f"/api/tickets/{ticket['id']}/llm-calls")
+        assert [(c["model"], c["provider"]) for c in calls.json()] == [("m", "backup")]
+        await async_client.delete(f"/api/tickets/{ticket['id']}")
+
     async def test_delete_ticket(self, async_client):
         """测试删除 Ticket"""
         # 创建 Agent
@@ -75,6 +122,198 @@ class TestTicketsRouter:
         get_response = await async_client.get(f"/api/tickets/{ticket['id']}")
         assert get_response.status_code == 404
 
+    async def test_cancel_ticket(self, async_client):
+        """测试取消 Ticket：打断本进程中运行的 Executor"""
+        agent_response = await async_client.post(
+            "/api/agents", json={"name": "Test Agent", "prompt": "Test prompt"}
+        )
+        agent = agent_response.json()
+        create_response = await async_client.post(
+            "/api/tickets", json={"agent_id": agent["id"]}
+        )
+        ticket = create_response.json()
+
+        class FakeExecutor:
+            def stop(self):
+                pass
+
+        task = asyncio.create_task(asyncio.sleep(3600))
+        executor_registry.register(ticket["id"], FakeExecutor(), task)
+        try:
+            response = await async_client.post(f"/api/tickets/{ticket['id']}/cancel")
+        finally:
+            executor_registry.unregister(ticket["id"])
+        assert response.status_code == 200
+        assert response.json()["status"] == "cancelled"
+        assert task.cancelled()
+
+        # 已取消的 Ticket 不能再次取消
+        response = await async_client.post(f"/api/tickets/{ticket['id']}/cancel")
+        assert response.status_code == 400
+
+        await async_client.delete(f"/api/tickets/{ticket['id']}")
+
+    async def test_reset_running_ticket(self, async_client):
+        """测试重置运行中的 Ticket：先打断 Executor 并释放租约"""
+        agent_response = await async_client.post(
+            "/api/agents", json={"name": "Test Agent", "prompt": "Test prompt"}
+        )
+        agent = agent_response.json()
+        ticket = (
+            await async_client.post("/api/tickets", json={"agent_id": agent["id"]})
+        ).json()
+        async with async_session_maker() as db:
+            row = await db.get(Ticket, ticket["id"])
+            row.status = TicketStatus.RUNNING.value
+            row.lease_owner = "worker-1"
+            row.lease_expires_at = datetime.utcnow() + timedelta(minutes=5)
+            await db.commit()
+
+        class FakeExecutor:
+            def stop(self):
+                pass
+
+        task = asyncio.create_task(asyncio.sleep(3600))
+        executor_registry.register(ticket["id"], FakeExecutor(), task)
+        try:
+            response = await async_client.patch(f"/api/tickets/{ticket['id']}/reset")
+        finally:
+            executor_registry.unregister(ticket["id"])
+        assert response.status_code == 200
+        assert response.json()["status"] == "pending"
+        assert task.cancelled()
+        async with async_session_maker() as db:
+            row = await db.get(Ticket, ticket["id"])
+            assert row.lease_owner is None and row.lease_expires_at is None
+
+        await async_client.delete(f"/api/tickets/{ticket['id']}")
+
+    async def test_scheduled_ticket_lifecycle(self, async_client):
+        """测试定时 Ticket 的创建、修改、删除都会同步到定时堆"""
+        events = []
+
+        def on_schedule(ticket_id, run_at):
+            events.append((ticket_id, run_at))
+
+        agent_response = await async_client.post(
+            "/api/agents", json={"name": "Test Agent", "prompt": "Test prompt"}
+        )
+        agent = agent_response.json()
+        run_at = (datetime.utcnow() + timedelta(hours=1)).replace(microsecond=0)
+
+        notifier.subscribe_schedule(on_schedule)
+        try:
+            response = await async_client.post(
+                "/api/tickets",
+                json={"agent_id": agent["id"], "run_at": run_at.isoformat()},
+            )
+            assert response.status_code == 201
+            ticket = response.json()
+            assert ticket["status"] == "scheduled"
+            assert events[-1] == (ticket["id"], run_at)
+
+            # 置空 run_at：立即执行
+            response = await async_client.patch(
+                f"/api/tickets/{ticket['id']}", json={"run_at": None}
+            )
+            assert response.status_code == 200
+            assert response.json()["status"] == "pending"
+            assert events[-1] == (ticket["id"], None)
+
+            # 改为重复执行
+            response = await async_client.patch(
+                f"/api/tickets/{ticket['id']}", json={"repeat_interval": 3600}
+            )
+            assert response.json()["status"] == "scheduled"
+            assert response.json()["repeat_interval"] == 3600
+
+            # 重置后仍然重复执行
+            events.clear()
+            response = await async_client.patch(f"/api/tickets/{ticket['id']}/reset")
+            assert response.status_code == 200
+            assert response.json()["status"] == "scheduled"
+            assert response.json()["repeat_interval"] == 3600
+            assert events and events[-1][0] == ticket["id"] and events[-1][1] is not None
+
+            await async_client.delete(f"/api/tickets/{ticket['id']}")
+            assert events[-1] == (ticket["id"], None)
+        finally:
+            notifier.unsubscribe_schedule(on_schedule)
+
+    async def test_idempotency_key(self, async_client):
+        """测试相同幂等键只创建一次 Ticket"""
+        agent_response = await async_client.post(
+            "/api/agents", json={"name": "Test Agent", "prompt": "Test prompt"}
+        )
+        agent = agent_response.json()
+        key = f"retry-{uuid.uuid4()}"
+        body = {"agent_id": agent["id"], "params": {"task": "a"}}
+
+        first = await async_client.post(
+            "/api/tickets", json=body, headers={"Idempotency-Key": key}
+        )
+        second = await async_client.post(
+            "/api/tickets", json=body, headers={"Idempotency-Key": key}
+        )
+        assert first.status_code == 201
+        assert second.status_code == 200
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert second.json()["id"] == first.json()["id"]
+
+        # 同一个键用于不同的请求
+        conflict = await async_client.post(
+            "/api/tickets",
+            json={**body, "params": {"task": "b"}},
+            headers={"Idempotency-Key": key},
+        )
+        assert conflict.status_code == 422
+        await async_client.delete(f"/api/tickets/{first.json()['id']}")
+
+    async def test_result_cache(self, async_client):
+        """测试启用缓存的 Agent 合并执行中的相同 Ticket 并复用已完成结果"""
+        agent_response = await async_client.post(
+            "/api/agents",
+            json={"name": "Cached Agent", "prompt": "Test prompt", "cache_enabled": True},
+        )
+        agent = agent_response.json()
+        body = {"agent_id": agent["id"], "params": {"task": str(uuid.uuid4())}}
+
+        # 并发提交的相同 Ticket 挂到同一个执行上
+        first, second = await asyncio.gather(
+            async_client.post("/api/tickets", json=body),
+            async_client.post("/api/tickets", json=body),
+        )
+        outcomes = sorted([first.headers["X-Ticket-Cache"], second.headers["X-Ticket-Cache"]])
+        assert outcomes == ["coalesced", "miss"]
+        assert first.json()["id"] == second.json()["id"]
+        ticket_id = first.json()["id"]
+
+        async with async_session_maker() as db:
+            ticket = await db.get(Ticket, ticket_id)
+            ticket.status = TicketStatus.COMPLETED.value
+            ticket.result = '{"summary": "cached"}'
+            await db.commit()
+
+        hit = await async_client.post("/api/tickets", json=body)
+        assert hit.status_code == 200
+        assert hit.headers["X-Ticket-Cache"] == "hit"
+        assert hit.json()["id"] == ticket_id
+        assert hit.json()["result"] == {"summary": "cached"}
+
+        # 强制重新执行
+        fresh = await async_client.post("/api/tickets", json={**body, "use_cache": False})
+        assert fresh.status_code == 201
+        assert fresh.json()["id"] != ticket_id
+
+        # Agent 配置变更后旧结果不再命中
+        await async_client.put(f"/api/agents/{agent['id']}", json={"prompt": "New prompt"})
+        miss = await async_client.post("/api/tickets", json=body)
+        assert miss.status_code == 201
+        assert miss.headers["X-Ticket-Cache"] == "miss"
+
+        for created in (ticket_id, fresh.json()["id"], miss.json()["id"]):
+            await async_client.delete(f"/api/tickets/{created}")
+
     async def test_create_ticket_with_nonexistent_agent(self, async_client):
         """测试使用不存在的 Agent 创建 Ticket"""
         ticket_data = {"agent_id": "nonexistent-agent-id"}
@@ -31,7 +31,7 @@ class TestDispatcherBasic:
         assert dispatcher.running is False
 
     @patch("app.scheduler.dispatcher.async_session_maker")
-    @patch("app.scheduler.dispatcher.ExecutorFactory.create_executor")
+    @patch("app.scheduler.worker_pool.ExecutorFactory.create_executor")
     async def test_dispatch_pending_tickets_no_tickets(
         self, mock_factory, mock_session_maker
     ):
@@ -41,7 +41,8 @@ class TestDispatcherBasic:
         # Mock 数据库会话
         mock_db = AsyncMock()
         mock_result = Mock()
-        mock_result.scalars.return_value.all.return_value = []
+        mock_result.all.return_value = []
+        mock_result.one.return_value = (0, 0)
         mock_db.execute = AsyncMock(return_value=mock_result)
         mock_db.commit = AsyncMock()
 
@@ -0,0 +1,39 @@
+"""测试用的模型客户端替身：messages.create 和 messages.stream 共用同一个 create 函数"""
+
+from types import SimpleNamespace
+
+
+class FakeStream:
+    """messages.stream(...) 的替身：进入时调用 create，按响应内容产生流事件"""
+
+    def __init__(self, create, request):
+        self._create = create
+        self._request = request
+        self._response = None
+
+    async def __aenter__(self):
+        self._response = await self._create(**self._request)
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for block in self._response.content:
+            if block.type == "text":
+                yield SimpleNamespace(type="text", text=block.text)
+            elif block.type == "tool_use":
+                yield SimpleNamespace(type="content_block_start", content_block=block)
+
+    async def get_final_message(self):
+        return self._response
+
+
+class FakeMessages:
+    """client.messages 的替身"""
+
+    def __init__(self, create):
+        self.create = create
+
+    def stream(self, **request):
+        return FakeStream(self.create, request)
@@ -0,0 +1,206 @@
+"""Ticket 预算测试"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.session import Session, SessionStatus
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.budget import (
+    BudgetReason,
+    TicketBudget,
+    TicketUsage,
+    estimate_cost,
+)
+from app.scheduler.executor import AnthropicExecutor
+from tests.test_scheduler.fake_llm import FakeMessages
+
+
+def tool_use_response(
+    input_tokens: int = 100, output_tokens: int = 20, cache_read_tokens: int = 0
+):
+    """构造一个调用 add_step（不结束任务）的模型响应"""
+    return SimpleNamespace(
+        stop_reason="tool_use",
+        content=[
+            SimpleNamespace(
+                type="tool_use",
+                id="toolu_1",
+                name="add_step",
+                input={"title": "step", "status": "completed"},
+            )
+        ],
+        usage=SimpleNamespace(
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cache_read_input_tokens=cache_read_tokens,
+        ),
+    )
+
+
+def fake_client(respond):
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            async def create(**kw):
+                return await respond(**kw)
+
+            self.messages = FakeMessages(create)
+
+    return FakeClient
+
+
+async def respond_tool_use(**kwargs):
+    return tool_use_response()
+
+
+@pytest.fixture
+async def session_maker(test_engine):
+    maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    with (
+        patch("app.scheduler.executor.async_session_maker", maker),
+        patch("app.scheduler.write_behind.async_session_maker", maker),
+    ):
+        yield maker
+
+
+async def create_ticket(maker, agent_kwargs=None, **ticket_kwargs):
+    async with maker() as db:
+        db.add(Agent(id="agent-1", name="Agent", prompt="p", **(agent_kwargs or {})))
+        db.add(
+            Ticket(
+                id="ticket-1",
+                agent_id="agent-1",
+                status=TicketStatus.RUNNING.value,
+                **ticket_kwargs,
+            )
+        )
+        db.add(Session(id="session-1", ticket_id="ticket-1"))
+        await db.commit()
+
+
+@pytest.mark.unit
+class TestTicketBudget:
+    """测试预算合并与检查"""
+
+    def test_resolve_precedence(self):
+        ticket = SimpleNamespace(
+            max_iterations=None,
+            max_wall_seconds=30.0,
+            max_input_tokens=None,
+            max_output_tokens=0,
+            max_cost_usd=None,
+        )
+        agent = SimpleNamespace(
+            max_iterations=10,
+            max_wall_seconds=600.0,
+            max_input_tokens=5000,
+            max_output_tokens=1000,
+            max_cost_usd=None,
+        )
+        budget = TicketBudget.resolve(ticket, agent)
+
+        assert budget.max_iterations == 10
+        assert budget.max_wall_seconds == 30.0
+        assert budget.max_input_tokens == 5000
+        # Ticket 显式设置 0 表示不限制，不回退到 Agent
+        assert budget.max_output_tokens is None
+        assert budget.max_cost_usd is None
+
+    def test_check(self):
+        budget = TicketBudget(max_iterations=3, max_cost_usd=0.01)
+        assert budget.check(TicketUsage(iterations=2)) is None
+        assert budget.check(TicketUsage(iterations=3)).reason == BudgetReason.ITERATIONS
+        assert budget.check(TicketUsage(cost_usd=0.02)).reason == BudgetReason.COST
+
+    def test_input_budget_counts_cached_tokens(self):
+        budget = TicketBudget(max_input_tokens=1000)
+        assert budget.check(TicketUsage(input_tokens=10, cache_read_tokens=900)) is None
+        exceeded = budget.check(
+            TicketUsage(input_tokens=10, cache_write_tokens=100, cache_read_tokens=900)
+        )
+        assert exceeded.reason == BudgetReason.INPUT_TOKENS
+        assert "1010/1000" in str(exceeded)
+
+    def test_usage_from_response(self):
+        usage = TicketUsage()
+        usage.add_response("claude-3-5-sonnet-20241022", tool_use_response(1000, 100))
+        usage.add_response("claude-3-5-sonnet-20241022", SimpleNamespace())
+
+        assert (usage.input_tokens, usage.output_tokens) == (1000, 100)
+        assert usage.cost_usd == pytest.approx(estimate_cost("claude-3-5-sonnet", 1000, 100))
+        assert estimate_cost("claude-3-5-sonnet", 1_000_000, 0) == pytest.approx(3.0)
+
+
+@pytest.mark.unit
+class TestExecutorBudget:
+    """测试 Executor 执行预算并写回用量"""
+
+    async def test_iteration_budget_from_agent(self, session_maker):
+        await create_ticket(session_maker, agent_kwargs={"max_iterations": 3})
+
+        with patch("anthropic.AsyncAnthropic", fake_client(respond_tool_use)):
+            await AnthropicExecutor("ticket-1", "session-1").run()
+
+        async with session_maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+            session = await db.get(Session, "session-1")
+        assert ticket.status == TicketStatus.FAILED.value
+        assert ticket.failure_reason == BudgetReason.ITERATIONS.value
+        assert session.status == SessionStatus.FAILED.value
+        assert ticket.usage_iterations == 3
+        assert ticket.usage_input_tokens == 300
+        assert ticket.usage_output_tokens == 60
+        assert ticket.usage_cost_usd > 0
+
+    async def test_token_budget_from_ticket(self, session_maker):
+        await create_ticket(session_maker, max_input_tokens=250)
+
+        with patch("anthropic.AsyncAnthropic", fake_client(respond_tool_use)):
+            await AnthropicExecutor("ticket-1", "session-1").run()
+
+        async with session_maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+        assert ticket.failure_reason == BudgetReason.INPUT_TOKENS.value
+        assert ticket.usage_iterations == 3
+        assert ticket.usage_input_tokens == 300
+
+    async def test_token_budget_with_prompt_cache(self, session_maker):
+        # 提示缓存命中时几乎所有输入都计入 cache_read_tokens
+        await create_ticket(session_maker, max_input_tokens=2500)
+
+        async def respond_cached(**kwargs):
+            return tool_use_response(input_tokens=5, cache_read_tokens=1000)
+
+        with patch("anthropic.AsyncAnthropic", fake_client(respond_cached)):
+            await AnthropicExecutor("ticket-1", "session-1").run()
+
+        async with session_maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+        assert ticket.failure_reason == BudgetReason.INPUT_TOKENS.value
+        assert ticket.usage_iterations == 3
+        assert ticket.usage_input_tokens == 15
+        assert ticket.usage_cache_read_tokens == 3000
+
+    async def test_wall_clock_budget_interrupts_call(self, session_maker):
+        await create_ticket(session_maker, max_wall_seconds=0.2)
+
+        async def slow_create(**kwargs):
+            await asyncio.sleep(0.5)
+            return tool_use_response()
+
+        started = asyncio.get_running_loop().time()
+        with patch("anthropic.AsyncAnthropic", fake_client(slow_create)):
+            await AnthropicExecutor("ticket-1", "session-1").run()
+        assert asyncio.get_running_loop().time() - started < 0.45
+
+        async with session_maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+            session = await db.get(Session, "session-1")
+        assert ticket.status == TicketStatus.FAILED.value
+        assert ticket.failure_reason == BudgetReason.WALL_CLOCK.value
+        assert session.status == SessionStatus.FAILED.value
+        assert ticket.usage_wall_seconds >= 0.2
@@ -0,0 +1,215 @@
+"""上下文窗口管理测试"""
+
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.message import Message, MessageRole
+from app.models.session import Session
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.budget import TicketUsage
+from app.scheduler.context_window import (
+    ContextWindow,
+    estimate_tokens,
+    excerpt,
+    summary_request,
+)
+from app.scheduler.conversation import ConversationBuffer
+from app.scheduler.executor import AnthropicExecutor
+from app.scheduler.model_router import ModelTarget
+from app.scheduler.write_behind import write_behind
+
+
+def build_conversation(turns: int, output_chars: int = 20_000) -> ConversationBuffer:
+    """turns 轮 read_file 调用，每次返回 output_chars 字符"""
+    buffer = ConversationBuffer()
+    buffer.add(MessageRole.SYSTEM.value, "system")
+    buffer.add(MessageRole.USER.value, "start")
+    for turn in range(turns):
+        blocks = [
+            {"type": "tool_use", "id": f"t{turn}", "name": "read_file", "input": {}}
+        ]
+        buffer.add(MessageRole.ASSISTANT.value, json.dumps(blocks), blocks)
+        result = {
+            "tool_use_id": f"t{turn}",
+            "tool_name": "read_file",
+            "result": "x" * output_chars,
+        }
+        buffer.add(MessageRole.TOOL.value, json.dumps(result), result)
+    return buffer
+
+
+def assert_valid(messages: list[dict]):
+    """首条为 user，tool_result 紧跟对应的 tool_use"""
+    assert messages[0]["role"] == "user"
+    for previous, message in zip(messages, messages[1:]):
+        assert previous["role"] != message["role"]
+        if isinstance(message["content"], list) and message["role"] == "user":
+            used = {b["id"] for b in previous["content"] if b["type"] == "tool_use"}
+            assert {b["tool_use_id"] for b in message["content"]} <= used
+
+
+@pytest.mark.unit
+class TestTokenAccounting:
+    """测试每条消息的 token 估算缓存"""
+
+    def test_tokens_cached_per_message(self):
+        buffer = build_conversation(2, output_chars=400)
+        assert len(buffer.tokens) == len(buffer.messages) == 5
+        assert buffer.tokens[-1] == estimate_tokens(buffer.messages[-1]["content"])
+
+        # 连续的工具结果合并进同一条消息时累加
+        before = buffer.tokens[-1]
+        buffer.add(MessageRole.TOOL.value, "", {"tool_use_id": "t1", "result": "y" * 400})
+        assert len(buffer.tokens) == 5
+        assert buffer.tokens[-1] > before
+
+    def test_non_ascii_counts_more(self):
+        assert estimate_tokens("任务" * 100) > estimate_tokens("ab" * 100)
+
+    def test_excerpt(self):
+        text = "a" * 3000 + "b" * 3000
+        short = excerpt(text, 600)
+        assert short.startswith("a" * 400) and short.endswith("b" * 200)
+        assert "5400" in short
+        assert excerpt("short", 600) == "short"
+
+
+@pytest.mark.unit
+class TestContextWindow:
+    """测试压缩策略"""
+
+    def fit(self, context: ContextWindow, window: int) -> list[dict]:
+        with (
+            patch("app.scheduler.context_window.MODEL_CONTEXT_WINDOWS", {}),
+            patch("app.scheduler.context_window.LLM_CONTEXT_WINDOW_TOKENS", window),
+            patch("app.scheduler.context_window.LLM_MAX_OUTPUT_TOKENS", 0),
+        ):
+            return context.fit("test-model", [])
+
+    def test_under_budget_unchanged(self):
+        buffer = build_conversation(3, output_chars=400)
+        messages = self.fit(ContextWindow(buffer), 100_000)
+        assert messages == buffer.api_messages()
+
+    def test_old_tool_results_excerpted(self):
+        buffer = build_conversation(10)
+        context = ContextWindow(buffer)
+        messages = self.fit(context, 30_000)
+
+        assert sum(estimate_tokens(m["content"]) for m in messages) <= 30_000
+        assert len(messages) == len(buffer.messages)
+        assert len(messages[2]["content"][0]["content"]) < 3000
+        # 最近的消息和内存会话中的原始内容不变
+        assert messages[-1] is buffer.messages[-1]
+        assert len(buffer.messages[2]["content"][0]["content"]) == 20_000
+        assert_valid(messages)
+
+        # 压缩进度保持：下一轮的前缀相同
+        buffer.add(MessageRole.ASSISTANT.value, "", [{"type": "text", "text": "ok"}])
+        assert self.fit(context, 30_000)[:-1] == messages
+
+    def test_old_turns_omitted(self):
+        buffer = build_conversation(20, output_chars=4000)
+        context = ContextWindow(buffer)
+        messages = self.fit(context, 2_500)
+
+        assert context.drop_until > 0
+        assert "已省略" in messages[0]["content"]
+        assert messages[1]["role"] == "assistant"
+        assert_valid(messages)
+        assert context.needs_summary
+
+    def test_request_tokens_exclude_cached_prefix(self):
+        buffer = build_conversation(3, output_chars=400)
+        context = ContextWindow(buffer)
+        tools = [{"name": "read_file", "input_schema": {}}]
+        fixed = estimate_tokens(buffer.system) + estimate_tokens(tools)
+
+        messages = self.fit(context, 100_000)
+        full = fixed + sum(estimate_tokens(m["content"]) for m in messages)
+        assert context.request_tokens(tools) == full
+
+        # 上一次请求成功后，下一轮只计新增的消息
+        context.mark_sent(tools)
+        buffer.add(MessageRole.ASSISTANT.value, "", [{"type": "text", "text": "ok"}])
+        self.fit(context, 100_000)
+        assert context.request_tokens(tools) == buffer.tokens[-1]
+        with patch("app.scheduler.context_window.LLM_PROMPT_CACHE", False):
+            assert context.request_tokens(tools) == full + buffer.tokens[-1]
+
+        # 压缩改变了前缀：缓存不再命中
+        context.mark_sent(tools)
+        self.fit(context, 150)
+        assert context.drop_until or context.excerpt_until
+        assert context.request_tokens(tools) > buffer.tokens[-1]
+
+    def test_summary_row_restores_cut(self):
+        buffer = build_conversation(4, output_chars=100)
+        summary = {"summary": "读了 4 个文件", "messages": 3}
+        buffer.add(MessageRole.SUMMARY.value, json.dumps(summary, ensure_ascii=False))
+
+        context = ContextWindow(buffer)
+        messages = self.fit(context, 100_000)
+        assert messages[0]["content"].endswith("读了 4 个文件")
+        assert messages[1:] == buffer.messages[3:]
+        assert not context.needs_summary
+
+    def test_summary_request_includes_previous(self):
+        request = summary_request("之前", [{"role": "user", "content": "start"}])
+        assert "之前" in request["messages"][0]["content"]
+        assert "user: start" in request["messages"][0]["content"]
+
+
+@pytest.mark.unit
+class TestExecutorSummary:
+    """测试 Executor 生成并保存摘要"""
+
+    async def test_summary_saved_as_message(self, test_engine):
+        maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        async with maker() as db:
+            db.add(Agent(id="agent-1", name="Agent", prompt="p"))
+            db.add(Ticket(id="ticket-1", agent_id="agent-1", status=TicketStatus.RUNNING.value))
+            db.add(Session(id="session-1", ticket_id="ticket-1"))
+            await db.commit()
+
+        executor = AnthropicExecutor("ticket-1", "session-1")
+        executor._conversation = build_conversation(20, output_chars=4000)
+        executor._context = ContextWindow(executor._conversation)
+        executor._usage = TicketUsage()
+        TestContextWindow().fit(executor._context, 2_500)
+
+        async def create(**kwargs):
+            return SimpleNamespace(
+                stop_reason="end_turn",
+                content=[SimpleNamespace(type="text", text="已读取前面的文件")],
+                usage=SimpleNamespace(input_tokens=100, output_tokens=10),
+            )
+
+        client = SimpleNamespace(messages=SimpleNamespace(create=create))
+        with patch("app.scheduler.executor.get_llm_client", return_value=client):
+            await executor._summarize(
+                ModelTarget("test-model", "default"), SimpleNamespace(id="session-1")
+            )
+        executor._save_iteration()
+        with patch("app.scheduler.write_behind.async_session_maker", maker):
+            await write_behind.flush()
+        async with maker() as db:
+            row = (
+                await db.execute(
+                    select(Message).where(Message.role == MessageRole.SUMMARY.value)
+                )
+            ).scalar_one()
+
+        assert json.loads(row.content) == {
+            "summary": "已读取前面的文件",
+            "messages": executor._context.drop_until,
+        }
+        assert not executor._context.needs_summary
+        messages = TestContextWindow().fit(executor._context, 2_500)
+        assert messages[0]["content"].endswith("已读取前面的文件")
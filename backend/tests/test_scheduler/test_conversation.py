@@ -0,0 +1,84 @@
+"""ConversationBuffer 测试"""
+
+import json
+
+import pytest
+
+from app.models.message import MessageRole
+from app.scheduler.conversation import START_MESSAGE, ConversationBuffer
+
+
+def tool_row(tool_use_id: str, result: str) -> str:
+    return json.dumps({"tool_use_id": tool_use_id, "tool_name": "t", "result": result})
+
+
+@pytest.mark.unit
+class TestConversationBuffer:
+    """测试追加式 API 格式会话"""
+
+    def test_build_from_rows(self):
+        buffer = ConversationBuffer()
+        rows = [
+            (1, MessageRole.SYSTEM.value, "system prompt"),
+            (2, MessageRole.USER.value, "start"),
+            (
+                3,
+                MessageRole.ASSISTANT.value,
+                json.dumps(
+                    [
+                        {"type": "thinking", "thinking": "..."},
+                        {"type": "tool_use", "id": "a", "name": "t", "input": {}},
+                        {"type": "tool_use", "id": "b", "name": "t", "input": {}},
+                    ]
+                ),
+            ),
+            (4, MessageRole.TOOL.value, tool_row("a", "ra")),
+            (5, MessageRole.TOOL.value, tool_row("b", "rb")),
+            (6, MessageRole.TOOL.value, "not json"),
+            (7, MessageRole.ASSISTANT.value, "plain text"),
+        ]
+        for row in rows:
+            buffer.add_row(*row)
+
+        assert buffer.system == "system prompt"
+        assert buffer.last_message_id == 7
+        assert buffer.size_bytes == sum(len(row[2]) for row in rows)
+        assert buffer.api_messages() == [
+            {"role": "user", "content": "start"},
+            {
+                "role": "assistant",
+                "content": [
+                    {"type": "tool_use", "id": "a", "name": "t", "input": {}},
+                    {"type": "tool_use", "id": "b", "name": "t", "input": {}},
+                ],
+            },
+            {
+                "role": "user",
+                "content": [
+                    {"type": "tool_result", "tool_use_id": "a", "content": "ra"},
+                    {"type": "tool_result", "tool_use_id": "b", "content": "rb"},
+                ],
+            },
+            {"role": "assistant", "content": "plain text"},
+        ]
+
+    def test_tool_results_split_by_user_message(self):
+        buffer = ConversationBuffer()
+        buffer.add(MessageRole.TOOL.value, tool_row("a", "ra"))
+        buffer.add(MessageRole.USER.value, "reply")
+        buffer.add(MessageRole.TOOL.value, tool_row("b", "rb"))
+
+        roles = [(m["role"], type(m["content"]).__name__) for m in buffer.messages]
+        assert roles == [("user", "list"), ("user", "str"), ("user", "list")]
+
+    def test_parsed_content_and_snapshot(self):
+        buffer = ConversationBuffer()
+        assert buffer.api_messages() == [{"role": "user", "content": START_MESSAGE}]
+
+        blocks = [{"type": "text", "text": "hi"}]
+        buffer.add(MessageRole.ASSISTANT.value, "ignored when parsed", blocks)
+        sent = buffer.api_messages()
+        buffer.add(MessageRole.USER.value, "next")
+
+        assert sent == [{"role": "assistant", "content": blocks}]
+        assert len(buffer.api_messages()) == 2
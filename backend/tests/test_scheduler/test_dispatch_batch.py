@@ -0,0 +1,168 @@
+"""批量派发测试"""
+
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.session import Session, SessionStatus
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.dispatcher import Dispatcher
+from app.scheduler.worker_pool import WorkerPool
+
+
+class IdleExecutor:
+    """运行到被取消为止的假 Executor"""
+
+    def __init__(self, ticket_id: str, session_id: str):
+        self.session_id = session_id
+
+    async def run(self):
+        await asyncio.Event().wait()
+
+    def stop(self):
+        pass
+
+
+@pytest.fixture
+async def session_maker(test_engine):
+    """绑定测试数据库的 session 工厂，并替换 Dispatcher 使用的工厂"""
+    maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Agent(id="agent-a", name="A", prompt="p", max_concurrency=100))
+        db.add(Agent(id="agent-b", name="B", prompt="p", max_concurrency=100))
+        await db.commit()
+
+    with (
+        patch("app.scheduler.dispatcher.async_session_maker", maker),
+        patch("app.scheduler.worker_pool.ExecutorFactory.create_executor", IdleExecutor),
+    ):
+        yield maker
+
+
+async def statuses(maker) -> dict[str, str]:
+    async with maker() as db:
+        return dict((await db.execute(select(Ticket.id, Ticket.status))).all())
+
+
+def cancel_all(dispatcher: Dispatcher):
+    for task in list(dispatcher.pool._tasks.values()):
+        task.cancel()
+
+
+@pytest.mark.unit
+class TestBatchedDispatch:
+    """测试有界批次、按 priority/入队时间取候选与批量创建 Session"""
+
+    async def test_dispatches_in_batches(self, session_maker):
+        """批次小于空闲槽位时分多批派发，每个 Ticket 创建一个 Session"""
+        async with session_maker() as db:
+            for i in range(5):
+                db.add(Ticket(id=f"ticket-{i}", agent_id="agent-a"))
+            await db.commit()
+
+        dispatcher = Dispatcher(
+            pool=WorkerPool(max_workers=10, default_agent_limit=10), dispatch_batch=2
+        )
+        await dispatcher._dispatch_pending_tickets()
+
+        assert set((await statuses(session_maker)).values()) == {
+            TicketStatus.RUNNING.value
+        }
+        async with session_maker() as db:
+            count = await db.scalar(
+                select(func.count()).where(Session.status == SessionStatus.ACTIVE.value)
+            )
+        assert count == 5
+        assert dispatcher.pool.active_count == 5
+        cancel_all(dispatcher)
+
+    async def test_highest_priority_oldest_first(self, session_maker):
+        """候选按 priority 降序、入队时间升序截取"""
+        now = datetime.utcnow()
+        async with session_maker() as db:
+            db.add(Ticket(id="low", agent_id="agent-a", updated_at=now - timedelta(hours=1)))
+            db.add(Ticket(id="high-new", agent_id="agent-a", priority=5, updated_at=now))
+            db.add(
+                Ticket(
+                    id="high-old",
+                    agent_id="agent-a",
+                    priority=5,
+                    updated_at=now - timedelta(minutes=1),
+                )
+            )
+            await db.commit()
+
+        dispatcher = Dispatcher(pool=WorkerPool(max_workers=1))
+        await dispatcher._dispatch_pending_tickets()
+
+        result = await statuses(session_maker)
+        assert result["high-old"] == TicketStatus.RUNNING.value
+        assert result["high-new"] == TicketStatus.PENDING.value
+        assert result["low"] == TicketStatus.PENDING.value
+        cancel_all(dispatcher)
+
+    async def test_backlog_does_not_crowd_out_other_agents(self, session_maker):
+        """积压的 Agent 每批最多贡献空闲槽位数个候选"""
+        async with session_maker() as db:
+            for i in range(20):
+                db.add(Ticket(id=f"ticket-a{i}", agent_id="agent-a", priority=9))
+            db.add(Ticket(id="ticket-b", agent_id="agent-b"))
+            await db.commit()
+
+        dispatcher = Dispatcher(
+            pool=WorkerPool(max_workers=2, default_agent_limit=10), dispatch_batch=4
+        )
+        await dispatcher._dispatch_pending_tickets()
+
+        assert (await statuses(session_maker))["ticket-b"] == TicketStatus.RUNNING.value
+        cancel_all(dispatcher)
+
+    async def test_resumed_ticket_reuses_active_session(self, session_maker):
+        """仍有活跃 Session 的 Ticket 进入 resume lane 并沿用该 Session"""
+        async with session_maker() as db:
+            db.add(Ticket(id="resumed", agent_id="agent-a"))
+            db.add(Ticket(id="fresh", agent_id="agent-a", priority=9))
+            db.add(Session(id="session-old", ticket_id="resumed", status="completed"))
+            db.add(Session(id="session-1", ticket_id="resumed"))
+            await db.commit()
+
+        dispatcher = Dispatcher(pool=WorkerPool(max_workers=1))
+        await dispatcher._dispatch_pending_tickets()
+
+        assert (await statuses(session_maker))["resumed"] == TicketStatus.RUNNING.value
+        executor = dispatcher.pool._executors["resumed"]
+        assert executor.session_id == "session-1"
+        async with session_maker() as db:
+            count = await db.scalar(
+                select(func.count()).where(Session.ticket_id == "resumed")
+            )
+        assert count == 2
+        cancel_all(dispatcher)
+
+    async def test_claimed_elsewhere_releases_slot(self, session_maker):
+        """批量认领时已被其它进程认领的 Ticket 释放预留的槽位"""
+        async with session_maker() as db:
+            db.add(Ticket(id="ticket-1", agent_id="agent-a"))
+            await db.commit()
+
+        dispatcher = Dispatcher(pool=WorkerPool(max_workers=2))
+        other = Dispatcher()
+        claim = dispatcher._claim_tickets
+
+        async def claim_after_other(db, ticket_ids):
+            async with session_maker() as other_db:
+                await other._claim_tickets(other_db, ticket_ids)
+                await other_db.commit()
+            return await claim(db, ticket_ids)
+
+        dispatcher._claim_tickets = claim_after_other
+        await dispatcher._dispatch_pending_tickets()
+
+        assert dispatcher.pool.active_count == 0
+        async with session_maker() as db:
+            assert await db.scalar(select(func.count()).select_from(Session)) == 0
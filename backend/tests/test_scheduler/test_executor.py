@@ -78,7 +78,6 @@ class TestAnthropicExecutor:
         executor = AnthropicExecutor(sample_ticket.id, sample_session.id)
 
         result = await executor._handle_system_tool(
-            db_session,
             sample_ticket,
             sample_session,
             "complete_task",
@@ -100,7 +99,6 @@ class TestAnthropicExecutor:
         executor = AnthropicExecutor(sample_ticket.id, sample_session.id)
 
         result = await executor._handle_system_tool(
-            db_session,
             sample_ticket,
             sample_session,
             "fail_task",
@@ -123,7 +121,6 @@ class TestAnthropicExecutor:
         executor = AnthropicExecutor(sample_ticket.id, sample_session.id)
 
         result = await executor._handle_system_tool(
-            db_session,
             sample_ticket,
             sample_session,
             "request_human_input",
@@ -149,7 +146,6 @@ class TestAnthropicExecutor:
         initial_step_count = len(sample_ticket.steps)
 
         result = await executor._handle_system_tool(
-            db_session,
             sample_ticket,
             sample_session,
             "add_step",
@@ -135,7 +135,10 @@ async def test_agent_integration_flow(db_session, test_engine):
 
     logger.info("Initializing Executor...")
 
-    with patch("app.scheduler.executor.async_session_maker", mock_maker):
+    with (
+        patch("app.scheduler.executor.async_session_maker", mock_maker),
+        patch("app.scheduler.write_behind.async_session_maker", mock_maker),
+    ):
         executor = AnthropicExecutor(ticket.id, session.id)
 
         logger.info("Running Executor (Turn 1)...")
@@ -0,0 +1,118 @@
+"""Ticket 租约认领测试"""
+
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.dispatcher import Dispatcher
+
+
+@pytest.fixture
+async def session_maker(test_engine):
+    """绑定测试数据库的 session 工厂，并替换 Dispatcher 使用的工厂"""
+    maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Agent(id="agent-1", name="Agent", prompt="p"))
+        await db.commit()
+
+    with patch("app.scheduler.dispatcher.async_session_maker", maker):
+        yield maker
+
+
+@pytest.mark.unit
+class TestTicketLeases:
+    """测试 compare-and-set 认领、续约与过期回收"""
+
+    async def test_claim_only_once(self, session_maker):
+        """两个 Dispatcher 竞争同一 Ticket，只有一个认领成功"""
+        async with session_maker() as db:
+            db.add(Ticket(id="ticket-1", agent_id="agent-1"))
+            await db.commit()
+
+        first, second = Dispatcher(), Dispatcher()
+        async with session_maker() as db:
+            assert await first._claim_tickets(db, ["ticket-1"]) == {"ticket-1"}
+            await db.commit()
+        async with session_maker() as db:
+            assert await second._claim_tickets(db, ["ticket-1"]) == set()
+
+        async with session_maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+            assert ticket.status == TicketStatus.RUNNING.value
+            assert ticket.lease_owner == first.worker_id
+            assert ticket.lease_expires_at > datetime.utcnow()
+
+    async def test_reclaim_expired_leases(self, session_maker):
+        """过期租约的 running Ticket 被放回 pending"""
+        async with session_maker() as db:
+            db.add(
+                Ticket(
+                    id="ticket-expired",
+                    agent_id="agent-1",
+                    status=TicketStatus.RUNNING.value,
+                    lease_owner="crashed-worker",
+                    lease_expires_at=datetime.utcnow() - timedelta(seconds=1),
+                )
+            )
+            db.add(
+                Ticket(
+                    id="ticket-alive",
+                    agent_id="agent-1",
+                    status=TicketStatus.RUNNING.value,
+                    lease_owner="live-worker",
+                    lease_expires_at=datetime.utcnow() + timedelta(seconds=60),
+                )
+            )
+            await db.commit()
+
+        reclaimed = await Dispatcher()._reclaim_expired_leases()
+        assert reclaimed == 1
+
+        async with session_maker() as db:
+            result = await db.execute(select(Ticket.id, Ticket.status, Ticket.lease_owner))
+            rows = {row.id: row for row in result.all()}
+        assert rows["ticket-expired"].status == TicketStatus.PENDING.value
+        assert rows["ticket-expired"].lease_owner is None
+        assert rows["ticket-alive"].status == TicketStatus.RUNNING.value
+
+    async def test_renew_extends_lease_and_stops_lost(self, session_maker):
+        """续约延长自己的租约，丢失租约的 Executor 被取消"""
+        dispatcher = Dispatcher(lease_ttl=30)
+        old_deadline = datetime.utcnow() + timedelta(seconds=1)
+        async with session_maker() as db:
+            db.add(
+                Ticket(
+                    id="ticket-mine",
+                    agent_id="agent-1",
+                    status=TicketStatus.RUNNING.value,
+                    lease_owner=dispatcher.worker_id,
+                    lease_expires_at=old_deadline,
+                )
+            )
+            db.add(
+                Ticket(
+                    id="ticket-stolen",
+                    agent_id="agent-1",
+                    status=TicketStatus.RUNNING.value,
+                    lease_owner="other-worker",
+                    lease_expires_at=old_deadline,
+                )
+            )
+            await db.commit()
+
+        dispatcher.pool.running_ticket_ids = Mock(
+            return_value=["ticket-mine", "ticket-stolen"]
+        )
+        dispatcher.pool.cancel = Mock()
+
+        await dispatcher._renew_leases()
+
+        dispatcher.pool.cancel.assert_called_once_with("ticket-stolen")
+        async with session_maker() as db:
+            ticket = await db.get(Ticket, "ticket-mine")
+            assert ticket.lease_expires_at > old_deadline + timedelta(seconds=10)
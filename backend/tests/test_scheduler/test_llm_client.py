@@ -0,0 +1,96 @@
+"""共享 LLM 客户端测试"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.scheduler import llm_client
+from app.scheduler.executor import AnthropicExecutor
+from app.scheduler.llm_transport import LiveTransport
+from app.scheduler.rate_limiter import LLMRateLimiter
+
+
+@pytest.mark.unit
+class TestSharedLLMClient:
+    """测试客户端复用与并发调用"""
+
+    async def test_client_shared_within_loop(self, monkeypatch):
+        created = []
+
+        def create_client(provider):
+            created.append(SimpleNamespace(close=None, provider=provider))
+            return created[-1]
+
+        monkeypatch.setattr(llm_client, "_create_client", create_client)
+        first = llm_client.get_llm_client()
+        assert llm_client.get_llm_client() is first
+        assert len(created) == 1
+        # 每个服务商各有一个客户端
+        backup = llm_client.get_llm_client("backup")
+        assert backup is not first and backup.provider == "backup"
+        assert llm_client.get_llm_client("backup") is backup
+
+        llm_client._clients.pop(asyncio.get_running_loop())
+
+    async def test_real_client_pools_connections(self, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        client = llm_client.get_llm_client()
+        assert client.__class__.__name__ == "AsyncAnthropic"
+        await llm_client.close_llm_client()
+        assert asyncio.get_running_loop() not in llm_client._clients
+
+    async def test_set_transport_closes_clients(self, monkeypatch):
+        closed = []
+
+        async def close():
+            closed.append(True)
+
+        monkeypatch.setattr(
+            llm_client, "_create_client", lambda provider: SimpleNamespace(close=close)
+        )
+        first = llm_client.get_llm_client()
+        previous = await llm_client.set_llm_transport(LiveTransport())
+        try:
+            assert closed == [True]
+            assert llm_client.get_llm_client() is not first
+        finally:
+            await llm_client.set_llm_transport(previous)
+        assert closed == [True, True]
+
+    def test_parse_providers(self):
+        providers = llm_client.parse_providers(
+            "backup=https://backup.example.com, eu = https://eu.example.com,bad"
+        )
+        assert providers == {
+            "default": None,
+            "backup": "https://backup.example.com",
+            "eu": "https://eu.example.com",
+        }
+
+    async def test_concurrent_calls_overlap(self, monkeypatch):
+        in_flight = 0
+        peak = 0
+
+        async def create(**kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+            return SimpleNamespace(stop_reason="end_turn", content=[])
+
+        client = SimpleNamespace(messages=SimpleNamespace(create=create))
+        monkeypatch.setattr(
+            "app.scheduler.executor.llm_rate_limiter", LLMRateLimiter(max_concurrency=8)
+        )
+        executors = [AnthropicExecutor(f"ticket-{i}", f"session-{i}") for i in range(8)]
+
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(
+            *(e._create_message(client, model="m", messages=[]) for e in executors)
+        )
+        elapsed = asyncio.get_running_loop().time() - started
+
+        assert peak == 8
+        assert elapsed < 0.05 * 4
@@ -0,0 +1,190 @@
+"""LLM 传输层测试：请求哈希、录制和离线回放"""
+
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models.agent import Agent
+from app.models.llm_call import LLMCall
+from app.models.session import Session
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler import llm_client
+from app.scheduler.executor import AnthropicExecutor
+from app.scheduler.llm_transport import (
+    CassetteStore,
+    RecordTransport,
+    ReplayMiss,
+    ReplayTransport,
+    request_key,
+)
+from app.scheduler.metrics import scheduler_metrics
+from app.scheduler.write_behind import write_behind
+from tests.test_scheduler.fake_llm import FakeMessages
+
+
+def tool_response(name: str, tool_input: dict):
+    return SimpleNamespace(
+        id=f"msg_{name}",
+        stop_reason="tool_use",
+        content=[
+            SimpleNamespace(
+                type="tool_use", id=f"toolu_{name}", name=name, input=tool_input
+            )
+        ],
+        usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+    )
+
+
+def replies():
+    return [
+        tool_response("add_step", {"title": "Read", "status": "running"}),
+        tool_response("complete_step", {"summary": "ok"}),
+        tool_response("complete_task", {"summary": "done"}),
+    ]
+
+
+async def run_ticket(transport, create) -> tuple[Ticket, list[LLMCall]]:
+    """在新的内存数据库中经 transport 运行一个 Ticket，create 为实际模型调用"""
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Agent(id="agent-1", name="Agent", prompt="p", model="m"))
+        db.add(
+            Ticket(id="ticket-1", agent_id="agent-1", status=TicketStatus.RUNNING.value)
+        )
+        db.add(Session(id="session-1", ticket_id="ticket-1"))
+        await db.commit()
+
+    previous = await llm_client.set_llm_transport(transport)
+    try:
+        with (
+            patch("app.scheduler.executor.async_session_maker", maker),
+            patch("app.scheduler.write_behind.async_session_maker", maker),
+            patch.object(write_behind, "flush_interval", 60),
+            patch(
+                "app.scheduler.llm_client._create_client",
+                lambda provider: SimpleNamespace(messages=FakeMessages(create)),
+            ),
+        ):
+            await AnthropicExecutor("ticket-1", "session-1").run()
+    finally:
+        await llm_client.set_llm_transport(previous)
+
+    async with maker() as db:
+        ticket = await db.get(Ticket, "ticket-1")
+        calls = (await db.execute(select(LLMCall).order_by(LLMCall.id))).scalars().all()
+    await engine.dispose()
+    return ticket, calls
+
+
+@pytest.mark.unit
+class TestRequestKey:
+    """测试请求规范化"""
+
+    def test_ignores_cache_breakpoints_and_transport_params(self):
+        request = {
+            "model": "m",
+            "system": [{"type": "text", "text": "s"}],
+            "messages": [{"role": "user", "content": "hi"}],
+        }
+        cached = {
+            "model": "m",
+            "system": [
+                {"type": "text", "text": "s", "cache_control": {"type": "ephemeral"}}
+            ],
+            "messages": [{"role": "user", "content": "hi"}],
+            "timeout": 30,
+        }
+        assert request_key(request) == request_key(cached)
+        other = {**request, "messages": [{"role": "user", "content": "bye"}]}
+        assert request_key(request) != request_key(other)
+
+    def test_ignore_tool_results(self):
+        def request(output):
+            result = {"type": "tool_result", "tool_use_id": "t1", "content": output}
+            return {"model": "m", "messages": [{"role": "user", "content": [result]}]}
+
+        assert request_key(request("a")) != request_key(request("b"))
+        assert request_key(request("a"), True) == request_key(request("b"), True)
+
+
+@pytest.mark.unit
+class TestRecordReplay:
+    """测试录制后离线回放 Executor"""
+
+    async def test_replay_reproduces_recorded_run(self, tmp_path):
+        store = CassetteStore(tmp_path)
+        recorded = replies()
+
+        async def live(**kwargs):
+            return recorded.pop(0)
+
+        ticket, calls = await run_ticket(RecordTransport(store), live)
+        assert ticket.status == TicketStatus.COMPLETED.value
+        assert len(store) == 3
+
+        async def unreachable(**kwargs):
+            raise AssertionError("replay must not call the model")
+
+        scheduler_metrics.reset()
+        replayed, replay_calls = await run_ticket(
+            ReplayTransport(CassetteStore(tmp_path)), unreachable
+        )
+        assert replayed.status == TicketStatus.COMPLETED.value
+        assert replayed.result == ticket.result
+        assert [c.input_tokens for c in replay_calls] == [c.input_tokens for c in calls]
+        assert scheduler_metrics.snapshot()["counters"]["llm_replay_hits"] == 3
+
+    async def test_miss_raises_or_goes_live(self, tmp_path):
+        store = CassetteStore(tmp_path)
+
+        async def unreachable(**kwargs):
+            raise AssertionError("replay must not call the model")
+
+        ticket, _ = await run_ticket(ReplayTransport(store), unreachable)
+        assert ticket.status == TicketStatus.FAILED.value
+        assert "No recorded response" in ticket.error_message
+
+        pending = replies()
+
+        async def live(**kwargs):
+            return pending.pop(0)
+
+        ticket, _ = await run_ticket(ReplayTransport(store, on_miss="live"), live)
+        assert ticket.status == TicketStatus.COMPLETED.value
+        # 未命中时调用模型的响应已录制
+        assert len(store) == 3
+
+    async def test_artificial_latency(self, tmp_path):
+        store = CassetteStore(tmp_path)
+        request = {"model": "m", "max_tokens": 10, "messages": []}
+        store.put(
+            request_key(request),
+            {"latency": 0.2, "response": {"content": [], "usage": None}},
+        )
+
+        for transport, expected in (
+            (ReplayTransport(store), (0.0, 0.05)),
+            (ReplayTransport(store, latency_ms=50), (0.05, 0.15)),
+            (ReplayTransport(store, latency_ms=50, latency_scale=0.5), (0.15, 0.25)),
+        ):
+            wrapped = transport.wrap(lambda: None, "default")
+            started = time.monotonic()
+            response = await wrapped.messages.create(**request)
+            elapsed = time.monotonic() - started
+            assert response.content == []
+            assert expected[0] <= elapsed < expected[1]
+            with pytest.raises(ReplayMiss):
+                await wrapped.messages.create(**{**request, "max_tokens": 20})
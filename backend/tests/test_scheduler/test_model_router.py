@@ -0,0 +1,233 @@
+"""模型路由测试：模型链、回退、级联和滚动统计"""
+
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.llm_call import LLMCall
+from app.models.session import Session
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.executor import SYSTEM_TOOLS, AnthropicExecutor
+from app.scheduler.metrics import scheduler_metrics
+from app.scheduler.model_router import ModelRouter, ModelTarget, low_confidence
+from app.scheduler.write_behind import write_behind
+from tests.test_scheduler.fake_llm import FakeMessages
+
+
+class StatusError(Exception):
+    """带状态码的 API 错误"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={})
+
+
+def tool_response(name: str, tool_input: dict, stop_reason: str = "tool_use"):
+    return SimpleNamespace(
+        stop_reason=stop_reason,
+        content=[
+            SimpleNamespace(
+                type="tool_use", id=f"toolu_{name}", name=name, input=tool_input
+            )
+        ],
+        usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+    )
+
+
+def keys(plan) -> list[str]:
+    return [target.key for _, target in plan]
+
+
+@pytest.mark.unit
+class TestModelRouter:
+    """测试调用计划的排序"""
+
+    def test_chain(self):
+        agent = SimpleNamespace(
+            id="a", model="cheap", fallback_models=json.dumps(["strong", "cheap"])
+        )
+        assert ModelRouter.chain(agent) == ["cheap", "strong"]
+        with patch("app.scheduler.model_router.ANTHROPIC_MODEL", "env-model"):
+            assert ModelRouter.chain(SimpleNamespace(id="b")) == ["env-model"]
+
+    def test_providers_ordered_by_latency(self):
+        router = ModelRouter(providers=["default", "backup"])
+        assert keys(router.plan(["m"])) == ["m@default", "m@backup"]
+
+        for _ in range(10):
+            router.record(ModelTarget("m", "default"), 2.0, ok=True)
+            router.record(ModelTarget("m", "backup"), 0.5, ok=True)
+        assert keys(router.plan(["m", "n@default"])) == [
+            "m@backup",
+            "m@default",
+            "n@default",
+        ]
+        snapshot = router.snapshot()["m@backup"]
+        assert snapshot["calls"] == 10 and snapshot["p95_ms"] == 500.0
+
+    def test_unhealthy_target_demoted_until_cooldown(self):
+        router = ModelRouter(providers=["default"], min_samples=4, cooldown=30)
+        primary = ModelTarget("primary", "default")
+        for ok in (True, False, False, False):
+            router.record(primary, 1.0, ok=ok)
+        assert router.snapshot()["primary@default"]["error_rate"] == 0.75
+        assert keys(router.plan(["primary", "backup"])) == [
+            "backup@default",
+            "primary@default",
+        ]
+
+        # 冷却期过后重新按模型链顺序探测
+        later = time.monotonic() + 31
+        with patch("app.scheduler.model_router.time.monotonic", return_value=later):
+            assert keys(router.plan(["primary", "backup"]))[0] == "primary@default"
+
+    def test_cascade_start(self):
+        router = ModelRouter(providers=["default"])
+        chain = ["haiku", "sonnet", "opus"]
+        assert [level for level, _ in router.plan(chain, start=1)] == [1, 2]
+        assert keys(router.plan(chain, start=5)) == ["opus@default"]
+
+
+@pytest.mark.unit
+class TestLowConfidence:
+    """测试级联升级信号"""
+
+    def test_signals(self):
+        def text(value):
+            return SimpleNamespace(type="text", text=value)
+
+        ok = tool_response("complete_task", {"summary": "done"})
+        assert low_confidence(ok, SYSTEM_TOOLS) is None
+        truncated = tool_response("complete_task", {"summary": "d"}, "max_tokens")
+        assert low_confidence(truncated, SYSTEM_TOOLS) == "max_tokens"
+        empty = SimpleNamespace(stop_reason="end_turn", content=[text("  ")])
+        assert low_confidence(empty, SYSTEM_TOOLS) == "empty"
+        unknown = tool_response("rm_rf", {})
+        assert low_confidence(unknown, SYSTEM_TOOLS) == "unknown_tool"
+        missing = tool_response("add_step", {"title": "s"})
+        assert low_confidence(missing, SYSTEM_TOOLS) == "invalid_input"
+
+
+@pytest.mark.unit
+class TestExecutorRouting:
+    """测试 Executor 的回退和级联"""
+
+    @pytest.fixture
+    async def maker(self, test_engine):
+        maker = async_sessionmaker(
+            test_engine, class_=AsyncSession, expire_on_commit=False
+        )
+        return maker
+
+    async def run(self, maker, agent: Agent, replies: dict):
+        """运行一个 Ticket，replies: 模型 -> 依次返回的响应或抛出的错误"""
+        async with maker() as db:
+            db.add(agent)
+            db.add(
+                Ticket(id="ticket-1", agent_id=agent.id, status=TicketStatus.RUNNING.value)
+            )
+            db.add(Session(id="session-1", ticket_id="ticket-1"))
+            await db.commit()
+
+        calls = []
+
+        async def create(**kwargs):
+            calls.append(kwargs["model"])
+            reply = replies[kwargs["model"]].pop(0)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+
+        client = SimpleNamespace(messages=FakeMessages(create))
+        with (
+            patch("app.scheduler.executor.async_session_maker", maker),
+            patch("app.scheduler.write_behind.async_session_maker", maker),
+            patch.object(write_behind, "flush_interval", 60),
+            patch("app.scheduler.executor.get_llm_client", return_value=client),
+            patch(
+                "app.scheduler.executor.model_router", ModelRouter(providers=["default"])
+            ) as router,
+        ):
+            await AnthropicExecutor("ticket-1", "session-1").run()
+
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+            llm_calls = (
+                await db.execute(select(LLMCall).order_by(LLMCall.id))
+            ).scalars().all()
+        return ticket, calls, llm_calls, router
+
+    async def test_fallback_on_overload(self, maker):
+        scheduler_metrics.reset()
+        agent = Agent(
+            id="agent-1",
+            name="Agent",
+            prompt="p",
+            model="primary",
+            fallback_models=json.dumps(["backup"]),
+            llm_retry_max_retries=0,
+        )
+        replies = {
+            "primary": [StatusError(529)],
+            "backup": [tool_response("complete_task", {"summary": "done"})],
+        }
+        ticket, calls, llm_calls, router = await self.run(maker, agent, replies)
+
+        assert ticket.status == TicketStatus.COMPLETED.value
+        assert calls == ["primary", "backup"]
+        assert [(c.model, c.provider) for c in llm_calls] == [("backup", "default")]
+        assert scheduler_metrics.snapshot()["counters"]["llm_fallbacks"] == 1
+        stats = router.snapshot()
+        assert stats["primary@default"]["error_rate"] == 1.0
+        assert stats["backup@default"]["error_rate"] == 0.0
+
+    async def test_bad_request_does_not_fall_back(self, maker):
+        agent = Agent(
+            id="agent-1",
+            name="Agent",
+            prompt="p",
+            model="primary",
+            fallback_models=json.dumps(["backup"]),
+        )
+        replies = {"primary": [StatusError(400)], "backup": []}
+        ticket, calls, _, router = await self.run(maker, agent, replies)
+
+        assert ticket.status == TicketStatus.FAILED.value
+        assert calls == ["primary"]
+        # 请求本身的错误不计入目标的错误率
+        assert router.snapshot() == {}
+
+    async def test_cascade_escalates_and_stays(self, maker):
+        scheduler_metrics.reset()
+        agent = Agent(
+            id="agent-1",
+            name="Agent",
+            prompt="p",
+            model="cheap",
+            fallback_models=json.dumps(["strong"]),
+            model_cascade=True,
+        )
+        replies = {
+            "cheap": [tool_response("add_step", {"title": "s"})],
+            "strong": [
+                tool_response("add_step", {"title": "s", "status": "running"}),
+                tool_response("complete_task", {"summary": "done"}),
+            ],
+        }
+        ticket, calls, llm_calls, _ = await self.run(maker, agent, replies)
+
+        assert ticket.status == TicketStatus.COMPLETED.value
+        # 第一轮便宜模型的响应缺少必填参数，升级后停留在 strong
+        assert calls == ["cheap", "strong", "strong"]
+        # 被丢弃的响应同样记录调用
+        assert [c.model for c in llm_calls] == ["cheap", "strong", "strong"]
+        counters = scheduler_metrics.snapshot()["counters"]
+        assert counters["llm_escalations"] == 1
+        assert counters["llm_escalations.invalid_input"] == 1
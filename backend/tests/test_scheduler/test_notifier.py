@@ -0,0 +1,51 @@
+"""Notifier 唤醒通道测试"""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.scheduler import notifier
+
+
+@pytest.mark.unit
+class TestNotifier:
+    """测试进程内唤醒通道"""
+
+    async def test_notify_sets_subscribed_events(self):
+        """通知会 set 所有订阅的事件"""
+        first = notifier.subscribe()
+        second = notifier.subscribe()
+        try:
+            notifier.notify_ticket_ready()
+            assert first.is_set()
+            assert second.is_set()
+        finally:
+            notifier.unsubscribe(first)
+            notifier.unsubscribe(second)
+
+    async def test_unsubscribed_event_not_notified(self):
+        """取消订阅后不再收到通知"""
+        event = notifier.subscribe()
+        notifier.unsubscribe(event)
+
+        notifier.notify_ticket_ready()
+        assert not event.is_set()
+
+    async def test_dispatcher_wakes_before_interval(self):
+        """Dispatcher 收到通知后立即派发，而不是等待轮询间隔"""
+        from app.scheduler.dispatcher import Dispatcher
+
+        dispatcher = Dispatcher(interval=60.0)
+        with patch.object(
+            dispatcher, "_dispatch_pending_tickets", new_callable=AsyncMock
+        ) as mock_dispatch:
+            await dispatcher.start()
+            await asyncio.sleep(0.01)
+            assert mock_dispatch.await_count == 1
+
+            notifier.notify_ticket_ready()
+            await asyncio.sleep(0.01)
+            assert mock_dispatch.await_count == 2
+
+            dispatcher.stop()
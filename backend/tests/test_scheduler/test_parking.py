@@ -0,0 +1,154 @@
+"""挂起 Executor 停放与恢复测试"""
+
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.message import Message, MessageRole
+from app.models.session import Session, SessionStatus
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.executor import AnthropicExecutor
+from app.scheduler.parking import ParkingLot, parking_lot
+from tests.test_scheduler.fake_llm import FakeMessages
+
+
+class SizedExecutor:
+    """带固定大小的假 Executor"""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def parked_size(self) -> int:
+        return self.size
+
+
+def tool_use_response(name: str, tool_input: dict):
+    """构造一个只包含单个 tool_use 的模型响应"""
+    return SimpleNamespace(
+        stop_reason="tool_use",
+        content=[
+            SimpleNamespace(type="tool_use", id=f"toolu_{name}", name=name, input=tool_input)
+        ],
+    )
+
+
+@pytest.mark.unit
+class TestParkingLot:
+    """测试停放区淘汰策略"""
+
+    def test_park_and_take(self):
+        lot = ParkingLot()
+        executor = SizedExecutor(10)
+        lot.park("session-1", executor)
+
+        assert len(lot) == 1
+        assert lot.take("session-1") is executor
+        assert lot.take("session-1") is None
+        assert lot.total_bytes == 0
+
+    def test_discard_forwards(self):
+        lot = ParkingLot()
+        forwarded = []
+        lot.add_forwarder(forwarded.append)
+        lot.park("session-1", SizedExecutor(10))
+
+        lot.discard("session-1")
+        lot.discard("session-2")
+        assert len(lot) == 0 and lot.total_bytes == 0
+        # 停放在 worker 进程中的 Executor 同样被丢弃
+        assert forwarded == ["session-1", "session-2"]
+        lot.remove_forwarder(forwarded.append)
+        lot.discard("session-3")
+        assert forwarded == ["session-1", "session-2"]
+
+    def test_evict_idle(self):
+        lot = ParkingLot(idle_ttl=60)
+        lot.park("session-1", SizedExecutor(10))
+
+        with patch("app.scheduler.parking.time.monotonic", return_value=time.monotonic() + 61):
+            assert lot.evict() == 1
+        assert lot.take("session-1") is None
+
+    def test_evict_lru_over_memory_budget(self):
+        lot = ParkingLot(max_bytes=25)
+        lot.park("old", SizedExecutor(10))
+        lot.park("mid", SizedExecutor(10))
+        lot.park("new", SizedExecutor(10))
+
+        assert len(lot) == 2
+        assert lot.take("old") is None
+        assert lot.total_bytes == 20
+
+
+@pytest.mark.unit
+class TestParkedExecutorResume:
+    """测试挂起后恢复沿用内存中的会话"""
+
+    async def test_resume_uses_in_memory_history(self, test_engine):
+        maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        async with maker() as db:
+            db.add(Agent(id="agent-1", name="Agent", prompt="p"))
+            db.add(Ticket(id="ticket-1", agent_id="agent-1", status=TicketStatus.RUNNING.value))
+            db.add(Session(id="session-1", ticket_id="ticket-1"))
+            await db.commit()
+
+        responses = [
+            tool_use_response("request_human_input", {"prompt": "Which file?"}),
+            tool_use_response("complete_task", {"summary": "done"}),
+        ]
+        calls = []
+
+        class FakeClient:
+            def __init__(self, *args, **kwargs):
+                self.messages = FakeMessages(self.create)
+
+            async def create(self, **kwargs):
+                calls.append(kwargs["messages"])
+                return responses[len(calls) - 1]
+
+        with (
+            patch("app.scheduler.executor.async_session_maker", maker),
+            patch("app.scheduler.write_behind.async_session_maker", maker),
+            patch("anthropic.AsyncAnthropic", FakeClient),
+        ):
+            executor = AnthropicExecutor("ticket-1", "session-1")
+            await executor.run()
+            assert parking_lot.take("session-1") is executor
+
+            # 人工回复
+            async with maker() as db:
+                db.add(
+                    Message(
+                        session_id="session-1",
+                        role=MessageRole.USER.value,
+                        content="README.md",
+                        timestamp=datetime.utcnow(),
+                    )
+                )
+                ticket = await db.get(Ticket, "ticket-1")
+                ticket.status = TicketStatus.RUNNING.value
+                await db.commit()
+
+            await executor.run()
+
+        # 恢复后只追加本轮 assistant、工具结果和人工回复，自己写入的消息不会重复加载
+        # （最后一条消息带提示缓存断点）
+        assert calls[1][: len(calls[0]) - 1] == calls[0][:-1]
+        assert len(calls[1]) == len(calls[0]) + 3
+        assert calls[1][-1] == {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "README.md", "cache_control": {"type": "ephemeral"}}
+            ],
+        }
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+            session = await db.get(Session, "session-1")
+            assert ticket.status == TicketStatus.COMPLETED.value
+            assert session.status == SessionStatus.COMPLETED.value
+        assert parking_lot.take("session-1") is None
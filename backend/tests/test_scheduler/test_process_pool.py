@@ -0,0 +1,174 @@
+"""多进程 Executor 工作池测试"""
+
+import asyncio
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base
+from app.models.agent import Agent
+from app.models.ticket import Ticket, TicketStatus
+from app.config import LLM_MAX_CONCURRENCY
+from app.scheduler.dispatcher import Dispatcher
+from app.scheduler.process_pool import ProcessWorkerPool
+from app.scheduler.registry import executor_registry
+from app.scheduler.stats import worker_stats
+from tests.test_scheduler.fake_llm import FakeMessages
+
+
+class CompletingClient:
+    """直接调用 complete_task 的假 anthropic 客户端"""
+
+    def __init__(self, *args, **kwargs):
+        self.messages = FakeMessages(self.create)
+
+    async def create(self, **kwargs):
+        return SimpleNamespace(
+            stop_reason="tool_use",
+            content=[
+                SimpleNamespace(
+                    type="tool_use",
+                    id="toolu_1",
+                    name="complete_task",
+                    input={"summary": f"done in {os.getpid()}"},
+                )
+            ],
+        )
+
+
+class HangingClient(CompletingClient):
+    """模型调用一直不返回的假 anthropic 客户端"""
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(3600)
+
+
+def install_fake_client(client=CompletingClient):
+    """worker 进程 initializer：替换 anthropic 客户端"""
+    import anthropic
+
+    anthropic.AsyncAnthropic = client
+
+
+async def create_database(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path}/worker.db"
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Agent(id="agent-1", name="Agent", prompt="p"))
+        db.add(Ticket(id="ticket-1", agent_id="agent-1"))
+        await db.commit()
+    return url, engine, maker
+
+
+@pytest.mark.integration
+class TestProcessWorkerPool:
+    """测试 Ticket 在 worker 进程中执行"""
+
+    async def test_ticket_runs_in_worker_process(self, tmp_path):
+        url, engine, maker = await create_database(tmp_path)
+
+        pool = ProcessWorkerPool(1, initializer=install_fake_client)
+        dispatcher = Dispatcher(pool=pool)
+        # worker 进程启动时从环境变量读取数据库地址
+        with (
+            patch.dict(os.environ, {"DATABASE_URL": url}),
+            patch("app.scheduler.dispatcher.async_session_maker", maker),
+        ):
+            await pool.start()
+            try:
+                await dispatcher._dispatch_pending_tickets()
+                assert pool.is_running("ticket-1")
+                task = pool._tasks["ticket-1"]
+                await asyncio.wait_for(asyncio.shield(task), timeout=30)
+                await asyncio.sleep(0)
+                assert pool.active_count == 0
+            finally:
+                await pool.close()
+
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+            assert ticket.status == TicketStatus.COMPLETED.value
+        await engine.dispose()
+
+    async def test_cancel_waits_for_worker_and_stats_are_reported(self, tmp_path):
+        url, engine, maker = await create_database(tmp_path)
+
+        pool = ProcessWorkerPool(
+            2, initializer=install_fake_client, initargs=(HangingClient,)
+        )
+        dispatcher = Dispatcher(pool=pool)
+        with (
+            patch.dict(
+                os.environ,
+                {"DATABASE_URL": url, "SCHEDULER_WORKER_REPORT_INTERVAL": "0.1"},
+            ),
+            patch("app.scheduler.dispatcher.async_session_maker", maker),
+        ):
+            await pool.start()
+            try:
+                await dispatcher._dispatch_pending_tickets()
+                for _ in range(100):
+                    if len(worker_stats) == 2:
+                        break
+                    await asyncio.sleep(0.1)
+                # 各 worker 进程只使用 1/2 的 LLM 并发上限，合计不超过配置
+                stats = worker_stats.snapshot()
+                assert stats["rate_limiter"]["max_concurrency"] == LLM_MAX_CONCURRENCY
+
+                task = executor_registry.cancel("ticket-1")
+                # Future 在 worker 进程回报 Executor 退出后才结束，此前槽位仍被占用
+                assert not task.done()
+                assert pool.is_running("ticket-1")
+                await asyncio.wait([task], timeout=30)
+                assert task.cancelled()
+                await asyncio.sleep(0)
+                assert pool.active_count == 0
+            finally:
+                await pool.close()
+        assert len(worker_stats) == 0
+        await engine.dispose()
+
+    async def test_dead_worker_frees_slot_and_ticket_is_reclaimed(self, tmp_path):
+        url, engine, maker = await create_database(tmp_path)
+
+        pool = ProcessWorkerPool(
+            1, initializer=install_fake_client, initargs=(HangingClient,)
+        )
+        dispatcher = Dispatcher(pool=pool, lease_ttl=1)
+        with (
+            patch.dict(os.environ, {"DATABASE_URL": url}),
+            patch("app.scheduler.dispatcher.async_session_maker", maker),
+        ):
+            await pool.start()
+            try:
+                await dispatcher._dispatch_pending_tickets()
+                task = pool._tasks["ticket-1"]
+                dead = pool._procs[0]
+                dead.kill()
+
+                # 监视线程发现 worker 退出：Future 被取消、槽位释放、不再续约
+                await asyncio.wait([task], timeout=10)
+                assert task.cancelled()
+                await asyncio.sleep(0)
+                assert pool.active_count == 0
+                assert pool.running_ticket_ids() == []
+                # worker 进程已重启
+                assert pool._procs[0] is not dead and pool._procs[0].is_alive()
+
+                # 租约过期后 Ticket 被回收
+                await asyncio.sleep(1.1)
+                assert await dispatcher._reclaim_expired_leases() == 1
+            finally:
+                await pool.close()
+
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+            assert ticket.status == TicketStatus.PENDING.value
+            assert ticket.lease_owner is None
+        await engine.dispose()
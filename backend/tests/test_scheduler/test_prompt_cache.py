@@ -0,0 +1,138 @@
+"""提示缓存测试"""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.llm_call import LLMCall
+from app.models.session import Session
+from app.models.ticket import Ticket, TicketStatus
+from app.models.tool import Tool
+from app.scheduler.budget import estimate_cost
+from app.scheduler.executor import AnthropicExecutor
+from app.scheduler.prompt_cache import CACHE_CONTROL, apply_prompt_cache
+from app.tools import get_all_tools_for_agent
+from tests.test_scheduler.fake_llm import FakeMessages
+
+
+@pytest.mark.unit
+class TestPromptCacheBreakpoints:
+    """测试缓存断点的位置"""
+
+    def test_breakpoints_on_copies(self):
+        tools = [{"name": "a"}, {"name": "b"}]
+        messages = [
+            {"role": "user", "content": "start"},
+            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "x"}]},
+        ]
+
+        request = apply_prompt_cache("system prompt", tools, messages)
+
+        assert request["system"] == [
+            {"type": "text", "text": "system prompt", "cache_control": CACHE_CONTROL}
+        ]
+        assert request["tools"] == [
+            {"name": "a"},
+            {"name": "b", "cache_control": CACHE_CONTROL},
+        ]
+        assert request["messages"][0] == {"role": "user", "content": "start"}
+        assert request["messages"][-1]["content"][-1]["cache_control"] == CACHE_CONTROL
+        # 原始列表和消息不变
+        assert "cache_control" not in tools[-1]
+        assert "cache_control" not in messages[-1]["content"][-1]
+
+    def test_disabled(self):
+        with patch("app.scheduler.prompt_cache.LLM_PROMPT_CACHE", False):
+            request = apply_prompt_cache("s", [{"name": "a"}], [])
+        assert request == {"system": "s", "tools": [{"name": "a"}], "messages": []}
+
+    def test_tool_order_is_deterministic(self):
+        agent = SimpleNamespace(
+            tools=[
+                Tool(name="zeta", description="", schema={"type": "object"}),
+                Tool(name="alpha", description="", schema={"type": "object"}),
+            ]
+        )
+        assert [t["name"] for t in get_all_tools_for_agent(agent)] == ["alpha", "zeta"]
+
+    def test_cache_pricing(self):
+        uncached = estimate_cost("claude-sonnet-4", 10_000, 0)
+        assert estimate_cost("claude-sonnet-4", 0, 0, cache_read_tokens=10_000) == (
+            pytest.approx(uncached * 0.1)
+        )
+        assert estimate_cost("claude-sonnet-4", 0, 0, cache_write_tokens=10_000) == (
+            pytest.approx(uncached * 1.25)
+        )
+
+
+@pytest.mark.unit
+class TestExecutorRecordsCalls:
+    """测试 Executor 记录每次调用的缓存读写 token"""
+
+    async def test_llm_calls_recorded(self, test_engine):
+        maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        async with maker() as db:
+            db.add(Agent(id="agent-1", name="Agent", prompt="p"))
+            db.add(Ticket(id="ticket-1", agent_id="agent-1", status=TicketStatus.RUNNING.value))
+            db.add(Session(id="session-1", ticket_id="ticket-1"))
+            await db.commit()
+
+        requests = []
+
+        def response(name, tool_input, cache_write, cache_read):
+            return SimpleNamespace(
+                stop_reason="tool_use",
+                content=[
+                    SimpleNamespace(
+                        type="tool_use", id=f"toolu_{name}", name=name, input=tool_input
+                    )
+                ],
+                usage=SimpleNamespace(
+                    input_tokens=50,
+                    output_tokens=10,
+                    cache_creation_input_tokens=cache_write,
+                    cache_read_input_tokens=cache_read,
+                ),
+            )
+
+        responses = [
+            response("add_step", {"title": "s", "status": "completed"}, 2000, 0),
+            response("complete_task", {"summary": "done"}, 100, 2000),
+        ]
+
+        class FakeClient:
+            def __init__(self, *args, **kwargs):
+                self.messages = FakeMessages(self.create)
+
+            async def create(self, **kwargs):
+                requests.append(kwargs)
+                return responses[len(requests) - 1]
+
+        with (
+            patch("app.scheduler.executor.async_session_maker", maker),
+            patch("app.scheduler.write_behind.async_session_maker", maker),
+            patch("anthropic.AsyncAnthropic", FakeClient),
+        ):
+            await AnthropicExecutor("ticket-1", "session-1").run()
+
+        assert requests[0]["system"][0]["cache_control"] == CACHE_CONTROL
+        assert requests[0]["tools"][-1]["cache_control"] == CACHE_CONTROL
+        assert requests[1]["messages"][-1]["content"][-1]["cache_control"] == CACHE_CONTROL
+
+        async with maker() as db:
+            calls = (
+                await db.execute(select(LLMCall).order_by(LLMCall.id))
+            ).scalars().all()
+            ticket = await db.get(Ticket, "ticket-1")
+        assert [(c.cache_write_tokens, c.cache_read_tokens) for c in calls] == [
+            (2000, 0),
+            (100, 2000),
+        ]
+        assert all(c.session_id == "session-1" and c.cost_usd > 0 for c in calls)
+        assert ticket.usage_cache_write_tokens == 2100
+        assert ticket.usage_cache_read_tokens == 2000
+        assert ticket.usage_cost_usd == pytest.approx(sum(c.cost_usd for c in calls))
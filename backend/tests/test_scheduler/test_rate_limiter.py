@@ -0,0 +1,156 @@
+"""LLM 共享限流器测试"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.scheduler.executor import AnthropicExecutor
+from app.scheduler.rate_limiter import LLMRateLimiter, TokenBucket
+
+
+class RateLimitError(Exception):
+    """模拟 anthropic 的 429 错误"""
+
+    status_code = 429
+
+    def __init__(self, retry_after: str | None = None):
+        super().__init__("rate limited")
+        headers = {"retry-after": retry_after} if retry_after else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+@pytest.mark.unit
+class TestTokenBucket:
+    """测试令牌桶"""
+
+    def test_wait_time(self):
+        bucket = TokenBucket(60)
+        assert bucket.wait_time(60) == 0
+        bucket.consume(60)
+        assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+
+    def test_amount_over_capacity_waits_for_full_bucket(self):
+        bucket = TokenBucket(60)
+        assert bucket.wait_time(1000) == 0
+
+
+@pytest.mark.unit
+class TestLLMRateLimiter:
+    """测试并发窗口、AIMD 调整与 FIFO 放行"""
+
+    async def test_concurrency_window_blocks(self):
+        limiter = LLMRateLimiter(max_concurrency=2)
+        await limiter.acquire()
+        await limiter.acquire()
+
+        third = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert not third.done()
+        assert limiter.queue_depth == 1
+
+        limiter.release()
+        await asyncio.wait_for(third, timeout=1)
+        assert limiter.in_flight == 2
+        assert limiter.queue_depth == 0
+
+    async def test_request_bucket_delays(self):
+        limiter = LLMRateLimiter(requests_per_minute=600)
+        limiter.requests.consume(limiter.requests.available())
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await limiter.acquire()
+        assert loop.time() - started >= 0.05
+
+    def test_aimd(self):
+        limiter = LLMRateLimiter(max_concurrency=8)
+        limiter.on_rate_limited(retry_after=0)
+        assert limiter.window == 4
+        limiter.on_rate_limited(retry_after=0)
+        assert limiter.window == 2
+        for _ in range(4):
+            limiter.on_success()
+        assert 3 < limiter.window < 4
+        assert limiter.rate_limited_total == 2
+
+    def test_partition(self):
+        # 4 个 worker 进程均分限额
+        limiter = LLMRateLimiter(
+            requests_per_minute=60, tokens_per_minute=1000, max_concurrency=10
+        )
+        limiter.partition(4)
+        snapshot = limiter.snapshot()
+        assert snapshot["requests_per_minute"] == 15
+        assert snapshot["tokens_per_minute"] == 250
+        assert limiter.max_concurrency == 2 and limiter.window == 2
+
+        unlimited = LLMRateLimiter(requests_per_minute=0, max_concurrency=2)
+        unlimited.partition(4)
+        assert unlimited.requests is None
+        assert unlimited.max_concurrency == 1
+
+    async def test_fifo_admission(self):
+        limiter = LLMRateLimiter(max_concurrency=1)
+        await limiter.acquire()
+        order = []
+
+        async def worker(name):
+            await limiter.acquire()
+            order.append(name)
+            limiter.release()
+
+        tasks = [asyncio.create_task(worker(i)) for i in range(5)]
+        await asyncio.sleep(0.01)
+        limiter.release()
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=1)
+        assert order == [0, 1, 2, 3, 4]
+
+    async def test_permit_honours_retry_after(self):
+        limiter = LLMRateLimiter(max_concurrency=4)
+        with pytest.raises(RateLimitError):
+            async with limiter.limit():
+                raise RateLimitError(retry_after="0.1")
+
+        assert limiter.window == 2
+        assert limiter.in_flight == 0
+        assert limiter.snapshot()["paused_for_s"] > 0
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await limiter.acquire()
+        assert loop.time() - started >= 0.05
+
+    async def test_permit_records_actual_usage(self):
+        limiter = LLMRateLimiter(tokens_per_minute=10_000)
+        async with limiter.limit(1000) as permit:
+            permit.record_usage(
+                SimpleNamespace(usage=SimpleNamespace(input_tokens=1500, output_tokens=500))
+            )
+        assert limiter.tokens.available() == pytest.approx(8000, abs=5)
+
+
+@pytest.mark.unit
+class TestExecutorRateLimiting:
+    """测试 Executor 遇到 429 时经限流器重新排队"""
+
+    async def test_create_message_requeues_rate_limited(self):
+        limiter = LLMRateLimiter(max_concurrency=4)
+        attempts = []
+
+        async def create(**kwargs):
+            attempts.append(kwargs)
+            if len(attempts) == 1:
+                raise RateLimitError(retry_after="0")
+            return SimpleNamespace(stop_reason="end_turn", content=[])
+
+        client = SimpleNamespace(messages=SimpleNamespace(create=create))
+        executor = AnthropicExecutor("ticket-1", "session-1")
+        with patch("app.scheduler.executor.llm_rate_limiter", limiter):
+            response = await executor._create_message(client, model="m", messages=[])
+
+        assert response.stop_reason == "end_turn"
+        assert len(attempts) == 2
+        assert limiter.rate_limited_total == 1
+        assert limiter.in_flight == 0
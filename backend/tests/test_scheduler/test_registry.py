@@ -0,0 +1,114 @@
+"""Executor 注册表与取消测试"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.session import Session
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.executor import AnthropicExecutor
+from app.scheduler.registry import executor_registry
+from app.scheduler.worker_pool import WorkerPool
+from tests.test_scheduler.fake_llm import FakeMessages
+
+
+class SleepingExecutor:
+    """一直运行直到被取消的假 Executor"""
+
+    def __init__(self, ticket_id: str, session_id: str):
+        self.stop_requested = False
+
+    async def run(self):
+        await asyncio.sleep(3600)
+
+    def stop(self):
+        self.stop_requested = True
+
+
+@pytest.mark.unit
+class TestExecutorRegistry:
+    """测试注册表随 WorkerPool 注册/注销并能立即取消"""
+
+    async def test_cancel_releases_slot(self):
+        pool = WorkerPool()
+        executor = SleepingExecutor("ticket-1", "session-1")
+        pool.reserve("ticket-1", "agent-1")
+        pool.submit("ticket-1", executor)
+        assert executor_registry.get("ticket-1") is executor
+
+        task = executor_registry.cancel("ticket-1")
+        await asyncio.wait([task], timeout=1)
+
+        assert task.cancelled()
+        assert executor.stop_requested
+        assert "ticket-1" not in executor_registry
+        assert pool.active_count == 0
+
+    async def test_remote_cancel_waits_for_exit(self):
+        # worker 进程中的 Executor：通知其取消，Future 在回报退出后才结束
+        cancelled = []
+        handle = SimpleNamespace(stop=None, cancel=lambda: cancelled.append(True))
+        future = asyncio.get_running_loop().create_future()
+        executor_registry.register("ticket-1", handle, future)
+        try:
+            assert executor_registry.cancel("ticket-1") is future
+            assert cancelled == [True]
+            assert not future.done()
+        finally:
+            executor_registry.unregister("ticket-1")
+
+    def test_cancel_unknown_ticket(self):
+        assert executor_registry.cancel("missing") is None
+
+    async def test_cancel_interrupts_tool_call(self, test_engine):
+        """进行中的工具协程被立即打断，Executor 不会把 Ticket 标记为失败"""
+        maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        async with maker() as db:
+            db.add(Agent(id="agent-1", name="Agent", prompt="p"))
+            db.add(Ticket(id="ticket-1", agent_id="agent-1", status=TicketStatus.RUNNING.value))
+            db.add(Session(id="session-1", ticket_id="ticket-1"))
+            await db.commit()
+
+        tool_started = asyncio.Event()
+
+        async def slow_tool(params):
+            tool_started.set()
+            await asyncio.sleep(3600)
+
+        class FakeClient:
+            def __init__(self, *args, **kwargs):
+                self.messages = FakeMessages(self.create)
+
+            async def create(self, **kwargs):
+                return SimpleNamespace(
+                    stop_reason="tool_use",
+                    content=[
+                        SimpleNamespace(
+                            type="tool_use", id="toolu_1", name="slow_tool", input={}
+                        )
+                    ],
+                )
+
+        pool = WorkerPool()
+        with (
+            patch("app.scheduler.executor.async_session_maker", maker),
+            patch("app.scheduler.write_behind.async_session_maker", maker),
+            patch("app.scheduler.executor.get_tool_executor", return_value=slow_tool),
+            patch("anthropic.AsyncAnthropic", FakeClient),
+        ):
+            pool.reserve("ticket-1", "agent-1")
+            pool.submit("ticket-1", AnthropicExecutor("ticket-1", "session-1"))
+            await asyncio.wait_for(tool_started.wait(), timeout=5)
+
+            task = executor_registry.cancel("ticket-1")
+            await asyncio.wait([task], timeout=1)
+
+        assert task.cancelled()
+        assert pool.active_count == 0
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+            assert ticket.status == TicketStatus.RUNNING.value
@@ -0,0 +1,131 @@
+"""模型调用重试策略测试"""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import anthropic
+import httpx
+import pytest
+
+from app.scheduler.executor import AnthropicExecutor
+from app.scheduler.metrics import scheduler_metrics
+from app.scheduler.rate_limiter import LLMRateLimiter
+from app.scheduler.retry import RetryPolicy, retry_reason
+
+
+class StatusError(Exception):
+    """带状态码的 API 错误"""
+
+    def __init__(self, status_code: int, retry_after: str | None = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": retry_after} if retry_after else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+@pytest.mark.unit
+class TestRetryReason:
+    """测试可重试错误的识别"""
+
+    def test_status_codes(self):
+        assert retry_reason(StatusError(429)) == "rate_limited"
+        assert retry_reason(StatusError(529)) == "rate_limited"
+        assert retry_reason(StatusError(500)) == "server_error"
+        assert retry_reason(StatusError(503)) == "server_error"
+        assert retry_reason(StatusError(408)) == "timeout"
+        assert retry_reason(StatusError(400)) is None
+        assert retry_reason(StatusError(401)) is None
+
+    def test_network_errors(self):
+        request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+        assert retry_reason(anthropic.APITimeoutError(request=request)) == "timeout"
+        assert retry_reason(anthropic.APIConnectionError(request=request)) == "connection"
+        assert retry_reason(httpx.ReadTimeout("slow")) == "timeout"
+        assert retry_reason(ConnectionResetError()) == "connection"
+        assert retry_reason(ValueError("bad")) is None
+
+
+@pytest.mark.unit
+class TestRetryPolicy:
+    """测试退避时间计算"""
+
+    def test_backoff_is_jittered_and_capped(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+        with patch("app.scheduler.retry.random.uniform", side_effect=lambda a, b: b):
+            assert [policy.backoff(n) for n in range(5)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+        delays = {policy.backoff(2) for _ in range(20)}
+        assert len(delays) > 1 and all(0 <= d <= 4.0 for d in delays)
+
+    def test_retry_after_honoured(self):
+        policy = RetryPolicy(max_retries=3, base_delay=0.01)
+        assert policy.next_delay(StatusError(429, retry_after="7"), 0, 0) == 7.0
+
+    def test_limits(self):
+        policy = RetryPolicy(max_retries=2, max_elapsed=10, base_delay=0.01)
+        assert policy.next_delay(StatusError(400), 0, 0) is None
+        assert policy.next_delay(StatusError(500), 1, 0) is not None
+        assert policy.next_delay(StatusError(500), 2, 0) is None
+        # 下一次重试会超出最长重试时间
+        assert policy.next_delay(StatusError(503, retry_after="5"), 0, 6) is None
+
+    def test_resolve_from_agent(self):
+        agent = SimpleNamespace(llm_retry_max_retries=0, llm_retry_max_elapsed=None)
+        policy = RetryPolicy.resolve(agent)
+        assert policy.max_retries == 0
+        assert policy.max_elapsed == RetryPolicy().max_elapsed
+
+
+@pytest.mark.unit
+class TestExecutorRetries:
+    """测试 Executor 调用模型时的重试"""
+
+    def executor(self, **policy) -> AnthropicExecutor:
+        executor = AnthropicExecutor("ticket-1", "session-1")
+        executor._retry_policy = RetryPolicy(base_delay=0.001, **policy)
+        return executor
+
+    def client(self, errors: list[Exception]):
+        attempts = []
+
+        async def create(**kwargs):
+            attempts.append(kwargs)
+            if errors:
+                raise errors.pop(0)
+            return SimpleNamespace(stop_reason="end_turn", content=[])
+
+        return SimpleNamespace(messages=SimpleNamespace(create=create)), attempts
+
+    async def test_transient_errors_retried(self):
+        scheduler_metrics.reset()
+        executor = self.executor(max_retries=5)
+        client, attempts = self.client([StatusError(529), ConnectionResetError()])
+
+        with patch("app.scheduler.executor.llm_rate_limiter", LLMRateLimiter()):
+            response = await executor._create_message(client, model="m", messages=[])
+
+        assert response.stop_reason == "end_turn"
+        assert len(attempts) == 3
+        assert executor._call_retries == 2
+        counters = scheduler_metrics.snapshot()["counters"]
+        assert counters["llm_retries"] == 2
+        assert counters["llm_retries.rate_limited"] == 1
+        assert counters["llm_retries.connection"] == 1
+        assert scheduler_metrics.snapshot()["latency"]["llm_retry_wait"]["count"] == 2
+
+    async def test_non_retryable_raises_immediately(self):
+        executor = self.executor(max_retries=5)
+        client, attempts = self.client([StatusError(400)])
+
+        with pytest.raises(StatusError):
+            await executor._create_message(client, model="m", messages=[])
+        assert len(attempts) == 1
+
+    async def test_gives_up_after_max_retries(self):
+        scheduler_metrics.reset()
+        executor = self.executor(max_retries=2)
+        client, attempts = self.client([StatusError(500)] * 5)
+
+        with pytest.raises(StatusError):
+            await executor._create_message(client, model="m", messages=[])
+        assert len(attempts) == 3
+        assert scheduler_metrics.snapshot()["counters"]["llm_retries_exhausted"] == 1
@@ -0,0 +1,212 @@
+"""优雅关闭与遗留 Ticket 恢复测试"""
+
+import asyncio
+import socket
+import subprocess
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.session import Session, SessionStatus
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.dispatcher import Dispatcher
+from app.scheduler.worker_pool import WorkerPool
+
+
+class CooperativeExecutor:
+    """在 stop() 后退出的假 Executor"""
+
+    def __init__(self, ticket_id: str, session_id: str):
+        self.stopped = asyncio.Event()
+
+    async def run(self):
+        await self.stopped.wait()
+
+    def stop(self):
+        self.stopped.set()
+
+
+class StubbornExecutor:
+    """忽略 stop() 的假 Executor"""
+
+    def __init__(self, ticket_id: str, session_id: str):
+        self.cancelled = False
+
+    async def run(self):
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+    def stop(self):
+        pass
+
+
+class ReturningExecutor:
+    """立即返回、不修改 Ticket 状态的假 Executor"""
+
+    def __init__(self, ticket_id: str, session_id: str):
+        pass
+
+    async def run(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+def dead_pid() -> int:
+    """返回一个已退出进程的 PID"""
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+@pytest.fixture
+async def session_maker(test_engine):
+    """绑定测试数据库的 session 工厂，并替换 Dispatcher 使用的工厂"""
+    maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Agent(id="agent-1", name="Agent", prompt="p"))
+        await db.commit()
+
+    with patch("app.scheduler.dispatcher.async_session_maker", maker):
+        yield maker
+
+
+async def ticket_statuses(maker) -> dict:
+    async with maker() as db:
+        result = await db.execute(select(Ticket.id, Ticket.status, Ticket.lease_owner))
+        return {row.id: row for row in result.all()}
+
+
+@pytest.mark.unit
+class TestDrain:
+    """测试 WorkerPool 排空"""
+
+    async def test_drain_waits_then_cancels(self):
+        pool = WorkerPool()
+        cooperative = CooperativeExecutor("t1", "s")
+        stubborn = StubbornExecutor("t2", "s")
+        for ticket_id, executor in (("t1", cooperative), ("t2", stubborn)):
+            pool.reserve(ticket_id, "agent-1")
+            pool.submit(ticket_id, executor)
+
+        cancelled = await pool.drain(timeout=0.1)
+
+        assert cancelled == 1
+        assert stubborn.cancelled
+        await asyncio.sleep(0)
+        assert pool.active_count == 0
+
+    async def test_shutdown_requeues_owned_tickets(self, session_maker):
+        """关闭后本进程持有的 running Ticket 回到 pending，其它进程的不受影响"""
+        dispatcher = Dispatcher()
+        lease = datetime.utcnow() + timedelta(seconds=60)
+        async with session_maker() as db:
+            db.add(Ticket(id="ticket-1", agent_id="agent-1"))
+            db.add(
+                Ticket(
+                    id="ticket-other",
+                    agent_id="agent-1",
+                    status=TicketStatus.RUNNING.value,
+                    lease_owner="other-host:1:abcd",
+                    lease_expires_at=lease,
+                )
+            )
+            await db.commit()
+
+        with patch(
+            "app.scheduler.worker_pool.ExecutorFactory.create_executor", StubbornExecutor
+        ):
+            await dispatcher._dispatch_pending_tickets()
+        assert dispatcher.pool.is_running("ticket-1")
+
+        await dispatcher.shutdown(timeout=0.1)
+
+        rows = await ticket_statuses(session_maker)
+        assert rows["ticket-1"].status == TicketStatus.PENDING.value
+        assert rows["ticket-1"].lease_owner is None
+        assert rows["ticket-other"].status == TicketStatus.RUNNING.value
+        assert dispatcher.pool.active_count == 0
+
+
+@pytest.mark.unit
+class TestOrphanRecovery:
+    """测试启动时恢复遗留的 running Ticket"""
+
+    async def test_recover_orphaned_tickets(self, session_maker):
+        host = socket.gethostname()
+        live_lease = datetime.utcnow() + timedelta(seconds=60)
+        async with session_maker() as db:
+            db.add_all(
+                [
+                    Ticket(
+                        id="no-owner",
+                        agent_id="agent-1",
+                        status=TicketStatus.RUNNING.value,
+                    ),
+                    Ticket(
+                        id="expired",
+                        agent_id="agent-1",
+                        status=TicketStatus.RUNNING.value,
+                        lease_owner="other-host:1:abcd",
+                        lease_expires_at=datetime.utcnow() - timedelta(seconds=1),
+                    ),
+                    Ticket(
+                        id="dead-process",
+                        agent_id="agent-1",
+                        status=TicketStatus.RUNNING.value,
+                        lease_owner=f"{host}:{dead_pid()}:abcd",
+                        lease_expires_at=live_lease,
+                    ),
+                    Ticket(
+                        id="other-host",
+                        agent_id="agent-1",
+                        status=TicketStatus.RUNNING.value,
+                        lease_owner="other-host:1:abcd",
+                        lease_expires_at=live_lease,
+                    ),
+                ]
+            )
+            await db.commit()
+
+        recovered = await Dispatcher()._recover_orphaned_tickets()
+
+        assert recovered == 3
+        rows = await ticket_statuses(session_maker)
+        assert rows["no-owner"].status == TicketStatus.PENDING.value
+        assert rows["expired"].status == TicketStatus.PENDING.value
+        assert rows["dead-process"].status == TicketStatus.PENDING.value
+        assert rows["other-host"].status == TicketStatus.RUNNING.value
+
+    async def test_exited_executor_suspends_ticket(self, session_maker):
+        """Executor 退出时 Ticket 仍为 running，挂起等待输入而不是一直占用"""
+        dispatcher = Dispatcher()
+        async with session_maker() as db:
+            db.add(Ticket(id="ticket-1", agent_id="agent-1"))
+            await db.commit()
+
+        with patch(
+            "app.scheduler.worker_pool.ExecutorFactory.create_executor", ReturningExecutor
+        ):
+            await dispatcher._dispatch_pending_tickets()
+        # 等待 Executor 任务结束及其退出回调
+        await asyncio.sleep(0.05)
+        await asyncio.gather(*dispatcher._exit_tasks)
+
+        async with session_maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+            result = await db.execute(
+                select(Session).where(Session.ticket_id == "ticket-1")
+            )
+            session = result.scalar_one()
+        assert ticket.status == TicketStatus.SUSPENDED.value
+        assert ticket.lease_owner is None
+        assert session.status == SessionStatus.SUSPENDED.value
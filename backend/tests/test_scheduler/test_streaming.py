@@ -0,0 +1,311 @@
+"""流式输出测试"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.llm_call import LLMCall
+from app.models.message import Message, MessageRole
+from app.models.session import Session
+from app.models.ticket import Ticket, TicketStatus
+from app.routers.sessions import session_event_stream
+from app.scheduler.conversation import ConversationBuffer
+from app.scheduler.executor import AnthropicExecutor
+from app.scheduler.metrics import scheduler_metrics
+from app.scheduler.streaming import AssistantStream, StreamHub, stream_hub
+from app.scheduler.write_behind import WriteBehindBuffer, write_behind
+from tests.test_scheduler.fake_llm import FakeMessages
+
+
+async def create_session(maker):
+    async with maker() as db:
+        db.add(Agent(id="agent-1", name="Agent", prompt="p"))
+        db.add(Ticket(id="ticket-1", agent_id="agent-1", status=TicketStatus.RUNNING.value))
+        db.add(Session(id="session-1", ticket_id="ticket-1"))
+        await db.commit()
+
+
+def drain(queue: asyncio.Queue) -> list[dict]:
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+@pytest.mark.unit
+class TestStreamHub:
+    """测试事件分发"""
+
+    def test_fan_out_and_drop_oldest(self):
+        hub = StreamHub(queue_size=2)
+        first = hub.subscribe("s")
+        second = hub.subscribe("s")
+        other = hub.subscribe("other")
+
+        for i in range(3):
+            hub.publish("s", {"type": "text_delta", "text": str(i)})
+
+        # 慢订阅者只保留最新的事件
+        assert [e["text"] for e in drain(first)] == ["1", "2"]
+        assert [e["text"] for e in drain(second)] == ["1", "2"]
+        assert other.empty()
+
+        hub.unsubscribe("s", first)
+        hub.unsubscribe("s", second)
+        assert hub.subscriber_count("s") == 0
+
+    def test_forwarder(self):
+        hub = StreamHub()
+        forwarded = []
+        forwarder = lambda session_id, event: forwarded.append((session_id, event))  # noqa: E731
+        hub.add_forwarder(forwarder)
+        hub.publish("s", {"type": "message_start"})
+        hub.remove_forwarder(forwarder)
+        hub.publish("s", {"type": "message_stop"})
+        assert forwarded == [("s", {"type": "message_start"})]
+
+
+@pytest.mark.unit
+class TestAssistantStream:
+    """测试增量持久化"""
+
+    async def test_partial_message_persisted(self, test_engine):
+        maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        await create_session(maker)
+        hub = StreamHub()
+        queue = hub.subscribe("session-1")
+        writer = WriteBehindBuffer(flush_interval=60, session_maker=maker)
+
+        stream = AssistantStream("session-1", flush_interval=60, hub=hub, writer=writer)
+        stream.start()
+        stream.text_delta("Hel")
+        stream.text_delta("lo")
+
+        # 首个 token 写入的 partial 消息已入队，之后的增量等待下一次 flush_interval
+        assert writer.pending == 1
+        await writer.flush()
+        async with maker() as other:
+            row = (await other.execute(select(Message))).scalar_one()
+        assert row.partial is True
+        assert json.loads(row.content) == [{"type": "text", "text": "Hel"}]
+        assert stream.first_token_latency is not None
+
+        message = stream.finish('[{"type": "text", "text": "Hello"}]')
+        writer.save(message)
+        # message_stop 在最终内容落库后发布
+        assert [e["type"] for e in drain(queue)] == [
+            "message_start",
+            "text_delta",
+            "text_delta",
+        ]
+        await writer.flush()
+
+        async with maker() as db:
+            row = (await db.execute(select(Message))).scalar_one()
+        assert row.id == message.id
+        assert row.partial is False
+        assert json.loads(row.content) == [{"type": "text", "text": "Hello"}]
+        assert drain(queue) == [{"type": "message_stop", "message_id": message.id}]
+
+    async def test_partial_message_not_loaded_into_context(self, test_engine):
+        maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        await create_session(maker)
+        async with maker() as db:
+            db.add(Message(session_id="session-1", role=MessageRole.SYSTEM.value, content="s"))
+            db.add(Message(session_id="session-1", role=MessageRole.USER.value, content="go"))
+            db.add(
+                Message(
+                    session_id="session-1",
+                    role=MessageRole.ASSISTANT.value,
+                    content='[{"type": "text", "text": "par"}]',
+                    partial=True,
+                )
+            )
+            await db.commit()
+
+        executor = AnthropicExecutor("ticket-1", "session-1")
+        executor._conversation = ConversationBuffer()
+        async with maker() as db:
+            assert await executor._load_messages(db) == 2
+        assert executor._conversation.api_messages() == [{"role": "user", "content": "go"}]
+
+    async def test_abort_drops_partial_message(self, test_engine):
+        maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        await create_session(maker)
+        hub = StreamHub()
+        queue = hub.subscribe("session-1")
+        writer = WriteBehindBuffer(flush_interval=60, session_maker=maker)
+
+        # 尚未提交：直接从队列中丢弃
+        stream = AssistantStream("session-1", flush_interval=60, hub=hub, writer=writer)
+        stream.start()
+        stream.text_delta("Hel")
+        stream.abort()
+        assert writer.pending == 0
+        assert stream.message is None
+        assert drain(queue)[-1] == {"type": "message_abort"}
+
+        # finish 之后 abort 无效
+        stream = AssistantStream("session-1", flush_interval=60, hub=hub, writer=writer)
+        stream.text_delta("Hello")
+        writer.save(stream.finish('[{"type": "text", "text": "Hello"}]'))
+        stream.abort()
+        await writer.flush()
+        async with maker() as db:
+            row = (await db.execute(select(Message))).scalar_one()
+        assert row.partial is False
+
+
+@pytest.mark.unit
+class TestExecutorStreaming:
+    """测试 Executor 流式调用模型"""
+
+    async def test_deltas_published_and_message_finalized(self, test_engine):
+        maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        await create_session(maker)
+
+        response = SimpleNamespace(
+            stop_reason="tool_use",
+            content=[
+                SimpleNamespace(type="text", text="All done."),
+                SimpleNamespace(
+                    type="tool_use",
+                    id="toolu_1",
+                    name="complete_task",
+                    input={"summary": "done"},
+                ),
+            ],
+            usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+        )
+
+        class FakeClient:
+            def __init__(self, *args, **kwargs):
+                self.messages = FakeMessages(self.create)
+
+            async def create(self, **kwargs):
+                return response
+
+        scheduler_metrics.reset()
+        queue = stream_hub.subscribe("session-1")
+        try:
+            with (
+                patch("app.scheduler.executor.async_session_maker", maker),
+                patch("app.scheduler.write_behind.async_session_maker", maker),
+                patch("anthropic.AsyncAnthropic", FakeClient),
+            ):
+                await AnthropicExecutor("ticket-1", "session-1").run()
+        finally:
+            stream_hub.unsubscribe("session-1", queue)
+
+        events = drain(queue)
+        assert [e["type"] for e in events] == [
+            "message_start",
+            "text_delta",
+            "tool_use",
+            "message_stop",
+        ]
+        assert events[1]["text"] == "All done."
+        assert events[2] == {"type": "tool_use", "id": "toolu_1", "name": "complete_task"}
+
+        async with maker() as db:
+            assistant = (
+                await db.execute(
+                    select(Message).where(Message.role == MessageRole.ASSISTANT.value)
+                )
+            ).scalar_one()
+            call = (await db.execute(select(LLMCall))).scalar_one()
+        assert events[3]["message_id"] == assistant.id
+        assert assistant.partial is False
+        assert json.loads(assistant.content)[1]["input"] == {"summary": "done"}
+        assert call.first_token_ms is not None
+        assert call.first_token_ms <= call.latency_ms
+
+        latency = scheduler_metrics.snapshot()["latency"]
+        assert latency["llm_first_token"]["count"] == 1
+        assert latency["llm_call"]["count"] == 1
+
+    async def test_stream_failing_after_deltas_leaves_no_partial_message(self, test_engine):
+        maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        await create_session(maker)
+
+        async def partial_rows():
+            async with maker() as db:
+                result = await db.execute(select(Message).where(Message.partial.is_(True)))
+                return result.scalars().all()
+
+        flushed = []
+
+        class BrokenStream:
+            """输出一段文本并落库后连接中断"""
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def __aiter__(self):
+                yield SimpleNamespace(type="text", text="Working on")
+                await write_behind.flush()
+                flushed.extend(await partial_rows())
+                raise RuntimeError("connection reset")
+
+        class FakeClient:
+            def __init__(self, *args, **kwargs):
+                self.messages = SimpleNamespace(stream=lambda **request: BrokenStream())
+
+        queue = stream_hub.subscribe("session-1")
+        try:
+            with (
+                patch("app.scheduler.executor.async_session_maker", maker),
+                patch("app.scheduler.write_behind.async_session_maker", maker),
+                patch("anthropic.AsyncAnthropic", FakeClient),
+            ):
+                await AnthropicExecutor("ticket-1", "session-1").run()
+        finally:
+            stream_hub.unsubscribe("session-1", queue)
+
+        # partial 消息在中断前已落库，失败后被删除
+        assert len(flushed) == 1
+        assert await partial_rows() == []
+        assert [e["type"] for e in drain(queue)] == [
+            "message_start",
+            "text_delta",
+            "message_abort",
+        ]
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+        assert ticket.status == TicketStatus.FAILED.value
+        assert "connection reset" in ticket.error_message
+
+
+@pytest.mark.unit
+class TestSessionEventStream:
+    """测试 SSE 帧"""
+
+    async def test_frames_and_heartbeat(self):
+        disconnected = False
+
+        async def is_disconnected():
+            return disconnected
+
+        request = SimpleNamespace(is_disconnected=is_disconnected)
+        queue = stream_hub.subscribe("session-sse")
+        frames = session_event_stream(request, "session-sse", queue, heartbeat=0.01)
+
+        stream_hub.publish("session-sse", {"type": "text_delta", "text": "hi"})
+        assert await anext(frames) == (
+            'event: text_delta\ndata: {"type": "text_delta", "text": "hi"}\n\n'
+        )
+        assert await anext(frames) == ": keepalive\n\n"
+
+        disconnected = True
+        with pytest.raises(StopAsyncIteration):
+            await anext(frames)
+        assert stream_hub.subscriber_count("session-sse") == 0
@@ -0,0 +1,151 @@
+"""定时 Ticket 与定时堆测试"""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler import notifier
+from app.scheduler.dispatcher import Dispatcher
+from app.scheduler.timer_heap import TimerHeap
+
+
+@pytest.fixture
+async def session_maker(test_engine):
+    """绑定测试数据库的 session 工厂，并替换 Dispatcher 使用的工厂"""
+    maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Agent(id="agent-1", name="Agent", prompt="p"))
+        await db.commit()
+
+    with patch("app.scheduler.dispatcher.async_session_maker", maker):
+        yield maker
+
+
+@pytest.mark.unit
+class TestTimerHeap:
+    """测试定时堆的调度、修改与惰性删除"""
+
+    def test_pop_due_in_order(self):
+        heap = TimerHeap()
+        now = datetime.utcnow()
+        heap.schedule("later", now + timedelta(seconds=60))
+        heap.schedule("soon", now - timedelta(seconds=1))
+        heap.schedule("sooner", now - timedelta(seconds=2))
+
+        assert heap.pop_due(now) == ["sooner", "soon"]
+        assert heap.next_deadline() == now + timedelta(seconds=60)
+        assert len(heap) == 1
+
+    def test_reschedule_and_remove(self):
+        heap = TimerHeap()
+        now = datetime.utcnow()
+        heap.schedule("a", now - timedelta(seconds=1))
+        heap.schedule("a", now + timedelta(seconds=60))
+        heap.schedule("b", now - timedelta(seconds=1))
+        heap.remove("b")
+
+        assert heap.pop_due(now) == []
+        assert heap.next_deadline() == now + timedelta(seconds=60)
+        assert "b" not in heap
+
+    def test_stale_entries_are_compacted(self):
+        heap = TimerHeap()
+        now = datetime.utcnow()
+        for i in range(500):
+            heap.schedule("a", now + timedelta(seconds=i))
+        assert len(heap._heap) <= 2 * len(heap) + 65
+
+
+@pytest.mark.unit
+class TestScheduledTickets:
+    """测试 Dispatcher 加载定时堆并在到期时转为 pending"""
+
+    async def test_load_and_promote_one_shot(self, session_maker):
+        past = datetime.utcnow() - timedelta(seconds=1)
+        future = datetime.utcnow() + timedelta(hours=1)
+        async with session_maker() as db:
+            db.add(
+                Ticket(
+                    id="due",
+                    agent_id="agent-1",
+                    status=TicketStatus.SCHEDULED.value,
+                    run_at=past,
+                )
+            )
+            db.add(
+                Ticket(
+                    id="later",
+                    agent_id="agent-1",
+                    status=TicketStatus.SCHEDULED.value,
+                    run_at=future,
+                )
+            )
+            await db.commit()
+
+        dispatcher = Dispatcher()
+        await dispatcher._load_timers()
+        assert len(dispatcher.timers) == 2
+
+        assert await dispatcher._promote_due_tickets() == 1
+        assert dispatcher.timers.next_deadline() == future
+        async with session_maker() as db:
+            assert (await db.get(Ticket, "due")).status == TicketStatus.PENDING.value
+            assert (await db.get(Ticket, "later")).status == TicketStatus.SCHEDULED.value
+
+    async def test_recurring_spawns_copy_and_skips_missed_runs(self, session_maker):
+        run_at = datetime.utcnow() - timedelta(seconds=250)
+        async with session_maker() as db:
+            db.add(
+                Ticket(
+                    id="nightly",
+                    agent_id="agent-1",
+                    status=TicketStatus.SCHEDULED.value,
+                    priority=5,
+                    params='{"task": "review"}',
+                    run_at=run_at,
+                    repeat_interval=100,
+                )
+            )
+            await db.commit()
+
+        dispatcher = Dispatcher()
+        await dispatcher._load_timers()
+        assert await dispatcher._promote_due_tickets() == 1
+
+        next_run = run_at + timedelta(seconds=300)
+        assert dispatcher.timers.next_deadline() == next_run
+        async with session_maker() as db:
+            template = await db.get(Ticket, "nightly")
+            assert template.status == TicketStatus.SCHEDULED.value
+            assert template.run_at == next_run
+            result = await db.execute(
+                select(Ticket).where(Ticket.status == TicketStatus.PENDING.value)
+            )
+            copy = result.scalar_one()
+        assert copy.params == '{"task": "review"}'
+        assert copy.priority == 5
+        assert copy.repeat_interval is None
+
+    async def test_stale_heap_entry_is_ignored(self, session_maker):
+        """堆中已失效的条目（Ticket 已被删除）不会产生任何更新"""
+        dispatcher = Dispatcher()
+        dispatcher.timers.schedule("deleted", datetime.utcnow() - timedelta(seconds=1))
+        assert await dispatcher._promote_due_tickets() == 0
+        assert len(dispatcher.timers) == 0
+
+    def test_schedule_notifications_update_heap(self):
+        dispatcher = Dispatcher()
+        run_at = datetime.utcnow() + timedelta(minutes=5)
+        notifier.subscribe_schedule(dispatcher._on_schedule_changed)
+        try:
+            notifier.notify_ticket_scheduled("ticket-1", run_at)
+            assert dispatcher.timers.next_deadline() == run_at
+            notifier.notify_ticket_scheduled("ticket-1", None)
+            assert dispatcher.timers.next_deadline() is None
+        finally:
+            notifier.unsubscribe_schedule(dispatcher._on_schedule_changed)
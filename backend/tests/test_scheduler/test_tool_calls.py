@@ -0,0 +1,88 @@
+"""同一轮工具调用并发执行测试"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.scheduler.executor import AnthropicExecutor
+from app.tools.registry import get_all_registered_tools, is_serial_tool
+
+
+def tool_block(index: int, name: str):
+    return SimpleNamespace(
+        type="tool_use", id=f"toolu_{index}", name=name, input={"i": index}
+    )
+
+
+@pytest.mark.unit
+class TestToolCallConcurrency:
+    """测试工具调用的并发执行与结果顺序"""
+
+    async def _run(
+        self, names: list[str], delays: dict[int, float], concurrency: int = 4
+    ):
+        events = []
+        in_flight = 0
+        peak = 0
+
+        async def execute_tool(tool_name, tool_input):
+            nonlocal in_flight, peak
+            index = tool_input["i"]
+            in_flight += 1
+            peak = max(peak, in_flight)
+            events.append(("start", index))
+            await asyncio.sleep(delays.get(index, 0.05))
+            events.append(("end", index))
+            in_flight -= 1
+            return f"result-{index}"
+
+        executor = AnthropicExecutor("ticket-1", "session-1")
+        blocks = [tool_block(i, name) for i, name in enumerate(names)]
+        with (
+            patch.object(executor, "_execute_tool", side_effect=execute_tool),
+            patch("app.scheduler.executor.TOOL_CALL_CONCURRENCY", concurrency),
+        ):
+            started = time.perf_counter()
+            results = await executor._run_tool_calls(None, None, blocks)
+            elapsed = time.perf_counter() - started
+        return results, events, peak, elapsed
+
+    async def test_independent_calls_overlap_and_keep_order(self):
+        # 先开始的调用最晚结束，结果仍按调用顺序返回
+        results, events, peak, elapsed = await self._run(
+            ["read_file"] * 4, {0: 0.15, 1: 0.1, 2: 0.05, 3: 0.01}
+        )
+        assert results == [f"result-{i}" for i in range(4)]
+        assert peak == 4
+        assert elapsed < 0.25
+        assert events[-1] == ("end", 0)
+
+    async def test_concurrency_cap(self):
+        _, _, peak, _ = await self._run(["http_request"] * 6, {}, concurrency=2)
+        assert peak == 2
+
+    async def test_serial_tool_is_a_barrier(self):
+        results, events, _, _ = await self._run(
+            ["read_file", "read_file", "write_file", "read_file"], {0: 0.05, 1: 0.02}
+        )
+        assert results == [f"result-{i}" for i in range(4)]
+        # write_file 在前两个读取结束后开始，在后一个读取开始前结束
+        write_start = events.index(("start", 2))
+        assert {("end", 0), ("end", 1)} <= set(events[:write_start])
+        assert events.index(("end", 2)) < events.index(("start", 3))
+
+    def test_serial_flags(self):
+        tools = get_all_registered_tools()
+        assert tools["write_file"].serial is True
+        assert tools["complete_task"].serial is True
+        assert tools["read_file"].serial is False
+        assert is_serial_tool("execute_command")
+        # http_request 只有读请求可并发，写请求按调用顺序执行
+        assert not is_serial_tool("http_request", {"url": "u", "method": "get"})
+        assert not is_serial_tool("http_request", {"url": "u"})
+        assert is_serial_tool("http_request", {"url": "u", "method": "POST"})
+        assert is_serial_tool("http_request")
+        assert not is_serial_tool("unregistered_tool")
@@ -0,0 +1,132 @@
+"""短事务测试：Executor 运行期间不持有数据库连接和事务，API 写入不被阻塞"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base, get_db
+from app.main import app
+from app.models.agent import Agent
+from app.models.session import Session
+from app.models.step import Step
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.executor import AnthropicExecutor
+from app.scheduler.write_behind import write_behind
+from tests.test_scheduler.fake_llm import FakeMessages
+
+TICKETS = 3
+
+
+def tool_response(name: str, tool_input: dict):
+    return SimpleNamespace(
+        stop_reason="tool_use",
+        content=[
+            SimpleNamespace(type="tool_use", id=f"toolu_{name}", name=name, input=tool_input)
+        ],
+        usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+    )
+
+
+@pytest.fixture
+async def file_db(tmp_path):
+    """文件数据库（与生产相同的 SQLite 锁语义），锁等待超过 1 秒即报错"""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path}/units.db", connect_args={"timeout": 1}
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Agent(id="agent-1", name="Agent", prompt="p"))
+        for i in range(TICKETS):
+            db.add(
+                Ticket(id=f"ticket-{i}", agent_id="agent-1", status=TicketStatus.RUNNING.value)
+            )
+            db.add(Session(id=f"session-{i}", ticket_id=f"ticket-{i}"))
+        await db.commit()
+    yield engine, maker
+    await engine.dispose()
+
+
+@pytest.mark.integration
+class TestUnitsOfWork:
+    """测试 Executor 在模型调用期间不占用数据库"""
+
+    async def test_api_writes_not_blocked_while_tickets_run(self, file_db):
+        engine, maker = file_db
+        release = asyncio.Event()
+        all_waiting = asyncio.Event()
+        waiting = 0
+
+        class SlowClient:
+            """第一轮添加步骤；第二轮模拟慢速模型调用，放行后完成任务"""
+
+            def __init__(self, *args, **kwargs):
+                self.messages = FakeMessages(self.create)
+
+            async def create(self, **kwargs):
+                nonlocal waiting
+                if len(kwargs["messages"]) == 1:
+                    return tool_response("add_step", {"title": "s", "status": "running"})
+                waiting += 1
+                if waiting == TICKETS:
+                    all_waiting.set()
+                await release.wait()
+                return tool_response("complete_task", {"summary": "done"})
+
+        async def get_test_db():
+            async with maker() as db:
+                yield db
+                await db.commit()
+
+        app.dependency_overrides[get_db] = get_test_db
+        try:
+            with (
+                patch("app.scheduler.executor.async_session_maker", maker),
+                patch("app.scheduler.write_behind.async_session_maker", maker),
+                patch.object(write_behind, "flush_interval", 0.01),
+                patch("anthropic.AsyncAnthropic", SlowClient),
+            ):
+                runs = [
+                    asyncio.create_task(
+                        AnthropicExecutor(f"ticket-{i}", f"session-{i}").run()
+                    )
+                    for i in range(TICKETS)
+                ]
+                try:
+                    await asyncio.wait_for(all_waiting.wait(), timeout=5)
+                    # 第一轮的消息和步骤已在后台提交
+                    await asyncio.sleep(0.1)
+                    assert write_behind.pending == 0
+
+                    # 所有 Executor 都在等待模型响应：没有占用连接，也就没有打开的事务
+                    assert engine.sync_engine.pool.checkedout() == 0
+
+                    transport = ASGITransport(app=app)
+                    async with AsyncClient(transport=transport, base_url="http://test") as client:
+                        started = time.monotonic()
+                        for i in range(5):
+                            response = await client.post(
+                                "/api/agents", json={"name": f"api-{i}", "prompt": "p"}
+                            )
+                            assert response.status_code == 201
+                        assert time.monotonic() - started < 1.0
+                finally:
+                    release.set()
+                    await asyncio.gather(*runs)
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+
+        async with maker() as db:
+            statuses = (await db.execute(select(Ticket.status))).scalars().all()
+            steps = await db.scalar(select(func.count()).select_from(Step))
+            agents = await db.scalar(select(func.count()).select_from(Agent))
+        assert statuses == [TicketStatus.COMPLETED.value] * TICKETS
+        assert steps == TICKETS
+        assert agents == 1 + 5
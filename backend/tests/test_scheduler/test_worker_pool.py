@@ -0,0 +1,131 @@
+"""WorkerPool 与有界派发测试"""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.worker_pool import WorkerPool
+
+
+class BlockingExecutor:
+    """运行到 release 被 set 为止的假 Executor"""
+
+    def __init__(self, ticket_id: str, session_id: str):
+        self.ticket_id = ticket_id
+        self.session_id = session_id
+        self.release = asyncio.Event()
+
+    async def run(self):
+        await self.release.wait()
+
+    def stop(self):
+        self.release.set()
+
+
+@pytest.mark.unit
+class TestWorkerPool:
+    """测试 WorkerPool 槽位管理"""
+
+    async def test_global_limit(self):
+        """达到全局上限后不再有容量"""
+        pool = WorkerPool(max_workers=2, default_agent_limit=10)
+        executors = [BlockingExecutor(f"t{i}", "s") for i in range(2)]
+        for i, executor in enumerate(executors):
+            pool.reserve(f"t{i}", f"agent-{i}")
+            pool.submit(f"t{i}", executor)
+
+        assert pool.is_full
+        assert not pool.has_capacity("agent-other")
+
+        for executor in executors:
+            executor.stop()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert pool.active_count == 0
+
+    async def test_agent_limit(self):
+        """单个 Agent 达到上限后其它 Agent 仍可派发"""
+        pool = WorkerPool(max_workers=10, default_agent_limit=1)
+        executor = BlockingExecutor("t1", "s")
+        pool.reserve("t1", "agent-a")
+        pool.submit("t1", executor)
+
+        assert not pool.has_capacity("agent-a")
+        assert pool.has_capacity("agent-a", agent_limit=2)
+        assert pool.has_capacity("agent-b")
+
+        executor.stop()
+
+    async def test_release_reservation(self):
+        """预留作废后释放槽位"""
+        pool = WorkerPool(max_workers=1)
+        pool.reserve("t1", "agent-a")
+        assert pool.is_full
+
+        pool.release("t1")
+        assert not pool.is_full
+        assert pool.agent_count("agent-a") == 0
+
+    async def test_release_calls_callback(self):
+        """任务结束后释放槽位并回调"""
+        released = []
+        pool = WorkerPool(on_release=lambda: released.append(True))
+        executor = BlockingExecutor("t1", "s")
+        pool.reserve("t1", "agent-a")
+        task = pool.submit("t1", executor)
+
+        executor.stop()
+        await task
+        await asyncio.sleep(0)
+
+        assert released == [True]
+        assert not pool.is_running("t1")
+        assert pool.agent_count("agent-a") == 0
+
+
+@pytest.mark.unit
+class TestBoundedDispatch:
+    """测试超出上限的 Ticket 保持 pending"""
+
+    async def test_tickets_beyond_caps_stay_pending(self, test_engine):
+        from app.scheduler.dispatcher import Dispatcher
+
+        session_maker = async_sessionmaker(
+            test_engine, class_=AsyncSession, expire_on_commit=False
+        )
+        async with session_maker() as db:
+            db.add(Agent(id="agent-a", name="A", prompt="p", max_concurrency=1))
+            db.add(Agent(id="agent-b", name="B", prompt="p"))
+            for i in range(3):
+                db.add(Ticket(id=f"ticket-a{i}", agent_id="agent-a"))
+                db.add(Ticket(id=f"ticket-b{i}", agent_id="agent-b"))
+            await db.commit()
+
+        dispatcher = Dispatcher(pool=WorkerPool(max_workers=3, default_agent_limit=5))
+        with (
+            patch("app.scheduler.dispatcher.async_session_maker", session_maker),
+            patch(
+                "app.scheduler.worker_pool.ExecutorFactory.create_executor",
+                BlockingExecutor,
+            ),
+        ):
+            await dispatcher._dispatch_pending_tickets()
+
+        async with session_maker() as db:
+            result = await db.execute(select(Ticket.agent_id, Ticket.status))
+            rows = result.all()
+
+        running = [agent for agent, s in rows if s == TicketStatus.RUNNING.value]
+        pending = [agent for agent, s in rows if s == TicketStatus.PENDING.value]
+        assert running.count("agent-a") == 1
+        assert running.count("agent-b") == 2
+        assert len(pending) == 3
+        assert dispatcher.pool.active_count == 3
+
+        for task in list(dispatcher.pool._tasks.values()):
+            task.cancel()
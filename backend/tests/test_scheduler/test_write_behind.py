@@ -0,0 +1,378 @@
+"""批量写入（write-behind）测试"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.agent import Agent
+from app.models.llm_call import LLMCall
+from app.models.message import Message, MessageRole
+from app.models.session import Session
+from app.models.step import Step
+from app.models.ticket import Ticket, TicketStatus
+from app.scheduler.context import ExecutionContext, execution_context
+from app.scheduler.executor import AnthropicExecutor
+from app.scheduler.executor2 import SDKExecutor
+from app.scheduler.metrics import scheduler_metrics
+from app.scheduler.write_behind import (
+    LeaseFence,
+    WriteBehindBuffer,
+    release_lease,
+    write_behind,
+)
+from app.tools.system_tools import complete_task
+from tests.test_scheduler.fake_llm import FakeMessages
+
+
+@pytest.fixture
+async def maker(test_engine):
+    maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Agent(id="agent-1", name="Agent", prompt="p"))
+        db.add(Ticket(id="ticket-1", agent_id="agent-1", status=TicketStatus.RUNNING.value))
+        db.add(Session(id="session-1", ticket_id="ticket-1"))
+        await db.commit()
+    return maker
+
+
+def message(content: str) -> Message:
+    return Message(session_id="session-1", role=MessageRole.TOOL.value, content=content)
+
+
+async def contents(maker) -> list[str]:
+    async with maker() as db:
+        rows = await db.execute(select(Message.content).order_by(Message.id))
+        return list(rows.scalars())
+
+
+async def set_lease(maker, owner: str | None):
+    async with maker() as db:
+        await db.execute(
+            update(Ticket).where(Ticket.id == "ticket-1").values(lease_owner=owner)
+        )
+        await db.commit()
+
+
+@pytest.mark.unit
+class TestWriteBehindBuffer:
+    """测试批量提交、阈值和快照语义"""
+
+    async def test_group_commit(self, maker):
+        scheduler_metrics.reset()
+        writer = WriteBehindBuffer(flush_interval=60, session_maker=maker)
+        rows = [message(str(i)) for i in range(3)]
+        writer.save(rows[0])
+        writer.save(*rows[1:], Step(ticket_id="ticket-1", idx=0, title="s"))
+        assert await contents(maker) == []
+
+        await writer.flush()
+
+        assert await contents(maker) == ["0", "1", "2"]
+        # 提交后回填主键和默认值
+        assert [r.id for r in rows] == sorted(r.id for r in rows)
+        assert rows[0].partial is False and rows[0].timestamp is not None
+        snapshot = scheduler_metrics.snapshot()
+        assert snapshot["counters"]["write_behind_flushes"] == 1
+        assert snapshot["counters"]["write_behind_rows"] == 4
+        assert snapshot["values"]["write_behind_batch_size"]["max"] == 4
+        assert snapshot["latency"]["write_behind_flush"]["count"] == 1
+
+    async def test_size_threshold(self, maker):
+        scheduler_metrics.reset()
+        writer = WriteBehindBuffer(max_batch=2, flush_interval=60, session_maker=maker)
+        writer.save(message("a"))
+        await asyncio.sleep(0.05)
+        assert writer.pending == 1
+
+        writer.save(message("b"))
+        # 达到批大小，在后台开始提交
+        await asyncio.sleep(0)
+        assert writer.pending == 0
+        await writer.flush()
+        assert await contents(maker) == ["a", "b"]
+        assert scheduler_metrics.snapshot()["values"]["write_behind_batch_size"]["max"] == 2
+
+    async def test_time_threshold(self, maker):
+        writer = WriteBehindBuffer(flush_interval=0.05, session_maker=maker)
+        writer.save(message("a"))
+        await asyncio.sleep(0.3)
+        assert await contents(maker) == ["a"]
+        assert writer.pending == 0
+
+    async def test_saves_of_one_row_coalesce(self, maker):
+        writer = WriteBehindBuffer(flush_interval=60, session_maker=maker)
+        row = message("first")
+        writer.save(row)
+        row.content = "second"
+        writer.save(row)
+        assert writer.pending == 1
+        await writer.flush()
+
+        # 已写入的行再次 save 时更新
+        row.content = "third"
+        writer.save(row)
+        await writer.flush()
+        assert await contents(maker) == ["third"]
+
+    async def test_update_writes_changed_columns_only(self, maker):
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+        # 其它连接在此期间修改的列不被覆盖
+        async with maker() as db:
+            await db.execute(
+                update(Ticket).where(Ticket.id == "ticket-1").values(error_message="api")
+            )
+            await db.commit()
+
+        writer = WriteBehindBuffer(flush_interval=60, session_maker=maker)
+        ticket.status = TicketStatus.COMPLETED.value
+        writer.save(ticket)
+        # 快照之后的修改需要再次 save
+        ticket.result = "later"
+        await writer.flush()
+
+        async with maker() as db:
+            stored = await db.get(Ticket, "ticket-1")
+        assert stored.status == TicketStatus.COMPLETED.value
+        assert stored.error_message == "api"
+        assert stored.result is None
+
+    async def test_save_during_flush_is_not_lost(self, maker):
+        writer = WriteBehindBuffer(flush_interval=60, session_maker=maker)
+        row = message("partial")
+        writer.save(row)
+        flushing = asyncio.create_task(writer.flush())
+        await asyncio.sleep(0)
+        row.content = "final"
+        writer.save(row)
+        await flushing
+        await writer.flush()
+        assert await contents(maker) == ["final"]
+
+    async def test_failed_flush_requeued(self, maker):
+        scheduler_metrics.reset()
+
+        def broken():
+            raise ConnectionError("database unavailable")
+
+        writer = WriteBehindBuffer(flush_interval=60, session_maker=broken)
+        notified = []
+        writer.save(message("a"))
+        writer.after_flush(lambda: notified.append(True))
+        with pytest.raises(ConnectionError):
+            await writer.flush()
+        assert writer.pending == 1 and notified == []
+
+        writer.session_maker = maker
+        await writer.flush()
+        assert await contents(maker) == ["a"]
+        assert notified == [True]
+        assert scheduler_metrics.snapshot()["counters"]["write_behind_errors"] == 1
+
+    async def test_fenced_writes_dropped_after_lease_lost(self, maker):
+        await set_lease(maker, "worker-a")
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+
+        scheduler_metrics.reset()
+        lost = []
+        fence = LeaseFence("ticket-1", "worker-a", lambda: lost.append(True))
+        writer = WriteBehindBuffer(flush_interval=60, session_maker=maker)
+        ticket.status = TicketStatus.COMPLETED.value
+        writer.save(message("fenced"), ticket, fence=fence)
+        writer.save(message("other"))
+        # 租约在提交前被其它进程接管
+        await set_lease(maker, "worker-b")
+        await writer.flush()
+
+        assert await contents(maker) == ["other"]
+        async with maker() as db:
+            stored = await db.get(Ticket, "ticket-1")
+        assert stored.status == TicketStatus.RUNNING.value
+        assert stored.lease_owner == "worker-b"
+        assert lost == [True] and fence.lost
+        # 丢失后的写入直接丢弃
+        writer.save(message("late"), fence=fence)
+        assert writer.pending == 0
+        assert scheduler_metrics.snapshot()["counters"]["write_behind_fenced"] == 3
+
+
+def tool_response(name: str, tool_input: dict):
+    return SimpleNamespace(
+        stop_reason="tool_use",
+        content=[
+            SimpleNamespace(
+                type="tool_use", id=f"toolu_{name}", name=name, input=tool_input
+            )
+        ],
+        usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+    )
+
+
+async def run_executor(maker, on_call=None):
+    """运行一个三轮完成的 Executor，on_call(n) 在第 n 次模型调用时调用"""
+    responses = [
+        tool_response("add_step", {"title": "s", "status": "running"}),
+        tool_response("complete_step", {"summary": "ok"}),
+        tool_response("complete_task", {"summary": "done"}),
+    ]
+    calls = []
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            self.messages = FakeMessages(self.create)
+
+        async def create(self, **kwargs):
+            calls.append(kwargs)
+            if on_call is not None:
+                await on_call(len(calls))
+            return responses[len(calls) - 1]
+
+    with (
+        patch("app.scheduler.executor.async_session_maker", maker),
+        patch("app.scheduler.write_behind.async_session_maker", maker),
+        patch.object(write_behind, "flush_interval", 60),
+        patch("anthropic.AsyncAnthropic", FakeClient),
+    ):
+        await AnthropicExecutor("ticket-1", "session-1").run()
+
+
+@pytest.mark.unit
+class TestLeaseRelease:
+    """测试 Executor 自己释放租约，以及 SDKExecutor 路径的租约条件"""
+
+    async def test_writes_after_own_release_are_kept(self, maker):
+        await set_lease(maker, "worker-a")
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+
+        fence = LeaseFence("ticket-1", "worker-a")
+        writer = WriteBehindBuffer(flush_interval=60, session_maker=maker)
+        ticket.status = TicketStatus.COMPLETED.value
+        release_lease(ticket)
+        writer.save(ticket, fence=fence)
+        await writer.flush()
+        # 释放后 Executor 的后续写入（如最后一条消息）仍然落库
+        writer.save(message("after"), fence=fence)
+        await writer.flush()
+
+        assert await contents(maker) == ["after"]
+        assert not fence.lost and fence.owner is None
+
+    async def _complete_with_fence(self, maker, fence):
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+            session = await db.get(Session, "session-1")
+        executor = SDKExecutor("ticket-1", "session-1")
+        token = execution_context.set(
+            ExecutionContext(
+                ticket=ticket, session=session, executor=executor, fence=fence
+            )
+        )
+        try:
+            with (
+                patch("app.scheduler.write_behind.async_session_maker", maker),
+                patch.object(write_behind, "flush_interval", 60),
+            ):
+                await complete_task.handler({"summary": "done"})
+        finally:
+            execution_context.reset(token)
+        async with maker() as db:
+            return await db.get(Ticket, "ticket-1")
+
+    async def test_sdk_system_tool_releases_lease(self, maker):
+        await set_lease(maker, "worker-a")
+        fence = LeaseFence("ticket-1", "worker-a")
+        ticket = await self._complete_with_fence(maker, fence)
+        assert ticket.status == TicketStatus.COMPLETED.value
+        assert ticket.lease_owner is None
+
+    async def test_sdk_system_tool_fenced(self, maker):
+        await set_lease(maker, "worker-b")
+        fence = LeaseFence("ticket-1", "worker-a")
+        ticket = await self._complete_with_fence(maker, fence)
+        assert ticket.status == TicketStatus.RUNNING.value
+        assert ticket.lease_owner == "worker-b"
+        assert fence.lost
+
+    async def test_sdk_mark_failed_fenced(self, maker):
+        await set_lease(maker, "worker-b")
+        executor = SDKExecutor("ticket-1", "session-1")
+        executor._lease = LeaseFence("ticket-1", "worker-a", executor.stop)
+        with (
+            patch("app.scheduler.executor2.async_session_maker", maker),
+            patch("app.scheduler.write_behind.async_session_maker", maker),
+        ):
+            await executor._mark_failed("boom")
+            async with maker() as db:
+                ticket = await db.get(Ticket, "ticket-1")
+            assert ticket.status == TicketStatus.RUNNING.value
+            assert executor._lease.lost and executor._should_stop
+
+            # 仍持有租约时标记失败并释放租约
+            await set_lease(maker, "worker-a")
+            executor._lease = LeaseFence("ticket-1", "worker-a")
+            await executor._mark_failed("boom")
+            async with maker() as db:
+                ticket = await db.get(Ticket, "ticket-1")
+                session = await db.get(Session, "session-1")
+        assert ticket.status == TicketStatus.FAILED.value
+        assert ticket.error_message == "boom"
+        assert ticket.lease_owner is None
+        assert session.status == "failed"
+
+
+@pytest.mark.unit
+class TestExecutorWriteBehind:
+    """测试 Executor 经 write_behind 写入"""
+
+    async def test_run_commits_once_at_completion(self, maker):
+        scheduler_metrics.reset()
+        await run_executor(maker)
+
+        # 三轮迭代的消息、步骤、调用记录和最终状态在完成时一次提交
+        assert scheduler_metrics.snapshot()["counters"]["write_behind_flushes"] == 1
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+            step = (await db.execute(select(Step))).scalar_one()
+            llm_calls = (await db.execute(select(LLMCall))).scalars().all()
+            roles = (
+                await db.execute(select(Message.role).order_by(Message.id))
+            ).scalars().all()
+        assert ticket.status == TicketStatus.COMPLETED.value
+        assert ticket.usage_iterations == 3
+        assert step.status == "completed"
+        assert len(llm_calls) == 3
+        assert roles == ["system", "user"] + ["assistant", "tool"] * 3
+
+    async def test_completion_releases_lease(self, maker):
+        await set_lease(maker, "worker-a")
+        await run_executor(maker)
+
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+        assert ticket.status == TicketStatus.COMPLETED.value
+        assert ticket.lease_owner is None and ticket.lease_expires_at is None
+
+    async def test_lost_lease_drops_executor_writes(self, maker):
+        await set_lease(maker, "worker-a")
+
+        async def reclaim(n):
+            if n == 2:
+                # 运行期间租约被回收并由其它进程重新认领
+                await set_lease(maker, "worker-b")
+
+        await run_executor(maker, reclaim)
+
+        assert await contents(maker) == []
+        async with maker() as db:
+            ticket = await db.get(Ticket, "ticket-1")
+            session = await db.get(Session, "session-1")
+        assert ticket.status == TicketStatus.RUNNING.value
+        assert ticket.lease_owner == "worker-b"
+        assert ticket.usage_iterations in (None, 0)
+        assert session.status == "active"
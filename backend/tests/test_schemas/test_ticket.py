@@ -36,6 +36,15 @@ class TestTicketSchemas:
         assert request.agent_id == "agent-123"
         assert request.params is None
         assert request.context is None
+        assert request.priority == 0
+
+    def test_create_ticket_request_priority_range(self):
+        """测试 CreateTicketRequest priority 取值范围"""
+        from pydantic import ValidationError
+
+        assert CreateTicketRequest(agent_id="a", priority=100).priority == 100
+        with pytest.raises(ValidationError):
+            CreateTicketRequest(agent_id="a", priority=-1)
 
     def test_ticket_summary(self):
         """测试 TicketSummary schema"""
@@ -0,0 +1,33 @@
+"""Ticket Cache 单元测试"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.ticket_cache import compute_cache_key
+
+
+def make_agent(**kwargs):
+    fields = {"id": "agent-1", "version": 1, "skill_name": None, "prompt": "Hi {{ name }}"}
+    fields.update(kwargs)
+    return SimpleNamespace(**fields)
+
+
+@pytest.mark.unit
+class TestCacheKey:
+    """测试内容缓存键"""
+
+    def test_key_ignores_dict_order(self):
+        agent = make_agent()
+        first = compute_cache_key(agent, {"name": "a", "n": 1}, {"x": 1})
+        second = compute_cache_key(agent, {"n": 1, "name": "a"}, {"x": 1})
+        assert first == second
+
+    def test_key_changes_with_content(self):
+        agent = make_agent()
+        base = compute_cache_key(agent, {"name": "a"}, None)
+        assert compute_cache_key(agent, {"name": "b"}, None) != base
+        assert compute_cache_key(agent, {"name": "a"}, {"x": 1}) != base
+        assert compute_cache_key(make_agent(version=2), {"name": "a"}, None) != base
+        assert compute_cache_key(make_agent(prompt="Bye"), {"name": "a"}, None) != base
+        assert compute_cache_key(make_agent(id="agent-2"), {"name": "a"}, None) != base
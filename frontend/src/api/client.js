@@ -35,6 +35,7 @@ export const api = {
     }),
     resumeTicket: (id) => request(`/tickets/${id}/resume`, { method: 'PATCH' }),
     resetTicket: (id) => request(`/tickets/${id}/reset`, { method: 'PATCH' }),
+    cancelTicket: (id) => request(`/tickets/${id}/cancel`, { method: 'POST' }),
     deleteTicket: (id) => request(`/tickets/${id}`, { method: 'DELETE' }),
 
     // Agents
@@ -56,6 +57,8 @@ export const api = {
         return request(`/sessions${query ? `?${query}` : ''}`)
     },
     getSession: (id) => request(`/sessions/${id}`),
+    // Server-Sent Events: 实时输出
+    streamSession: (id) => new EventSource(`${API_BASE}/sessions/${id}/stream`),
     addMessage: (sessionId, content) => request(`/sessions/${sessionId}/messages`, {
         method: 'POST',
         body: JSON.stringify({ content }),
@@ -6,9 +6,10 @@ const roleStyles = {
     assistant: 'bg-indigo-500/20 border-indigo-500/30',
     user: 'bg-purple-500/20 border-purple-500/30',
     tool: 'bg-slate-900 border-slate-700 font-mono text-xs',
+    summary: 'bg-amber-500/10 border-amber-500/30 text-xs',
 }
 
-export default function SessionView({ session, onSendMessage, onClose }) {
+export default function SessionView({ session, liveMessage, onSendMessage, onClose }) {
     const [inputValue, setInputValue] = useState('')
 
     const handleSendMessage = () => {
@@ -34,6 +35,11 @@ export default function SessionView({ session, onSendMessage, onClose }) {
                 }
             } catch { }
         }
+        if (msg.role === 'summary') {
+            try {
+                return JSON.parse(msg.content).summary
+            } catch { }
+        }
         return msg.content
     }
 
@@ -52,14 +58,29 @@ export default function SessionView({ session, onSendMessage, onClose }) {
             </div>
 
             <div className="flex-1 overflow-y-auto scroll-area p-4 space-y-3">
-                {session.messages?.map(msg => (
+                {session.messages?.filter(msg => !(liveMessage && msg.partial)).map(msg => (
                     <div key={msg.id} className={msg.role === 'user' ? 'flex justify-end' : ''}>
                         <div className={`max-w-[90%] border rounded-lg p-3 ${roleStyles[msg.role] || roleStyles.assistant}`}>
-                            <div className="text-xs text-slate-500 mb-1">{msg.role}</div>
+                            <div className="text-xs text-slate-500 mb-1">{msg.role}{msg.partial && ' (partial)'}</div>
                             <div className="text-sm whitespace-pre-wrap">{parseMessageContent(msg)}</div>
                         </div>
                     </div>
                 ))}
+                {liveMessage && (
+                    <div>
+                        <div className={`max-w-[90%] border rounded-lg p-3 ${roleStyles.assistant}`}>
+                            <div className="text-xs text-slate-500 mb-1">assistant ▍</div>
+                            <div className="text-sm whitespace-pre-wrap">
+                                {liveMessage.text && <p>{liveMessage.text}</p>}
+                                {liveMessage.tools.map((name, i) => (
+                                    <div key={i} className="mt-2 p-2 bg-slate-800 rounded text-xs">
+                                        <span className="text-indigo-400">Tool: {name}</span>
+                                    </div>
+                                ))}
+                            </div>
+                        </div>
+                    </div>
+                )}
             </div>
 
             {session.status === 'suspended' && (
@@ -54,4 +54,18 @@ describe('SessionView', () => {
         fireEvent.click(screen.getByText('✕'))
         expect(onClose).toHaveBeenCalled()
     })
+    it('renders live message and hides partial rows while streaming', () => {
+        const session = {
+            ...mockSession,
+            messages: [
+                ...mockSession.messages,
+                { id: '3', role: 'assistant', content: '[{"type":"text","text":"Stale"}]', partial: true }
+            ]
+        }
+        render(<SessionView session={session} liveMessage={{ text: 'Streaming', tools: ['read_file'] }} />)
+
+        expect(screen.getByText('Streaming')).toBeInTheDocument()
+        expect(screen.getByText('Tool: read_file')).toBeInTheDocument()
+        expect(screen.queryByText('Stale')).not.toBeInTheDocument()
+    })
 })
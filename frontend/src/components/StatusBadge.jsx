@@ -1,19 +1,23 @@
 const statusStyles = {
+    scheduled: 'bg-purple-500/20 text-purple-400',
     pending: 'bg-yellow-500/20 text-yellow-400',
     running: 'bg-blue-500/20 text-blue-400 animate-pulse-dot',
     active: 'bg-blue-500/20 text-blue-400 animate-pulse-dot',
     suspended: 'bg-orange-500/20 text-orange-400',
     completed: 'bg-green-500/20 text-green-400',
     failed: 'bg-red-500/20 text-red-400',
+    cancelled: 'bg-slate-500/20 text-slate-400',
 }
 
 const statusIcons = {
+    scheduled: '⏰',
     pending: '⏳',
     running: '▶',
     active: '▶',
     suspended: '⏸',
     completed: '✓',
     failed: '✕',
+    cancelled: '⊘',
 }
 
 export default function StatusBadge({ status, large = false }) {
@@ -9,14 +9,34 @@ export default function SessionDetailPage() {
     const [session, setSession] = useState(null)
     const [loading, setLoading] = useState(true)
     const [error, setError] = useState(null)
+    // 正在生成的 assistant 消息（来自 SSE）
+    const [liveMessage, setLiveMessage] = useState(null)
 
     useEffect(() => {
         loadSession()
     }, [id])
 
-    const loadSession = async () => {
+    useEffect(() => {
+        const source = api.streamSession(id)
+        const on = (type, handler) => source.addEventListener(type, (e) => handler(JSON.parse(e.data)))
+        on('message_start', () => setLiveMessage({ text: '', tools: [] }))
+        on('message_restart', () => setLiveMessage({ text: '', tools: [] }))
+        on('text_delta', ({ text }) => setLiveMessage(m => ({ ...(m || { tools: [] }), text: (m?.text || '') + text })))
+        on('tool_use', ({ name }) => setLiveMessage(m => ({ ...(m || { text: '' }), tools: [...(m?.tools || []), name] })))
+        on('message_stop', () => {
+            setLiveMessage(null)
+            loadSession(true)
+        })
+        on('message_abort', () => {
+            setLiveMessage(null)
+            loadSession(true)
+        })
+        return () => source.close()
+    }, [id])
+
+    const loadSession = async (quiet = false) => {
         try {
-            setLoading(true)
+            if (!quiet) setLoading(true)
             const data = await api.getSession(id)
             setSession(data)
         } catch (err) {
@@ -53,6 +73,7 @@ export default function SessionDetailPage() {
         <div className="max-w-4xl mx-auto h-[calc(100vh-8rem)]">
             <SessionView
                 session={session}
+                liveMessage={liveMessage}
                 onSendMessage={handleSendMessage}
             />
         </div>
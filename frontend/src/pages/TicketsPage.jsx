@@ -58,6 +58,19 @@ export default function TicketsPage() {
         }
     }
 
+    const handleCancel = async (id) => {
+        if (!confirm('确定要取消此 Ticket 吗？正在执行的操作将被中断。')) return
+        try {
+            await api.cancelTicket(id)
+            loadTickets()
+            if (selectedTicket?.id === id) {
+                loadTicketDetail(id)
+            }
+        } catch (err) {
+            alert(err.message)
+        }
+    }
+
     const handleReset = async (id) => {
         if (!confirm('确定要重置此 Ticket 吗？这将归档当前 Session。')) return
         try {
@@ -151,6 +164,14 @@ export default function TicketsPage() {
                                         ▶ Resume
                                     </button>
                                 )}
+                                {['scheduled', 'pending', 'running', 'suspended'].includes(selectedTicket.status) && (
+                                    <button
+                                        onClick={() => handleCancel(selectedTicket.id)}
+                                        className="px-3 py-1.5 bg-red-600 hover:bg-red-500 rounded-lg text-sm"
+                                    >
+                                        ⊘ Cancel
+                                    </button>
+                                )}
                                 <button
                                     onClick={() => handleReset(selectedTicket.id)}
                                     className="px-3 py-1.5 bg-slate-700 hover:bg-slate-600 rounded-lg text-sm"
@@ -203,6 +224,22 @@ export default function TicketsPage() {
                                 <span className="text-slate-400">Created</span>
                                 <span>{formatTime(selectedTicket.created_at)}</span>
                             </div>
+                            {selectedTicket.usage && (
+                                <div className="flex justify-between">
+                                    <span className="text-slate-400">Usage</span>
+                                    <span>
+                                        {selectedTicket.usage.iterations} iter · {selectedTicket.usage.input_tokens + selectedTicket.usage.output_tokens} tok · ${selectedTicket.usage.cost_usd.toFixed(4)} · {Math.round(selectedTicket.usage.wall_seconds)}s
+                                    </span>
+                                </div>
+                            )}
+                            {selectedTicket.usage?.cache_read_tokens + selectedTicket.usage?.cache_write_tokens > 0 && (
+                                <div className="flex justify-between">
+                                    <span className="text-slate-400">Prompt cache</span>
+                                    <span>
+                                        {selectedTicket.usage.cache_read_tokens} read · {selectedTicket.usage.cache_write_tokens} written
+                                    </span>
+                                </div>
+                            )}
                         </div>
 
                         {selectedTicket.steps?.length > 0 && (
@@ -239,6 +276,9 @@ export default function TicketsPage() {
 
                         {selectedTicket.error_message && (
                             <div className="p-3 bg-red-500/20 border border-red-500/30 rounded-lg">
+                                {selectedTicket.failure_reason && (
+                                    <p className="text-xs font-mono text-red-300 mb-1">{selectedTicket.failure_reason}</p>
+                                )}
                                 <p className="text-sm text-red-400">{selectedTicket.error_message}</p>
                             </div>
                         )}